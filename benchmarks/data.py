@@ -0,0 +1,284 @@
+"""Deterministic synthetic dataset for the benchmark scenarios.
+
+``generate(scale, seed)`` fills the configured database. Point it at a
+dedicated benchmark database, not production. It creates users (with
+profiles), categories, products, ratings, chat rooms and messages, eco-places
+and footprint sessions, plus a small calculator factor set when none exists.
+Every generated row is marked (``bench_`` usernames, ``bench-`` slugs,
+``BENCH_MARK`` descriptions, ``calculation_version='bench'``), so ``flush()``
+removes exactly that.
+
+Rows are built in fixed chunks, and each chunk's random generator is seeded
+from ``(seed, table, chunk start)``. Running again with the same scale and
+seed therefore produces the same data. An interrupted run continues where it
+stopped, and a larger scale only adds rows on top of a smaller one.
+"""
+from __future__ import annotations
+
+import random
+from dataclasses import asdict, dataclass
+from decimal import Decimal
+from typing import Callable, Dict, Iterable, List, Optional
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from carbon_calculator.models import ActivityCategory, EmissionFactor, Region, UserFootprintSession
+from chat.models import ChatRoom, Message
+from places.models import EcoPlace
+from store.models import Category, Order, Product, ProductRating, Profile
+
+User = get_user_model()
+
+CHUNK = 10_000
+USER_PREFIX = 'bench_user_'
+SLUG_PREFIX = 'bench-'
+ROOM_PREFIX = 'bench-room-'
+BENCH_MARK = '[bench]'
+BENCH_EMAIL_DOMAIN = 'bench.invalid'
+FOOTPRINT_VERSION = 'bench'
+
+# Poland, roughly: the places_api radius scenario picks its centres in the same box
+LAT_RANGE = (49.0, 54.8)
+LNG_RANGE = (14.1, 24.1)
+CITIES = ['Warszawa', 'Kraków', 'Łódź', 'Wrocław', 'Poznań', 'Gdańsk', 'Szczecin', 'Lublin', 'Białystok', 'Katowice']
+WORDS = ['eko', 'bambusowy', 'lniany', 'szklany', 'wielorazowy', 'kompostowalny', 'organiczny', 'naturalny',
+         'bawełniany', 'drewniany', 'stalowy', 'zero waste', 'roślinny', 'ręcznie robiony', 'lokalny']
+
+
+@dataclass(frozen=True)
+class Scale:
+    users: int
+    categories: int
+    products: int
+    ratings: int
+    rooms: int
+    messages: int
+    places: int
+    footprints: int
+
+
+SCALES: Dict[str, Scale] = {
+    'full': Scale(users=20_000, categories=50, products=100_000, ratings=1_000_000, rooms=200,
+                  messages=10_000_000, places=100_000, footprints=1_000_000),
+    'medium': Scale(users=5_000, categories=30, products=10_000, ratings=100_000, rooms=50,
+                    messages=1_000_000, places=10_000, footprints=100_000),
+    'small': Scale(users=500, categories=20, products=1_000, ratings=10_000, rooms=10,
+                   messages=100_000, places=1_000, footprints=10_000),
+    # for tests of the suite itself
+    'tiny': Scale(users=20, categories=3, products=60, ratings=200, rooms=2,
+                  messages=300, places=50, footprints=40),
+}
+
+
+def _rng(seed: int, table: str, start: int) -> random.Random:
+    return random.Random(f"{seed}:{table}:{start}")
+
+
+def _fill(table: str, existing: int, target: int, seed: int, build: Callable[[random.Random, int], object],
+          create: Callable[[List[object]], None], log: Optional[Callable[[str], None]]) -> int:
+    """Create rows ``existing..target`` in ``CHUNK``-aligned, individually committed chunks."""
+    start = existing - existing % CHUNK
+    created = 0
+    while start < target:
+        end = min(start + CHUNK, target)
+        rng = _rng(seed, table, start)
+        rows = [build(rng, i) for i in range(start, end)]
+        rows = rows[existing - start:] if existing > start else rows
+        with transaction.atomic():
+            create(rows)
+        created += len(rows)
+        existing = start = end
+        if log:
+            log(f"  {table}: {end}/{target}")
+    return created
+
+
+def _ids(queryset) -> List[int]:
+    return list(queryset.order_by('id').values_list('id', flat=True))
+
+
+def generate(scale: str = 'small', seed: int = 42, log: Optional[Callable[[str], None]] = None) -> Dict[str, int]:
+    """Bring the benchmark dataset up to ``scale``; returns the number of rows created per table."""
+    size = SCALES[scale]
+    created: Dict[str, int] = {}
+
+    def users(rng, i):
+        name = f"{USER_PREFIX}{i:06d}"
+        return User(username=name, email=f"{name}@{BENCH_EMAIL_DOMAIN}", password='!', first_name=rng.choice(CITIES))
+
+    created['users'] = _fill('users', bench_users().count(), size.users, seed, users,
+                             lambda rows: User.objects.bulk_create(rows, ignore_conflicts=True), log)
+    user_ids = _ids(bench_users())
+    # bulk_create skips the post_save signal that gives every user a profile
+    Profile.objects.bulk_create([Profile(user_id=uid) for uid in
+                                 set(user_ids) - set(Profile.objects.filter(user_id__in=user_ids)
+                                                     .values_list('user_id', flat=True))], ignore_conflicts=True)
+
+    def categories(rng, i):
+        return Category(name=f"Bench {rng.choice(WORDS)} {i}", slug=f"{SLUG_PREFIX}cat-{i:03d}")
+
+    created['categories'] = _fill('categories', bench_categories().count(), size.categories, seed, categories,
+                                  lambda rows: Category.objects.bulk_create(rows, ignore_conflicts=True), log)
+    category_ids = _ids(bench_categories())
+
+    def products(rng, i):
+        words = ' '.join(rng.sample(WORDS, 3))
+        return Product(category_id=category_ids[i % len(category_ids)], name=f"{words.capitalize()} {i}",
+                       slug=f"{SLUG_PREFIX}product-{i:06d}", description=f"{BENCH_MARK} {words}",
+                       price=Decimal(rng.randint(199, 99_999)) / 100, stock=rng.randint(0, 200),
+                       available=rng.random() > 0.05)
+
+    created['products'] = _fill('products', bench_products().count(), size.products, seed, products,
+                                lambda rows: Product.objects.bulk_create(rows, ignore_conflicts=True), log)
+    product_ids = _ids(bench_products())
+
+    # ratings i -> (product i % P, user (i // P + 37 * product) % U): no pair repeats while ratings <= P * U
+    def ratings(rng, i):
+        p = i % len(product_ids)
+        return ProductRating(product_id=product_ids[p], user_id=user_ids[(i // len(product_ids) + 37 * p) % len(user_ids)],
+                             value=min(5, max(1, round(rng.gauss(3.8, 1.0)))))
+
+    rating_target = min(size.ratings, len(product_ids) * len(user_ids))
+    created['ratings'] = _fill('ratings', bench_ratings().count(), rating_target, seed, ratings,
+                               lambda rows: ProductRating.objects.bulk_create(rows, ignore_conflicts=True), log)
+
+    def rooms(rng, i):
+        return ChatRoom(name=f"{ROOM_PREFIX}{i:04d}", topic=BENCH_MARK, owner_id=user_ids[i % len(user_ids)])
+
+    created['rooms'] = _fill('rooms', bench_rooms().count(), size.rooms, seed, rooms, ChatRoom.objects.bulk_create, log)
+    room_ids = _ids(bench_rooms())
+    # every bench user is a member of every room with index == user index mod rooms (owners included)
+    Membership = ChatRoom.members.through
+    Membership.objects.bulk_create(
+        [Membership(chatroom_id=room_ids[j % len(room_ids)], user_id=uid) for j, uid in enumerate(user_ids)],
+        ignore_conflicts=True, batch_size=CHUNK,
+    )
+
+    def messages(rng, i):
+        room = i % len(room_ids)
+        members = user_ids[room::len(room_ids)] or user_ids
+        return Message(room_id=room_ids[room], user_id=rng.choice(members),
+                       text=' '.join(rng.choices(WORDS, k=rng.randint(2, 12))))
+
+    created['messages'] = _fill('messages', bench_messages().count(), size.messages, seed, messages,
+                                Message.objects.bulk_create, log)
+
+    def places(rng, i):
+        return EcoPlace(name=f"Bench {rng.choice(WORDS)} {i}", category=rng.choice(EcoPlace.CATEGORY_CHOICES)[0],
+                        city=rng.choice(CITIES), address=f"ul. Testowa {i}", description=BENCH_MARK,
+                        lat=Decimal(str(round(rng.uniform(*LAT_RANGE), 6))),
+                        lng=Decimal(str(round(rng.uniform(*LNG_RANGE), 6))))
+
+    created['places'] = _fill('places', bench_places().count(), size.places, seed, places,
+                              EcoPlace.objects.bulk_create, log)
+
+    def footprints(rng, i):
+        anonymous = rng.random() < 0.6
+        total = Decimal(rng.randint(150_000, 1_800_000)) / 100
+        return UserFootprintSession(
+            user_id=None if anonymous else rng.choice(user_ids),
+            session_key=f"bench{i:035d}" if anonymous else None,
+            inputs_data={'bench': True}, total_co2_emissions_kg_annual=total,
+            category_breakdown_kg_annual={'transport': float(total) * 0.4, 'energia': float(total) * 0.6},
+            calculation_version=FOOTPRINT_VERSION,
+        )
+
+    created['footprints'] = _fill('footprints', bench_footprints().count(), size.footprints, seed, footprints,
+                                  UserFootprintSession.objects.bulk_create, log)
+    created['factors'] = ensure_calculator_factors()
+    return created
+
+
+def ensure_calculator_factors() -> int:
+    """A minimal calculator (two categories, number and select questions) when the database has none."""
+    if EmissionFactor.objects.filter(is_active=True).exists():
+        return 0
+    Region.objects.get_or_create(code='PL', defaults={'name': 'Polska', 'grid_intensity_kg_per_kwh': Decimal('0.7'),
+                                                      'is_default': True})
+    transport, _ = ActivityCategory.objects.get_or_create(slug=f'{SLUG_PREFIX}transport', defaults={'name': 'Bench transport'})
+    energy, _ = ActivityCategory.objects.get_or_create(slug=f'{SLUG_PREFIX}energia', defaults={'name': 'Bench energia'})
+    periods = {'per_week': {'label': 'na tydzień', 'annual_multiplier': 52},
+               'per_month': {'label': 'na miesiąc', 'annual_multiplier': 12}}
+    factors = [
+        EmissionFactor(activity_category=transport, name='Bench auto', unit_name='km', co2_kg_per_unit=Decimal('0.17'),
+                       form_question_text='Ile km samochodem?', periodicity_options_for_form=periods),
+        EmissionFactor(activity_category=transport, name='Bench lot', unit_name='h', co2_kg_per_unit=Decimal('90.5'),
+                       form_question_text='Ile godzin lotu?'),
+        EmissionFactor(activity_category=energy, name='Bench prąd', unit_name='kWh', co2_kg_per_unit=Decimal('0.8'),
+                       form_question_text='Ile kWh?', use_region_grid_intensity=True, per_household=True,
+                       periodicity_options_for_form=periods),
+        EmissionFactor(activity_category=energy, name='Bench dieta', unit_name='x', co2_kg_per_unit=Decimal('1000'),
+                       form_question_text='Dieta?', form_field_type='select',
+                       form_field_options={'1': 'Mięsna', '0.55': 'Wege'}),
+    ]
+    EmissionFactor.objects.bulk_create(factors)
+    return len(factors)
+
+
+def bench_users():
+    return User.objects.filter(username__startswith=USER_PREFIX)
+
+
+def bench_categories():
+    return Category.objects.filter(slug__startswith=f'{SLUG_PREFIX}cat-')
+
+
+def bench_products():
+    return Product.objects.filter(slug__startswith=f'{SLUG_PREFIX}product-')
+
+
+def bench_ratings():
+    return ProductRating.objects.filter(product__slug__startswith=f'{SLUG_PREFIX}product-')
+
+
+def bench_rooms():
+    return ChatRoom.objects.filter(name__startswith=ROOM_PREFIX)
+
+
+def bench_messages():
+    return Message.objects.filter(room__name__startswith=ROOM_PREFIX)
+
+
+def bench_places():
+    return EcoPlace.objects.filter(description=BENCH_MARK)
+
+
+def bench_footprints():
+    return UserFootprintSession.objects.filter(calculation_version=FOOTPRINT_VERSION)
+
+
+def counts() -> Dict[str, int]:
+    return {
+        'users': bench_users().count(), 'categories': bench_categories().count(),
+        'products': bench_products().count(), 'ratings': bench_ratings().count(),
+        'rooms': bench_rooms().count(), 'messages': bench_messages().count(),
+        'places': bench_places().count(), 'footprints': bench_footprints().count(),
+    }
+
+
+def flush(log: Optional[Callable[[str], None]] = None) -> Dict[str, int]:
+    """Delete every generated row (orders left by an aborted scenario run included)."""
+    deleted: Dict[str, int] = {}
+    steps: Iterable = (
+        ('orders', Order.objects.filter(email__endswith=f'@{BENCH_EMAIL_DOMAIN}')),
+        ('messages', bench_messages()),
+        ('rooms', bench_rooms()),
+        ('ratings', bench_ratings()),
+        ('products', bench_products()),
+        ('categories', bench_categories()),
+        ('places', bench_places()),
+        ('footprints', bench_footprints()),
+        ('users', bench_users()),
+    )
+    for table, queryset in steps:
+        with transaction.atomic():
+            deleted[table] = queryset._raw_delete(queryset.db) if table in ('messages', 'footprints') else \
+                queryset.delete()[0]
+        if log:
+            log(f"  {table}: {deleted[table]} deleted")
+    return deleted
+
+
+def describe(scale: str) -> Dict[str, int]:
+    return asdict(SCALES[scale])
@@ -0,0 +1,42 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.runner import compare
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare two run_benchmarks result files (e.g. the main branch and a feature branch). "
+        "Usage: manage.py compare_benchmarks BASE.json HEAD.json [--threshold 10] [--fail-on-regression] [--json]"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("base")
+        parser.add_argument("head")
+        parser.add_argument("--threshold", type=float, default=10.0, help="Regression threshold in percent.")
+        parser.add_argument("--fail-on-regression", action="store_true", help="Exit with an error on regressions.")
+        parser.add_argument("--json", action="store_true", help="Print the comparison as JSON.")
+
+    def handle(self, *args, **options):
+        try:
+            base, head = (json.loads(open(path, encoding='utf-8').read()) for path in (options["base"], options["head"]))
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Cannot read results: {e}")
+        if base['meta'].get('dataset') != head['meta'].get('dataset'):
+            self.stderr.write(self.style.WARNING("The runs used different datasets; numbers are not comparable."))
+        rows = compare(base, head, threshold=options["threshold"])
+        regressions = [row for row in rows if row['regression']]
+        if options["json"]:
+            self.stdout.write(json.dumps(rows, indent=2))
+        else:
+            self.stdout.write(f"{(base['meta'].get('commit') or '?')[:12]} -> {(head['meta'].get('commit') or '?')[:12]}")
+            for row in rows:
+                if row['metric'] is None:
+                    self.stdout.write(f"{row['scenario']:<32} only in {'base' if row['base'] else 'head'}")
+                    continue
+                line = (f"{row['scenario']:<32} {row['metric']:<12} {row['base']:>10} -> {row['head']:>10} "
+                        f"({row['change_pct']:+.1f}%)")
+                self.stdout.write(self.style.ERROR(line) if row['regression'] else line)
+        if regressions and options["fail_on_regression"]:
+            raise CommandError(f"{len(regressions)} metric(s) regressed by more than {options['threshold']}%")
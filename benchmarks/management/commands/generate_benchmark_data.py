@@ -0,0 +1,33 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from benchmarks import data
+
+
+class Command(BaseCommand):
+    help = (
+        "Create (or top up) the deterministic benchmark dataset in the configured database - use a dedicated "
+        "benchmark database. Scales: " + ", ".join(f"{name} ({s.products} products, {s.messages} messages)"
+                                                   for name, s in data.SCALES.items()) + ". "
+        "Usage: manage.py generate_benchmark_data [--scale small] [--seed 42] [--flush] [--stats]"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", choices=sorted(data.SCALES), default="small")
+        parser.add_argument("--seed", type=int, default=42, help="Same seed and scale give the same data.")
+        parser.add_argument("--flush", action="store_true", help="Delete all generated rows instead.")
+        parser.add_argument("--stats", action="store_true", help="Only print row counts of the dataset as JSON.")
+
+    def handle(self, *args, **options):
+        if options["stats"]:
+            self.stdout.write(json.dumps(data.counts(), indent=2))
+            return
+        log = self.stdout.write if options["verbosity"] > 1 else None
+        if options["flush"]:
+            deleted = data.flush(log=log)
+            self.stdout.write(self.style.SUCCESS("Deleted: " + json.dumps(deleted)))
+            return
+        created = data.generate(options["scale"], seed=options["seed"], log=log or self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(f"Scale {options['scale']} (seed {options['seed']}), created: "
+                                             + json.dumps(created)))
@@ -0,0 +1,107 @@
+import json
+import os
+import re
+import tempfile
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+
+PAGES = {'homepage': 'homepage', 'product_list': 'store:product_list'}  # URL names
+PRODUCTION_STATIC_STORAGE = 'common.static.MinifiedManifestStaticFilesStorage'
+ACCEPT_ENCODING = 'br, gzip'
+
+
+class Rollback(Exception):
+    pass
+
+
+def _body(response) -> bytes:
+    # the test client closes a streamed response itself once it has been consumed
+    return b''.join(response.streaming_content) if response.streaming else response.content
+
+
+class Command(BaseCommand):
+    help = (
+        "Bytes transferred for a page and the static assets it references: the raw source files (what was served "
+        "before the static pipeline) against collectstatic output served by WhiteNoise (minified, hashed, brotli/gzip). "
+        "Collects into a temporary STATIC_ROOT with the production storage. "
+        "Usage: manage.py measure_static_transfer [--page homepage=/ --page product_list=/store/] [--json]"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--page", action="append", default=[], metavar="NAME=PATH",
+                            help="Page to measure (repeatable, default: homepage and product list).")
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+
+    def handle(self, *args, **options):
+        pages = (dict(page.split('=', 1) for page in options["page"])
+                 or {name: reverse(url_name) for name, url_name in PAGES.items()})
+        with tempfile.TemporaryDirectory() as static_root, override_settings(
+            DEBUG=False, ALLOWED_HOSTS=['testserver'], SECURE_SSL_REDIRECT=False, STATIC_ROOT=static_root,
+            STORAGES={**settings.STORAGES, 'staticfiles': {'BACKEND': PRODUCTION_STATIC_STORAGE}},
+            WHITENOISE_AUTOREFRESH=False, WHITENOISE_USE_FINDERS=False,
+        ):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            from django.contrib.staticfiles.storage import staticfiles_storage
+            self.source_names = {hashed: name for name, hashed in staticfiles_storage.hashed_files.items()}
+            report = {}
+            try:
+                with transaction.atomic():
+                    client = Client(HTTP_ACCEPT_ENCODING=ACCEPT_ENCODING)
+                    for name, path in pages.items():
+                        report[name] = self.measure_page(client, path)
+                    raise Rollback
+            except Rollback:
+                pass
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        for name, page in report.items():
+            self.stdout.write(f"{name} ({page['path']}): HTML {page['html_bytes']} B, {len(page['assets'])} assets")
+            for asset in page['assets']:
+                self.stdout.write(f"  {asset['name']:<40} {asset['before']:>8} -> {asset['after']:>7} B "
+                                  f"{asset['encoding'] or '-':<5} {asset['cache_control']}")
+            self.stdout.write(self.style.SUCCESS(
+                f"  static assets: {page['before_bytes']} -> {page['after_bytes']} B "
+                f"(-{page['saved_pct']}%), page total {page['html_bytes'] + page['after_bytes']} B"
+            ))
+
+    def measure_page(self, client, path):
+        response = client.get(path)
+        html = _body(response)
+        prefix = re.escape(settings.STATIC_URL)
+        urls = list(dict.fromkeys(re.findall(rf'(?:href|src)="({prefix}[^"?#]+)', html.decode('utf-8', 'replace'))))
+        assets = []
+        for url in urls:
+            served = client.get(url)
+            if served.status_code != 200:
+                self.stderr.write(f"{url}: HTTP {served.status_code}")
+                continue
+            name = self.source_names.get(url[len(settings.STATIC_URL):])
+            source = finders.find(name) if name else None
+            after = len(_body(served))
+            assets.append({
+                'name': name or url,
+                'url': url,
+                'before': os.path.getsize(source) if source else after,
+                'after': after,
+                'encoding': served.get('Content-Encoding'),
+                'cache_control': served.get('Cache-Control'),
+            })
+        before = sum(a['before'] for a in assets)
+        after = sum(a['after'] for a in assets)
+        return {
+            'path': path,
+            'status': response.status_code,
+            'html_bytes': len(html),
+            'before_bytes': before,
+            'after_bytes': after,
+            'saved_pct': round((1 - after / before) * 100, 1) if before else 0.0,
+            'assets': assets,
+        }
+
@@ -0,0 +1,66 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from benchmarks import data, runner
+from benchmarks.scenarios import Context, all_scenarios, environment
+
+RESULTS_DIR = Path(settings.BASE_DIR) / 'benchmarks' / 'results'
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the benchmark scenarios against the generated dataset (generate_benchmark_data) and write "
+        "p50/p95/p99, query counts and RSS per scenario as JSON. Everything runs in a transaction that is "
+        "rolled back. Usage: manage.py run_benchmarks [--iterations 50] [--warmup 3] [--only product_list] "
+        "[--output results.json] [--list]"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=50, help="Timed iterations per scenario.")
+        parser.add_argument("--warmup", type=int, default=3, help="Untimed iterations first.")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--only", action="append", default=[],
+                            help="Run scenarios whose name starts with this (repeatable).")
+        parser.add_argument("--output", help="Result file (default: benchmarks/results/<commit>.json).")
+        parser.add_argument("--list", action="store_true", help="List scenarios and exit.")
+
+    def handle(self, *args, **options):
+        scenarios = all_scenarios()
+        if options["only"]:
+            scenarios = [s for s in scenarios if s.name.startswith(tuple(options["only"]))]
+        if options["list"]:
+            for scenario in scenarios:
+                self.stdout.write(f"{scenario.name:<32} {scenario.description}")
+            return
+        if not scenarios:
+            raise CommandError("No scenario matches --only")
+        dataset = data.counts()
+        if not dataset['products']:
+            raise CommandError("No benchmark data: run `manage.py generate_benchmark_data` first")
+
+        results = {}
+        try:
+            with transaction.atomic():
+                ctx = Context(seed=options["seed"])
+                with environment(ctx):
+                    results = runner.run(scenarios, ctx, max(1, options["iterations"]), max(0, options["warmup"]),
+                                         log=self.stdout.write)
+                raise Rollback
+        except Rollback:
+            pass
+
+        meta = runner.environment()
+        meta.update(dataset=dataset, iterations=options["iterations"], warmup=options["warmup"], seed=options["seed"])
+        output = Path(options["output"]) if options["output"] else \
+            RESULTS_DIR / f"{(meta['commit'] or 'unknown')[:12]}{'-dirty' if meta['dirty'] else ''}.json"
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps({'meta': meta, 'scenarios': results}, indent=2, sort_keys=True))
+        self.stdout.write(self.style.SUCCESS(f"Results written to {output}"))
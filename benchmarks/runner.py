@@ -0,0 +1,163 @@
+"""Scenario runner: timings, query counts and RSS per scenario, results as JSON.
+
+Results look like
+``{'meta': {commit, dirty, timestamp, python, django, database, dataset, ...},
+'scenarios': {name: {p50_ms, p95_ms, p99_ms, mean_ms, queries_avg, queries_max,
+rss_mb, max_rss_mb, errors, ...}}}``. Two result files can be compared with
+``compare()`` (``manage.py compare_benchmarks``), so a run on one commit is
+comparable with the same run on another, as long as both used the same
+dataset scale and seed.
+"""
+from __future__ import annotations
+
+import logging
+import math
+import os
+import platform
+import subprocess
+import time
+from contextlib import ExitStack
+from dataclasses import dataclass
+from datetime import datetime, timezone as dt_timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import django
+from django.conf import settings
+from django.db import connection, connections
+
+logger = logging.getLogger(__name__)
+
+# metrics compared between runs; for all of them lower is better
+COMPARED = ('p50_ms', 'p95_ms', 'p99_ms', 'queries_avg', 'rss_mb')
+
+
+@dataclass
+class Scenario:
+    name: str
+    run: Callable[[Any, int], None]
+    # untimed, before every iteration (e.g. creating the order a webhook will mark paid)
+    prepare: Optional[Callable[[Any, int], None]] = None
+    description: str = ''
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def rss_mb() -> float:
+    """Current resident set size (Linux /proc), else the peak from getrusage."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, IndexError):
+        return max_rss_mb()
+
+
+def max_rss_mb() -> float:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if platform.system() == 'Darwin' else peak / 2 ** 10  # bytes on macOS, KiB elsewhere
+
+
+def measure(scenario: Scenario, ctx, iterations: int, warmup: int = 3) -> Dict[str, Any]:
+    counter = QueryCounter()
+    timings: List[float] = []
+    queries: List[int] = []
+    errors = 0
+    with ExitStack() as stack:
+        for conn in connections.all():
+            stack.enter_context(conn.execute_wrapper(counter))
+        for i in range(warmup + iterations):
+            if scenario.prepare:
+                scenario.prepare(ctx, i)
+            counter.count = 0
+            start = time.perf_counter()
+            try:
+                scenario.run(ctx, i)
+            except Exception:  # noqa: BLE001 - a failing iteration is reported, the run goes on
+                errors += 1
+                logger.exception("Benchmark %s: iteration %s failed", scenario.name, i)
+            elapsed = (time.perf_counter() - start) * 1000
+            if i >= warmup:
+                timings.append(elapsed)
+                queries.append(counter.count)
+    timings.sort()
+    return {
+        'iterations': iterations,
+        'errors': errors,
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'mean_ms': round(sum(timings) / len(timings), 3) if timings else 0.0,
+        'max_ms': round(timings[-1], 3) if timings else 0.0,
+        'queries_avg': round(sum(queries) / len(queries), 2) if queries else 0.0,
+        'queries_max': max(queries) if queries else 0,
+        'rss_mb': round(rss_mb(), 1),
+        'max_rss_mb': round(max_rss_mb(), 1),
+    }
+
+
+def _git(*args: str) -> Optional[str]:
+    try:
+        return subprocess.run(['git', *args], cwd=settings.BASE_DIR, capture_output=True, text=True,
+                              timeout=10, check=True).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment() -> Dict[str, Any]:
+    status = _git('status', '--porcelain', '--untracked-files=no')
+    return {
+        'commit': _git('rev-parse', 'HEAD'),
+        'dirty': bool(status) if status is not None else None,
+        'timestamp': datetime.now(dt_timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'debug': settings.DEBUG,
+    }
+
+
+def run(scenarios: List[Scenario], ctx, iterations: int, warmup: int = 3,
+        log: Optional[Callable[[str], None]] = None) -> Dict[str, Dict[str, Any]]:
+    results = {}
+    for scenario in scenarios:
+        results[scenario.name] = result = measure(scenario, ctx, iterations, warmup)
+        if log:
+            log(f"{scenario.name:<40} p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms  "
+                f"p99 {result['p99_ms']:8.2f} ms  queries {result['queries_avg']:6.1f}  "
+                f"rss {result['rss_mb']:7.1f} MB" + (f"  errors {result['errors']}" if result['errors'] else ''))
+    return results
+
+
+def compare(base: Dict[str, Any], head: Dict[str, Any], threshold: float = 10.0) -> List[Dict[str, Any]]:
+    """Per scenario and metric: base, head, change in % and whether it regressed by more than ``threshold`` %."""
+    rows = []
+    for name in sorted(set(base['scenarios']) | set(head['scenarios'])):
+        old, new = base['scenarios'].get(name), head['scenarios'].get(name)
+        if old is None or new is None:
+            rows.append({'scenario': name, 'metric': None, 'base': old is not None, 'head': new is not None,
+                         'change_pct': None, 'regression': False})
+            continue
+        for metric in COMPARED:
+            before, after = old.get(metric, 0), new.get(metric, 0)
+            change = ((after - before) / before * 100) if before else (0.0 if after == before else math.inf)
+            rows.append({'scenario': name, 'metric': metric, 'base': before, 'head': after,
+                         'change_pct': round(change, 1), 'regression': change > threshold})
+    return rows
@@ -0,0 +1,242 @@
+"""Benchmark scenarios over the generated dataset (benchmarks.data).
+
+Each scenario drives the real URL through Django's test client, so the
+middleware, sessions, templates and the configured cache and channel layer
+are all part of the measurement. Only Stripe is stubbed:
+``checkout.Session.create`` returns a fake session, and webhook signatures
+are not verified. ``run_benchmarks`` runs everything inside a transaction
+that is rolled back, so orders, messages and footprints created here don't
+pile up between runs. ``on_commit`` callbacks (e-mails, thumbnails) never
+fire.
+"""
+from __future__ import annotations
+
+import json
+import random
+from contextlib import ExitStack, contextmanager
+from functools import cached_property
+from types import SimpleNamespace
+from typing import Dict, Iterator, List
+from unittest import mock
+
+import stripe
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from carbon_calculator.forms import FootprintCalculatorForm
+from carbon_calculator.services.catalog import get_catalog
+from store.models import Order, OrderItem
+
+from . import data
+from .runner import Scenario
+
+PRODUCT_SORTS = ('new', 'price_asc', 'price_desc', 'popular', 'rating_desc', 'rating_asc')
+RADII_KM = (5, 25, 50)
+FANOUT_SUBSCRIBERS = 50
+WEBHOOK_SECRET = 'whsec_bench'
+
+
+class BenchmarkError(AssertionError):
+    pass
+
+
+def expect(response, *statuses: int):
+    if response.status_code not in statuses:
+        raise BenchmarkError(f"{response.request['PATH_INFO']}: HTTP {response.status_code}, expected {statuses}")
+    return response
+
+
+class Context:
+    """Shared state of one run: a seeded RNG, logged-in clients and ids picked from the dataset."""
+
+    def __init__(self, seed: int = 42):
+        self.rng = random.Random(seed)
+        self.anonymous = Client()
+
+    @cached_property
+    def product_ids(self) -> List[int]:
+        ids = list(data.bench_products().filter(available=True, stock__gt=5).order_by('id')
+                   .values_list('id', flat=True)[:5000])
+        if not ids:
+            raise BenchmarkError("No benchmark products: run `manage.py generate_benchmark_data` first")
+        return ids
+
+    @cached_property
+    def product_slugs(self) -> List[str]:
+        return list(data.bench_products().filter(id__in=self.product_ids[:1000]).values_list('slug', flat=True))
+
+    @cached_property
+    def category_slugs(self) -> List[str]:
+        return list(data.bench_categories().values_list('slug', flat=True))
+
+    @cached_property
+    def member(self):
+        room = data.bench_rooms().order_by('id').first()
+        if room is None:
+            raise BenchmarkError("No benchmark chat rooms: run `manage.py generate_benchmark_data` first")
+        user = room.members.order_by('id').first() or room.owner
+        client = Client()
+        client.force_login(user)
+        return SimpleNamespace(client=client, user=user, room=room)
+
+    @cached_property
+    def calculator_form(self) -> Dict[str, str]:
+        """A filled-in calculator form: numbers for number fields, the first option of every select."""
+        form = FootprintCalculatorForm(catalog=get_catalog())
+        values = {}
+        for name, field in form.fields.items():
+            choices = [value for value, _ in getattr(field, 'choices', []) if value not in ('', None)]
+            if choices:
+                values[name] = str(choices[0])
+            elif name.startswith('factor_input_') or name == 'profile_household_members':
+                values[name] = str(self.rng.randint(1, 4) if name == 'profile_household_members' else
+                                   self.rng.randint(10, 500))
+        return values
+
+
+# --- product list -------------------------------------------------------------------------------
+
+def _product_list(params):
+    def run(ctx: Context, i: int):
+        query = params(ctx) if callable(params) else dict(params)
+        query.setdefault('page', ctx.rng.randint(1, 5))
+        expect(ctx.anonymous.get(reverse('store:product_list'), query), 200)
+    return run
+
+
+def _product_list_category(ctx: Context, i: int):
+    slug = ctx.rng.choice(ctx.category_slugs)
+    expect(ctx.anonymous.get(reverse('store:product_list_by_category', args=[slug]),
+                             {'sort': ctx.rng.choice(PRODUCT_SORTS)}), 200)
+
+
+def _product_detail(ctx: Context, i: int):
+    expect(ctx.anonymous.get(reverse('store:product_detail', args=[ctx.rng.choice(ctx.product_slugs)])), 200)
+
+
+# --- cart -> checkout ---------------------------------------------------------------------------
+
+def _new_shopper(ctx: Context, i: int):
+    ctx.shopper = Client()
+
+
+def _cart_checkout(ctx: Context, i: int):
+    client = ctx.shopper
+    for product_id in ctx.rng.sample(ctx.product_ids, 2):
+        expect(client.post(reverse('store:cart_add', args=[product_id]), {'quantity': ctx.rng.randint(1, 3)},
+                           HTTP_X_REQUESTED_WITH='XMLHttpRequest'), 200)
+    expect(client.get(reverse('store:cart_detail')), 200)
+    expect(client.post(reverse('payments:checkout'), {
+        'first_name': 'Jan', 'last_name': 'Testowy', 'email': f"buyer{i}@{data.BENCH_EMAIL_DOMAIN}",
+        'address_line_1': 'ul. Testowa 1', 'address_line_2': '', 'postal_code': '00-001',
+        'city': 'Warszawa', 'country': 'Polska',
+    }), 302, 303)
+
+
+def _fake_checkout_session(**params):
+    order_id = params.get('metadata', {}).get('order_id')
+    return SimpleNamespace(id=f"cs_bench_{order_id}", url=f"https://checkout.stripe.test/{order_id}")
+
+
+# --- webhook ------------------------------------------------------------------------------------
+
+def _paid_order_event(ctx: Context, i: int):
+    order = Order.objects.create(first_name='Jan', last_name='Testowy', email=f"hook{i}@{data.BENCH_EMAIL_DOMAIN}",
+                                 address_line_1='ul. Testowa 1', postal_code='00-001', city='Warszawa')
+    for product_id in ctx.rng.sample(ctx.product_ids, 3):
+        OrderItem.objects.create(order=order, product_id=product_id, price='9.99', quantity=1)
+    ctx.webhook_payload = json.dumps({
+        'id': f"evt_bench_{order.id}", 'object': 'event', 'type': 'checkout.session.completed',
+        'data': {'object': {
+            'id': f"cs_bench_{order.id}", 'object': 'checkout.session', 'mode': 'payment',
+            'payment_status': 'paid', 'customer_details': {'email': order.email},
+            'metadata': {'order_id': str(order.id), 'coupon_code': ''},
+        }},
+    })
+
+
+def _webhook(ctx: Context, i: int):
+    expect(ctx.anonymous.post(reverse('payments:stripe_webhook'), ctx.webhook_payload,
+                              content_type='application/json', HTTP_STRIPE_SIGNATURE='bench'), 200)
+
+
+def _unsigned_event(payload, sig_header, secret, *args, **kwargs):
+    return stripe.Event.construct_from(json.loads(payload), stripe.api_key or 'sk_bench')
+
+
+# --- places, chat, calculator -------------------------------------------------------------------
+
+def _places_radius(ctx: Context, i: int):
+    expect(ctx.anonymous.get(reverse('places:places_api'), {
+        'center_lat': round(ctx.rng.uniform(*data.LAT_RANGE), 5),
+        'center_lng': round(ctx.rng.uniform(*data.LNG_RANGE), 5),
+        'radius_km': ctx.rng.choice(RADII_KM),
+    }), 200)
+
+
+def _chat_send(ctx: Context, i: int):
+    member = ctx.member
+    expect(member.client.post(reverse('chat:send_message', args=[member.room.id]),
+                              {'text': f"wiadomość {i} " + ' '.join(ctx.rng.choices(data.WORDS, k=6))}), 200)
+
+
+def _chat_history(ctx: Context, i: int):
+    member = ctx.member
+    expect(member.client.get(reverse('chat:messages_api', args=[member.room.id])), 200)
+
+
+def _calculator_post(ctx: Context, i: int):
+    expect(ctx.anonymous.post(reverse('carbon_calculator:calculate_page'), ctx.calculator_form), 200)
+
+
+def all_scenarios() -> List[Scenario]:
+    scenarios = [
+        Scenario(f"product_list[sort={sort}]", _product_list({'sort': sort}), description="Sorted catalogue page")
+        for sort in PRODUCT_SORTS
+    ]
+    scenarios += [
+        Scenario("product_list[category]", _product_list_category),
+        Scenario("product_list[query]", _product_list(lambda ctx: {'query': ctx.rng.choice(data.WORDS)})),
+        Scenario("product_list[price]", _product_list(lambda ctx: {'min_price': ctx.rng.randint(10, 200),
+                                                                   'max_price': ctx.rng.randint(300, 900)})),
+        Scenario("product_list[min_rating]", _product_list({'min_rating': 4})),
+        Scenario("product_list[all_filters]", _product_list(lambda ctx: {
+            'query': ctx.rng.choice(data.WORDS), 'min_price': 20, 'max_price': 800, 'min_rating': 3,
+            'sort': ctx.rng.choice(PRODUCT_SORTS)})),
+        Scenario("product_detail", _product_detail),
+        Scenario("cart_checkout", _cart_checkout, prepare=_new_shopper,
+                 description="2x add to cart, cart page, checkout POST (Stripe stubbed)"),
+        Scenario("stripe_webhook", _webhook, prepare=_paid_order_event,
+                 description="checkout.session.completed for a 3-item order"),
+        Scenario("places_api[radius]", _places_radius),
+        Scenario("chat_send[fanout]", _chat_send,
+                 description=f"send_message to a room group with {FANOUT_SUBSCRIBERS} subscribed channels"),
+        Scenario("chat_messages_api", _chat_history),
+        Scenario("calculator_post", _calculator_post),
+    ]
+    return scenarios
+
+
+@contextmanager
+def environment(ctx: Context) -> Iterator[None]:
+    """Settings and stubs for a run: test-client host, no rate limits, Stripe stubbed, chat subscribers."""
+    rate_limits = {scope: (10 ** 9, 1) for scope in ('blog_comment', 'chat_message', 'place_review')}
+    with ExitStack() as stack:
+        stack.enter_context(override_settings(
+            ALLOWED_HOSTS=['testserver'], SECURE_SSL_REDIRECT=False, RATE_LIMITS=rate_limits,
+            STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET,
+        ))
+        stack.enter_context(mock.patch.object(stripe.checkout.Session, 'create', side_effect=_fake_checkout_session))
+        stack.enter_context(mock.patch.object(stripe.Webhook, 'construct_event', side_effect=_unsigned_event))
+        layer = get_channel_layer()
+        group = f"chat_{ctx.member.room.id}"
+        channels = [f"bench-fanout.{n}" for n in range(FANOUT_SUBSCRIBERS)]
+        for channel in channels:
+            async_to_sync(layer.group_add)(group, channel)
+        try:
+            yield
+        finally:
+            for channel in channels:
+                async_to_sync(layer.group_discard)(group, channel)
@@ -0,0 +1,36 @@
+from django.test import TestCase
+
+from benchmarks import data, runner
+from benchmarks.scenarios import Context, all_scenarios, environment
+
+
+class BenchmarkSuiteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.created = data.generate('tiny', seed=7)
+
+    def test_generate_is_repeatable(self):
+        self.assertEqual(data.counts(), data.describe('tiny'))
+        slugs = list(data.bench_products().order_by('slug').values_list('slug', 'price')[:20])
+        self.assertEqual(data.generate('tiny', seed=7)['products'], 0)  # already there: nothing added
+        data.flush()
+        self.assertEqual(sum(data.counts().values()), 0)
+        data.generate('tiny', seed=7)
+        self.assertEqual(list(data.bench_products().order_by('slug').values_list('slug', 'price')[:20]), slugs)
+
+    def test_scenarios_run_without_errors(self):
+        ctx = Context(seed=1)
+        with environment(ctx):
+            results = runner.run(all_scenarios(), ctx, iterations=1, warmup=0)
+        self.assertEqual({name: r['errors'] for name, r in results.items() if r['errors']}, {})
+        self.assertGreater(results['product_list[sort=popular]']['queries_avg'], 0)
+
+    def test_compare_flags_regressions(self):
+        base = {'scenarios': {'a': {'p50_ms': 10, 'p95_ms': 20, 'p99_ms': 30, 'queries_avg': 5, 'rss_mb': 100}}}
+        head = {'scenarios': {'a': {'p50_ms': 10.5, 'p95_ms': 30, 'p99_ms': 30, 'queries_avg': 5, 'rss_mb': 100},
+                              'b': {'p50_ms': 1}}}
+        rows = runner.compare(base, head, threshold=10)
+        self.assertEqual([(r['scenario'], r['metric']) for r in rows if r['regression']], [('a', 'p95_ms')])
+        self.assertIn({'scenario': 'b', 'metric': None, 'base': False, 'head': True, 'change_pct': None,
+                       'regression': False}, rows)
+        self.assertEqual(runner.percentile([1, 2, 3, 4], 50), 2)
@@ -3,6 +3,7 @@ from django.utils import timezone
 from datetime import timedelta
 from django.db.models import Q
 from .models import Post, Comment, BlogBan
+from .services.moderation import invalidate_bans, invalidate_comment_counts
 
 @admin.register(Post)
 class PostAdmin(admin.ModelAdmin):
@@ -17,9 +18,9 @@ class PostAdmin(admin.ModelAdmin):
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
     list_display = (
-        'author', 'post', 'created_at', 'active', 'removed_at', 'removed_by', 'ip_address'
+        'author', 'post', 'created_at', 'active', 'thumb_status', 'removed_at', 'removed_by', 'ip_address'
     )
-    list_filter = ('active', 'created_at', 'updated_at', 'author', 'removed_at', 'removed_by')
+    list_filter = ('active', 'thumb_status', 'created_at', 'updated_at', 'author', 'removed_at', 'removed_by')
     search_fields = ('author__username', 'post__title', 'body', 'ip_address')
     date_hierarchy = 'created_at'
     ordering = ('-created_at',)
@@ -30,21 +31,29 @@ class CommentAdmin(admin.ModelAdmin):
     ]
 
     def approve_comments(self, request, queryset):
+        post_ids = list(queryset.values_list('post_id', flat=True).distinct())
         queryset.update(active=True)
+        invalidate_comment_counts(post_ids)
     approve_comments.short_description = "Zatwierdź wybrane komentarze"
 
     def disapprove_comments(self, request, queryset):
+        post_ids = list(queryset.values_list('post_id', flat=True).distinct())
         queryset.update(active=False)
+        invalidate_comment_counts(post_ids)
     disapprove_comments.short_description = "Odrzuć wybrane komentarze"
 
     def soft_remove_comments(self, request, queryset):
+        post_ids = list(queryset.values_list('post_id', flat=True).distinct())
         now = timezone.now()
         updated = queryset.update(active=False, removed_at=now, removed_by=request.user)
+        invalidate_comment_counts(post_ids)
         self.message_user(request, f"Oznaczono jako usunięte: {updated}")
     soft_remove_comments.short_description = "Miękkie usunięcie (active=False, removed_*)"
 
     def restore_comments(self, request, queryset):
+        post_ids = list(queryset.values_list('post_id', flat=True).distinct())
         updated = queryset.update(active=True, removed_at=None, removed_by=None, remove_reason='')
+        invalidate_comment_counts(post_ids)
         self.message_user(request, f"Przywrócono: {updated}")
     restore_comments.short_description = "Przywróć komentarze"
 
@@ -91,10 +100,12 @@ class BlogBanAdmin(admin.ModelAdmin):
 
     def activate_bans(self, request, queryset):
         updated = queryset.update(active=True)
+        invalidate_bans()
         self.message_user(request, f"Aktywowano bany: {updated}")
     activate_bans.short_description = "Aktywuj bany"
 
     def deactivate_bans(self, request, queryset):
         updated = queryset.update(active=False)
+        invalidate_bans()
         self.message_user(request, f"Dezaktywowano bany: {updated}")
     deactivate_bans.short_description = "Dezaktywuj bany"
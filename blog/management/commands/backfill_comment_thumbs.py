@@ -1,6 +1,23 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
 from django.core.management.base import BaseCommand, CommandParser
-from django.db import transaction
+from django.db import connections
+
 from blog.models import Comment
+from blog.tasks import generate_comment_thumbnail, generate_comment_thumbnail_task
+
+
+def _render(ids):
+    return Counter(generate_comment_thumbnail(pk, retry=False) for pk in ids)
+
+
+def _render_in_thread(ids):
+    """Worker body: each thread opens its own DB connection, so close it when the slice is done."""
+    try:
+        return _render(ids)
+    finally:
+        connections.close_all()
 
 
 class Command(BaseCommand):
@@ -11,10 +28,26 @@ class Command(BaseCommand):
             '--force', action='store_true', default=False,
             help='Regenerate thumbnails even if already present.'
         )
+        parser.add_argument(
+            '--retry-failed', action='store_true', default=False,
+            help="Also process comments whose thumbnail previously failed."
+        )
         parser.add_argument(
             '--limit', type=int, default=0,
             help='Limit the number of processed comments (0 = no limit).'
         )
+        parser.add_argument(
+            '--batch-size', type=int, default=200,
+            help='Comments fetched per batch (keyset over id).'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Threads rendering thumbnails in parallel within a batch (1 = inline).'
+        )
+        parser.add_argument(
+            '--enqueue', action='store_true', default=False,
+            help='Schedule background tasks instead of rendering in this process.'
+        )
         parser.add_argument(
             '--dry-run', action='store_true', default=False,
             help='Show what would be done without saving changes.'
@@ -23,48 +56,60 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         force = bool(options.get('force'))
         limit = int(options.get('limit') or 0)
+        batch_size = max(1, int(options.get('batch_size') or 200))
+        workers = max(1, int(options.get('workers') or 1))
+        enqueue = bool(options.get('enqueue'))
         dry_run = bool(options.get('dry_run'))
 
-        qs = Comment.objects.filter(image__isnull=False)
+        qs = Comment.objects.exclude(image__isnull=True).exclude(image='')
         if not force:
-            qs = qs.filter(image_thumb__isnull=True)
+            statuses = ['pending', 'none'] + (['failed'] if options.get('retry_failed') else [])
+            qs = qs.filter(thumb_status__in=statuses)
 
         total = qs.count()
         if limit > 0:
             total = min(total, limit)
         self.stdout.write(self.style.NOTICE(
-            f"Processing up to {total} comment(s) (force={force}, dry_run={dry_run})"
+            f"Processing up to {total} comment(s) (force={force}, workers={workers}, "
+            f"enqueue={enqueue}, dry_run={dry_run})"
         ))
 
+        results = Counter()
         processed = 0
-        created = 0
-        skipped = 0
-        errors = 0
-
-        for comment in qs.iterator(chunk_size=100):
-            if limit and processed >= limit:
-                break
-            processed += 1
-            try:
-                if not force and comment.image_thumb:
-                    skipped += 1
-                    continue
+        last_pk = 0
+        pool = ThreadPoolExecutor(max_workers=workers) if workers > 1 and not enqueue and not dry_run else None
+        try:
+            while not limit or processed < limit:
+                take = batch_size if not limit else min(batch_size, limit - processed)
+                ids = list(qs.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:take])
+                if not ids:
+                    break
+                last_pk = ids[-1]
+                processed += len(ids)
+
                 if dry_run:
-                    # Simulate work
-                    created += 1
-                    self.stdout.write(f"[DRY] Would generate thumb for comment #{comment.id}")
+                    for pk in ids:
+                        self.stdout.write(f"[DRY] Would generate thumb for comment #{pk}")
+                    results['would_process'] += len(ids)
                     continue
-                with transaction.atomic():
-                    # Use model helper to generate and persist
-                    comment._generate_thumbnail()
-                    created += 1
-                    self.stdout.write(f"OK  Generated thumb for comment #{comment.id}")
-            except Exception as exc:
-                errors += 1
-                self.stderr.write(self.style.WARNING(
-                    f"ERR Failed for comment #{comment.id}: {exc}"
-                ))
-
-        self.stdout.write(self.style.SUCCESS(
-            f"Done. processed={processed}, created={created}, skipped={skipped}, errors={errors}"
-        ))
+                Comment.objects.filter(pk__in=ids).update(thumb_status='pending')
+                if enqueue:
+                    for pk in ids:
+                        generate_comment_thumbnail_task(pk)
+                    results['enqueued'] += len(ids)
+                    continue
+                if pool is None:
+                    results.update(_render(ids))
+                else:
+                    slices = [ids[i::workers] for i in range(workers)]
+                    for counts in pool.map(_render_in_thread, [s for s in slices if s]):
+                        results.update(counts)
+                self.stdout.write(f"... {processed}/{total}")
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        summary = ", ".join(f"{key}={value}" for key, value in sorted(results.items())) or "nothing to do"
+        style = self.style.WARNING if results.get('failed') else self.style.SUCCESS
+        self.stdout.write(style(f"Done. processed={processed}, {summary}"))
+
@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.template import Context, Template
+
+from blog.models import Post
+
+SAMPLE_PARAGRAPH = (
+    "## Dlaczego warto segregować odpady?\n"
+    "Segregacja <b>zmniejsza</b> ilość odpadów trafiających na wysypiska & pozwala odzyskać surowce. "
+    "Każdy kilogram papieru oddanego do recyklingu to mniej wyciętych drzew i mniejsze zużycie wody.\n"
+    "Warto zacząć od prostych kroków: osobny kosz na plastik, szkło i bioodpady.\n"
+)
+
+
+class Command(BaseCommand):
+    help = "Benchmark rendering a long post body per request vs serving the pre-rendered HTML."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--paragraphs', type=int, default=300, help='Paragraphs in the synthetic post.')
+        parser.add_argument('--iterations', type=int, default=200, help='Simulated detail-view renders.')
+
+    def handle(self, *args, **options):
+        paragraphs = int(options['paragraphs'])
+        iterations = int(options['iterations'])
+        raw_body = "\n".join(SAMPLE_PARAGRAPH for _ in range(paragraphs))
+
+        legacy_tpl = Template("{% load markdown_filters %}{{ post.body|md_sanitize_headings|linebreaks }}")
+        cached_tpl = Template("{{ post.rendered_body }}")
+
+        legacy_post = Post(title='Benchmark', slug='benchmark', body=raw_body)
+        cached_post = Post(title='Benchmark', slug='benchmark', body=raw_body)
+        cached_post.refresh_body_html()  # what Post.save does once at write time
+
+        started = time.perf_counter()
+        for _ in range(iterations):
+            legacy_html = legacy_tpl.render(Context({'post': legacy_post}))
+        legacy_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for _ in range(iterations):
+            cached_html = cached_tpl.render(Context({'post': cached_post}))
+        cached_s = time.perf_counter() - started
+
+        self.stdout.write(f"body: {len(raw_body)} chars, {paragraphs} paragraphs, {iterations} renders")
+        self.stdout.write(f"per-request filters: {legacy_s / iterations * 1000:.3f} ms/render")
+        self.stdout.write(f"pre-rendered HTML:   {cached_s / iterations * 1000:.3f} ms/render")
+        if cached_s:
+            self.stdout.write(f"speedup:             {legacy_s / cached_s:.1f}x")
+        if legacy_html != cached_html:
+            self.stderr.write(self.style.ERROR("Rendered HTML differs between the two paths!"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Rendered HTML identical."))
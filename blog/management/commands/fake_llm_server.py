@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandParser
+
+from blog.services.fake_llm import FakeGeminiServer
+
+
+class Command(BaseCommand):
+    help = "Run a local fake Gemini endpoint (for generate_eco_post with GEMINI_API_BASE_URL)."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--host', default='127.0.0.1', help='Interface to bind.')
+        parser.add_argument('--port', type=int, default=8765, help='Port to listen on.')
+
+    def handle(self, *args, **options):
+        server = FakeGeminiServer(host=options['host'], port=options['port'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Fake Gemini endpoint on {server.base_url} — set GEMINI_API_BASE_URL={server.base_url}"
+        ))
+        try:
+            server.httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.httpd.server_close()
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandParser
+
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    help = "Sanitize post bodies and rebuild their pre-rendered HTML (after a renderer change or for old posts)."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            '--force', action='store_true', default=False,
+            help='Re-render every post even if its stored HTML is up to date.'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true', default=False,
+            help='Only count posts that would be rebuilt.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=200,
+            help='Posts written per bulk update.'
+        )
+
+    def handle(self, *args, **options):
+        force = bool(options.get('force'))
+        dry_run = bool(options.get('dry_run'))
+        batch_size = int(options.get('batch_size') or 200)
+
+        qs = Post.objects.only('id', 'body', 'body_html', 'body_html_key').order_by('pk')
+        processed = 0
+        rebuilt = 0
+        batch = []
+
+        for post in qs.iterator(chunk_size=batch_size):
+            processed += 1
+            if force:
+                post.body_html_key = ''
+            if not post.refresh_body_html():
+                continue
+            rebuilt += 1
+            if dry_run:
+                continue
+            batch.append(post)
+            if len(batch) >= batch_size:
+                Post.objects.bulk_update(batch, ['body', 'body_html', 'body_html_key'])
+                batch = []
+        if batch:
+            Post.objects.bulk_update(batch, ['body', 'body_html', 'body_html_key'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done. processed={processed}, rebuilt={rebuilt}, dry_run={dry_run}"
+        ))
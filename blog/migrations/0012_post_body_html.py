@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-19 16:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0011_alter_comment_options_alter_commentrating_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='body_html',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='Treść (HTML)'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='body_html_key',
+            field=models.CharField(blank=True, default='', editable=False, max_length=40),
+        ),
+    ]
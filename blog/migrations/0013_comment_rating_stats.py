@@ -0,0 +1,45 @@
+# Generated by Django 5.2 on 2026-10-19 16:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_rating_stats(apps, schema_editor):
+    Comment = apps.get_model('blog', 'Comment')
+    CommentRating = apps.get_model('blog', 'CommentRating')
+    stats = (CommentRating.objects.values('comment_id')
+             .annotate(avg=models.Avg('value'), cnt=models.Count('id')).order_by())
+    batch = []
+    for row in stats.iterator():
+        batch.append(Comment(pk=row['comment_id'], rating_avg=round(row['avg'] or 0, 2), rating_count=row['cnt']))
+        if len(batch) >= 500:
+            Comment.objects.bulk_update(batch, ['rating_avg', 'rating_count'])
+            batch = []
+    if batch:
+        Comment.objects.bulk_update(batch, ['rating_avg', 'rating_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0012_post_body_html'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='rating_avg',
+            field=models.FloatField(default=0, verbose_name='Średnia ocena'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Liczba ocen'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'active', '-created_at', '-id'], name='blog_comment_thread_idx'),
+        ),
+        migrations.RunPython(backfill_rating_stats, migrations.RunPython.noop),
+    ]
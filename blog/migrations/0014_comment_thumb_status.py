@@ -0,0 +1,26 @@
+# Generated by Django 5.2 on 2026-10-19 16:52
+
+from django.db import migrations, models
+
+
+def backfill_thumb_status(apps, schema_editor):
+    Comment = apps.get_model('blog', 'Comment')
+    with_image = Comment.objects.exclude(image__isnull=True).exclude(image='')
+    with_image.exclude(image_thumb__isnull=True).exclude(image_thumb='').update(thumb_status='ready')
+    with_image.filter(thumb_status='none').update(thumb_status='pending')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0013_comment_rating_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='thumb_status',
+            field=models.CharField(choices=[('none', 'Brak obrazka'), ('pending', 'Przetwarzanie'), ('ready', 'Gotowa'), ('failed', 'Błąd przetwarzania')], default='none', max_length=10, verbose_name='Status miniatury'),
+        ),
+        migrations.RunPython(backfill_thumb_status, migrations.RunPython.noop),
+    ]
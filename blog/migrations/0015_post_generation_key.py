@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 20:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0014_comment_thumb_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='generation_key',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=64),
+        ),
+    ]
@@ -3,10 +3,13 @@ from django.conf import settings
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+from django.utils.safestring import mark_safe
 from django.core.files.base import ContentFile
 from io import BytesIO
-from PIL import Image
 from store.models import get_product_image_storage_instance
+from .services.rendering import render_body, render_key, sanitize_headings
+
+
 class Post(models.Model):
     STATUS_CHOICES = [
         ('draft', _('Szkic')),
@@ -22,6 +25,11 @@ class Post(models.Model):
         verbose_name=_('Autor')
     )
     body = models.TextField(verbose_name=_('Treść'))
+    # Pre-rendered, sanitized HTML of body; regenerated on save when body_html_key is stale
+    body_html = models.TextField(blank=True, default='', editable=False, verbose_name=_('Treść (HTML)'))
+    body_html_key = models.CharField(max_length=40, blank=True, default='', editable=False)
+    # ResponseCache key of the model answer a generated post was made from (generate_eco_post)
+    generation_key = models.CharField(max_length=64, blank=True, default='', editable=False, db_index=True)
     image = models.ImageField(
         upload_to='blog_images/%Y/%m/%d/',
         blank=True,
@@ -53,6 +61,31 @@ class Post(models.Model):
     def get_absolute_url(self):
         return reverse('blog:post_detail', args=[self.slug])
 
+    def refresh_body_html(self) -> bool:
+        """Sanitize body and re-render body_html if stale. Returns True when anything changed."""
+        body = sanitize_headings(self.body) or ''
+        key = render_key(body)
+        if body == self.body and key == self.body_html_key:
+            return False
+        self.body = body
+        self.body_html = render_body(body)
+        self.body_html_key = key
+        return True
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'body' in update_fields:
+            if self.refresh_body_html() and update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'body_html', 'body_html_key'}
+        super().save(*args, **kwargs)
+
+    @property
+    def rendered_body(self):
+        if self.body_html and self.body_html_key == render_key(self.body):
+            return mark_safe(self.body_html)
+        # Not rebuilt yet (e.g. renderer version bumped) - render without persisting
+        return mark_safe(render_body(self.body))
+
 class Comment(models.Model):
     post = models.ForeignKey(
         Post,
@@ -81,6 +114,14 @@ class Comment(models.Model):
         verbose_name=_("Miniatura"),
         storage=get_product_image_storage_instance()
     )
+    THUMB_STATUS_CHOICES = [
+        ('none', _('Brak obrazka')),
+        ('pending', _('Przetwarzanie')),
+        ('ready', _('Gotowa')),
+        ('failed', _('Błąd przetwarzania')),
+    ]
+    # Thumbnails are rendered by blog.tasks.generate_comment_thumbnail_task after the comment is saved
+    thumb_status = models.CharField(max_length=10, choices=THUMB_STATUS_CHOICES, default='none', verbose_name=_('Status miniatury'))
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Utworzono'))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_('Zaktualizowano'))
     active = models.BooleanField(default=True, verbose_name=_('Aktywny'))
@@ -88,6 +129,9 @@ class Comment(models.Model):
     removed_at = models.DateTimeField(null=True, blank=True, verbose_name=_('Usunięto'))
     removed_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name='moderated_blog_comments', verbose_name=_('Usunięte przez'))
     remove_reason = models.CharField(max_length=250, blank=True, default='', verbose_name=_('Powód usunięcia'))
+    # Denormalized from CommentRating, kept up to date by refresh_rating_stats()
+    rating_avg = models.FloatField(default=0, verbose_name=_('Średnia ocena'))
+    rating_count = models.PositiveIntegerField(default=0, verbose_name=_('Liczba ocen'))
 
     class Meta:
         ordering = ['created_at']
@@ -95,27 +139,48 @@ class Comment(models.Model):
         verbose_name_plural = _('Komentarze')
         indexes = [
             models.Index(fields=['created_at']),
+            # Keyset pagination of a post's thread (newest first)
+            models.Index(fields=['post', 'active', '-created_at', '-id'], name='blog_comment_thread_idx'),
         ]
 
     def __str__(self):
         return f'{self.author} – {self.post}'
 
     def save(self, *args, **kwargs):
-        # Save first to ensure self.image has a file path
-        super_save = super().save
-        creating = self.pk is None
-        super_save(*args, **kwargs)
-        # Generate thumbnail if needed
-        if self.image and (not self.image_thumb or creating):
-            try:
-                self._generate_thumbnail()
-            except Exception:
-                # Silently ignore thumbnail failures
-                return
+        # The thumbnail itself is generated off-request (blog/signals.py schedules the task)
+        if self.image and not self.image_thumb and self.thumb_status == 'none':
+            self.thumb_status = 'pending'
+            self._thumb_requested = True  # read (once) by the post_save receiver that queues the task
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'thumb_status'}
+        super().save(*args, **kwargs)
+
+    def refresh_rating_stats(self):
+        """Recompute rating_avg/rating_count from CommentRating rows and store them."""
+        agg = self.ratings.aggregate(avg=models.Avg('value'), cnt=models.Count('id'))
+        self.rating_avg = round(agg['avg'] or 0, 2)
+        self.rating_count = agg['cnt'] or 0
+        Comment.objects.filter(pk=self.pk).update(rating_avg=self.rating_avg, rating_count=self.rating_count)
+
+    @classmethod
+    def refresh_rating_stats_bulk(cls, ids):
+        """refresh_rating_stats() for many comments in two queries; ids of deleted comments are skipped."""
+        comments = list(
+            cls.objects.filter(pk__in=ids)
+            .annotate(avg=models.Avg('ratings__value'), cnt=models.Count('ratings'))
+            .only('pk')
+        )
+        for comment in comments:
+            comment.rating_avg = round(comment.avg or 0, 2)
+            comment.rating_count = comment.cnt
+        cls.objects.bulk_update(comments, ['rating_avg', 'rating_count'])
 
     def _generate_thumbnail(self, max_size=(600, 600), quality=82):
         if not self.image:
             return
+        from PIL import Image  # Pillow only when a thumbnail is rendered, not at model import
+
         # Open original image
         self.image.open('rb')
         with BytesIO(self.image.read()) as buf:
@@ -136,7 +201,8 @@ class Comment(models.Model):
             content = ContentFile(out.read())
             # Ensure directory structure by re-calling save on model
             self.image_thumb.save(thumb_name, content, save=False)
-            super().save(update_fields=['image_thumb'])
+            self.thumb_status = 'ready'
+            super().save(update_fields=['image_thumb', 'thumb_status'])
 
 
 class CommentRating(models.Model):
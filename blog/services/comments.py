@@ -0,0 +1,67 @@
+"""Keyset pagination of post comment threads (newest first)."""
+
+import base64
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from django.db.models import Q
+
+from blog.models import Comment, CommentRating
+
+COMMENTS_PAGE_SIZE = 20
+
+
+class InvalidCursor(ValueError):
+    """The cursor was not produced by encode_cursor (tampered with or truncated)."""
+
+
+def encode_cursor(comment: Comment) -> str:
+    raw = f"{comment.created_at.isoformat()}|{comment.pk}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple[datetime, int]]:
+    """
+    Return (created_at, id) of the last comment already shown, or None for no cursor (first page).
+    A malformed cursor raises InvalidCursor instead of falling back to the first page, which would
+    append the same comments to the thread again.
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        created_at, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(cursor) from e
+
+
+def comments_page(post, user=None, cursor: Optional[str] = None,
+                  page_size: int = COMMENTS_PAGE_SIZE) -> Tuple[List[Comment], Optional[str]]:
+    """
+    One page of active comments after ``cursor`` plus the cursor for the next page (None on the last page).
+    Each comment gets ``user_rating_value`` from a single IN query for the page.
+    Raises InvalidCursor for a malformed ``cursor``.
+    """
+    qs = (post.comments.filter(active=True)
+          .select_related('author__profile')
+          .order_by('-created_at', '-id'))
+    position = decode_cursor(cursor)
+    if position:
+        created_at, pk = position
+        qs = qs.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+    comments = list(qs[:page_size + 1])
+    has_more = len(comments) > page_size
+    comments = comments[:page_size]
+
+    user_ratings = {}
+    if user is not None and user.is_authenticated and comments:
+        user_ratings = dict(
+            CommentRating.objects.filter(user=user, comment_id__in=[c.pk for c in comments])
+            .values_list('comment_id', 'value')
+        )
+    for comment in comments:
+        comment.user_rating_value = user_ratings.get(comment.pk)
+
+    next_cursor = encode_cursor(comments[-1]) if has_more else None
+    return comments, next_cursor
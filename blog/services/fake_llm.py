@@ -0,0 +1,97 @@
+"""Local stand-in for the Gemini ``generateContent`` endpoint.
+
+Answers every request with a deterministic post derived from the prompt, so
+``generate_eco_post`` can be exercised (tests, dry runs) without a key or
+network access::
+
+    with FakeGeminiServer() as server:
+        client = RestGeminiClient('test-key', server.base_url)
+
+or ``manage.py fake_llm_server`` + ``GEMINI_API_BASE_URL=http://127.0.0.1:8765``.
+"""
+
+import hashlib
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Optional
+
+PATH_RE = re.compile(r"^/v1beta/models/(?P<model>[^/:]+):generateContent$")
+
+
+def default_responder(model: str, prompt: str) -> str:
+    digest = hashlib.sha1(prompt.encode('utf-8')).hexdigest()[:8]
+    return json.dumps({
+        'title': f"Eko wpis {digest}",
+        'body': f"Wygenerowano lokalnie ({model}).\n\nTreść testowa {digest}.",
+    }, ensure_ascii=False)
+
+
+class FakeGeminiServer:
+    """Threaded HTTP server on 127.0.0.1; ``requests`` records (model, prompt) of every call."""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0,
+                 responder: Optional[Callable[[str, str], str]] = None):
+        self.responder = responder or default_responder
+        self.requests: List[tuple] = []
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                match = PATH_RE.match(self.path.split('?', 1)[0])
+                if not match:
+                    self._reply(404, {'error': {'message': 'not found'}})
+                    return
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    payload = json.loads(self.rfile.read(length) or b'{}')
+                    prompt = ''.join(p.get('text', '') for c in payload.get('contents', []) for p in c.get('parts', []))
+                except ValueError:
+                    self._reply(400, {'error': {'message': 'invalid JSON'}})
+                    return
+                model = match.group('model')
+                with server._lock:
+                    server.requests.append((model, prompt))
+                text = server.responder(model, prompt)
+                self._reply(200, {'candidates': [{'content': {'role': 'model', 'parts': [{'text': text}]}}]})
+
+            def _reply(self, status, body):
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> 'FakeGeminiServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
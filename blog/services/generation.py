@@ -0,0 +1,373 @@
+"""Generation of eco blog posts with Gemini (used by ``manage.py generate_eco_post``).
+
+The fallback chain of models/temperatures lives here together with the pieces
+that make batch runs cheap:
+
+* clients are built once per run and reused (the SDK client caches one
+  ``GenerativeModel`` per model name; the REST client keeps a pooled session),
+* ``ResponseCache`` stores prompt -> raw response on disk, so reruns and tests
+  do not call (and bill) the API again for the same prompt,
+* ``generate_batch`` runs several topics concurrently with bounded parallelism;
+  answers already published (``Post.generation_key``) are not replayed from the cache,
+* ``unique_slugs`` resolves slugs for a whole batch with one query.
+
+Setting ``GEMINI_API_BASE_URL`` (or ``--api-base-url``) switches to the REST
+client, which speaks the public ``generateContent`` JSON API; point it at
+``manage.py fake_llm_server`` to run without a real key.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import reduce
+from operator import or_
+from typing import AbstractSet, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import requests
+from django.db.models import Q
+from django.utils.text import slugify
+
+from blog.models import Post
+
+logger = logging.getLogger(__name__)
+
+ENV_GEMINI_API_BASE_URL = "GEMINI_API_BASE_URL"
+
+# Nazwy modeli Gemini
+PRIMARY_GEMINI_MODEL = 'gemini-1.5-flash-latest'  # Główny model do użycia
+FALLBACK_GEMINI_MODEL = 'gemini-pro'
+
+PROMPT_TEMPLATE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), 'management', 'commands', 'gemini_blog_prompt.txt'
+)
+
+# Bezpieczne ustawienia
+SAFETY_SETTINGS = [
+    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
+]
+
+STRICT_JSON_SUFFIX = (
+    "\n\nWAŻNE: ZWRÓĆ WYŁĄCZNIE surowy JSON bez żadnych bloków kodu, bez komentarza, bez dodatkowego tekstu."
+    " Nie używaj znaczników ```json. Tylko poprawny JSON z polami 'title' i 'body'."
+)
+
+ATTEMPTS = [
+    {"model": PRIMARY_GEMINI_MODEL, "temperature": 0.7, "suffix": ""},
+    {"model": PRIMARY_GEMINI_MODEL, "temperature": 0.4, "suffix": STRICT_JSON_SUFFIX},
+    {"model": FALLBACK_GEMINI_MODEL, "temperature": 0.2, "suffix": STRICT_JSON_SUFFIX},
+]
+
+
+class LLMFatalError(Exception):
+    """The API rejected the call in a way that retrying with another model/temperature will not fix."""
+
+
+REFERRER_BLOCKED_HELP = (
+    "Wykryto błąd 403: API_KEY_HTTP_REFERRER_BLOCKED — Klucz Gemini ma ograniczenia HTTP referrer. "
+    "Wywołania backendu (serwer-serwer) nie wysyłają referera, więc taki klucz jest odrzucany. "
+    "Rozwiązanie: utwórz NOWY klucz API przeznaczony dla backendu (bez ograniczeń HTTP referrer) "
+    "lub usuń restrykcje referera z obecnego klucza."
+)
+
+
+def _is_referrer_blocked(err_txt: str) -> bool:
+    return "API_KEY_HTTP_REFERRER_BLOCKED" in err_txt or ("referer" in err_txt.lower() and "blocked" in err_txt.lower())
+
+
+class SdkGeminiClient:
+    """google-generativeai client: configured once, one GenerativeModel per model name."""
+
+    def __init__(self, api_key: str):
+        import google.generativeai as genai
+
+        self._genai = genai
+        genai.configure(api_key=api_key)
+        self._models: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _model(self, name: str):
+        with self._lock:
+            model = self._models.get(name)
+            if model is None:
+                model = self._models[name] = self._genai.GenerativeModel(name)
+            return model
+
+    def generate(self, model_name: str, prompt: str, temperature: float) -> Optional[str]:
+        generation_config = self._genai.types.GenerationConfig(
+            temperature=temperature,
+            response_mime_type="application/json",
+        )  # type: ignore
+        try:
+            response = self._model(model_name).generate_content(
+                prompt,
+                generation_config=generation_config,
+                safety_settings=SAFETY_SETTINGS,
+            )
+        except Exception as e:
+            if _is_referrer_blocked(str(e)):
+                raise LLMFatalError(REFERRER_BLOCKED_HELP) from e
+            raise
+
+        if getattr(response, 'text', None):
+            return response.text
+        if getattr(response, 'candidates', None):
+            try:
+                return response.candidates[0].content.parts[0].text
+            except Exception:
+                pass
+        feedback = getattr(response, 'prompt_feedback', None)
+        if feedback:
+            logger.warning("Pusta odpowiedź tekstowa od Gemini. Powód: %s", getattr(feedback, 'block_reason', '?'))
+        return None
+
+
+class RestGeminiClient:
+    """Plain HTTP client for the ``generateContent`` endpoint with a pooled session."""
+
+    def __init__(self, api_key: str, base_url: str, *, timeout: float = 60, pool_size: int = 10):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def generate(self, model_name: str, prompt: str, temperature: float) -> Optional[str]:
+        resp = self.session.post(
+            f"{self.base_url}/v1beta/models/{model_name}:generateContent",
+            params={'key': self.api_key},
+            json={
+                'contents': [{'role': 'user', 'parts': [{'text': prompt}]}],
+                'generationConfig': {'temperature': temperature, 'responseMimeType': 'application/json'},
+                'safetySettings': SAFETY_SETTINGS,
+            },
+            timeout=self.timeout,
+        )
+        if resp.status_code == 403 and _is_referrer_blocked(resp.text):
+            raise LLMFatalError(REFERRER_BLOCKED_HELP)
+        resp.raise_for_status()
+        data = resp.json()
+        try:
+            return data['candidates'][0]['content']['parts'][0]['text']
+        except (KeyError, IndexError, TypeError):
+            logger.warning("Pusta odpowiedź tekstowa od Gemini. Powód: %s",
+                           (data.get('promptFeedback') or {}).get('blockReason', '?'))
+            return None
+
+
+def build_client(api_key: str, base_url: Optional[str] = None, *, pool_size: int = 10):
+    base_url = base_url or os.getenv(ENV_GEMINI_API_BASE_URL)
+    if base_url:
+        return RestGeminiClient(api_key, base_url, pool_size=pool_size)
+    return SdkGeminiClient(api_key)
+
+
+class ResponseCache:
+    """Prompt -> raw model response, one JSON file per (model, temperature, prompt) key."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(model_name: str, temperature: float, prompt: str) -> str:
+        return hashlib.sha256(f"{model_name}\0{temperature:.3f}\0{prompt}".encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, model_name: str, temperature: float, prompt: str) -> Optional[str]:
+        try:
+            with open(self._path(self.key(model_name, temperature, prompt)), 'r', encoding='utf-8') as f:
+                return json.load(f)['text']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def set(self, model_name: str, temperature: float, prompt: str, text: str) -> None:
+        path = self._path(self.key(model_name, temperature, prompt))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write-then-rename so concurrent workers never read a half-written file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'model': model_name, 'temperature': temperature, 'text': text}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+
+_prompt_template: Optional[str] = None
+
+
+def load_prompt_template(topic_prompt_str: str, topic_slug_for_hashtag_str: str) -> Optional[str]:
+    global _prompt_template
+    if _prompt_template is None:
+        try:
+            with open(PROMPT_TEMPLATE_PATH, 'r', encoding='utf-8') as f:
+                _prompt_template = f.read()
+        except FileNotFoundError:
+            logger.error(f"Nie znaleziono pliku szablonu podpowiedzi: {PROMPT_TEMPLATE_PATH}")
+            return None
+        # Opcjonalnie ostrzeż, jeśli placeholdery nie zostały znalezione
+        if '{topic_prompt}' not in _prompt_template or '{topic_slug_for_hashtag}' not in _prompt_template:
+            logger.warning('Szablon podpowiedzi nie zawiera jednego z oczekiwanych placeholderów: {topic_prompt} lub {topic_slug_for_hashtag}.')
+
+    # Uwaga: NIE używaj .format() na całym szablonie, bo zawiera on klamry JSON.
+    # Wykonujemy celowe podstawienia tylko naszych placeholderów.
+    return (
+        _prompt_template
+        .replace('{topic_prompt}', topic_prompt_str)
+        .replace('{topic_slug_for_hashtag}', topic_slug_for_hashtag_str)
+    )
+
+
+def try_parse_json(text: str) -> Optional[dict]:
+    if not text:
+        return None
+    s = text.strip()
+    # 1) Usuń fenced code blocks ```json ... ```
+    m = re.search(r"```json\s*(\{[\s\S]*\})\s*```", s, re.DOTALL)
+    if m:
+        s = m.group(1).strip()
+    # 2) Spróbuj bezpośrednio
+    try:
+        return json.loads(s)
+    except Exception:
+        pass
+    # 3) Spróbuj znaleźć największy zbalansowany blok JSON od pierwszej '{'
+    start = s.find('{')
+    end = s.rfind('}')
+    if start != -1 and end != -1 and end > start:
+        candidate = s[start:end + 1]
+        # Upewnij się, że nawiasy są zbalansowane
+        depth = 0
+        for ch in candidate:
+            if ch == '{':
+                depth += 1
+            elif ch == '}':
+                depth -= 1
+                if depth < 0:
+                    break
+        if depth == 0:
+            try:
+                return json.loads(candidate)
+            except Exception:
+                pass
+    return None
+
+
+def _valid_post(data: Optional[dict]) -> Optional[dict]:
+    if not isinstance(data, dict):
+        return None
+    title, body = data.get("title"), data.get("body")
+    if isinstance(title, str) and title.strip() and isinstance(body, str) and body.strip():
+        return {"title": title.strip(), "body": body.strip()}
+    return None
+
+
+def _attempts(topic_prompt_text: str) -> Optional[List[Tuple[str, float, str]]]:
+    """(model, temperature, prompt) of every step of the fallback chain for a topic."""
+    topic_slug = slugify(topic_prompt_text, allow_unicode=True).replace("-", "_") if topic_prompt_text else "ecotips"
+    base_prompt = load_prompt_template(topic_prompt_text, topic_slug)
+    if not base_prompt:
+        return None  # Błąd już zalogowany w load_prompt_template
+    return [(cfg["model"], cfg["temperature"], base_prompt + cfg["suffix"]) for cfg in ATTEMPTS]
+
+
+def response_keys(topics: Iterable[str]) -> List[str]:
+    """ResponseCache keys every attempt for these topics can produce (to look up published answers)."""
+    keys = []
+    for topic in topics:
+        keys.extend(ResponseCache.key(*attempt) for attempt in (_attempts(topic) or []))
+    return keys
+
+
+def generate_post_content(topic_prompt_text: str, client, cache: Optional[ResponseCache] = None,
+                          published_keys: AbstractSet[str] = frozenset()) -> Optional[dict]:
+    """
+    Walk the model/temperature fallback chain until one answer parses as ``{"title", "body"}``.
+    The result also carries the ``key`` of that answer; cached answers listed in ``published_keys``
+    were already turned into posts and are requested from the API again instead of being replayed.
+    """
+    logger.info(f"Kontaktowanie się z API Gemini w celu wygenerowania posta na temat: '{topic_prompt_text}'...")
+    attempts = _attempts(topic_prompt_text)
+    if not attempts:
+        return None
+
+    last_error_preview = None
+    for idx, (model_name, temp, prompt) in enumerate(attempts, start=1):
+        key = ResponseCache.key(model_name, temp, prompt)
+        raw_text = cache.get(model_name, temp, prompt) if cache and key not in published_keys else None
+        from_cache = raw_text is not None
+        if not from_cache:
+            logger.info("Próba %d/%d z modelem '%s' i temperaturą %.2f..." % (idx, len(ATTEMPTS), model_name, temp))
+            try:
+                raw_text = client.generate(model_name, prompt, temp)
+            except LLMFatalError as e:
+                # Nie ma sensu ponawiać — zakończ pętlę prób
+                logger.error(str(e))
+                return None
+            except Exception as e_api:
+                logger.warning(f"Próba {idx}: wyjątek podczas generowania: {e_api}")
+                continue
+        if not raw_text:
+            logger.warning(f"Próba {idx}: pusta odpowiedź tekstowa od Gemini.")
+            continue
+
+        post = _valid_post(try_parse_json(raw_text))
+        if post is None:
+            last_error_preview = raw_text[:500]
+            logger.warning(f"Próba {idx}: nie udało się sparsować JSON lub brak pól. Podgląd: '{last_error_preview}'")
+            continue
+        # Only answers that produced a post are cached, so a retry can still get a better one
+        if cache and not from_cache:
+            cache.set(model_name, temp, prompt, raw_text)
+        logger.info(f"Próba {idx}: sukces — poprawny JSON{' (z cache)' if from_cache else ''}.")
+        post["key"] = key
+        return post
+
+    if last_error_preview:
+        logger.error(f"Wszystkie próby nieudane. Ostatni podgląd odpowiedzi: '{last_error_preview}'")
+    else:
+        logger.error("Wszystkie próby nieudane bez treści do podglądu.")
+    return None
+
+
+def generate_batch(topics: Sequence[str], client, cache: Optional[ResponseCache] = None,
+                   concurrency: int = 4, published_keys: AbstractSet[str] = frozenset()) -> List[Tuple[str, Optional[dict]]]:
+    """Generate one post per topic, at most ``concurrency`` API calls in flight; results keep topic order."""
+    if concurrency <= 1 or len(topics) <= 1:
+        return [(topic, generate_post_content(topic, client, cache, published_keys)) for topic in topics]
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = pool.map(lambda topic: generate_post_content(topic, client, cache, published_keys), topics)
+        return list(zip(topics, results))
+
+
+def unique_slugs(bases: Iterable[str]) -> List[str]:
+    """
+    Unique slug for every base (``base``, ``base-1``, ...), also unique within the batch.
+    Existing slugs sharing any of the prefixes are loaded with a single query.
+    """
+    bases = list(bases)
+    if not bases:
+        return []
+    prefixes = set(bases)
+    taken = set(
+        Post.objects.filter(reduce(or_, (Q(slug__startswith=b) for b in prefixes)))
+        .values_list('slug', flat=True)
+    )
+    slugs = []
+    for base in bases:
+        slug, counter = base, 1
+        while slug in taken:
+            slug = f"{base}-{counter}"
+            counter += 1
+        taken.add(slug)
+        slugs.append(slug)
+    return slugs
@@ -0,0 +1,87 @@
+"""Cached ban lookups and per-post comment counters for the comment endpoints.
+
+Both live in the default cache so the comment POST path does not hit the
+database during spam waves. Bans are refreshed when a BlogBan changes (see
+blog/signals.py and the admin actions); counters are bumped on new comments
+and dropped whenever a comment's visibility may have changed.
+"""
+
+from typing import Iterable, Optional
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from blog.models import BlogBan
+
+BANS_CACHE_KEY = 'blog:active_bans'
+BANS_CACHE_TIMEOUT = 300  # safety net in case an update bypasses invalidation
+COMMENT_COUNT_TIMEOUT = 60 * 60
+
+
+def _load_active_bans():
+    now = timezone.now()
+    rows = (BlogBan.objects.filter(active=True)
+            .exclude(until__lte=now)
+            .values_list('user_id', 'ip_address', 'until'))
+    users, ips = {}, {}
+    for user_id, ip, until in rows:
+        expires = until.timestamp() if until else None
+        if user_id:
+            users[user_id] = _later(users.get(user_id, 0), expires)
+        if ip:
+            ips[ip] = _later(ips.get(ip, 0), expires)
+    return {'users': users, 'ips': ips}
+
+
+def _later(current, expires):
+    # None = permanent ban and wins over any expiry
+    if current is None or expires is None:
+        return None
+    return max(current, expires)
+
+
+def active_bans():
+    bans = cache.get(BANS_CACHE_KEY)
+    if bans is None:
+        bans = _load_active_bans()
+        cache.set(BANS_CACHE_KEY, bans, BANS_CACHE_TIMEOUT)
+    return bans
+
+
+def invalidate_bans() -> None:
+    cache.delete(BANS_CACHE_KEY)
+
+
+def is_banned(user=None, ip: Optional[str] = None) -> bool:
+    bans = active_bans()
+    now = timezone.now().timestamp()
+    candidates = []
+    if user is not None and getattr(user, 'is_authenticated', False):
+        candidates.append(bans['users'].get(user.pk, 0))
+    if ip:
+        candidates.append(bans['ips'].get(ip, 0))
+    return any(expires is None or expires > now for expires in candidates)
+
+
+def _count_key(post_id: int) -> str:
+    return f'blog:post:{post_id}:comment_count'
+
+
+def comment_count(post) -> int:
+    """Number of active comments on the post, served from the cache."""
+    return cache.get_or_set(
+        _count_key(post.pk),
+        lambda: post.comments.filter(active=True).count(),
+        COMMENT_COUNT_TIMEOUT,
+    )
+
+
+def comment_added(post_id: int) -> None:
+    try:
+        cache.incr(_count_key(post_id))
+    except ValueError:
+        pass  # not cached yet; next read computes it
+
+
+def invalidate_comment_counts(post_ids: Iterable[int]) -> None:
+    cache.delete_many([_count_key(pid) for pid in set(post_ids)])
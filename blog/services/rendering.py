@@ -0,0 +1,35 @@
+"""Pre-rendering of blog post bodies.
+
+Post bodies are sanitized (markdown heading hashes stripped) when they are
+written and rendered to HTML once; the result is stored on the post together
+with a key derived from the body and RENDERER_VERSION. Bump the version
+whenever the rendering pipeline changes and run ``manage.py rebuild_post_html``.
+"""
+
+import hashlib
+import re
+
+from django.utils.html import linebreaks
+
+RENDERER_VERSION = '1'
+
+HEADING_HASHES_RE = re.compile(r"^(\s{0,3})#{1,6}(\s+)")
+
+
+def sanitize_headings(value: str) -> str:
+    """
+    Strip leading '#' from markdown-ish heading lines.
+    This prevents '### ' appearing in rendered content from AI-generated text.
+    """
+    if not value:
+        return value
+    return "\n".join(HEADING_HASHES_RE.sub(r"\1\2", ln) for ln in str(value).splitlines())
+
+
+def render_key(body: str) -> str:
+    return hashlib.sha1(f"{RENDERER_VERSION}\0{body or ''}".encode('utf-8')).hexdigest()
+
+
+def render_body(body: str) -> str:
+    """Same output as ``{{ body|md_sanitize_headings|linebreaks }}`` with autoescaping on."""
+    return linebreaks(sanitize_headings(body or ''), autoescape=True)
@@ -0,0 +1,55 @@
+import threading
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import BlogBan, Comment, CommentRating
+from .services.moderation import comment_added, invalidate_bans, invalidate_comment_counts
+from .tasks import generate_comment_thumbnail_task
+
+
+@receiver(post_save, sender=BlogBan)
+@receiver(post_delete, sender=BlogBan)
+def blog_ban_changed(sender, **kwargs):
+    invalidate_bans()
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, update_fields=None, **kwargs):
+    # Only when this save made the thumbnail pending: later full saves of a still-pending comment
+    # (edits, moderation) must not queue it again
+    if instance.__dict__.pop('_thumb_requested', False) or (created and instance.thumb_status == 'pending'):
+        transaction.on_commit(lambda: generate_comment_thumbnail_task(instance.pk, remove_existing_tasks=True))
+    if created:
+        if instance.active:
+            transaction.on_commit(lambda: comment_added(instance.post_id))
+    elif update_fields is None or 'active' in update_fields:
+        invalidate_comment_counts([instance.post_id])
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    invalidate_comment_counts([instance.post_id])
+
+
+# Comments whose ratings were removed by the delete() call currently running: (origin, comment ids)
+_rating_deletes = threading.local()
+
+
+@receiver(post_delete, sender=CommentRating)
+def comment_rating_deleted(sender, instance, origin=None, **kwargs):
+    # The rate view refreshes the stats itself; deletes come from the admin or a cascade (user, comment).
+    # Every rating removed by one delete() shares its origin: their comments get one bulk refresh after
+    # commit, which skips comments deleted by the same cascade.
+    batch = getattr(_rating_deletes, 'batch', None)
+    if batch is None or origin is None or batch[0] is not origin:
+        batch = _rating_deletes.batch = (origin, set())
+
+        def refresh(batch=batch):
+            if getattr(_rating_deletes, 'batch', None) is batch:
+                _rating_deletes.batch = None
+            Comment.refresh_rating_stats_bulk(batch[1])
+
+        transaction.on_commit(refresh)
+    batch[1].add(instance.comment_id)
@@ -0,0 +1,52 @@
+"""Background tasks for blog comments."""
+
+import logging
+
+from taskqueue import background
+
+from .models import Comment
+
+logger = logging.getLogger(__name__)
+
+# Delay (seconds) before each retry; the number of entries + 1 is the attempt limit
+THUMB_RETRY_DELAYS = (30, 5 * 60)
+
+
+def generate_comment_thumbnail(comment_id: int, attempt: int = 1, retry: bool = True) -> str:
+    """
+    Render the thumbnail of a comment image and return the resulting thumb_status.
+
+    Transient failures (storage hiccups) are rescheduled with a back-off; an image
+    PIL cannot decode is marked 'failed' straight away since retrying will not help.
+    The comment template falls back to the original image until the thumb is ready.
+    """
+    comment = Comment.objects.filter(pk=comment_id).only('id', 'image', 'image_thumb', 'thumb_status').first()
+    if comment is None:
+        logger.warning("TASK: blog comment #%s not found, skipping thumbnail", comment_id)
+        return 'none'
+    if not comment.image:
+        if comment.thumb_status != 'none':
+            Comment.objects.filter(pk=comment_id).update(thumb_status='none')
+        return 'none'
+    if comment.thumb_status == 'ready' and comment.image_thumb:
+        return 'ready'
+    from PIL import UnidentifiedImageError
+
+    try:
+        comment._generate_thumbnail()
+        return 'ready'
+    except UnidentifiedImageError as e:
+        logger.warning("TASK: comment #%s image cannot be decoded: %s", comment_id, e)
+    except Exception as e:  # noqa: BLE001 - storage/IO errors are worth another try
+        if retry and attempt <= len(THUMB_RETRY_DELAYS):
+            delay = THUMB_RETRY_DELAYS[attempt - 1]
+            logger.warning("TASK: thumbnail for comment #%s failed (attempt %d), retrying in %ss: %s",
+                           comment_id, attempt, delay, e)
+            generate_comment_thumbnail_task(comment_id, attempt + 1, schedule=delay)
+            return 'pending'
+        logger.exception("TASK ERROR: thumbnail for comment #%s failed after %d attempt(s): %s", comment_id, attempt, e)
+    Comment.objects.filter(pk=comment_id).update(thumb_status='failed')
+    return 'failed'
+
+
+generate_comment_thumbnail_task = background(schedule=0)(generate_comment_thumbnail)
@@ -1,9 +1,9 @@
 from django import template
-import re
+
+from blog.services.rendering import sanitize_headings
 
 register = template.Library()
 
-HEADING_HASHES_RE = re.compile(r"^(\s{0,3})#{1,6}(\s+)")
 
 @register.filter(name='md_sanitize_headings')
 def md_sanitize_headings(value: str) -> str:
@@ -11,11 +11,8 @@ def md_sanitize_headings(value: str) -> str:
     Sanitize markdown-ish headings by stripping leading '#' in heading lines.
     This prevents '### ' appearing in rendered content from AI-generated text.
     Works line-by-line; leaves normal text intact.
+
+    Post bodies are already sanitized on save (see Post.save); the filter stays
+    for other text and for posts not yet processed by rebuild_post_html.
     """
-    if not value:
-        return value
-    lines = str(value).splitlines()
-    cleaned = []
-    for ln in lines:
-        cleaned.append(HEADING_HASHES_RE.sub(r"\1\2", ln))
-    return "\n".join(cleaned)
+    return sanitize_headings(value)
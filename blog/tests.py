@@ -1,3 +1,11 @@
+import os
+import re
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
 from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
@@ -58,3 +66,294 @@ class CreatePostAPITests(TestCase):
 		self.assertEqual(resp.status_code, 500)
 		self.assertIn('error', resp.json())
 
+
+
+class PostBodyRenderCacheTests(TestCase):
+	def setUp(self):
+		self.author = User.objects.create_user(username="writer", password="pass12345")
+
+	def test_body_sanitized_and_rendered_on_save(self):
+		post = Post.objects.create(author=self.author, title="T", slug="t", status='published',
+		                           body="## Nagłówek\n<script>x</script>\n\nDrugi akapit")
+		self.assertEqual(post.body, " Nagłówek\n<script>x</script>\n\nDrugi akapit")
+		self.assertIn("&lt;script&gt;", post.body_html)
+		self.assertTrue(post.body_html.startswith("<p> Nagłówek<br>"))
+
+		post.body = "Nowa treść"
+		post.save(update_fields=['body'])
+		post.refresh_from_db()
+		self.assertEqual(post.body_html, "<p>Nowa treść</p>")
+
+	def test_detail_uses_stored_html(self):
+		post = Post.objects.create(author=self.author, title="T", slug="t", status='published', body="Treść")
+		Post.objects.filter(pk=post.pk).update(body_html="<p>PRE-RENDERED</p>")
+		resp = self.client.get(reverse('blog:post_detail', args=[post.slug]))
+		self.assertContains(resp, "PRE-RENDERED")
+
+	def test_rebuild_command(self):
+		post = Post.objects.create(author=self.author, title="T", slug="t", body="Treść")
+		Post.objects.filter(pk=post.pk).update(body="### Stary", body_html="", body_html_key="")
+		out = StringIO()
+		call_command('rebuild_post_html', stdout=out)
+		self.assertIn("rebuilt=1", out.getvalue())
+		post.refresh_from_db()
+		self.assertEqual((post.body, post.body_html), (" Stary", "<p> Stary</p>"))
+
+
+class CommentThreadPaginationTests(TestCase):
+	def setUp(self):
+		from .models import Comment, CommentRating
+		self.author = User.objects.create_user(username="writer", password="pass12345")
+		self.reader = User.objects.create_user(username="reader", password="pass12345")
+		self.post = Post.objects.create(author=self.author, title="T", slug="t", status='published', body="Treść")
+		self.comments = [Comment.objects.create(post=self.post, author=self.author, body=f"c{i}") for i in range(45)]
+		CommentRating.objects.create(comment=self.comments[-1], user=self.reader, value=4)
+
+	def test_load_more_walks_whole_thread(self):
+		self.client.force_login(self.reader)
+		resp = self.client.get(reverse('blog:post_detail', args=[self.post.slug]))
+		self.assertEqual(len(resp.context['comments']), 20)
+		self.assertEqual(resp.context['comments_count'], 45)
+		self.assertEqual(resp.context['comments'][0].user_rating_value, 4)
+		seen = [c.pk for c in resp.context['comments']]
+		cursor = resp.context['comments_next_cursor']
+		url = reverse('blog:comments_page', args=[self.post.slug])
+		while cursor:
+			data = self.client.get(url, {'cursor': cursor}).json()
+			seen += [int(pk) for pk in re.findall(r'id="comment-(\d+)"', data['html'])]
+			cursor = data['next_cursor']
+		self.assertEqual(seen, [c.pk for c in reversed(self.comments)])
+
+	def test_malformed_cursor_is_rejected_not_restarted(self):
+		url = reverse('blog:comments_page', args=[self.post.slug])
+		for cursor in ('!!!', 'bm90LWEtY3Vyc29y'):  # not base64 / base64 without "date|id"
+			resp = self.client.get(url, {'cursor': cursor})
+			self.assertEqual(resp.status_code, 400)
+			self.assertFalse(resp.json()['ok'])
+
+	def test_page_query_count_does_not_grow_with_thread(self):
+		from .services.comments import comments_page
+		with self.assertNumQueries(2):  # page + current user's ratings (one IN query)
+			comments_page(self.post, self.reader)
+
+	def test_rate_comment_maintains_stats(self):
+		other = User.objects.create_user(username="other", password="pass12345")
+		target = self.comments[0]
+		for user, value in ((self.reader, 5), (other, 2), (self.reader, 3)):
+			self.client.force_login(user)
+			resp = self.client.post(reverse('blog:rate_comment', args=[target.pk]), {'value': value})
+		self.assertEqual(resp.json()['average'], 2.5)
+		target.refresh_from_db()
+		self.assertEqual((target.rating_avg, target.rating_count), (2.5, 2))
+
+		with self.captureOnCommitCallbacks(execute=True):
+			other.delete()  # cascades to the rating
+		target.refresh_from_db()
+		self.assertEqual((target.rating_avg, target.rating_count), (3, 1))
+
+	def test_cascade_refreshes_rated_comments_once(self):
+		from .models import Comment, CommentRating
+		rater = User.objects.create_user(username="rater", password="pass12345")
+		own = Comment.objects.create(post=self.post, author=rater, body="own")
+		for comment in self.comments[:10] + [own]:
+			CommentRating.objects.create(comment=comment, user=rater, value=5)
+		rated = Comment.objects.filter(pk__in=[c.pk for c in self.comments[:10]])
+		Comment.refresh_rating_stats_bulk([c.pk for c in rated])
+		self.assertEqual(set(rated.values_list('rating_count', flat=True)), {1})
+		with self.captureOnCommitCallbacks() as callbacks:
+			rater.delete()  # its ratings and its own (rated) comment go in one cascade
+		self.assertEqual(len(callbacks), 1)
+		with self.assertNumQueries(2):  # comments with their aggregates + one bulk UPDATE
+			callbacks[0]()
+		self.assertEqual(set(rated.values_list('rating_count', flat=True)), {0})
+
+
+class CommentModerationCacheTests(TestCase):
+	def setUp(self):
+		from django.core.cache import cache
+		cache.clear()
+		self.author = User.objects.create_user(username="author", password="pass12345")
+		self.reader = User.objects.create_user(username="reader", password="pass12345")
+		self.post = Post.objects.create(title="Moderated", slug="moderated", author=self.author, body="Body", status='published')
+
+	def test_sliding_window_limits_and_survives_cache_outage(self):
+		from common.ratelimit import SlidingWindowLimiter
+		limiter = SlidingWindowLimiter('test', 2, 60)
+		results = [limiter.hit(user=self.reader, ip='10.0.0.1').allowed for _ in range(3)]
+		self.assertEqual(results, [True, True, False])
+		# A different user on the same IP is limited by the IP counter
+		self.assertFalse(limiter.hit(user=self.author, ip='10.0.0.1').allowed)
+		self.assertTrue(limiter.hit(user=self.author, ip='10.0.0.2', peek=True).allowed)
+		with mock.patch.object(limiter.store, 'get_many', side_effect=ConnectionError('down')):
+			self.assertTrue(limiter.hit(key='fallback').allowed)
+			self.assertTrue(limiter.hit(key='fallback').allowed)
+			self.assertFalse(limiter.hit(key='fallback').allowed)
+
+	def test_ban_cache_refreshes_when_ban_changes(self):
+		from .models import BlogBan
+		from .services.moderation import is_banned
+		self.assertFalse(is_banned(self.reader, '10.0.0.9'))
+		with self.assertNumQueries(0):
+			is_banned(self.reader, '10.0.0.9')
+		ban = BlogBan.objects.create(ip_address='10.0.0.9', active=True)
+		self.assertTrue(is_banned(None, '10.0.0.9'))
+		ban.active = False
+		ban.save()
+		self.assertFalse(is_banned(None, '10.0.0.9'))
+
+	@override_settings(RATE_LIMITS={'blog_comment': (1, 120)})
+	def test_comment_post_is_rate_limited_and_counter_stays_in_sync(self):
+		from .models import Comment
+		from .services.moderation import comment_count
+		Comment.objects.create(post=self.post, author=self.author, body="first", active=True)
+		self.assertEqual(comment_count(self.post), 1)
+		with self.captureOnCommitCallbacks(execute=True):
+			Comment.objects.create(post=self.post, author=self.author, body="second", active=True)
+		self.assertEqual(comment_count(self.post), 2)
+		second = Comment.objects.get(body="second")
+		second.active = False
+		second.save()
+		self.assertEqual(comment_count(self.post), 1)
+		Comment.objects.get(body="first").delete()
+		self.assertEqual(comment_count(self.post), 0)
+
+		from common.ratelimit import get_limiter
+		get_limiter('blog_comment', self.post.pk).hit(user=self.reader)
+		self.client.force_login(self.reader)
+		self.assertEqual(self._post_comment(self.post).status_code, 429)
+		# The limit is per post, as it was before the counters moved to the cache
+		other = Post.objects.create(title="Other", slug="other", author=self.author, body="Body", status='published')
+		self.assertEqual(self._post_comment(other).status_code, 200)
+
+	def _post_comment(self, post):
+		session = self.client.session
+		session['cmt:test'] = 4
+		session.save()
+		return self.client.post(
+			reverse('blog:post_detail', args=[post.slug]),
+			{'body': 'spam', 'captcha': '4', 'captcha_key': 'cmt:test'},
+			HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+		)
+
+	def test_rejected_hit_is_not_counted(self):
+		from common.ratelimit import SlidingWindowLimiter
+		limiter = SlidingWindowLimiter('test', 1, 60)
+		self.assertTrue(limiter.hit(key='k').allowed)
+		for _ in range(3):
+			self.assertFalse(limiter.hit(key='k').allowed)
+		self.assertEqual(limiter.hit(key='k', peek=True).count, 1)
+
+
+class CommentThumbnailTaskTests(TestCase):
+	def setUp(self):
+		self.media_root = tempfile.mkdtemp()
+		self.override = override_settings(MEDIA_ROOT=self.media_root)
+		self.override.enable()
+		author = User.objects.create_user(username="author", password="pass12345")
+		self.post = Post.objects.create(title="Thumbs", slug="thumbs", author=author, body="Body", status='published')
+		self.author = author
+
+	def tearDown(self):
+		self.override.disable()
+		shutil.rmtree(self.media_root, ignore_errors=True)
+
+	def _comment(self, data=None, name='photo.png'):
+		import io
+		from django.core.files.uploadedfile import SimpleUploadedFile
+		from PIL import Image
+		from .models import Comment
+		if data is None:
+			buf = io.BytesIO()
+			Image.new('RGB', (1200, 800), (30, 160, 90)).save(buf, format='PNG')
+			data = buf.getvalue()
+		return Comment.objects.create(post=self.post, author=self.author, body="pic",
+									  image=SimpleUploadedFile(name, data, content_type='image/png'))
+
+	def test_save_defers_thumbnail_to_background_task(self):
+		from taskqueue.models import QueuedTask
+		from .tasks import generate_comment_thumbnail
+		with self.captureOnCommitCallbacks(execute=True):
+			comment = self._comment()
+		comment.refresh_from_db()
+		self.assertEqual(comment.thumb_status, 'pending')
+		self.assertFalse(comment.image_thumb)
+		self.assertTrue(QueuedTask.objects.filter(name='blog.tasks.generate_comment_thumbnail').exists())
+		# Saving the comment again while the thumbnail is still pending does not queue another job
+		with self.captureOnCommitCallbacks(execute=True):
+			comment.body = "edited"
+			comment.save()
+			comment.save(update_fields=['thumb_status'])
+		self.assertEqual(QueuedTask.objects.filter(name='blog.tasks.generate_comment_thumbnail').count(), 1)
+
+		self.assertEqual(generate_comment_thumbnail(comment.pk), 'ready')
+		comment.refresh_from_db()
+		self.assertEqual(comment.thumb_status, 'ready')
+		self.assertTrue(comment.image_thumb.name.endswith('_thumb.jpg'))
+
+	def test_failures_retry_then_mark_failed(self):
+		from .models import Comment
+		from . import tasks
+		comment = self._comment()
+		with mock.patch.object(Comment, '_generate_thumbnail', side_effect=OSError('storage down')), \
+				mock.patch.object(tasks, 'generate_comment_thumbnail_task') as reschedule:
+			self.assertEqual(tasks.generate_comment_thumbnail(comment.pk), 'pending')
+			reschedule.assert_called_once_with(comment.pk, 2, schedule=tasks.THUMB_RETRY_DELAYS[0])
+			last = len(tasks.THUMB_RETRY_DELAYS) + 1
+			self.assertEqual(tasks.generate_comment_thumbnail(comment.pk, attempt=last), 'failed')
+		broken = self._comment(data=b'not an image')
+		self.assertEqual(tasks.generate_comment_thumbnail(broken.pk), 'failed')
+
+	def test_backfill_command_processes_pending_in_batches(self):
+		from .models import Comment
+		ids = [self._comment().pk for _ in range(3)]
+		out = StringIO()
+		call_command('backfill_comment_thumbs', '--batch-size', '2', '--workers', '1', stdout=out)
+		self.assertIn('ready=3', out.getvalue())
+		self.assertEqual(set(Comment.objects.filter(pk__in=ids).values_list('thumb_status', flat=True)), {'ready'})
+
+
+class GenerateEcoPostBatchTests(TestCase):
+	def setUp(self):
+		from .services.fake_llm import FakeGeminiServer
+		self.cache_dir = tempfile.mkdtemp()
+		self.server = FakeGeminiServer().start()
+		User.objects.create_user(username="Ecomarket", password="pass12345")
+
+	def tearDown(self):
+		self.server.stop()
+		shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+	def _run(self, count):
+		out = StringIO()
+		with mock.patch.dict(os.environ, {'GEMINI_API_KEY_FOR_BLOG': 'test-key'}):
+			call_command('generate_eco_post', '--count', str(count), '--concurrency', '3', '--skip-migrate',
+						 '--cache-dir', self.cache_dir, '--api-base-url', self.server.base_url, stdout=out)
+		return out.getvalue()
+
+	def test_batch_uses_fake_endpoint_and_disk_cache(self):
+		topics = ["Kompost w mieście", "Woda z kranu", "Torby wielorazowe"]
+		with mock.patch('random.sample', return_value=list(topics)):
+			self._run(3)
+			self.assertEqual(Post.objects.count(), 3)
+			self.assertEqual(len(self.server.requests), 3)
+			# A run that failed to publish is retried from the cache, without calling the API
+			Post.objects.all().delete()
+			self._run(3)
+			self.assertEqual(len(self.server.requests), 3)
+			self.assertEqual(Post.objects.count(), 3)
+			# Answers that are already posts are not replayed: the API is asked again,
+			# and the (here identical) titles get -N slugs instead of being dropped
+			self._run(3)
+		self.assertEqual(len(self.server.requests), 6)
+		self.assertEqual(Post.objects.count(), 6)
+		self.assertEqual(Post.objects.filter(slug__endswith='-1').count(), 3)
+		self.assertEqual(Post.objects.values('generation_key').distinct().count(), 3)
+
+	def test_unique_slugs_single_query(self):
+		from .services.generation import unique_slugs
+		author = User.objects.get(username="Ecomarket")
+		for slug in ("eko", "eko-1", "eko-wpis"):
+			Post.objects.create(title=slug, slug=slug, author=author, body="x")
+		with self.assertNumQueries(1):
+			slugs = unique_slugs(["eko", "eko", "nowy"])
+		self.assertEqual(slugs, ["eko-2", "eko-3", "nowy"])
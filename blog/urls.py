@@ -7,5 +7,6 @@ urlpatterns = [
     path('', views.PostListView.as_view(), name='post_list'),
     path('api/create_post/', views.CreatePostAPIView.as_view(), name='api_create_post'),
     path('comments/<int:comment_id>/rate/', views.rate_comment, name='rate_comment'),
+    re_path(r'^(?P<slug>[-\w\d]+)/comments/$', views.comments_page_view, name='comments_page'),
     re_path(r'^(?P<slug>[-\w\d]+)/$', views.PostDetailView.as_view(), name='post_detail'),
 ]
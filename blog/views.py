@@ -7,7 +7,7 @@ from django.views.decorators.cache import cache_page
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.urls import reverse_lazy # Not strictly needed here, but good for general use.
 from django.contrib import messages
-from .models import Post, Comment, CommentRating, BlogBan
+from .models import Post, Comment, CommentRating
 from .forms import CommentForm # Assuming CommentForm will be created later
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -15,12 +15,14 @@ from rest_framework import status
 from rest_framework.permissions import IsAuthenticated # Или кастомный permission для API-ключа
 from rest_framework.authentication import TokenAuthentication
 from .serializers import PostCreateSerializer
+from .services.comments import InvalidCursor, comments_page
+from .services.moderation import comment_count, is_banned
+from common.ratelimit import client_ip, get_limiter
 from django.contrib.auth import get_user_model
 from django.utils.text import slugify
 from django.utils import timezone
-from datetime import timedelta
 from django.conf import settings
-from django.db.models import Avg, Count, Subquery, OuterRef, Value, IntegerField, Q
+from django.db import transaction
 import re
 
 User = get_user_model()
@@ -61,9 +63,8 @@ class CreatePostAPIView(APIView):
             post_status = serializer.validated_data.get('status', 'published')
 
 
-            # Sanitize heading hashes in body as well (best effort)
+            # Heading hashes in body are sanitized (and the HTML pre-rendered) by Post.save
             body = serializer.validated_data['body']
-            body = re.sub(r"^(\s{0,3})#{1,6}(\s+)", r"\1\2", body or "", flags=re.MULTILINE)
 
             # Сохраняем пост с нужным автором и слагом
             # Мы не вызываем serializer.save() напрямую, так как нам нужно добавить author и slug.
@@ -104,22 +105,20 @@ class PostDetailView(View): # Inherit from View for custom GET and POST
 
     def get(self, request, slug, *args, **kwargs):
         post = get_object_or_404(Post, slug=slug, status='published')
-        comments_qs = post.comments.filter(active=True)
-        comments_qs = comments_qs.annotate(
-            rating_avg=Avg('ratings__value'),
-            rating_count=Count('ratings')
-        )
-        if request.user.is_authenticated:
-            user_rating_sq = CommentRating.objects.filter(comment=OuterRef('pk'), user=request.user).values('value')[:1]
-            comments_qs = comments_qs.annotate(user_rating_value=Subquery(user_rating_sq, output_field=IntegerField()))
-        comments = comments_qs.order_by('-created_at')
         comment_form = CommentForm(request=request)
-        context = {
+        return render(request, 'blog/post_detail.html', self._context(request, post, comment_form))
+
+    @staticmethod
+    def _context(request, post, comment_form):
+        # First page only; further pages come from the comments_page endpoint ("load more")
+        comments, next_cursor = comments_page(post, request.user)
+        return {
             'post': post,
             'comments': comments,
+            'comments_count': comment_count(post),
+            'comments_next_cursor': next_cursor,
             'comment_form': comment_form,
         }
-        return render(request, 'blog/post_detail.html', context)
 
     def post(self, request, slug, *args, **kwargs):
         post = get_object_or_404(Post, slug=slug, status='published')
@@ -129,15 +128,10 @@ class PostDetailView(View): # Inherit from View for custom GET and POST
             request.META.get('HTTP_X_REQUESTED_WITH') == 'XMLHttpRequest'
         )
 
-        # Basic IP detection
-        ip = request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')[0].strip() or request.META.get('REMOTE_ADDR')
+        ip = client_ip(request)
 
-        # Ban check
-        now = timezone.now()
-        ban_q = BlogBan.objects.filter(active=True).filter(
-            Q(user=request.user) | Q(ip_address=ip)
-        )
-        if ban_q.filter(Q(until__isnull=True) | Q(until__gt=now)).exists():
+        # Ban check (cached set of active bans, refreshed when bans change)
+        if is_banned(request.user, ip):
             msg = 'Twoje konto lub IP jest zablokowane.'
             return JsonResponse({'ok': False, 'error': msg}, status=403) if is_ajax else HttpResponseForbidden(msg)
 
@@ -150,24 +144,16 @@ class PostDetailView(View): # Inherit from View for custom GET and POST
         honeypot = (request.POST.get('website') or '').strip()  # name chosen to look legit
         if honeypot:
             # Silently drop or respond as success without creating
-            return JsonResponse({'ok': True, 'html': '', 'count': post.comments.filter(active=True).count()}) if is_ajax else redirect(post.get_absolute_url() + '#comments-section')
-
-        # Rate limit: max N comments per window per user or IP
-        WINDOW = timedelta(minutes=2)
-        MAX_COMMENTS = 3
-        since = now - WINDOW
-        recent_q = Comment.objects.filter(post=post, created_at__gte=since)
-        if request.user.is_authenticated:
-            recent_q = recent_q.filter(author=request.user)
-        elif ip:
-            recent_q = recent_q.filter(ip_address=ip)
-        if recent_q.count() >= MAX_COMMENTS:
-            msg = 'Za dużo komentarzy. Spróbuj za chwilę.'
-            return JsonResponse({'ok': False, 'error': msg}, status=429) if is_ajax else HttpResponseBadRequest(msg)
+            return JsonResponse({'ok': True, 'html': '', 'count': comment_count(post)}) if is_ajax else redirect(post.get_absolute_url() + '#comments-section')
 
         comment_form = CommentForm(data=request.POST, files=request.FILES, request=request)
 
         if comment_form.is_valid():
+            # Rate limit: sliding window per post, user and IP (RATE_LIMITS['blog_comment']), as before
+            # the move to the cache. Only valid comments are counted; hit() reserves the slot atomically.
+            if not get_limiter('blog_comment', post.pk).hit(user=request.user, ip=ip).allowed:
+                msg = 'Za dużo komentarzy. Spróbuj za chwilę.'
+                return JsonResponse({'ok': False, 'error': msg}, status=429) if is_ajax else HttpResponseBadRequest(msg)
             new_comment = comment_form.save(commit=False)
             new_comment.post = post
             new_comment.author = request.user
@@ -175,26 +161,16 @@ class PostDetailView(View): # Inherit from View for custom GET and POST
             new_comment.save()
 
             if is_ajax:
-                # For newly created comment, bootstrap aggregate fields for the template
-                new_comment.rating_avg = 0
-                new_comment.rating_count = 0
                 new_comment.user_rating_value = None
                 item_html = render_to_string('blog/_comment_item.html', {'comment': new_comment}, request=request)
-                count = post.comments.filter(active=True).count()
-                return JsonResponse({'ok': True, 'html': item_html, 'count': count})
+                return JsonResponse({'ok': True, 'html': item_html, 'count': comment_count(post)})
 
             return redirect(post.get_absolute_url() + '#comments-section')
         else:
             if is_ajax:
                 return JsonResponse({'ok': False, 'errors': comment_form.errors}, status=400)
 
-            comments = post.comments.filter(active=True).order_by('-created_at')
-            context = {
-                'post': post,
-                'comments': comments,
-                'comment_form': comment_form,
-            }
-            return render(request, 'blog/post_detail.html', context)
+            return render(request, 'blog/post_detail.html', self._context(request, post, comment_form))
 
     # For POST, we can wrap the method with LoginRequiredMixin's dispatch or use function decorator
     # For simplicity, we'll assume the form/template handles login checks,
@@ -268,14 +244,27 @@ def rate_comment(request, comment_id: int):
     if value not in (1, 2, 3, 4, 5):
         return JsonResponse({'ok': False, 'error': 'Ocena musi być w zakresie 1-5.'}, status=400)
 
-    # Create or update rating
-    obj, created = CommentRating.objects.update_or_create(
-        comment=comment, user=request.user,
-        defaults={'value': value}
-    )
+    with transaction.atomic():
+        # Lock the comment so concurrent votes don't overwrite each other's stats
+        Comment.objects.select_for_update().filter(pk=comment.pk).first()
+        # Create or update rating
+        obj, created = CommentRating.objects.update_or_create(
+            comment=comment, user=request.user,
+            defaults={'value': value}
+        )
+        comment.refresh_rating_stats()
+    return JsonResponse({'ok': True, 'average': comment.rating_avg, 'count': comment.rating_count, 'your_value': value})
+
 
-    # Compute aggregates
-    agg = comment.ratings.aggregate(avg=Avg('value'), cnt=Count('id'))
-    avg = agg['avg'] or 0
-    cnt = agg['cnt'] or 0
-    return JsonResponse({'ok': True, 'average': round(avg, 2), 'count': cnt, 'your_value': value})
+def comments_page_view(request, slug):
+    """AJAX "load more": next keyset page of a post's comments as rendered HTML."""
+    post = get_object_or_404(Post, slug=slug, status='published')
+    try:
+        comments, next_cursor = comments_page(post, request.user, cursor=request.GET.get('cursor'))
+    except InvalidCursor:
+        return JsonResponse({'ok': False, 'error': 'Nieprawidłowy kursor.'}, status=400)
+    html = ''.join(
+        render_to_string('blog/_comment_item.html', {'comment': comment}, request=request)
+        for comment in comments
+    )
+    return JsonResponse({'ok': True, 'html': html, 'next_cursor': next_cursor})
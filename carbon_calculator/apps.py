@@ -2,4 +2,7 @@ from django.apps import AppConfig
 
 class CarbonCalculatorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'carbon_calculator'
\ No newline at end of file
+    name = 'carbon_calculator'
+
+    def ready(self):
+        import carbon_calculator.signals  # noqa: F401
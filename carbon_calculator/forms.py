@@ -1,15 +1,16 @@
 # carbon_calculator/forms.py
 from django import forms
-from .models import EmissionFactor, ActivityCategory, Region
+from .services.catalog import get_catalog
 from decimal import Decimal
 
 class FootprintCalculatorForm(forms.Form):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, catalog=None, **kwargs):
         super().__init__(*args, **kwargs)
+        # Regiony, kategorie i czynniki pochodzą z zapamiętanego katalogu (bez zapytań w stanie ustalonym)
+        self.catalog = catalog or get_catalog()
         # Krok 1: Profil
-        regions = Region.objects.all().order_by('name')
-        region_choices = [(str(r.id), f"{r.name} ({r.grid_intensity_kg_per_kwh} kg/kWh)") for r in regions]
-        default_region = Region.objects.filter(is_default=True).first()
+        region_choices = [(str(r.id), f"{r.name} ({r.grid_intensity_kg_per_kwh} kg/kWh)") for r in self.catalog.regions]
+        default_region = self.catalog.default_region
         if region_choices:
             self.fields['profile_region'] = forms.ChoiceField(
                 label="Twój region/kraj (dla energii elektrycznej)",
@@ -28,17 +29,7 @@ class FootprintCalculatorForm(forms.Form):
     # Grupujemy pola w sekcje
         self.grouped_factors = {}
         self.profile_section = ['profile_region', 'profile_household_members']
-        categories = ActivityCategory.objects.filter(factors__is_active=True).distinct().order_by('order', 'name')
-
-        for category in categories:
-            factors_in_category = EmissionFactor.objects.filter(
-                activity_category=category,
-                is_active=True
-            ).order_by('order', 'name')
-
-            if not factors_in_category.exists():
-                continue
-
+        for category, factors_in_category in self.catalog.grouped_factors:
             self.grouped_factors[category] = []
 
             for factor in factors_in_category:
@@ -0,0 +1,377 @@
+import logging
+import random
+import time
+from decimal import Decimal, ROUND_HALF_UP
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+
+from carbon_calculator.services.tip_rules import RuleContext, compile_tips
+
+logger = logging.getLogger(__name__)
+
+CONDITION_TYPES = [
+    "category_emission_gt", "category_emission_lt", "category_emission_percentage_gt",
+    "input_value_gt", "input_value_equals", "total_emission_gt",
+]
+SAVINGS_TYPES = [
+    "fixed", "percentage_of_category", "reduction_from_input", "activity_substitution", "direct_from_input_change",
+]
+
+
+def check_tip_conditions(tip_conditions_json, user_inputs_db, category_breakdown_calc, total_annual_emissions_calc, active_factors_map):
+    """
+    Sprawdza, czy spełnione są warunki do wyświetlenia porady (interpretacja JSON w locie).
+    Dawny interpreter z widoku; widok korzysta ze skompilowanych reguł (services/tip_rules.py),
+    a ta funkcja jest wzorcem ich semantyki w benchmarku i w teście zgodności.
+    :param tip_conditions_json: JSON trigger_conditions_json z ReductionTip
+    :param user_inputs_db: Słownik user_inputs_for_session_db (dane wprowadzone przez użytkownika)
+                           Struktura: { "factor_id_X": {"raw_value": Y, "chosen_period_key_if_any": Z, ...}, ...}
+    :param category_breakdown_calc: Słownik category_breakdown_kg_annual_calc {category_slug: Decimal(value)}
+    :param total_annual_emissions_calc: Decimal, całkowity roczny ślad
+    :param active_factors_map: Słownik {factor_id: factor_instance} (dostęp do szczegółów czynników)
+    :return: True, jeśli wszystkie warunki są spełnione (lub brak warunków), inaczej False
+    """
+    if not tip_conditions_json:
+        return True  # Brak warunków oznacza poradę domyślnie stosowną
+
+    if not isinstance(tip_conditions_json, list):
+        logger.warning(f"trigger_conditions_json nie jest listą: {tip_conditions_json} dla porady.")
+        return False  # Nieprawidłowy format warunków
+
+    for condition in tip_conditions_json:
+        if not isinstance(condition, dict):
+            logger.warning(f"Element warunku nie jest słownikiem: {condition} dla porady.")
+            return False  # Pomijamy niepoprawny warunek, uznając, że ogólnie warunek nie jest spełniony
+
+        condition_type = condition.get("type")
+        current_condition_met = False  # Flaga dla aktualnie sprawdzanego warunku
+
+        try:
+            if condition_type == "category_emission_gt":
+                cat_slug = condition.get("category_slug")
+                threshold = Decimal(str(condition.get("threshold_kg_annual", "0")))
+                if cat_slug and cat_slug in category_breakdown_calc and category_breakdown_calc[cat_slug] > threshold:
+                    current_condition_met = True
+
+            elif condition_type == "category_emission_lt":
+                cat_slug = condition.get("category_slug")
+                threshold = Decimal(str(condition.get("threshold_kg_annual", "999999999")))  # Duża wartość domyślna
+                # Jeśli kategorii nie ma w obliczeniu, jej emisje = 0, co jest mniejsze od progu
+                category_emission = category_breakdown_calc.get(cat_slug, Decimal('0'))
+                if cat_slug and category_emission < threshold:
+                    current_condition_met = True
+
+            elif condition_type == "category_emission_percentage_gt":
+                cat_slug = condition.get("category_slug")
+                threshold_percentage = Decimal(str(condition.get("percentage", "0")))
+                if total_annual_emissions_calc > Decimal('0') and cat_slug and cat_slug in category_breakdown_calc:
+                    category_emission_value = category_breakdown_calc[cat_slug]
+                    category_percentage = (category_emission_value / total_annual_emissions_calc) * Decimal('100')
+                    if category_percentage > threshold_percentage:
+                        current_condition_met = True
+
+            elif condition_type == "input_value_gt":
+                factor_id_str = str(condition.get("factor_id"))
+                threshold_input_val = Decimal(str(condition.get("threshold_value", "0")))
+                if factor_id_str in user_inputs_db:
+                    # Porównujemy surową wartość wprowadzoną przez użytkownika
+                    raw_value = user_inputs_db[factor_id_str].get("raw_value")
+                    if raw_value is not None and Decimal(str(raw_value)) > threshold_input_val:
+                        current_condition_met = True
+
+            elif condition_type == "input_value_equals":
+                factor_id_str = str(condition.get("factor_id"))
+                expected_val_str = str(condition.get("expected_value"))  # Oczekujemy string, bo opcje select to stringi
+                if factor_id_str in user_inputs_db:
+                    # Dla pól 'select' user_inputs_db[factor_id_str]["raw_value"] będzie łańcuchem (klucz opcji)
+                    # Dla pól liczbowych to liczba, ale porównujemy jako tekst dla uniwersalności
+                    raw_value = user_inputs_db[factor_id_str].get("raw_value")
+                    if raw_value is not None and str(raw_value) == expected_val_str:
+                        current_condition_met = True
+
+            elif condition_type == "total_emission_gt":
+                threshold_total = Decimal(str(condition.get("threshold_kg_annual", "0")))
+                if total_annual_emissions_calc > threshold_total:
+                    current_condition_met = True
+
+            # Dodatkowe typy warunków można dodać później
+
+            else:
+                logger.warning(f"Nieznany lub niepełny typ warunku '{condition_type}' w: {condition} dla porady.")
+                return False  # Nieznany warunek => ogólny warunek niespełniony
+
+            if not current_condition_met:  # Jeśli któryś warunek z listy nie jest spełniony (logika AND)
+                return False  # Przerywamy — nie wszystkie warunki są spełnione
+
+        except (ValueError, TypeError, KeyError) as e:
+            logger.error(f"Błąd przy przetwarzaniu warunku JSON {condition} dla porady: {e}")
+            return False  # Uznajemy warunek za niespełniony przy błędzie
+
+    return True  # Jeśli wszystkie warunki zostały spełnione
+
+def calculate_tip_savings(tip_savings_logic_json, user_inputs_db, category_breakdown_calc, total_annual_emissions_calc, active_factors_map):
+    """
+    Oblicza potencjalną oszczędność CO2 dla porady (interpretacja JSON w locie, por. check_tip_conditions).
+    :param tip_savings_logic_json: JSON estimated_co2_reduction_kg_annual_logic
+    :param user_inputs_db: Słownik user_inputs_for_session_db
+                           Struktura: { "factor_id_X": {"raw_value": Y, "annual_multiplier_used": Z,
+                                                       "calculated_annual_co2_for_this_input": C, ...}, ...}
+    :param category_breakdown_calc: Słownik category_breakdown_kg_annual_calc {category_slug: Decimal(value)}
+    :param total_annual_emissions_calc: Decimal, całkowity roczny ślad
+    :param active_factors_map: Słownik {factor_id: factor_instance} (dostęp do co2_kg_per_unit)
+    :return: Decimal (oszczędność w kg CO2/rok) lub None
+    """
+    if not tip_savings_logic_json or not isinstance(tip_savings_logic_json, dict):
+        logger.debug(f"Brak logiki obliczania oszczędności lub nieprawidłowy format: {tip_savings_logic_json}")
+        return None
+
+    savings_type = tip_savings_logic_json.get("type")
+    potential_savings = None
+    quantizer = Decimal('0.1')  # Zaokrąglamy do 1 miejsca po przecinku
+
+    try:
+        if savings_type == "fixed":
+            value_str = str(tip_savings_logic_json.get("value_kg_annual", "0"))
+            potential_savings = Decimal(value_str)
+            logger.debug(f"Obliczenie oszczędności (fixed): {potential_savings} kg/rok")
+
+        elif savings_type == "percentage_of_category":
+            cat_slug = tip_savings_logic_json.get("category_slug")
+            percentage_str = str(tip_savings_logic_json.get("percentage", "0"))
+            percentage = Decimal(percentage_str)
+
+            if cat_slug in category_breakdown_calc and percentage > 0:
+                category_emission = category_breakdown_calc[cat_slug]
+                potential_savings = (category_emission * percentage / Decimal('100'))
+                logger.debug(f"Oszczędność (percentage_of_category '{cat_slug}'): {category_emission} * {percentage}% = {potential_savings} kg/rok")
+            else:
+                logger.debug(f"Kategoria '{cat_slug}' nie znaleziona w emisjach lub procent = 0 dla percentage_of_category.")
+
+        elif savings_type == "reduction_from_input":
+            # Oszczędność = X% rocznych emisji związanych z konkretnym wejściem użytkownika
+            input_factor_id_str = str(tip_savings_logic_json.get("input_factor_id"))
+            reduction_percentage_str = str(tip_savings_logic_json.get("reduction_percentage", "0"))
+            reduction_percentage = Decimal(reduction_percentage_str)
+
+            if input_factor_id_str in user_inputs_db and reduction_percentage > 0:
+                input_details = user_inputs_db[input_factor_id_str]
+                # Używamy już obliczonych rocznych emisji dla tego wejścia
+                annual_co2_for_this_input = Decimal(str(input_details.get("calculated_annual_co2_for_this_input", "0")))
+                potential_savings = annual_co2_for_this_input * reduction_percentage / Decimal('100')
+                logger.debug(f"Oszczędność (reduction_from_input factor_id={input_factor_id_str}): {annual_co2_for_this_input} * {reduction_percentage}% = {potential_savings} kg/rok")
+            else:
+                logger.debug(f"Czynnik ID {input_factor_id_str} nie znaleziony we wprowadzonych danych lub procent = 0 dla reduction_from_input.")
+
+        elif savings_type == "activity_substitution":
+            # Zastąpienie X% jednej aktywności (z oryginalnym CO2/jedn.) alternatywną (z nowym CO2/jedn.)
+            orig_factor_id_str = str(tip_savings_logic_json.get("original_input_factor_id"))
+            # CO2 na jednostkę alternatywnej aktywności
+            alt_co2_per_unit_str = str(tip_savings_logic_json.get("alternative_co2_per_unit", "0"))
+            alt_co2_per_unit = Decimal(alt_co2_per_unit_str)
+            # Jaki procent oryginalnej aktywności jest zastępowany (domyślnie 100%)
+            affected_input_percentage_str = str(tip_savings_logic_json.get("affected_input_percentage", "100"))
+            affected_input_percentage = Decimal(affected_input_percentage_str)
+
+            if orig_factor_id_str in user_inputs_db and affected_input_percentage > 0:
+                original_input_details = user_inputs_db[orig_factor_id_str]
+                original_factor_instance = active_factors_map.get(int(orig_factor_id_str))
+
+                if original_factor_instance:
+                    # Roczna liczba jednostek oryginalnej aktywności (np. roczny przebieg)
+                    raw_value = Decimal(str(original_input_details.get("raw_value", "0")))
+                    annual_multiplier = Decimal(str(original_input_details.get("annual_multiplier_used", "1")))
+                    annual_units_of_activity = raw_value * annual_multiplier
+
+                    # Jednostki aktywności, które podlegają zastąpieniu
+                    units_to_substitute = annual_units_of_activity * (affected_input_percentage / Decimal('100'))
+
+                    # Emisje oryginalnej aktywności dla zastępowanej części
+                    original_emissions_from_substituted_part = units_to_substitute * original_factor_instance.co2_kg_per_unit
+
+                    # Emisje z alternatywnej aktywności dla tej samej części
+                    alternative_emissions_from_substituted_part = units_to_substitute * alt_co2_per_unit
+
+                    potential_savings = original_emissions_from_substituted_part - alternative_emissions_from_substituted_part
+                    logger.debug(f"Oszczędność (activity_substitution factor_id={orig_factor_id_str}): Savings={potential_savings} kg/rok")
+                else:
+                    logger.warning(f"Oryginalny czynnik ID {orig_factor_id_str} nie znaleziony w active_factors_map dla activity_substitution.")
+            else:
+                logger.debug(f"Czynnik ID {orig_factor_id_str} nie znaleziony we wprowadzonych danych lub procent = 0 dla activity_substitution.")
+
+        elif savings_type == "direct_from_input_change":
+            # Zakładamy, że porada sugeruje zmianę wartości konkretnego czynnika na nową
+            input_factor_id_str = str(tip_savings_logic_json.get("input_factor_id"))
+            new_value_for_input_str = str(tip_savings_logic_json.get("new_value_for_input", "0"))
+            new_value_for_input = Decimal(new_value_for_input_str)
+
+            # Okres dla nowej wartości (jeśli różni się od pierwotnej lub nie był podany)
+            # Jeśli period_key_for_new_value nie podano, używamy annual_multiplier_used z oryginalnego wejścia
+            new_period_key = tip_savings_logic_json.get("period_key_for_new_value")
+
+            if input_factor_id_str in user_inputs_db:
+                original_input_details = user_inputs_db[input_factor_id_str]
+                factor_instance = active_factors_map.get(int(input_factor_id_str))
+
+                if factor_instance:
+                    # Oryginalne roczne emisje dla tego czynnika
+                    original_annual_co2_for_input = Decimal(str(original_input_details.get("calculated_annual_co2_for_this_input", "0")))
+
+                    # Obliczamy nowe roczne emisje
+                    new_annual_multiplier = Decimal(str(original_input_details.get("annual_multiplier_used", "1")))  # Domyślnie
+                    if new_period_key and getattr(factor_instance, 'periodicity_options_for_form', None):
+                        period_details = factor_instance.periodicity_options_for_form.get(new_period_key)
+                        if period_details and 'annual_multiplier' in period_details:
+                            new_annual_multiplier = Decimal(str(period_details['annual_multiplier']))
+
+                    new_annual_co2_for_input = (new_value_for_input * new_annual_multiplier * factor_instance.co2_kg_per_unit)
+
+                    potential_savings = original_annual_co2_for_input - new_annual_co2_for_input
+                    logger.debug(f"Oszczędność (direct_from_input_change factor_id={input_factor_id_str}): Original CO2={original_annual_co2_for_input}, New CO2={new_annual_co2_for_input}. Savings={potential_savings} kg/rok")
+            else:
+                logger.debug(f"Czynnik ID {input_factor_id_str} nie znaleziony we wprowadzonych danych dla direct_from_input_change.")
+
+        else:
+            logger.warning(f"Nieznany typ logiki oszczędności: '{savings_type}' dla porady.")
+
+        if potential_savings is not None:
+            # Oszczędność nie może być ujemna (porada nie powinna zwiększać śladu)
+            return max(Decimal('0.0'), potential_savings.quantize(quantizer, ROUND_HALF_UP))
+
+    except (ValueError, TypeError, KeyError) as e:
+        logger.error(f"Błąd typu/dostępu przy obliczaniu oszczędności (logika: {tip_savings_logic_json}): {e}")
+    except Exception as e_global:
+        logger.error(f"Nieoczekiwany błąd przy obliczaniu oszczędności porady (logika: {tip_savings_logic_json}): {e_global}")
+
+    return None
+
+
+def build_synthetic_catalog(rng, n_tips=1000, n_categories=12, n_factors=60):
+    """Niezapisane w bazie kategorie, czynniki i porady z losowymi regułami."""
+    categories = [SimpleNamespace(id=i, slug=f"cat-{i}", name=f"Kategoria {i}") for i in range(1, n_categories + 1)]
+    periods = {"per_week": {"label": "na tydzień", "annual_multiplier": 52},
+               "per_month": {"label": "na miesiąc", "annual_multiplier": 12}}
+    factors = {
+        i: SimpleNamespace(id=i, name=f"Czynnik {i}", form_question_text=f"Ile {i}?",
+                           category=rng.choice(categories),
+                           co2_kg_per_unit=Decimal(rng.randint(1, 5000)) / Decimal(1000),
+                           periodicity_options_for_form=periods)
+        for i in range(1, n_factors + 1)
+    }
+
+    def condition():
+        ctype = rng.choice(CONDITION_TYPES)
+        slug = rng.choice(categories).slug
+        fid = rng.choice(list(factors))
+        return {
+            "category_emission_gt": {"type": ctype, "category_slug": slug, "threshold_kg_annual": rng.randint(0, 800)},
+            "category_emission_lt": {"type": ctype, "category_slug": slug, "threshold_kg_annual": rng.randint(100, 2000)},
+            "category_emission_percentage_gt": {"type": ctype, "category_slug": slug, "percentage": rng.randint(1, 40)},
+            "input_value_gt": {"type": ctype, "factor_id": fid, "threshold_value": rng.randint(0, 300)},
+            "input_value_equals": {"type": ctype, "factor_id": fid, "expected_value": str(float(rng.randint(0, 5)))},
+            "total_emission_gt": {"type": ctype, "threshold_kg_annual": rng.randint(0, 5000)},
+        }[ctype]
+
+    def savings():
+        stype = rng.choice(SAVINGS_TYPES)
+        fid = rng.choice(list(factors))
+        return {
+            "fixed": {"type": stype, "value_kg_annual": rng.randint(1, 300)},
+            "percentage_of_category": {"type": stype, "category_slug": rng.choice(categories).slug,
+                                       "percentage": rng.randint(1, 50)},
+            "reduction_from_input": {"type": stype, "input_factor_id": fid, "reduction_percentage": rng.randint(1, 80)},
+            "activity_substitution": {"type": stype, "original_input_factor_id": fid,
+                                      "alternative_co2_per_unit": "0.05", "affected_input_percentage": rng.randint(10, 100)},
+            "direct_from_input_change": {"type": stype, "input_factor_id": fid, "new_value_for_input": rng.randint(0, 20),
+                                         "period_key_for_new_value": rng.choice([None, "per_week", "per_month"])},
+        }[stype]
+
+    tips, tip_categories = [], {}
+    for i in range(1, n_tips + 1):
+        tips.append(SimpleNamespace(
+            id=i, title=f"Porada {i}",
+            trigger_conditions_json=[condition() for _ in range(rng.randint(0, 3))],
+            estimated_co2_reduction_kg_annual_logic=savings(),
+        ))
+        tip_categories[i] = tuple(rng.sample(categories, rng.choice([0, 0, 1, 2])))
+    return categories, factors, tips, tip_categories
+
+
+def build_synthetic_context(rng, factors, n_inputs=8):
+    inputs, breakdown, total = {}, {}, Decimal('0')
+    for fid in rng.sample(list(factors), n_inputs):
+        factor = factors[fid]
+        raw = Decimal(rng.randint(0, 400))
+        multiplier = Decimal(rng.choice([1, 12, 52]))
+        emission = raw * multiplier * factor.co2_kg_per_unit
+        inputs[str(fid)] = {
+            "raw_value": float(raw),
+            "annual_multiplier_used": float(multiplier),
+            "calculated_annual_co2_for_this_input": float(emission.quantize(Decimal('0.01'))),
+        }
+        breakdown[factor.category.slug] = breakdown.get(factor.category.slug, Decimal('0')) + emission
+        total += emission
+    return RuleContext(inputs=inputs, breakdown=breakdown, total=total.quantize(Decimal('0.01')))
+
+
+def interpret_tips(tips, tip_categories, factors, ctx):
+    """Dotychczasowa ścieżka widoku: interpretacja JSON każdej porady przy każdym obliczeniu."""
+    shown = []
+    for tip in tips:
+        if not check_tip_conditions(tip.trigger_conditions_json, ctx.inputs, ctx.breakdown, ctx.total, factors):
+            continue
+        cats = tip_categories.get(tip.id, ())
+        if cats and not any(cat.slug in ctx.breakdown and ctx.breakdown[cat.slug] > 0 for cat in cats):
+            continue
+        savings = calculate_tip_savings(tip.estimated_co2_reduction_kg_annual_logic, ctx.inputs,
+                                        ctx.breakdown, ctx.total, factors)
+        shown.append((tip.id, savings))
+    return shown
+
+
+def compiled_tips(index, ctx):
+    return [(compiled.tip.id, compiled.savings(ctx)) for compiled in index.match(ctx)]
+
+
+class Command(BaseCommand):
+    help = "Benchmark interpreted vs compiled/indexed tip rules on synthetic data (no database access)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tips", type=int, default=1000)
+        parser.add_argument("--calculations", type=int, default=200)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        import logging
+        logging.disable(logging.WARNING)  # interpreter loguje każdą nieudaną regułę
+        try:
+            rng = random.Random(options["seed"])
+            categories, factors, tips, tip_categories = build_synthetic_catalog(rng, n_tips=options["tips"])
+            contexts = [build_synthetic_context(rng, factors) for _ in range(options["calculations"])]
+
+            started = time.perf_counter()
+            index = compile_tips(tips, tip_categories, factors)
+            compile_s = time.perf_counter() - started
+
+            started = time.perf_counter()
+            interpreted = [interpret_tips(tips, tip_categories, factors, ctx) for ctx in contexts]
+            interpreted_s = time.perf_counter() - started
+
+            started = time.perf_counter()
+            compiled = [compiled_tips(index, ctx) for ctx in contexts]
+            compiled_s = time.perf_counter() - started
+
+            evaluated = sum(len(index.candidates(ctx)) for ctx in contexts) / len(contexts)
+        finally:
+            logging.disable(logging.NOTSET)
+
+        n = len(contexts)
+        self.stdout.write(f"tips={len(tips)} calculations={n} compile={compile_s * 1000:.1f} ms")
+        self.stdout.write(f"interpreted: {interpreted_s / n * 1000:.3f} ms/calc ({len(tips)} tips evaluated)")
+        self.stdout.write(f"compiled:    {compiled_s / n * 1000:.3f} ms/calc ({evaluated:.0f} candidates evaluated)")
+        if compiled_s:
+            self.stdout.write(f"speedup:     {interpreted_s / compiled_s:.1f}x")
+        if interpreted != compiled:
+            self.stderr.write(self.style.ERROR("Results differ between interpreted and compiled rules!"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Results identical."))
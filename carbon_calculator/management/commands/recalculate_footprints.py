@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from carbon_calculator.services.recalculation import DEFAULT_WORKERS, recalculate_sessions
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute historical UserFootprintSession rows with the current emission factors and region "
+        "grid intensities, store them under a new calculation_version and report the deltas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Sessions read and written per batch")
+        parser.add_argument(
+            "--workers", type=int, default=DEFAULT_WORKERS,
+            help=f"Worker processes for the calculation (default {DEFAULT_WORKERS}; 0 = compute in this process)",
+        )
+        parser.add_argument("--calculation-version", help="Override the computed calculation_version")
+        parser.add_argument("--limit", type=int, help="Process at most this many sessions")
+        parser.add_argument("--dry-run", action="store_true", help="Report deltas without writing")
+        parser.add_argument("--top", type=int, default=10, help="How many of the largest changes to list")
+
+    def handle(self, *args, **options):
+        def progress(report):
+            if options["verbosity"] >= 2:
+                self.stdout.write(f"... {report.processed} sessions, {report.changed} changed")
+
+        report = recalculate_sessions(
+            chunk_size=options["chunk_size"],
+            workers=options["workers"],
+            version=options["calculation_version"],
+            dry_run=options["dry_run"],
+            limit=options["limit"],
+            top_n=options["top"],
+            progress=progress,
+        )
+        for line in report.lines():
+            self.stdout.write(line)
+        style = self.style.WARNING if report.errors else self.style.SUCCESS
+        self.stdout.write(style(f"Done: {report.processed} recalculated, {report.errors} errors."))
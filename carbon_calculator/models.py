@@ -6,6 +6,8 @@ from django.utils.text import slugify
 from django.core.exceptions import ValidationError
 from decimal import Decimal
 
+from .services.tip_rules import validate_tip_rules
+
 
 class Region(models.Model):
     code = models.CharField(max_length=10, unique=True, verbose_name="Kod kraju/regionu")
@@ -226,4 +228,11 @@ class ReductionTip(models.Model):
         ordering = ['-priority', 'title']
 
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return self.title
+
+    def clean(self):
+        super().clean()
+        # Reguły są kompilowane razem z katalogiem kalkulatora — błędy zgłaszamy już przy zapisie
+        errors = validate_tip_rules(self.trigger_conditions_json, self.estimated_co2_reduction_kg_annual_logic)
+        if errors:
+            raise ValidationError(errors)
@@ -0,0 +1,130 @@
+"""
+Wersjonowany snapshot katalogu kalkulatora trzymany w pamięci procesu.
+
+Snapshot zawiera skompilowaną tabelę czynników (FactorTable), kategorie, regiony
+oraz aktywne porady z prefetchem i skompilowanymi regułami (TipIndex). Obliczenie, formularz, podział na kategorie i
+dopasowanie porad korzystają z tego samego snapshotu, więc w stanie ustalonym
+obliczenie nie wykonuje żadnych zapytań o katalog.
+
+Unieważnianie: sygnały (zapis w adminie) zmieniają token wersji we
+współdzielonym cache; każdy proces porównuje swój token przy odczycie. Token
+jest czytany przez alias 'tiered' (common/cache.py), więc zwykle z pamięci
+procesu, a nie z Redisa przy każdym żądaniu.
+Dodatkowo snapshot wygasa po CARBON_CATALOG_TTL sekundach (np. gdy cache nie
+jest współdzielony między procesami albo zmieniono sugerowany produkt).
+"""
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from carbon_calculator.models import ActivityCategory, EmissionFactor, ReductionTip, Region
+from .engine import FactorTable
+from .tip_rules import TipIndex, compile_tips
+
+CATALOG_VERSION_KEY = 'carbon_calculator:catalog_version'
+
+_lock = threading.Lock()
+_snapshot: Optional['Catalog'] = None
+
+
+@dataclass(frozen=True)
+class Catalog:
+    version: str
+    built_at: float
+    factor_table: FactorTable
+    categories: Tuple[ActivityCategory, ...]  # wszystkie, wg (order, name)
+    grouped_factors: Tuple[Tuple[ActivityCategory, Tuple[EmissionFactor, ...]], ...]
+    regions: Tuple[Region, ...]  # wg nazwy
+    default_region: Optional[Region]
+    tips: Tuple[ReductionTip, ...]  # aktywne, wg (-priority, title)
+    tip_categories: Dict[int, Tuple[ActivityCategory, ...]] = field(default_factory=dict)
+    tip_index: TipIndex = field(default_factory=TipIndex)  # skompilowane reguły porad
+
+    @property
+    def active_factors_map(self) -> Dict[int, EmissionFactor]:
+        return self.factor_table.factors
+
+    @property
+    def category_names(self) -> Dict[str, str]:
+        return {cat.slug: cat.name for cat in self.categories}
+
+    def region(self, region_id) -> Optional[Region]:
+        for r in self.regions:
+            if str(r.id) == str(region_id):
+                return r
+        return None
+
+
+def build_catalog(version: str) -> Catalog:
+    factors = list(EmissionFactor.objects.filter(is_active=True).select_related('activity_category'))
+    categories = tuple(ActivityCategory.objects.all())
+    grouped: Dict[int, list] = {}
+    for f in sorted(factors, key=lambda f: (f.order, f.name)):
+        grouped.setdefault(f.activity_category_id, []).append(f)
+    grouped_factors = tuple(
+        (cat, tuple(grouped[cat.id])) for cat in categories if cat.id in grouped
+    )
+    regions = tuple(Region.objects.order_by('name'))
+    tips = tuple(
+        ReductionTip.objects.filter(is_active=True)
+        .prefetch_related('suggested_products', 'applies_to_categories')
+        .order_by('-priority', 'title')
+    )
+    factor_table = FactorTable(factors)
+    tip_categories = {tip.id: tuple(tip.applies_to_categories.all()) for tip in tips}
+    return Catalog(
+        version=version,
+        built_at=time.monotonic(),
+        factor_table=factor_table,
+        categories=categories,
+        grouped_factors=grouped_factors,
+        regions=regions,
+        default_region=next((r for r in regions if r.is_default), None),
+        tips=tips,
+        tip_categories=tip_categories,
+        tip_index=compile_tips(tips, tip_categories, factor_table.factors),
+    )
+
+
+def _current_version() -> str:
+    cache = caches['tiered']
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def get_catalog() -> Catalog:
+    global _snapshot
+    version = _current_version()
+    ttl = getattr(settings, 'CARBON_CATALOG_TTL', 300)
+    snap = _snapshot
+    if snap is not None and snap.version == version and time.monotonic() - snap.built_at < ttl:
+        return snap
+    with _lock:
+        snap = _snapshot
+        if snap is None or snap.version != version or time.monotonic() - snap.built_at >= ttl:
+            snap = build_catalog(version)
+            _snapshot = snap
+    return snap
+
+
+def _bump_version() -> None:
+    global _snapshot
+    caches['tiered'].set(CATALOG_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+    _snapshot = None
+
+
+def invalidate_catalog() -> None:
+    """Unieważnia snapshot teraz i ponownie po commicie (odbudowa w trakcie transakcji widziałaby stare dane)."""
+    _bump_version()
+    transaction.on_commit(_bump_version)
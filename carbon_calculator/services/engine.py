@@ -0,0 +1,238 @@
+"""
+Silnik obliczeń śladu węglowego, niezależny od widoków.
+
+Aktywne EmissionFactor są kompilowane raz do równoległych krotek (współczynniki,
+mnożniki okresów, indeks kategorii, flagi regionu/gospodarstwa), a pojedyncze
+obliczenie to jedno przejście po wejściach użytkownika. Arytmetyka pozostaje na
+Decimal — wyniki są identyczne co do grosza z dotychczasowym widokiem, a tę samą
+tabelę można użyć do przeliczania tysięcy zapisanych UserFootprintSession.
+"""
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+CALCULATION_VERSION = "1.0"
+
+CENT = Decimal('0.01')
+ZERO = Decimal('0.0')
+ONE = Decimal('1.0')
+
+# (factor_id, surowa wartość z formularza, klucz okresu lub None)
+InputRow = Tuple[int, object, Optional[str]]
+
+
+@dataclass(frozen=True)
+class FootprintResult:
+    total: Decimal  # zaokrąglone do 0.01
+    breakdown: Dict[str, Decimal]  # slug -> niezaokrąglone emisje (do warunków porad)
+    inputs: Dict[str, dict]  # format UserFootprintSession.inputs_data
+    skipped: Tuple[int, ...] = field(default=())
+
+    def breakdown_quantized(self) -> Dict[str, Decimal]:
+        return {slug: val.quantize(CENT, ROUND_HALF_UP) for slug, val in self.breakdown.items()}
+
+    def breakdown_for_db(self) -> Dict[str, float]:
+        return {slug: float(val) for slug, val in self.breakdown_quantized().items()}
+
+
+def _compile_periods(options) -> Dict[str, Tuple[Decimal, str]]:
+    compiled = {}
+    if not isinstance(options, dict):
+        return compiled
+    for key, details in options.items():
+        if isinstance(details, dict) and 'annual_multiplier' in details:
+            try:
+                compiled[key] = (Decimal(str(details['annual_multiplier'])), details.get('label', key))
+            except (InvalidOperation, ValueError, TypeError):
+                continue
+    return compiled
+
+
+def household_divisor(household_members) -> Decimal:
+    if household_members:
+        try:
+            hm = Decimal(str(household_members))
+            if hm > 0:
+                return hm
+        except (InvalidOperation, ValueError, TypeError):
+            pass
+    return Decimal('1')
+
+
+class FactorTable:
+    """Skompilowany zestaw aktywnych czynników emisji."""
+
+    def __init__(self, factors: Sequence):
+        factors = list(factors)
+        self.factors = {f.id: f for f in factors}  # active_factors_map dla porad
+        self.ids = tuple(f.id for f in factors)
+        self.position = {fid: i for i, fid in enumerate(self.ids)}
+        self.coefficients = tuple(f.co2_kg_per_unit for f in factors)
+        self.uses_grid = tuple(bool(getattr(f, 'use_region_grid_intensity', False)) for f in factors)
+        self.per_household = tuple(bool(getattr(f, 'per_household', False)) for f in factors)
+        self.is_select = tuple(getattr(f, 'form_field_type', 'number') == 'select' for f in factors)
+        self.unit_names = tuple(f.unit_name for f in factors)
+        self.periods = tuple(_compile_periods(f.periodicity_options_for_form) for f in factors)
+        self.category_slugs = tuple(dict.fromkeys(f.activity_category.slug for f in factors))
+        cat_pos = {slug: i for i, slug in enumerate(self.category_slugs)}
+        self.category_index = tuple(cat_pos[f.activity_category.slug] for f in factors)
+        self.fingerprint = self._fingerprint()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getstate__(self):
+        # Do procesów roboczych wysyłamy tylko skompilowane krotki, bez instancji modeli
+        state = self.__dict__.copy()
+        state['factors'] = {}
+        return state
+
+    def _fingerprint(self) -> str:
+        h = hashlib.sha1()
+        for i, fid in enumerate(self.ids):
+            periods = sorted((k, str(m)) for k, (m, _) in self.periods[i].items())
+            h.update(repr((fid, str(self.coefficients[i]), self.uses_grid[i], self.per_household[i],
+                           self.category_slugs[self.category_index[i]], periods)).encode('utf-8'))
+        return h.hexdigest()[:12]
+
+    def calculate(
+        self,
+        values: Iterable[InputRow],
+        *,
+        grid_intensity: Optional[Decimal] = None,
+        household_members=None,
+    ) -> FootprintResult:
+        """
+        Jedno przejście po wejściach. Kolejność działań jak w dotychczasowym widoku:
+        (wartość * mnożnik roczny * CO2/jedn.) / liczba osób, zaokrąglenie sumy na końcu.
+        :raises ValueError: nienumeryczna wartość dla pola liczbowego
+        """
+        divisor = household_divisor(household_members)
+        per_category: List[Decimal] = [ZERO] * len(self.category_slugs)
+        touched: Dict[int, None] = {}
+        inputs: Dict[str, dict] = {}
+        skipped = []
+        total = ZERO
+
+        position = self.position
+        for factor_id, raw, period_key in values:
+            i = position.get(factor_id)
+            if i is None:
+                skipped.append(factor_id)
+                continue
+            try:
+                value = Decimal(str(raw))
+            except InvalidOperation:
+                if self.is_select[i]:
+                    # Klucz opcji select musi być liczbą; pomijamy czynnik jak dotychczas
+                    skipped.append(factor_id)
+                    continue
+                raise ValueError(f"Nienumeryczna wartość '{raw}' dla czynnika {factor_id}")
+
+            multiplier, unit_label = ONE, self.unit_names[i]
+            if period_key:
+                compiled = self.periods[i].get(period_key)
+                if compiled:
+                    multiplier, unit_label = compiled
+            co2_per_unit = self.coefficients[i]
+            if self.uses_grid[i] and grid_intensity is not None:
+                co2_per_unit = grid_intensity
+            emission = value * multiplier * co2_per_unit
+            if self.per_household[i]:
+                emission = emission / divisor
+
+            total += emission
+            c = self.category_index[i]
+            per_category[c] += emission
+            touched[c] = None
+            inputs[str(factor_id)] = {
+                "raw_value": float(value),
+                "input_unit_label": unit_label,
+                "chosen_period_key_if_any": period_key,
+                "annual_multiplier_used": float(multiplier),
+                "factor_co2_kg_per_unit": float(co2_per_unit),
+                "calculated_annual_co2_for_this_input": float(emission.quantize(CENT, ROUND_HALF_UP)),
+            }
+
+        breakdown = {self.category_slugs[c]: per_category[c] for c in touched}
+        return FootprintResult(
+            total=total.quantize(CENT, ROUND_HALF_UP),
+            breakdown=breakdown,
+            inputs=inputs,
+            skipped=tuple(skipped),
+        )
+
+    def score_many(
+        self,
+        rows: Iterable[Mapping],
+        *,
+        region_intensities: Optional[Mapping[int, Decimal]] = None,
+        default_intensity: Optional[Decimal] = None,
+    ) -> List[FootprintResult]:
+        """Przelicza wiele zapisanych inputs_data tym samym skompilowanym zestawem."""
+        return [
+            self.calculate_stored(row, region_intensities=region_intensities, default_intensity=default_intensity)
+            for row in rows
+        ]
+
+    def calculate_stored(
+        self,
+        inputs_data: Mapping,
+        *,
+        region_intensities: Optional[Mapping[int, Decimal]] = None,
+        default_intensity: Optional[Decimal] = None,
+    ) -> FootprintResult:
+        """
+        Oblicza ponownie zapisany UserFootprintSession.inputs_data.
+        Intensywność sieci bierzemy z aktualnych regionów (po id), a jeśli region
+        zniknął — z wartości zapisanej w profilu, na końcu z regionu domyślnego.
+        """
+        grid = default_intensity
+        profile_region = inputs_data.get("_profile_region") or {}
+        if profile_region:
+            current = (region_intensities or {}).get(profile_region.get("id"))
+            if current is not None:
+                grid = current
+            elif profile_region.get("grid_intensity_kg_per_kwh") is not None:
+                grid = Decimal(str(profile_region["grid_intensity_kg_per_kwh"]))
+        result = self.calculate(
+            values_from_inputs_data(inputs_data),
+            grid_intensity=grid,
+            household_members=inputs_data.get("_profile_household_members"),
+        )
+        if profile_region:
+            result.inputs["_profile_region"] = (
+                dict(profile_region, grid_intensity_kg_per_kwh=float(grid)) if grid is not None else profile_region
+            )
+        if "_profile_household_members" in inputs_data:
+            result.inputs["_profile_household_members"] = inputs_data["_profile_household_members"]
+        return result
+
+
+def values_from_inputs_data(inputs_data: Mapping) -> List[InputRow]:
+    rows = []
+    for key, details in inputs_data.items():
+        if key.startswith('_') or not isinstance(details, dict) or details.get("raw_value") is None:
+            continue
+        try:
+            factor_id = int(key)
+        except ValueError:
+            continue
+        rows.append((factor_id, details.get("raw_value"), details.get("chosen_period_key_if_any")))
+    return rows
+
+
+def values_from_cleaned_data(cleaned_data: Mapping) -> List[InputRow]:
+    """Zamienia cleaned_data FootprintCalculatorForm na wiersze wejściowe silnika."""
+    rows = []
+    for name, value in cleaned_data.items():
+        if name.startswith('factor_input_') and not name.endswith('_period') and value is not None:
+            try:
+                factor_id = int(name.split('_')[2])
+            except (IndexError, ValueError):
+                continue
+            rows.append((factor_id, value, cleaned_data.get(f'{name}_period')))
+    return rows
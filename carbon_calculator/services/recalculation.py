@@ -0,0 +1,217 @@
+"""
+Masowe przeliczanie historycznych UserFootprintSession aktualnym zestawem czynników.
+
+Sesje są czytane porcjami po kluczu głównym (pamięć ograniczona do kilku porcji
+niezależnie od liczby wierszy), liczone w puli procesów tą samą FactorTable co
+widok i zapisywane przez bulk_update z nową calculation_version. Sesje, które
+już mają docelową wersję, są pomijane — przerwane zadanie można wznowić.
+"""
+from __future__ import annotations
+
+import hashlib
+import heapq
+import logging
+from collections import deque
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
+
+from django.db import transaction
+
+from carbon_calculator.models import UserFootprintSession
+from .catalog import get_catalog
+from .engine import CALCULATION_VERSION, FactorTable
+
+logger = logging.getLogger(__name__)
+
+UPDATE_FIELDS = ['inputs_data', 'total_co2_emissions_kg_annual', 'category_breakdown_kg_annual', 'calculation_version']
+
+# (id, nowy total, podział do bazy, inputs_data, liczba pominiętych czynników) albo (id, None, komunikat błędu, ...)
+RowResult = Tuple[int, Optional[Decimal], object, Optional[dict], int]
+
+
+def recalculation_version(table: FactorTable, region_intensities: Mapping[int, Decimal]) -> str:
+    """Wersja = wersja metodologii + odcisk czynników i intensywności sieci, np. '1.0+3f2a9c01b7de'."""
+    h = hashlib.sha1(table.fingerprint.encode('utf-8'))
+    for region_id, intensity in sorted(region_intensities.items()):
+        h.update(f"{region_id}:{intensity}".encode('utf-8'))
+    return f"{CALCULATION_VERSION}+{h.hexdigest()[:12]}"
+
+
+# Domyślna liczba procesów: mała i stała, żeby nie zajmować wszystkich rdzeni współdzielonego hosta
+# (procesy robocze tylko liczą, bazy używa wyłącznie proces główny)
+DEFAULT_WORKERS = 2
+
+# Stan procesu roboczego (ustawiany raz przez initializer puli)
+_worker_state: Dict[str, object] = {}
+
+
+def _init_worker(table: FactorTable, region_intensities, default_intensity) -> None:
+    _worker_state.update(table=table, region_intensities=region_intensities, default_intensity=default_intensity)
+
+
+def _recalculate_rows(rows: List[Tuple[int, dict]]) -> List[RowResult]:
+    table: FactorTable = _worker_state['table']
+    results = []
+    for session_id, inputs_data in rows:
+        try:
+            result = table.calculate_stored(
+                inputs_data or {},
+                region_intensities=_worker_state['region_intensities'],
+                default_intensity=_worker_state['default_intensity'],
+            )
+        except (ValueError, TypeError, ArithmeticError) as e:
+            results.append((session_id, None, str(e), None, 0))
+            continue
+        # result.inputs ma tylko czynniki, które da się dziś policzyć: odpowiedzi dla czynników wyłączonych
+        # lub usuniętych (i nieznane klucze) zostają z oryginału, żeby kolejne przeliczenie mogło ich użyć
+        inputs = dict(inputs_data or {})
+        inputs.update(result.inputs)
+        results.append((session_id, result.total, result.breakdown_for_db(), inputs, len(result.skipped)))
+    return results
+
+
+@dataclass
+class RecalculationReport:
+    version: str
+    dry_run: bool = False
+    processed: int = 0
+    changed: int = 0
+    errors: int = 0
+    with_skipped_factors: int = 0
+    old_sum: Decimal = Decimal('0')
+    new_sum: Decimal = Decimal('0')
+    max_increase: Decimal = Decimal('0')
+    max_decrease: Decimal = Decimal('0')
+    top_n: int = 10
+    _largest: List[Tuple[Decimal, int, Decimal, Decimal]] = field(default_factory=list)
+
+    def add(self, session_id: int, old_total: Decimal, new_total: Decimal, skipped: int) -> None:
+        self.processed += 1
+        self.old_sum += old_total
+        self.new_sum += new_total
+        if skipped:
+            self.with_skipped_factors += 1
+        delta = new_total - old_total
+        if delta:
+            self.changed += 1
+            self.max_increase = max(self.max_increase, delta)
+            self.max_decrease = min(self.max_decrease, delta)
+            entry = (abs(delta), session_id, old_total, new_total)
+            if len(self._largest) < self.top_n:
+                heapq.heappush(self._largest, entry)
+            else:
+                heapq.heappushpop(self._largest, entry)
+
+    @property
+    def largest_changes(self) -> List[Tuple[int, Decimal, Decimal]]:
+        return [(sid, old, new) for _, sid, old, new in sorted(self._largest, reverse=True)]
+
+    def lines(self) -> List[str]:
+        mean = (self.new_sum - self.old_sum) / self.processed if self.processed else Decimal('0')
+        lines = [
+            f"Wersja docelowa: {self.version}{' (dry run — bez zapisu)' if self.dry_run else ''}",
+            f"Przeliczono: {self.processed}, zmienionych: {self.changed}, błędów: {self.errors}, "
+            f"z pominiętymi (nieaktywnymi) czynnikami: {self.with_skipped_factors}",
+            f"Suma śladów: {self.old_sum} -> {self.new_sum} kg (średnia zmiana {mean.quantize(Decimal('0.01'))} kg)",
+            f"Największy wzrost: {self.max_increase} kg, największy spadek: {self.max_decrease} kg",
+        ]
+        for sid, old, new in self.largest_changes:
+            lines.append(f"  sesja #{sid}: {old} -> {new} ({new - old:+} kg)")
+        return lines
+
+
+def _chunks(chunk_size: int, version: str, limit: Optional[int]):
+    """Porcje (id, inputs_data, stary total) po kluczu głównym — zapis między porcjami jest bezpieczny."""
+    base = (UserFootprintSession.objects.exclude(calculation_version=version)
+            .order_by('pk').values_list('pk', 'inputs_data', 'total_co2_emissions_kg_annual'))
+    last_pk, remaining = 0, limit
+    while remaining is None or remaining > 0:
+        size = chunk_size if remaining is None else min(chunk_size, remaining)
+        chunk = list(base.filter(pk__gt=last_pk)[:size].iterator(chunk_size=size))
+        if not chunk:
+            return
+        last_pk = chunk[-1][0]
+        if remaining is not None:
+            remaining -= len(chunk)
+        yield chunk
+
+
+def recalculate_sessions(
+    *,
+    chunk_size: int = 2000,
+    workers: int = 0,
+    version: Optional[str] = None,
+    dry_run: bool = False,
+    limit: Optional[int] = None,
+    top_n: int = 10,
+    progress: Optional[Callable[[RecalculationReport], None]] = None,
+) -> RecalculationReport:
+    """
+    :param workers: liczba procesów; 0 = liczenie w bieżącym procesie
+    :param version: nadpisuje wyliczoną calculation_version
+    :param limit: maksymalna liczba sesji w tym uruchomieniu
+    """
+    catalog = get_catalog()
+    table = catalog.factor_table
+    region_intensities = {r.id: r.grid_intensity_kg_per_kwh for r in catalog.regions}
+    default_intensity = catalog.default_region.grid_intensity_kg_per_kwh if catalog.default_region else None
+    report = RecalculationReport(version=version or recalculation_version(table, region_intensities),
+                                 dry_run=dry_run, top_n=top_n)
+    logger.info(f"Przeliczanie sesji śladu do wersji {report.version} (czynników: {len(table)}, procesy: {workers})")
+
+    def apply(chunk, results: List[RowResult]) -> None:
+        old_totals = {pk: old_total for pk, _, old_total in chunk}
+        to_update = []
+        for session_id, total, breakdown, inputs, skipped in results:
+            if total is None:
+                report.errors += 1
+                logger.warning(f"Sesja #{session_id} nie została przeliczona: {breakdown}")
+                continue
+            report.add(session_id, old_totals[session_id], total, skipped)
+            to_update.append(UserFootprintSession(
+                pk=session_id,
+                inputs_data=inputs,
+                total_co2_emissions_kg_annual=total,
+                category_breakdown_kg_annual=breakdown,
+                calculation_version=report.version,
+            ))
+        if to_update and not dry_run:
+            with transaction.atomic():
+                UserFootprintSession.objects.bulk_update(to_update, UPDATE_FIELDS, batch_size=500)
+        if progress:
+            progress(report)
+
+    def rows(chunk):
+        return [(pk, inputs_data) for pk, inputs_data, _ in chunk]
+
+    chunks = _chunks(chunk_size, report.version, limit)
+
+    # fork: procesy dziedziczą skonfigurowane Django (przy spawn/forkserver - domyślnych na macOS i od
+    # Pythona 3.14 - samo odtworzenie initializera importuje modele przed django.setup()). Liczą tylko
+    # przekazane wiersze i nie używają odziedziczonego połączenia z bazą.
+    if workers > 0 and 'fork' not in multiprocessing.get_all_start_methods():
+        logger.warning("Brak metody startu 'fork' na tej platformie: liczenie w bieżącym procesie")
+        workers = 0
+
+    if workers <= 0:
+        _init_worker(table, region_intensities, default_intensity)
+        for chunk in chunks:
+            apply(chunk, _recalculate_rows(rows(chunk)))
+        return report
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'),
+                             initializer=_init_worker, initargs=(table, region_intensities, default_intensity)) as pool:
+        # Ograniczona liczba porcji w locie: czytamy następne, gdy pula liczy poprzednie
+        in_flight = deque()
+        for chunk in chunks:
+            in_flight.append((chunk, pool.submit(_recalculate_rows, rows(chunk))))
+            if len(in_flight) >= workers * 2:
+                done_chunk, future = in_flight.popleft()
+                apply(done_chunk, future.result())
+        while in_flight:
+            done_chunk, future = in_flight.popleft()
+            apply(done_chunk, future.result())
+    return report
@@ -0,0 +1,355 @@
+"""
+Kompilator reguł porad (ReductionTip).
+
+trigger_conditions_json i estimated_co2_reduction_kg_annual_logic są walidowane
+przy zapisie (ReductionTip.clean) i kompilowane raz, razem z katalogiem, do
+domknięć z progami zamienionymi już na Decimal. TipIndex wybiera kandydatów po
+slugach kategorii i id czynników obecnych w obliczeniu, więc porady, których
+warunki nie mogą być spełnione, nie są w ogóle oceniane.
+
+Semantyka jest taka sama jak w check_tip_conditions / calculate_tip_savings
+(management/commands/benchmark_tip_rules.py), z tą różnicą, że błędna reguła jest odrzucana raz przy kompilacji,
+a nie logowana przy każdym obliczeniu.
+"""
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import Callable, Dict, FrozenSet, List, Mapping, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+ZERO = Decimal('0')
+HUNDRED = Decimal('100')
+SAVINGS_QUANTUM = Decimal('0.1')
+
+
+class RuleError(ValueError):
+    """Nieprawidłowa reguła porady (komunikat trafia do formularza w adminie)."""
+
+
+@dataclass(frozen=True)
+class RuleContext:
+    inputs: Mapping[str, dict]  # user_inputs_for_session_db
+    breakdown: Mapping[str, Decimal]  # slug -> niezaokrąglone emisje
+    total: Decimal  # zaokrąglony całkowity ślad
+
+
+Predicate = Callable[[RuleContext], bool]
+SavingsFn = Callable[[RuleContext], Optional[Decimal]]
+
+
+def _decimal(rule: Mapping, key: str, default: str) -> Decimal:
+    raw = rule.get(key, default)
+    try:
+        value = Decimal(str(raw))
+    except (InvalidOperation, ValueError, TypeError):
+        raise RuleError(f"'{key}' musi być liczbą (otrzymano {raw!r}).")
+    if not value.is_finite():
+        raise RuleError(f"'{key}' musi być skończoną liczbą (otrzymano {raw!r}).")
+    return value
+
+
+def _slug(rule: Mapping, key: str = "category_slug") -> str:
+    slug = rule.get(key)
+    if not slug or not isinstance(slug, str):
+        raise RuleError(f"Brak '{key}' w regule {rule!r}.")
+    return slug
+
+
+def _factor_key(rule: Mapping, key: str) -> str:
+    """Klucz czynnika w user_inputs_db (str(id), jak w oryginalnym interpreterze)."""
+    raw = rule.get(key)
+    if isinstance(raw, bool) or not (isinstance(raw, int) or (isinstance(raw, str) and raw.isdigit())):
+        raise RuleError(f"'{key}' musi być identyfikatorem czynnika (liczbą całkowitą), otrzymano {raw!r}.")
+    return str(raw)
+
+
+def _raw_decimal(details: Mapping, key: str, default: str) -> Decimal:
+    return Decimal(str(details.get(key, default)))
+
+
+@dataclass(frozen=True)
+class Conditions:
+    predicates: Tuple[Predicate, ...] = ()
+    # Klucze, bez których warunki na pewno nie są spełnione (do indeksu)
+    required_categories: FrozenSet[str] = frozenset()
+    required_factors: FrozenSet[str] = frozenset()
+
+    def __call__(self, ctx: RuleContext) -> bool:
+        for predicate in self.predicates:
+            if not predicate(ctx):
+                return False
+        return True
+
+
+def _compile_condition(cond) -> Tuple[Predicate, Optional[str], Optional[str]]:
+    if not isinstance(cond, dict):
+        raise RuleError(f"Warunek musi być obiektem JSON, otrzymano {cond!r}.")
+    ctype = cond.get("type")
+
+    if ctype == "category_emission_gt":
+        slug, threshold = _slug(cond), _decimal(cond, "threshold_kg_annual", "0")
+        return (lambda c: slug in c.breakdown and c.breakdown[slug] > threshold), slug, None
+
+    if ctype == "category_emission_lt":
+        slug, threshold = _slug(cond), _decimal(cond, "threshold_kg_annual", "999999999")
+        return (lambda c: c.breakdown.get(slug, ZERO) < threshold), None, None
+
+    if ctype == "category_emission_percentage_gt":
+        slug, percentage = _slug(cond), _decimal(cond, "percentage", "0")
+
+        def predicate(c):
+            if c.total > ZERO and slug in c.breakdown:
+                return (c.breakdown[slug] / c.total) * HUNDRED > percentage
+            return False
+        return predicate, slug, None
+
+    if ctype == "input_value_gt":
+        key, threshold = _factor_key(cond, "factor_id"), _decimal(cond, "threshold_value", "0")
+
+        def predicate(c):
+            details = c.inputs.get(key)
+            raw = details.get("raw_value") if details else None
+            return raw is not None and Decimal(str(raw)) > threshold
+        return predicate, None, key
+
+    if ctype == "input_value_equals":
+        key = _factor_key(cond, "factor_id")
+        if "expected_value" not in cond:
+            raise RuleError(f"Brak 'expected_value' w regule {cond!r}.")
+        expected = str(cond["expected_value"])
+
+        def predicate(c):
+            details = c.inputs.get(key)
+            raw = details.get("raw_value") if details else None
+            return raw is not None and str(raw) == expected
+        return predicate, None, key
+
+    if ctype == "total_emission_gt":
+        threshold = _decimal(cond, "threshold_kg_annual", "0")
+        return (lambda c: c.total > threshold), None, None
+
+    raise RuleError(f"Nieznany typ warunku '{ctype}'.")
+
+
+def compile_conditions(conditions_json) -> Conditions:
+    """:raises RuleError: nieprawidłowy format warunków"""
+    if not conditions_json:
+        return Conditions()  # Brak warunków — porada zawsze stosowna
+    if not isinstance(conditions_json, list):
+        raise RuleError("Warunki muszą być listą obiektów JSON.")
+    predicates, categories, factors = [], set(), set()
+    for cond in conditions_json:
+        predicate, slug, factor_key = _compile_condition(cond)
+        predicates.append(predicate)
+        if slug:
+            categories.add(slug)
+        if factor_key:
+            factors.add(factor_key)
+    return Conditions(tuple(predicates), frozenset(categories), frozenset(factors))
+
+
+def _finish(savings: Optional[Decimal]) -> Optional[Decimal]:
+    if savings is None:
+        return None
+    # Oszczędność nie może być ujemna (porada nie powinna zwiększać śladu)
+    return max(Decimal('0.0'), savings.quantize(SAVINGS_QUANTUM, ROUND_HALF_UP))
+
+
+def _no_savings(ctx: RuleContext) -> None:
+    return None
+
+
+def compile_savings(logic_json, factors: Optional[Mapping[int, object]] = None) -> SavingsFn:
+    """
+    :param factors: active_factors_map z katalogu; czynniki są rozwiązywane przy kompilacji
+    :raises RuleError: nieprawidłowa logika oszczędności
+    """
+    if not logic_json:
+        return _no_savings
+    if not isinstance(logic_json, dict):
+        raise RuleError("Logika oszczędności musi być obiektem JSON.")
+    factors = factors or {}
+    stype = logic_json.get("type")
+
+    if stype == "fixed":
+        result = _finish(_decimal(logic_json, "value_kg_annual", "0"))
+        return lambda c: result
+
+    if stype == "percentage_of_category":
+        slug, percentage = _slug(logic_json), _decimal(logic_json, "percentage", "0")
+        if percentage <= 0:
+            return _no_savings
+
+        def savings(c):
+            if slug in c.breakdown:
+                return _finish(c.breakdown[slug] * percentage / HUNDRED)
+            return None
+        return savings
+
+    if stype == "reduction_from_input":
+        key = _factor_key(logic_json, "input_factor_id")
+        percentage = _decimal(logic_json, "reduction_percentage", "0")
+        if percentage <= 0:
+            return _no_savings
+
+        def savings(c):
+            details = c.inputs.get(key)
+            if details is None:
+                return None
+            annual_co2 = _raw_decimal(details, "calculated_annual_co2_for_this_input", "0")
+            return _finish(annual_co2 * percentage / HUNDRED)
+        return savings
+
+    if stype == "activity_substitution":
+        key = _factor_key(logic_json, "original_input_factor_id")
+        alt_co2_per_unit = _decimal(logic_json, "alternative_co2_per_unit", "0")
+        affected = _decimal(logic_json, "affected_input_percentage", "100")
+        factor = factors.get(int(key))
+        if affected <= 0 or factor is None:
+            return _no_savings
+        affected_share = affected / HUNDRED
+        co2_per_unit = factor.co2_kg_per_unit
+
+        def savings(c):
+            details = c.inputs.get(key)
+            if details is None:
+                return None
+            annual_units = _raw_decimal(details, "raw_value", "0") * _raw_decimal(details, "annual_multiplier_used", "1")
+            units_to_substitute = annual_units * affected_share
+            return _finish(units_to_substitute * co2_per_unit - units_to_substitute * alt_co2_per_unit)
+        return savings
+
+    if stype == "direct_from_input_change":
+        key = _factor_key(logic_json, "input_factor_id")
+        new_value = _decimal(logic_json, "new_value_for_input", "0")
+        new_period_key = logic_json.get("period_key_for_new_value")
+        factor = factors.get(int(key))
+        if factor is None:
+            return _no_savings
+        period_multiplier = None
+        options = getattr(factor, 'periodicity_options_for_form', None)
+        if new_period_key and isinstance(options, dict):
+            details = options.get(new_period_key)
+            if isinstance(details, dict) and 'annual_multiplier' in details:
+                period_multiplier = Decimal(str(details['annual_multiplier']))
+        co2_per_unit = factor.co2_kg_per_unit
+
+        def savings(c):
+            details = c.inputs.get(key)
+            if details is None:
+                return None
+            original = _raw_decimal(details, "calculated_annual_co2_for_this_input", "0")
+            multiplier = period_multiplier
+            if multiplier is None:
+                multiplier = _raw_decimal(details, "annual_multiplier_used", "1")
+            return _finish(original - new_value * multiplier * co2_per_unit)
+        return savings
+
+    raise RuleError(f"Nieznany typ logiki oszczędności '{stype}'.")
+
+
+def validate_tip_rules(conditions_json, savings_json) -> Dict[str, str]:
+    """Zwraca błędy w formacie {nazwa_pola: komunikat} (puste, jeśli reguły są poprawne)."""
+    errors = {}
+    for field_name, compiler, value in (
+        ('trigger_conditions_json', compile_conditions, conditions_json),
+        ('estimated_co2_reduction_kg_annual_logic', compile_savings, savings_json),
+    ):
+        try:
+            compiler(value)
+        except RuleError as e:
+            errors[field_name] = str(e)
+    return errors
+
+
+@dataclass(frozen=True)
+class CompiledTip:
+    tip: object
+    position: int
+    categories: Tuple[object, ...]  # applies_to_categories (ActivityCategory)
+    conditions: Conditions
+    savings_fn: SavingsFn = _no_savings
+
+    def matches(self, ctx: RuleContext) -> bool:
+        try:
+            if not self.conditions(ctx):
+                return False
+        except (InvalidOperation, ValueError, TypeError) as e:
+            logger.error(f"Błąd przy ocenie warunków porady '{self.tip}': {e}")
+            return False
+        if self.categories:
+            return any(ctx.breakdown.get(cat.slug, ZERO) > 0 for cat in self.categories)
+        return True
+
+    def savings(self, ctx: RuleContext) -> Optional[Decimal]:
+        try:
+            return self.savings_fn(ctx)
+        except (InvalidOperation, ValueError, TypeError) as e:
+            logger.error(f"Błąd przy obliczaniu oszczędności porady '{self.tip}': {e}")
+            return None
+
+
+@dataclass
+class TipIndex:
+    """Indeks porad: slug kategorii / id czynnika -> porady, które wymagają ich obecności."""
+    tips: List[CompiledTip] = field(default_factory=list)
+    always: List[int] = field(default_factory=list)
+    by_category: Dict[str, List[int]] = field(default_factory=dict)
+    by_factor: Dict[str, List[int]] = field(default_factory=dict)
+
+    def add(self, compiled: CompiledTip) -> None:
+        pos = len(self.tips)
+        self.tips.append(compiled)
+        conditions = compiled.conditions
+        if conditions.required_factors:
+            # Wystarczy jeden wymagany klucz; id czynnika jest bardziej selektywne niż kategoria
+            self.by_factor.setdefault(min(conditions.required_factors), []).append(pos)
+        elif conditions.required_categories:
+            self.by_category.setdefault(min(conditions.required_categories), []).append(pos)
+        elif compiled.categories:
+            for cat in compiled.categories:
+                self.by_category.setdefault(cat.slug, []).append(pos)
+        else:
+            self.always.append(pos)
+
+    def candidates(self, ctx: RuleContext) -> List[CompiledTip]:
+        positions = set(self.always)
+        for slug in ctx.breakdown:
+            positions.update(self.by_category.get(slug, ()))
+        for key in ctx.inputs:
+            positions.update(self.by_factor.get(key, ()))
+        return [self.tips[pos] for pos in sorted(positions)]
+
+    def match(self, ctx: RuleContext) -> List[CompiledTip]:
+        """Porady do wyświetlenia, w kolejności katalogu (-priority, title)."""
+        return [compiled for compiled in self.candidates(ctx) if compiled.matches(ctx)]
+
+
+def compile_tips(
+    tips: Sequence,
+    tip_categories: Mapping[int, Tuple[object, ...]],
+    factors: Mapping[int, object],
+) -> TipIndex:
+    index = TipIndex()
+    for tip in tips:
+        try:
+            conditions = compile_conditions(tip.trigger_conditions_json)
+        except RuleError as e:
+            logger.warning(f"Porada '{tip}' (id={tip.id}) pominięta — nieprawidłowe warunki: {e}")
+            continue
+        try:
+            savings_fn = compile_savings(tip.estimated_co2_reduction_kg_annual_logic, factors)
+        except RuleError as e:
+            logger.warning(f"Porada '{tip}' (id={tip.id}) bez oszacowania — nieprawidłowa logika oszczędności: {e}")
+            savings_fn = _no_savings
+        index.add(CompiledTip(
+            tip=tip,
+            position=len(index.tips),
+            categories=tuple(tip_categories.get(tip.id, ())),
+            conditions=conditions,
+            savings_fn=savings_fn,
+        ))
+    return index
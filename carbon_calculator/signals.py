@@ -0,0 +1,24 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .models import ActivityCategory, EmissionFactor, ReductionTip, Region
+from .services.catalog import invalidate_catalog
+
+
+@receiver(post_save, sender=EmissionFactor)
+@receiver(post_delete, sender=EmissionFactor)
+@receiver(post_save, sender=ActivityCategory)
+@receiver(post_delete, sender=ActivityCategory)
+@receiver(post_save, sender=ReductionTip)
+@receiver(post_delete, sender=ReductionTip)
+@receiver(post_save, sender=Region)
+@receiver(post_delete, sender=Region)
+def catalog_changed(sender, **kwargs):
+    invalidate_catalog()
+
+
+@receiver(m2m_changed, sender=ReductionTip.suggested_products.through)
+@receiver(m2m_changed, sender=ReductionTip.applies_to_categories.through)
+def catalog_relations_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_catalog()
@@ -1,6 +1,8 @@
 # carbon_calculator/templatetags/calculator_tags.py
+from decimal import Decimal
+
 from django import template
-from carbon_calculator.views import Decimal
+
 register = template.Library()
 
 @register.filter(name='get_form_field')
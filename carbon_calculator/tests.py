@@ -58,3 +58,311 @@ class EmissionFactorValidationTest(TestCase):
         )
         with self.assertRaises(ValidationError):
             factor.full_clean()
+
+
+def _legacy_calculate(factors, values, grid_intensity, household_members):
+    """Pętla obliczeń w kształcie sprzed wydzielenia silnika (punkt odniesienia dla parytetu)."""
+    from decimal import ROUND_HALF_UP
+    total = Decimal('0.0')
+    breakdown = {}
+    inputs = {}
+    for factor_id, value_form, chosen_period_key in values:
+        factor = factors[factor_id]
+        try:
+            current_value = Decimal(str(value_form))
+        except Exception:
+            continue
+        annual_multiplier = Decimal('1.0')
+        label = factor.unit_name
+        if chosen_period_key and factor.periodicity_options_for_form:
+            details = factor.periodicity_options_for_form.get(chosen_period_key)
+            if details and 'annual_multiplier' in details:
+                annual_multiplier = Decimal(str(details['annual_multiplier']))
+                label = details.get('label', chosen_period_key)
+        co2_per_unit = factor.co2_kg_per_unit
+        if factor.use_region_grid_intensity and grid_intensity is not None:
+            co2_per_unit = grid_intensity
+        divisor = Decimal('1')
+        if factor.per_household and household_members:
+            hm = Decimal(str(household_members))
+            if hm > 0:
+                divisor = hm
+        per_input = ((current_value * annual_multiplier * co2_per_unit) / divisor).quantize(Decimal('0.01'), ROUND_HALF_UP)
+        inputs[str(factor_id)] = {
+            "raw_value": float(current_value),
+            "input_unit_label": label,
+            "chosen_period_key_if_any": chosen_period_key,
+            "annual_multiplier_used": float(annual_multiplier),
+            "factor_co2_kg_per_unit": float(co2_per_unit),
+            "calculated_annual_co2_for_this_input": float(per_input),
+        }
+        emission = (current_value * annual_multiplier * co2_per_unit) / divisor
+        total += emission
+        slug = factor.activity_category.slug
+        breakdown[slug] = breakdown.get(slug, Decimal('0.0')) + emission
+    return total.quantize(Decimal('0.01'), ROUND_HALF_UP), breakdown, inputs
+
+
+class CalculationEngineParityTest(TestCase):
+    def setUp(self):
+        from carbon_calculator.services.engine import FactorTable
+        transport = ActivityCategory.objects.create(name="Transport", order=1)
+        energy = ActivityCategory.objects.create(name="Energia", order=2)
+        food = ActivityCategory.objects.create(name="Żywność", order=3)
+        periods = {
+            "per_week": {"label": "na tydzień", "annual_multiplier": 52},
+            "per_month": {"label": "na miesiąc", "annual_multiplier": "12"},
+            "per_day": {"label": "dziennie", "annual_multiplier": 365.25},
+        }
+        self.factors = [
+            EmissionFactor.objects.create(activity_category=transport, name="Auto", unit_name="km",
+                                          co2_kg_per_unit=Decimal('0.171234'), form_question_text="km?",
+                                          periodicity_options_for_form=periods),
+            EmissionFactor.objects.create(activity_category=transport, name="Lot", unit_name="h",
+                                          co2_kg_per_unit=Decimal('90.5'), form_question_text="h?"),
+            EmissionFactor.objects.create(activity_category=energy, name="Prąd", unit_name="kWh",
+                                          co2_kg_per_unit=Decimal('0.8'), form_question_text="kWh?",
+                                          use_region_grid_intensity=True, per_household=True,
+                                          periodicity_options_for_form=periods),
+            EmissionFactor.objects.create(activity_category=energy, name="Gaz", unit_name="m3",
+                                          co2_kg_per_unit=Decimal('1.987654'), form_question_text="m3?",
+                                          per_household=True),
+            EmissionFactor.objects.create(activity_category=food, name="Dieta", unit_name="x",
+                                          co2_kg_per_unit=Decimal('1000'), form_question_text="dieta?",
+                                          form_field_type='select',
+                                          form_field_options={"1": "Mięsna", "0.55": "Wege", "0.333": "Wegańska"}),
+        ]
+        self.by_id = {f.id: f for f in self.factors}
+        self.table = FactorTable(
+            EmissionFactor.objects.filter(is_active=True).select_related('activity_category')
+        )
+
+    def test_parity_randomized(self):
+        import random
+        rng = random.Random(20240601)
+        period_keys = [None, '', 'per_week', 'per_month', 'per_day', 'unknown']
+        for _ in range(300):
+            values = []
+            for f in self.factors:
+                if rng.random() < 0.25:
+                    continue
+                if f.form_field_type == 'select':
+                    raw = rng.choice(list(f.form_field_options) + [''])
+                else:
+                    raw = Decimal(rng.randint(0, 500000)) / Decimal(rng.choice([1, 10, 100, 1000]))
+                values.append((f.id, raw, rng.choice(period_keys)))
+            grid = rng.choice([None, Decimal('0.7240'), Decimal('0.1234')])
+            household = rng.choice([None, 1, 2, 3, 7])
+            total, breakdown, inputs = _legacy_calculate(self.by_id, values, grid, household)
+            result = self.table.calculate(values, grid_intensity=grid, household_members=household)
+            self.assertEqual(result.total, total)
+            self.assertEqual(result.breakdown, breakdown)
+            self.assertEqual(list(result.breakdown), list(breakdown))
+            self.assertEqual(result.inputs, inputs)
+
+    def test_calculate_stored_uses_current_region_intensity(self):
+        electricity = self.factors[2]
+        stored = {
+            str(electricity.id): {"raw_value": 100.0, "chosen_period_key_if_any": "per_month"},
+            "_profile_region": {"id": 7, "code": "PL", "name": "Polska", "grid_intensity_kg_per_kwh": 0.724},
+            "_profile_household_members": 2,
+        }
+        old = self.table.calculate_stored(stored)
+        self.assertEqual(old.total, Decimal('434.40'))
+        new = self.table.calculate_stored(stored, region_intensities={7: Decimal('0.5')})
+        self.assertEqual(new.total, Decimal('300.00'))
+        self.assertEqual(new.inputs["_profile_region"]["grid_intensity_kg_per_kwh"], 0.5)
+        self.assertEqual(new.inputs["_profile_household_members"], 2)
+
+    def test_view_stores_engine_result(self):
+        from django.urls import reverse
+        from carbon_calculator.models import UserFootprintSession
+        car, flight = self.factors[0], self.factors[1]
+        resp = self.client.post(reverse('carbon_calculator:calculate_page'), {
+            f'factor_input_{car.id}': '120',
+            f'factor_input_{car.id}_period': 'per_week',
+            f'factor_input_{flight.id}': '3.5',
+        })
+        self.assertEqual(resp.status_code, 200)
+        self.assertIsNone(resp.context['calculation_error'])
+        session = UserFootprintSession.objects.get()
+        expected = self.table.calculate([(car.id, Decimal('120'), 'per_week'), (flight.id, Decimal('3.5'), '')])
+        self.assertEqual(session.total_co2_emissions_kg_annual, expected.total)
+        self.assertEqual(session.category_breakdown_kg_annual, expected.breakdown_for_db())
+
+
+class CalculatorCatalogTest(TestCase):
+    def setUp(self):
+        from carbon_calculator.models import Region, ReductionTip
+        self.transport = ActivityCategory.objects.create(name="Transport", order=1)
+        self.car = EmissionFactor.objects.create(activity_category=self.transport, name="Auto", unit_name="km",
+                                                 co2_kg_per_unit=Decimal('0.2'), form_question_text="km?")
+        self.region = Region.objects.create(name="Polska", code="PL", grid_intensity_kg_per_kwh=Decimal('0.7'),
+                                            is_default=True)
+        self.tip = ReductionTip.objects.create(
+            title="Jedź rowerem",
+            description_template="Oszczędzisz {{potential_annual_savings_kg}} kg ({{factor_name_%d}})." % self.car.id,
+            estimated_co2_reduction_kg_annual_logic={"type": "percentage_of_category",
+                                                     "category_slug": self.transport.slug, "percentage": 10},
+        )
+        self.tip.applies_to_categories.add(self.transport)
+
+    def _post(self):
+        from django.urls import reverse
+        return self.client.post(reverse('carbon_calculator:calculate_page'), {
+            f'factor_input_{self.car.id}': '1000',
+            'profile_region': str(self.region.id),
+        })
+
+    def test_steady_state_makes_no_catalog_queries(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        self._post()  # rozgrzewa katalog
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self._post()
+        self.assertEqual(resp.status_code, 200)
+        self.assertIsNone(resp.context['calculation_error'])
+        catalog_tables = ('carbon_calculator_emissionfactor', 'carbon_calculator_activitycategory',
+                          'carbon_calculator_region', 'carbon_calculator_reductiontip')
+        touched = [q['sql'] for q in ctx.captured_queries if any(t in q['sql'] for t in catalog_tables)]
+        self.assertEqual(touched, [])
+        tips = resp.context['tips_by_category_display']["Transport"]
+        self.assertEqual(tips[0].formatted_description, "Oszczędzisz 20.0 kg (Auto).")
+        self.assertEqual(resp.context['results_data']['total_co2_annual'], Decimal('200.00'))
+
+    def test_cached_tips_are_not_mutated(self):
+        from carbon_calculator.services.catalog import get_catalog
+        self._post()
+        self.assertFalse(hasattr(get_catalog().tips[0], 'formatted_description'))
+
+    def test_admin_save_invalidates_catalog(self):
+        from carbon_calculator.services.catalog import get_catalog
+        before = get_catalog()
+        self.assertIs(get_catalog(), before)
+        self.car.co2_kg_per_unit = Decimal('0.5')
+        self.car.save()
+        after = get_catalog()
+        self.assertIsNot(after, before)
+        self.assertEqual(after.active_factors_map[self.car.id].co2_kg_per_unit, Decimal('0.5'))
+        self.tip.applies_to_categories.clear()
+        self.assertEqual(get_catalog().tip_categories[self.tip.id], ())
+
+
+class TipRuleCompilerTest(TestCase):
+    def test_compiled_rules_match_interpreter(self):
+        import random
+        from carbon_calculator.management.commands.benchmark_tip_rules import (
+            build_synthetic_catalog, build_synthetic_context, compiled_tips, interpret_tips,
+        )
+        from carbon_calculator.services.tip_rules import compile_tips
+        rng = random.Random(7)
+        _, factors, tips, tip_categories = build_synthetic_catalog(rng, n_tips=200)
+        index = compile_tips(tips, tip_categories, factors)
+        with self.assertLogs('carbon_calculator', level='DEBUG'):
+            for _ in range(50):
+                ctx = build_synthetic_context(rng, factors)
+                self.assertEqual(compiled_tips(index, ctx), interpret_tips(tips, tip_categories, factors, ctx))
+
+    def test_index_skips_tips_for_absent_keys(self):
+        from types import SimpleNamespace
+        from carbon_calculator.services.tip_rules import RuleContext, compile_tips
+        tips = [
+            SimpleNamespace(id=1, trigger_conditions_json=[{"type": "input_value_gt", "factor_id": 5}],
+                            estimated_co2_reduction_kg_annual_logic=None),
+            SimpleNamespace(id=2, trigger_conditions_json=None, estimated_co2_reduction_kg_annual_logic=None),
+            SimpleNamespace(id=3, trigger_conditions_json=[{"type": "nope"}], estimated_co2_reduction_kg_annual_logic=None),
+        ]
+        with self.assertLogs('carbon_calculator.services.tip_rules', level='WARNING'):
+            index = compile_tips(tips, {}, {})
+        ctx = RuleContext(inputs={"6": {"raw_value": 10.0}}, breakdown={}, total=Decimal('1'))
+        self.assertEqual([c.tip.id for c in index.candidates(ctx)], [2])
+
+    def test_admin_validation_rejects_malformed_rules(self):
+        from carbon_calculator.models import ReductionTip
+        tip = ReductionTip(
+            title="x", description_template="x",
+            trigger_conditions_json=[{"type": "category_emission_gt", "category_slug": "food",
+                                      "threshold_kg_annual": "dużo"}],
+            estimated_co2_reduction_kg_annual_logic={"type": "magic"},
+        )
+        with self.assertRaises(ValidationError) as cm:
+            tip.full_clean()
+        self.assertIn('trigger_conditions_json', cm.exception.message_dict)
+        self.assertIn('estimated_co2_reduction_kg_annual_logic', cm.exception.message_dict)
+        tip.trigger_conditions_json = [{"type": "total_emission_gt", "threshold_kg_annual": 100}]
+        tip.estimated_co2_reduction_kg_annual_logic = {"type": "fixed", "value_kg_annual": 50}
+        tip.full_clean()
+
+
+class RecalculateFootprintsTest(TestCase):
+    def setUp(self):
+        from carbon_calculator.models import Region, UserFootprintSession
+        food = ActivityCategory.objects.create(name="Żywność", order=1)
+        energy = ActivityCategory.objects.create(name="Energia", order=2)
+        self.meat = EmissionFactor.objects.create(activity_category=food, name="Mięso", unit_name="kg",
+                                                  co2_kg_per_unit=Decimal('20'), form_question_text="kg?")
+        self.power = EmissionFactor.objects.create(activity_category=energy, name="Prąd", unit_name="kWh",
+                                                   co2_kg_per_unit=Decimal('0.8'), form_question_text="kWh?",
+                                                   use_region_grid_intensity=True)
+        self.region = Region.objects.create(name="Polska", code="PL", grid_intensity_kg_per_kwh=Decimal('0.7'),
+                                            is_default=True)
+        for i in range(25):
+            UserFootprintSession.objects.create(
+                inputs_data={
+                    str(self.meat.id): {"raw_value": float(i)},
+                    str(self.power.id): {"raw_value": 100.0},
+                    "_profile_region": {"id": self.region.id, "code": "PL", "name": "Polska",
+                                        "grid_intensity_kg_per_kwh": 0.7},
+                },
+                total_co2_emissions_kg_annual=Decimal(i * 20 + 70),
+            )
+
+    def test_recalculates_in_chunks_and_reports_deltas(self):
+        from carbon_calculator.models import UserFootprintSession
+        from carbon_calculator.services.recalculation import recalculate_sessions
+        self.meat.co2_kg_per_unit = Decimal('10')
+        self.meat.save()
+
+        dry = recalculate_sessions(chunk_size=7, dry_run=True)
+        self.assertEqual((dry.processed, dry.changed), (25, 24))
+        self.assertFalse(UserFootprintSession.objects.filter(calculation_version=dry.version).exists())
+
+        report = recalculate_sessions(chunk_size=7, workers=2)
+        self.assertEqual((report.processed, report.changed, report.errors), (25, 24, 0))
+        self.assertEqual(report.new_sum - report.old_sum, Decimal(-10 * sum(range(25))))
+        self.assertEqual(report.largest_changes[0][1:], (Decimal('550'), Decimal('310.00')))
+        session = UserFootprintSession.objects.get(pk=report.largest_changes[0][0])
+        self.assertEqual(session.calculation_version, report.version)
+        self.assertEqual(session.category_breakdown_kg_annual, {"zywnosc": 240.0, "energia": 70.0})
+
+        # Sesje w docelowej wersji są pomijane — ponowne uruchomienie nic nie robi
+        self.assertEqual(recalculate_sessions(chunk_size=7).processed, 0)
+
+    def test_inputs_of_deactivated_factors_survive_recalculation(self):
+        from carbon_calculator.models import UserFootprintSession
+        from carbon_calculator.services.catalog import invalidate_catalog
+        from carbon_calculator.services.recalculation import recalculate_sessions
+        session = UserFootprintSession.objects.order_by('pk').last()  # meat 24 kg -> 480 + 70
+        self.meat.is_active = False
+        self.meat.save()
+        invalidate_catalog()
+        recalculate_sessions(chunk_size=50)
+        session.refresh_from_db()
+        self.assertEqual(session.total_co2_emissions_kg_annual, Decimal('70.00'))
+        self.assertEqual(session.inputs_data[str(self.meat.id)]["raw_value"], 24.0)
+
+        self.meat.is_active = True
+        self.meat.save()
+        invalidate_catalog()
+        recalculate_sessions(chunk_size=50)
+        session.refresh_from_db()
+        self.assertEqual(session.total_co2_emissions_kg_annual, Decimal('550.00'))
+
+    def test_command_output(self):
+        from io import StringIO
+        from django.core.management import call_command
+        self.region.grid_intensity_kg_per_kwh = Decimal('0.5')
+        self.region.save()
+        out = StringIO()
+        call_command('recalculate_footprints', '--workers', '0', '--limit', '10', stdout=out)
+        self.assertIn("Przeliczono: 10, zmienionych: 10", out.getvalue())
@@ -3,7 +3,7 @@ from django.contrib import admin, messages
 from django.utils import timezone
 from django.db import transaction
 from django.db.models import F
-from .models import Challenge, UserChallengeParticipation, Badge, UserBadge, EcoPointEvent
+from .models import Challenge, UserChallengeParticipation, Badge, UserBadge, EcoPointEvent, LeaderboardEntry
 from store.models import Profile, UserCoupon
 from .email import notify_challenge_review
 from django import forms
@@ -168,4 +168,15 @@ class UserBadgeAdmin(admin.ModelAdmin):
 class EcoPointEventAdmin(admin.ModelAdmin):
     list_display = ("user", "amount", "source", "challenge", "created_at")
     list_filter = ("source", "created_at")
-    search_fields = ("user__username", "challenge__title")
\ No newline at end of file
+    search_fields = ("user__username", "challenge__title")
+
+
+@admin.register(LeaderboardEntry)
+class LeaderboardEntryAdmin(admin.ModelAdmin):
+    list_display = ("period", "user", "points", "updated_at")
+    list_filter = ("period",)
+    search_fields = ("user__username",)
+    readonly_fields = ("user", "period", "points", "updated_at")
+
+    def has_add_permission(self, request):  # rollup is maintained from EcoPointEvent (rebuild_leaderboards)
+        return False
@@ -1,79 +1,100 @@
 # challenges/management/commands/award_winners.py
 
-from django.core.management.base import BaseCommand
-from django.utils import timezone
-from datetime import timedelta
-from django.contrib.auth import get_user_model
+from datetime import datetime
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
 from django.db import transaction
 
-from challenges.models import Coupon
-from store.models import Profile # У вас Profile в приложении store
+from challenges.models import LeaderboardEntry
+from challenges.services.leaderboard import period_of
+from challenges.tasks import enqueue_winner_notifications
+from store.services.coupons import Grant, issue_coupons, mark_notified, unnotified
+
+
+def _previous_period():
+    current = period_of()
+    return current.replace(year=current.year - 1, month=12) if current.month == 1 else current.replace(month=current.month - 1)
+
+
+def _plain_number(value: Decimal):
+    # JSON-friendly for the background task payload: 20 instead of Decimal('20.00')
+    return int(value) if value == value.to_integral_value() else str(value)
 
-User = get_user_model()
 
 class Command(BaseCommand):
-    help = 'Awards top users from the leaderboard with discount coupons at the beginning of the month.'
+    help = ('Awards top users of the monthly leaderboard with personal discount coupons at the beginning of the month. '
+            'Safe to re-run: every period has its own idempotency key.')
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--period', default=None, help='Month to award (YYYY-MM); defaults to the previous month.')
+        parser.add_argument('--places', type=int, default=3, help='How many top users get a coupon.')
+        parser.add_argument('--discounts', type=Decimal, nargs='+', default=[Decimal(20), Decimal(15), Decimal(10)],
+                            help='Discount (%%) per place; the last value applies to all remaining places.')
+        parser.add_argument('--valid-days', type=int, default=30)
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Coupons written per bulk insert.')
+        parser.add_argument('--no-email', action='store_true', default=False,
+                            help='Do not notify winners now (a later run without it notifies them).')
+        parser.add_argument('--dry-run', action='store_true', default=False)
 
-    @transaction.atomic
     def handle(self, *args, **options):
-        now = timezone.now()
-        self.stdout.write(f"--- Running monthly awards on {now.strftime('%Y-%m-%d %H:%M:%S')} ---")
+        if options['period']:
+            try:
+                period = datetime.strptime(options['period'], '%Y-%m').date()
+            except ValueError:
+                raise CommandError("--period must look like YYYY-MM")
+        else:
+            period = _previous_period()
+        discounts = options['discounts']
+        if any(d <= 0 or d > 100 for d in discounts):
+            raise CommandError("--discounts must be within (0, 100]")
+
+        self.stdout.write(f"--- Running monthly awards for {period:%Y-%m} ---")
+
+        # --- 1. Определение победителей: месячный рейтинг (по индексу rollup-таблицы) ---
+        winners = list(
+            LeaderboardEntry.objects.filter(period=period, points__gt=0)
+            .order_by('-points', 'updated_at')
+            .values_list('user_id', flat=True)[:max(0, options['places'])]
+        )
+        if not winners:
+            self.stdout.write(self.style.WARNING("No users with points in this period. No winners to award."))
+            return
 
-        # --- 1. Определение победителей ---
-        # Находим Топ-3 пользователей по eco_points
-        # select_related('user') оптимизирует запрос, чтобы сразу получить данные пользователя
-        top_profiles = Profile.objects.select_related('user').filter(eco_points__gt=0).order_by('-eco_points')[:3]
+        # --- 2. Гранты: место -> скидка, префикс кода вида TOP1-JUN2024 ---
+        month_year_str = period.strftime("%b%Y").upper()
+        grants = []
+        for place, user_id in enumerate(winners, 1):
+            discount = discounts[min(place, len(discounts)) - 1]
+            grants.append(Grant(user_id=user_id, discount=discount, prefix=f"TOP{place}-{month_year_str}",
+                                extra={'place': place}))
 
-        if not top_profiles:
-            self.stdout.write(self.style.WARNING("No users with eco_points > 0 found. No winners to award."))
+        if options['dry_run']:
+            self.stdout.write(f"Would award {len(grants)} user(s); top discount {grants[0].discount}%.")
             return
 
-        # --- 2. Определение наград ---
-        # Структура: (место, процент скидки)
-        awards = {
-            0: 20, # 1-е место (индекс 0)
-            1: 15, # 2-е место (индекс 1)
-            2: 10, # 3-е место (индекс 2)
-        }
-
-        # --- 3. Создание купонов ---
-        valid_from_date = now
-        valid_to_date = now + timedelta(days=30) # Купон действует 30 дней
-
-        for i, profile in enumerate(top_profiles):
-            winner = profile.user
-            discount_value = awards.get(i)
-
-            if not discount_value:
-                continue # На случай, если победителей меньше 3
-
-            # Создаем уникальный код купона
-            month_year_str = now.strftime("%b%Y").upper() # напр. JUN2024
-            coupon_code = f"TOP{i+1}-{month_year_str}-{winner.username.upper()}"
-
-            # Проверяем, не был ли уже выдан купон этому пользователю за этот месяц
-            if Coupon.objects.filter(user=winner, code__startswith=f"TOP{i+1}-{month_year_str}").exists():
-                self.stdout.write(self.style.NOTICE(f"User '{winner.username}' has already received a TOP-{i+1} award for {month_year_str}. Skipping."))
-                continue
-
-            Coupon.objects.create(
-                user=winner,
-                code=coupon_code,
-                discount_type='percent',
-                value=discount_value,
-                valid_from=valid_from_date,
-                valid_to=valid_to_date,
-                is_active=True,
-                max_usage=1, # Персональный купон на одно использование
-                min_purchase_amount=50.00 # Например, минимальная сумма покупки 50 PLN
-            )
-
-            self.stdout.write(self.style.SUCCESS(
-                f"Created a {discount_value}% discount coupon '{coupon_code}' for winner #{i+1}: '{winner.username}'"
-            ))
-
-            # TODO: Отправить email-уведомление победителю
-            # Здесь можно будет добавить вызов фоновой задачи для отправки email
-            # send_winner_notification_email.delay(winner.id, coupon_code)
-
-        self.stdout.write("--- Monthly awards process finished. ---")
\ No newline at end of file
+        # --- 3. Купоны: пакетно, идемпотентно по периоду ---
+        result = issue_coupons(f"award_winners:{period:%Y-%m}", grants,
+                               valid_days=options['valid_days'], chunk_size=max(1, options['chunk_size']))
+        self.stdout.write(self.style.SUCCESS(
+            f"Issued {len(result.issued)} coupon(s), skipped {result.skipped} already awarded "
+            f"(batch '{result.batch.key}': {result.batch.issued} total)."
+        ))
+
+        # --- 4. Уведомления: пакетами в фоне. Берём все гранты партии без notified_at, а не только
+        # выданные сейчас: если прошлый запуск упал между купонами и очередью, повторный их дошлёт ---
+        if not options['no_email']:
+            places = {grant.user_id: grant.extra['place'] for grant in grants}
+            notifications = [
+                {'user_id': i.user_id, 'place': places[i.user_id], 'coupon_code': i.code,
+                 'discount_value': _plain_number(i.discount)}
+                for i in unnotified(result.batch) if i.user_id in places
+            ]
+            if notifications:
+                # задачи - строки в БД: отметка и постановка в очередь фиксируются вместе
+                with transaction.atomic():
+                    mark_notified(result.batch, [n['user_id'] for n in notifications])
+                    enqueue_winner_notifications(notifications)
+                self.stdout.write(f"Queued {len(notifications)} winner notification(s).")
+
+        self.stdout.write("--- Monthly awards process finished. ---")
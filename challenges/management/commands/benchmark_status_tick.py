@@ -0,0 +1,127 @@
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import connection, transaction
+from django.utils import timezone
+
+from challenges.models import Challenge, UserChallengeParticipation
+from challenges.services.statuses import update_statuses
+
+User = get_user_model()
+
+PARTICIPATION_STATUSES = ['joined', 'in_progress', 'completed_pending_review', 'completed_approved', 'failed']
+
+
+class Rollback(Exception):
+    pass
+
+
+def legacy_update_statuses(now):
+    """The previous full-table implementation, kept here as the baseline."""
+    counters = {}
+    with transaction.atomic():
+        counters["ch_upcoming"] = Challenge.objects.filter(
+            is_active=True, start_date__gt=now).exclude(status="upcoming").update(status="upcoming")
+        counters["ch_active"] = Challenge.objects.filter(
+            is_active=True, start_date__lte=now, end_date__gte=now).exclude(status="active").update(status="active")
+        counters["ch_completed_period"] = Challenge.objects.filter(
+            is_active=True, end_date__lt=now).exclude(status__in=["completed_period", "archived"]).update(status="completed_period")
+        counters["parts_failed"] = UserChallengeParticipation.objects.filter(
+            challenge__end_date__lt=now, status__in=["joined", "in_progress"]).update(status="failed")
+    archive_before = now - timedelta(days=getattr(settings, 'CHALLENGES_ARCHIVE_AFTER_DAYS', 60))
+    counters["ch_archived"] = Challenge.objects.filter(
+        status="completed_period", end_date__lt=archive_before).update(status="archived")
+    return counters
+
+
+class Command(BaseCommand):
+    help = ("Benchmark the cron status tick (full-table sweep vs next_transition_at) on synthetic data. "
+            "Everything is created inside a transaction that is rolled back at the end.")
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--challenges', type=int, default=50_000, help='Synthetic challenges.')
+        parser.add_argument('--participations', type=int, default=5_000_000, help='Synthetic participations.')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise Rollback
+        except Rollback:
+            self.stdout.write("Synthetic data rolled back.")
+
+    def _timed(self, label, fn):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        changed = sum(result.values())
+        self.stdout.write(f"{label:<42} {elapsed * 1000:10.1f} ms  (rows changed: {changed})")
+        return result
+
+    def _run(self, options):
+        rng = random.Random(options['seed'])
+        n_challenges = int(options['challenges'])
+        n_parts = int(options['participations'])
+        now = timezone.now()
+
+        started = time.perf_counter()
+        per_user = max(1, n_challenges)
+        n_users = max(1, -(-n_parts // per_user))
+        users = User.objects.bulk_create(
+            [User(username=f"bench_status_{i}_{rng.random():.8f}") for i in range(n_users)]
+        )
+        challenges = []
+        for i in range(n_challenges):
+            start = now + timedelta(hours=rng.randint(-3 * 365 * 24, 90 * 24))
+            end = start + timedelta(days=rng.choice([7, 14, 30]))
+            ch = Challenge(title=f"Bench {i}", description="-", start_date=start, end_date=end,
+                           slug=f"bench-status-{i}-{rng.random():.8f}")
+            ch.status = 'upcoming' if start > now else ('active' if end >= now else 'completed_period')
+            ch.next_transition_at = ch.compute_next_transition(now)
+            challenges.append(ch)
+        challenges = Challenge.objects.bulk_create(challenges, batch_size=2000)
+        ended = set(ch.pk for ch in challenges if ch.end_date < now)
+
+        # Raw executemany: building millions of model instances would dominate the run
+        table = UserChallengeParticipation._meta.db_table
+        sql = f"INSERT INTO {table} (user_id, challenge_id, status, joined_at) VALUES (%s, %s, %s, %s)"
+        joined_at = connection.ops.adapt_datetimefield_value(now)
+        batch = []
+        created = 0
+        with connection.cursor() as cursor:
+            for user in users:
+                for ch in challenges:
+                    if created >= n_parts:
+                        break
+                    status = rng.choice(PARTICIPATION_STATUSES)
+                    if ch.pk in ended and status in ('joined', 'in_progress'):
+                        status = 'failed'
+                    batch.append((user.pk, ch.pk, status, joined_at))
+                    created += 1
+                    if len(batch) >= 50_000:
+                        cursor.executemany(sql, batch)
+                        batch = []
+            if batch:
+                cursor.executemany(sql, batch)
+        self.stdout.write(
+            f"data: {n_challenges} challenges, {created} participations, {n_users} users "
+            f"(built in {time.perf_counter() - started:.1f}s)"
+        )
+
+        self._timed("initial full pass (update_statuses --full)", lambda: update_statuses(now, full=True))
+        self._timed("steady tick, full-table sweep (before)", lambda: legacy_update_statuses(now))
+        self._timed("steady tick, next_transition_at (after)", lambda: update_statuses(now))
+
+        later = now + timedelta(days=1)
+        try:
+            with transaction.atomic():
+                self._timed("tick +1 day, full-table sweep (before)", lambda: legacy_update_statuses(later))
+                raise Rollback
+        except Rollback:
+            pass
+        self._timed("tick +1 day, next_transition_at (after)", lambda: update_statuses(later))
@@ -6,7 +6,8 @@ from challenges.services.recurrence import generate_recurrent_challenges
 
 
 class Command(BaseCommand):
-    help = "Combined scheduler tick: updates challenge statuses (with auto-archive) and generates recurring instances."
+    help = ("Combined scheduler tick: updates challenge statuses (with auto-archive) and generates recurring instances. "
+            "One-shot fallback for cron; the long-running `run_scheduler` runs the same jobs without a process per tick.")
 
     def handle(self, *args, **options):
         now = timezone.now()
@@ -1,10 +1,16 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandParser
 from challenges.services.recurrence import generate_recurrent_challenges
 
 
 class Command(BaseCommand):
     help = "Tworzy kolejne instancje wyzwań na podstawie szablonów z ustawioną powtarzalnością."
 
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            '--backfill-missed', action='store_true', default=False,
+            help='Utwórz także instancje dla okresów, które już minęły (jako zakończone).'
+        )
+
     def handle(self, *args, **options):
-        summary = generate_recurrent_challenges()
+        summary = generate_recurrent_challenges(backfill_missed=options['backfill_missed'])
         self.stdout.write(self.style.SUCCESS(f"Utworzono instancji: {summary['created']}"))
@@ -0,0 +1,30 @@
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db.models.functions import TruncMonth
+
+from challenges.models import EcoPointEvent
+from challenges.services.leaderboard import period_of, rebuild_period
+
+
+class Command(BaseCommand):
+    help = "Przelicza miesięczne rankingi (LeaderboardEntry) na podstawie zdarzeń punktowych."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--month', action='append', default=None,
+                            help='Miesiąc w formacie RRRR-MM (można podać wielokrotnie); domyślnie wszystkie.')
+
+    def handle(self, *args, **options):
+        if options['month']:
+            try:
+                periods = [datetime.strptime(m, '%Y-%m').date() for m in options['month']]
+            except ValueError as e:
+                raise CommandError(f"Niepoprawny miesiąc: {e}")
+        else:
+            periods = sorted({period_of(m) for m in (EcoPointEvent.objects.order_by()
+                                                     .annotate(m=TruncMonth('created_at', tzinfo=timezone.utc))
+                                                     .values_list('m', flat=True).distinct())})
+        for period in periods:
+            rows = rebuild_period(period)
+            self.stdout.write(f"{period:%Y-%m}: {rows} pozycji")
+        self.stdout.write(self.style.SUCCESS(f"Przeliczono miesięcy: {len(periods)}"))
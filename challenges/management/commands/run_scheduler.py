@@ -0,0 +1,68 @@
+import asyncio
+import os
+import signal
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from common.scheduler import Scheduler, load_jobs, serve_status
+
+
+class Command(BaseCommand):
+    help = ("Long-running scheduler for periodic jobs (settings.SCHEDULER_JOBS): challenge statuses, "
+            "recurring challenges, Stripe sync, image backfills. Replaces cron-driven cron_tick.")
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--only', nargs='+', default=None, help='Run only these jobs.')
+        parser.add_argument('--once', action='store_true', default=False,
+                            help='Run every job once and exit (no leader election).')
+        parser.add_argument('--list', action='store_true', default=False, help='List configured jobs and exit.')
+        parser.add_argument('--workers', type=int, default=4, help='Threads running jobs concurrently.')
+        # unauthenticated and it shows job errors: loopback only unless explicitly exposed
+        parser.add_argument('--status-host', default=os.getenv('SCHEDULER_STATUS_HOST', '127.0.0.1'),
+                            help='Interface of the status endpoint (default: 127.0.0.1).')
+        parser.add_argument('--status-port', type=int, default=int(os.getenv('SCHEDULER_STATUS_PORT', 8077)),
+                            help='Port of the JSON status endpoint (/status, /healthz); 0 disables it.')
+
+    def handle(self, *args, **options):
+        try:
+            jobs = load_jobs(only=options['only'])
+        except (ValueError, ImportError) as e:
+            raise CommandError(str(e))
+        if not jobs:
+            raise CommandError("No scheduler jobs configured (settings.SCHEDULER_JOBS).")
+
+        if options['list']:
+            for job in jobs:
+                self.stdout.write(f"{job.name}: every {job.interval:g}s ±{job.jitter:.0%}")
+            return
+
+        scheduler = Scheduler(jobs, max_workers=max(1, options['workers']))
+        if options['once']:
+            asyncio.run(scheduler.run_once())
+            for job in jobs:
+                stats = job.stats
+                line = f"{job.name}: {stats.last_duration:.3f}s {stats.last_error or stats.last_result}"
+                self.stdout.write(self.style.ERROR(line) if stats.failures else self.style.SUCCESS(line))
+            return
+
+        self.stdout.write(self.style.SUCCESS(f"Scheduler starting with {len(jobs)} job(s): "
+                                             f"{', '.join(job.name for job in jobs)}"))
+        asyncio.run(self._serve(scheduler, options['status_host'], options['status_port']))
+        self.stdout.write("Scheduler stopped.")
+
+    async def _serve(self, scheduler: Scheduler, host: str, port: int):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, scheduler.stop)
+            except (NotImplementedError, RuntimeError):  # e.g. Windows
+                pass
+        server = await serve_status(scheduler, host, port) if port else None
+        if server:
+            self.stdout.write(f"Status endpoint on http://{host}:{port}/status")
+        try:
+            await scheduler.run()
+        finally:
+            if server:
+                server.close()
+                await server.wait_closed()
@@ -1,12 +1,19 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandParser
 from challenges.services.statuses import update_statuses
 
 
 class Command(BaseCommand):
     help = "Aktualizuje statusy wyzwań i uczestników na podstawie dat (do crona)."
 
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            '--full', action='store_true', default=False,
+            help='Przelicz wszystkie wyzwania, nie tylko te z minionym next_transition_at '
+                 '(np. po zmianie CHALLENGES_ARCHIVE_AFTER_DAYS lub masowej edycji dat).'
+        )
+
     def handle(self, *args, **options):
-        summary = update_statuses()
+        summary = update_statuses(full=options['full'])
         self.stdout.write(self.style.SUCCESS(
             (
                 "OK: challenges "
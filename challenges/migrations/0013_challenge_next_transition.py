@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-19 16:57
+
+from django.db import migrations, models
+from django.db.models.functions import Now
+
+
+def mark_all_due(apps, schema_editor):
+    # The first cron tick evaluates every challenge once and stores the real next transition
+    Challenge = apps.get_model('challenges', 'Challenge')
+    Challenge.objects.exclude(status='archived').update(next_transition_at=Now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('challenges', '0012_participation_review_notes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='challenge',
+            name='next_transition_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Następna zmiana statusu'),
+        ),
+        migrations.AddIndex(
+            model_name='challenge',
+            index=models.Index(condition=models.Q(('next_transition_at__isnull', False)), fields=['next_transition_at'], name='challenge_next_transition_idx'),
+        ),
+        migrations.RunPython(mark_all_due, migrations.RunPython.noop),
+    ]
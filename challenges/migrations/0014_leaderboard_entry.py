@@ -0,0 +1,53 @@
+# Generated by Django 5.2 on 2026-10-19 17:06
+
+import datetime
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max, Sum
+from django.db.models.functions import TruncMonth
+
+
+def backfill_rollup(apps, schema_editor):
+    EcoPointEvent = apps.get_model('challenges', 'EcoPointEvent')
+    LeaderboardEntry = apps.get_model('challenges', 'LeaderboardEntry')
+    rows = (EcoPointEvent.objects
+            .annotate(month=TruncMonth('created_at', tzinfo=datetime.timezone.utc))
+            .values('user_id', 'month')
+            .annotate(points=Sum('amount'), last=Max('created_at'))
+            .order_by())
+    LeaderboardEntry.objects.bulk_create(
+        [LeaderboardEntry(user_id=row['user_id'], period=row['month'].date(), points=row['points'] or 0,
+                          updated_at=row['last']) for row in rows],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('challenges', '0013_challenge_next_transition'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField(help_text='Pierwszy dzień miesiąca (UTC).', verbose_name='Miesiąc')),
+                ('points', models.IntegerField(default=0, verbose_name='Punkty')),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Ostatnia zmiana')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Pozycja rankingu',
+                'verbose_name_plural': 'Pozycje rankingu',
+                'indexes': [models.Index(fields=['period', '-points', 'updated_at'], name='leaderboard_rank_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'period'), name='leaderboard_user_period_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill_rollup, migrations.RunPython.noop),
+    ]
@@ -3,6 +3,7 @@ from django.db import models
 from django.conf import settings
 from django.utils import timezone
 from django.urls import reverse
+from datetime import timedelta
 import re
 import uuid
 from store.models import Coupon, get_product_image_storage_instance
@@ -66,10 +67,19 @@ class Challenge(models.Model):
         verbose_name="Kupón za ukończenie wyzwania"
     )
 
+    # When the status can next change (start, end, auto-archive); the cron tick only looks at due rows
+    next_transition_at = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="Następna zmiana statusu")
+
     class Meta:
         verbose_name = "Wyzwanie"
         verbose_name_plural = "Wyzwania"
         ordering = ['start_date']
+        indexes = [
+            models.Index(
+                fields=['next_transition_at'], name='challenge_next_transition_idx',
+                condition=models.Q(next_transition_at__isnull=False),
+            ),
+        ]
 
     def __str__(self):
         base_name = self.title
@@ -83,6 +93,35 @@ class Challenge(models.Model):
             base_name += " (Шаблон)"
         return base_name
 
+    def save(self, *args, **kwargs):
+        self.next_transition_at = self.compute_next_transition()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'status', 'start_date', 'end_date'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'next_transition_at'}
+        super().save(*args, **kwargs)
+
+    def compute_next_transition(self, now=None):
+        """
+        start_date while upcoming, end_date while running, end_date + archive window once the
+        period is over, None when archived. ``now`` when the stored status already lags behind
+        the dates (see challenges.services.statuses).
+        """
+        if now is None:
+            now = timezone.now()
+        if self.status == 'archived' or not self.start_date or not self.end_date:
+            return None
+        if self.start_date > now:
+            expected, boundary = ('upcoming',), self.start_date
+        elif self.end_date >= now:
+            expected, boundary = ('active',), self.end_date
+        else:
+            expected, boundary = ('completed_period',), None
+            if self.status == 'completed_period':
+                boundary = self.end_date + timedelta(days=getattr(settings, 'CHALLENGES_ARCHIVE_AFTER_DAYS', 60))
+        if self.is_active and self.status not in expected:
+            return now
+        return boundary
+
     def get_absolute_url(self):
         return reverse('challenges:challenge_detail', kwargs={'slug': self.slug})
 
@@ -182,4 +221,29 @@ class EcoPointEvent(models.Model):
         ordering = ["-created_at"]
 
     def __str__(self):
-        return f"{self.user} +{self.amount} ({self.source})"
\ No newline at end of file
+        return f"{self.user} +{self.amount} ({self.source})"
+
+
+class LeaderboardEntry(models.Model):
+    """
+    Miesięczna suma punktów użytkownika (rollup EcoPointEvent), aktualizowana przy każdym
+    zapisie zdarzenia - ranking nie agreguje już wszystkich zdarzeń z miesiąca przy żądaniu.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="leaderboard_entries")
+    period = models.DateField(verbose_name="Miesiąc", help_text="Pierwszy dzień miesiąca (UTC).")
+    points = models.IntegerField(default=0, verbose_name="Punkty")
+    updated_at = models.DateTimeField(default=timezone.now, verbose_name="Ostatnia zmiana")
+
+    class Meta:
+        verbose_name = "Pozycja rankingu"
+        verbose_name_plural = "Pozycje rankingu"
+        constraints = [
+            models.UniqueConstraint(fields=["user", "period"], name="leaderboard_user_period_uniq"),
+        ]
+        indexes = [
+            # top-N and "my rank" are range scans over one period in ranking order
+            models.Index(fields=["period", "-points", "updated_at"], name="leaderboard_rank_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user} {self.period:%Y-%m}: {self.points}"
@@ -0,0 +1,188 @@
+"""Materialized leaderboards.
+
+Monthly rankings read ``LeaderboardEntry`` - a (user, month) -> points rollup
+bumped whenever an EcoPointEvent is written (see challenges/signals.py) - and
+the all-time ranking reads ``Profile.eco_points``; both through indexes in
+ranking order, so top-N and "my rank" never aggregate the event log.
+
+Top lists are cached as ``(user_id, points)`` pairs in the ``leaderboard``
+namespace of the tiered cache (common/cache.py); names and avatar URLs are
+resolved with one query when rendered, so renamed users, new avatars and
+static URLs that change on deploy are never served from the cache. Past
+months can no longer change through normal writes and are cached for a week;
+the current month and the all-time list are dropped on every write and carry
+a short timeout as a safety net for writes that bypass the signals. Requested
+months are clamped to the range that has data (``clamp_period``), so the
+query string cannot fill the cache with empty months.
+
+"My rank" counts the rows ahead of the user's through the same index (an
+index-only range scan, so O(log n + rank)); see ``monthly_rank``.
+"""
+from __future__ import annotations
+
+import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max, Min, Q, Sum
+from django.templatetags.static import static
+from django.utils import timezone
+
+from challenges.models import EcoPointEvent, LeaderboardEntry
+from common.cache import Namespace
+from store.models import Profile
+
+TOP_N = 20
+LIVE_CACHE_TIMEOUT = 300
+PAST_MONTH_CACHE_TIMEOUT = 7 * 24 * 60 * 60
+ALL_TIME_CACHE_KEY = 'all'
+FIRST_PERIOD_CACHE_KEY = 'first-period'
+
+leaderboard_cache = Namespace('leaderboard', alias='tiered')
+
+
+def period_of(when: Optional[datetime.datetime] = None) -> datetime.date:
+    """First day of the (UTC) month containing ``when``."""
+    when = when or timezone.now()
+    if timezone.is_aware(when):
+        when = when.astimezone(datetime.timezone.utc)
+    return datetime.date(when.year, when.month, 1)
+
+
+def clamp_period(period: datetime.date) -> datetime.date:
+    """``period`` limited to the months that can have entries: the first LeaderboardEntry .. the current month."""
+    current = period_of()
+    if period >= current:
+        return current
+    first = leaderboard_cache.get(FIRST_PERIOD_CACHE_KEY)
+    if first is None:
+        first = LeaderboardEntry.objects.aggregate(first=Min('period'))['first'] or current
+        leaderboard_cache.set(FIRST_PERIOD_CACHE_KEY, first, LIVE_CACHE_TIMEOUT)
+    return max(period, first)
+
+
+def _month_cache_key(period: datetime.date) -> str:
+    return f'month:{period:%Y-%m}'
+
+
+def invalidate(period: Optional[datetime.date] = None) -> None:
+    keys = [ALL_TIME_CACHE_KEY]
+    if period is not None:
+        keys.append(_month_cache_key(period))
+    leaderboard_cache.delete_many(keys)
+
+
+def record_points(user_id: int, amount: int, when: Optional[datetime.datetime] = None) -> None:
+    """Add ``amount`` (may be negative) to the user's rollup row for the month of ``when``."""
+    when = when or timezone.now()
+    period = period_of(when)
+    changes = {'points': F('points') + amount}
+    if amount > 0:
+        # ties are broken by who reached the score first
+        changes['updated_at'] = when
+    rows = LeaderboardEntry.objects.filter(user_id=user_id, period=period)
+    if not rows.update(**changes):
+        try:
+            with transaction.atomic():
+                LeaderboardEntry.objects.create(user_id=user_id, period=period, points=amount, updated_at=when)
+        except IntegrityError:  # a concurrent writer created the row first
+            rows.update(**changes)
+    transaction.on_commit(lambda: invalidate(period))
+
+
+def rebuild_period(period: datetime.date) -> int:
+    """Recompute one month of the rollup from the event log (repairs writes that bypassed the signals)."""
+    start = datetime.datetime(period.year, period.month, 1, tzinfo=datetime.timezone.utc)
+    end = (start + datetime.timedelta(days=32)).replace(day=1)
+    rows = (EcoPointEvent.objects.filter(created_at__gte=start, created_at__lt=end)
+            .values('user_id').annotate(points=Sum('amount'), last=Max('created_at')).order_by())
+    with transaction.atomic():
+        LeaderboardEntry.objects.filter(period=period).delete()
+        created = LeaderboardEntry.objects.bulk_create(
+            [LeaderboardEntry(user_id=row['user_id'], period=period, points=row['points'] or 0, updated_at=row['last'])
+             for row in rows],
+            batch_size=1000,
+        )
+    transaction.on_commit(lambda: invalidate(period))
+    return len(created)
+
+
+def _entry(rank: int, user, points: int) -> Dict:
+    profile = getattr(user, 'profile', None)
+    return {
+        'rank': rank,
+        'user_id': user.pk,
+        'username': user.username,
+        'display_name': user.get_full_name() or user.username,
+        'avatar_url': profile.avatar_url if profile else static('img/default_avatar.svg'),
+        'points': points,
+    }
+
+
+def _render(rows: Sequence[Tuple[int, int]]) -> List[Dict]:
+    """Cached ``(user_id, points)`` pairs -> template entries, users and profiles in one query."""
+    users = get_user_model().objects.select_related('profile').in_bulk([user_id for user_id, _ in rows])
+    # a user deleted since the list was cached leaves a gap in the ranks until the next write
+    return [_entry(rank, users[user_id], points)
+            for rank, (user_id, points) in enumerate(rows, 1) if user_id in users]
+
+
+def top_monthly(period: datetime.date, limit: int = TOP_N) -> List[Dict]:
+    key = _month_cache_key(period)
+    rows = leaderboard_cache.get(key)
+    if rows is None:
+        rows = list(LeaderboardEntry.objects.filter(period=period, points__gt=0)
+                    .order_by('-points', 'updated_at').values_list('user_id', 'points')[:TOP_N])
+        timeout = PAST_MONTH_CACHE_TIMEOUT if period < period_of() else LIVE_CACHE_TIMEOUT
+        leaderboard_cache.set(key, rows, timeout)
+    return _render(rows[:limit])
+
+
+def top_all_time(limit: int = TOP_N) -> List[Dict]:
+    rows = leaderboard_cache.get(ALL_TIME_CACHE_KEY)
+    if rows is None:
+        rows = list(Profile.objects.filter(eco_points__gt=0).order_by('-eco_points', 'last_points_update')
+                    .values_list('user_id', 'eco_points')[:TOP_N])
+        leaderboard_cache.set(ALL_TIME_CACHE_KEY, rows, LIVE_CACHE_TIMEOUT)
+    return _render(rows[:limit])
+
+
+def _ahead_of(points: int, updated_at, points_field: str, updated_field: str) -> Q:
+    ahead = Q(**{f'{points_field}__gt': points})
+    if updated_at is not None:
+        ahead |= Q(**{points_field: points, f'{updated_field}__lt': updated_at})
+    return ahead
+
+
+def monthly_rank(user, period: datetime.date) -> Optional[Dict]:
+    """The user's position in one month: an index range count over the rows ahead of theirs.
+
+    Not the O(log n) of an order-statistic tree: the count walks the
+    ``(period, -points, updated_at)`` index up to the user's entry, so it
+    costs O(log n + rank) index entries and no table rows. A month has
+    at most one row per active user, so even the last place is a count over a few
+    thousand index entries (well under a millisecond). A rank tree or
+    a score histogram would need its own write path on every EcoPointEvent
+    and buys nothing at this size.
+    """
+    if not getattr(user, 'is_authenticated', False):
+        return None
+    mine = LeaderboardEntry.objects.filter(user=user, period=period, points__gt=0).values('points', 'updated_at').first()
+    if mine is None:
+        return None
+    ahead = (LeaderboardEntry.objects.filter(period=period)
+             .filter(_ahead_of(mine['points'], mine['updated_at'], 'points', 'updated_at')).count())
+    return {'rank': ahead + 1, 'points': mine['points']}
+
+
+def all_time_rank(user) -> Optional[Dict]:
+    if not getattr(user, 'is_authenticated', False):
+        return None
+    mine = Profile.objects.filter(user=user, eco_points__gt=0).values('eco_points', 'last_points_update').first()
+    if mine is None:
+        return None
+    ahead = Profile.objects.filter(
+        _ahead_of(mine['eco_points'], mine['last_points_update'], 'eco_points', 'last_points_update')
+    ).count()
+    return {'rank': ahead + 1, 'points': mine['eco_points']}
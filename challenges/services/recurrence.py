@@ -1,13 +1,21 @@
 from __future__ import annotations
 
+from collections import defaultdict
 from datetime import timedelta
+from functools import reduce
+from operator import or_
 from django.utils import timezone
 from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.utils.text import slugify
-from typing import Dict
+from typing import Dict, Iterable, List
 
 from challenges.models import Challenge
 
+# Safety net for templates whose last instance is very old (e.g. weekly, idle for years)
+MAX_PERIODS_PER_RUN = 520
+
 
 def _next_period(start, end, recurrence: str):
     if recurrence == 'weekly':
@@ -31,59 +39,128 @@ def _next_period(start, end, recurrence: str):
     return None, None
 
 
-def generate_recurrent_challenges(now=None) -> Dict[str, int]:
+def _templates_with_state():
+    """Recurring templates annotated with their live-instance count and latest instance period (one query)."""
+    instances = Challenge.objects.filter(template_challenge=OuterRef('pk')).order_by()
+    latest = instances.order_by('-end_date')
+    future_count = (instances.filter(status__in=['upcoming', 'active'])
+                    .values('template_challenge').annotate(c=Count('pk')).values('c'))
+    return (
+        Challenge.objects.filter(is_template=True, is_active=True)
+        .exclude(recurrence_type='none')
+        .annotate(
+            future_count=Coalesce(Subquery(future_count, output_field=IntegerField()), Value(0)),
+            last_start=Subquery(latest.values('start_date')[:1]),
+            last_end=Subquery(latest.values('end_date')[:1]),
+        )
+        .order_by('pk')
+    )
+
+
+def unique_challenge_slugs(bases: Iterable[str], max_length: int = 220) -> List[str]:
+    """Slug per base (``base``, ``base-2``, ...), unique against the table and the batch, with one query."""
+    bases = [b[:max_length] for b in bases]
+    if not bases:
+        return []
+    taken = set(
+        Challenge.objects.filter(reduce(or_, (Q(slug__startswith=b) for b in set(bases))))
+        .order_by().values_list('slug', flat=True)
+    )
+    slugs = []
+    for base in bases:
+        slug, n = base, 2
+        while slug in taken:
+            suffix = f"-{n}"
+            slug = f"{base[:max_length - len(suffix)]}{suffix}"
+            n += 1
+        taken.add(slug)
+        slugs.append(slug)
+    return slugs
+
+
+def _overlaps(periods, start, end) -> bool:
+    return any(s <= end and e >= start for s, e in periods)
+
+
+def generate_recurrent_challenges(now=None, *, backfill_missed: bool = False) -> Dict[str, int]:
     """
-    For template challenges with recurrence_type != none, ensure there is an upcoming/active instance.
-    - If last instance ended before 'now', create a new instance shifted by recurrence.
+    For template challenges with recurrence_type != none, ensure there are up to
+    ``max_future_instances`` upcoming/active instances.
+
+    - Periods are chained from the latest instance (or the template itself) by recurrence, so
+      several missed periods are caught up in one run. Periods that already ended are skipped,
+      or created as completed_period with ``backfill_missed=True``.
     - Copy core fields; link template_challenge.
+
+    Template state comes from one annotated query, overlapping instances from one more, slugs
+    from one more, and all new rows are written with a single bulk_create.
     """
     if now is None:
         now = timezone.now()
 
-    created = 0
-    with transaction.atomic():
-        templates = Challenge.objects.filter(is_template=True, is_active=True).exclude(recurrence_type='none')
-        for tmpl in templates:
-            recurrence = tmpl.recurrence_type
-            max_future = max(1, getattr(tmpl, 'max_future_instances', 1))
-            # count current active or upcoming instances
-            future_count = tmpl.instances.filter(status__in=['upcoming', 'active']).count()
-            if future_count >= max_future:
-                continue
-            # find latest instance
-            last = tmpl.instances.order_by('-end_date').first()
-            base_start, base_end = (last.start_date, last.end_date) if last else (tmpl.start_date, tmpl.end_date)
-            if not base_start or not base_end:
-                continue
-            next_start, next_end = _next_period(base_start, base_end, recurrence)
+    templates = list(_templates_with_state())
+    plans = []  # (template, start, end)
+    for tmpl in templates:
+        max_future = max(1, getattr(tmpl, 'max_future_instances', 1))
+        missing = max_future - tmpl.future_count
+        if missing <= 0:
+            continue
+        base_start, base_end = (tmpl.last_start, tmpl.last_end) if tmpl.last_start else (tmpl.start_date, tmpl.end_date)
+        if not base_start or not base_end:
+            continue
+        for _ in range(MAX_PERIODS_PER_RUN):
+            next_start, next_end = _next_period(base_start, base_end, tmpl.recurrence_type)
             if not next_start or not next_end:
+                break
+            base_start, base_end = next_start, next_end
+            if next_end < now:
+                if backfill_missed:
+                    plans.append((tmpl, next_start, next_end))
                 continue
-            # create only if there is no overlapping/upcoming instance
-            exists = tmpl.instances.filter(start_date__lte=next_end, end_date__gte=next_start).exists()
-            if exists:
-                continue
-            # create new instance
-            new = Challenge(
-                title=tmpl.title,
-                short_description=tmpl.short_description,
-                description=tmpl.description,
-                points_for_completion=tmpl.points_for_completion,
-                start_date=next_start,
-                end_date=next_end,
-                image=tmpl.image,
-                badge_name_reward=tmpl.badge_name_reward,
-                badge_icon_class_reward=tmpl.badge_icon_class_reward,
-                status='upcoming' if next_start > now else 'active',
-                is_template=False,
-                is_active=tmpl.is_active,
-                template_challenge=tmpl,
-                recurrence_type='none',
-            )
-            # slug: base + date suffix
-            base_slug = slugify(tmpl.title)
-            suffix = f"-{next_start.strftime('%Y%m%d')}"
-            new.slug = f"{base_slug}{suffix}"[:220]
-            new.save()
-            created += 1
-
-    return {"created": created}
+            plans.append((tmpl, next_start, next_end))
+            missing -= 1
+            if missing <= 0:
+                break
+
+    if not plans:
+        return {"created": 0}
+
+    # create only if there is no overlapping instance
+    earliest = min(start for _, start, _ in plans)
+    existing = defaultdict(list)
+    for tmpl_id, start, end in (Challenge.objects
+                                .filter(template_challenge_id__in={t.pk for t, _, _ in plans}, end_date__gte=earliest)
+                                .order_by().values_list('template_challenge_id', 'start_date', 'end_date')):
+        existing[tmpl_id].append((start, end))
+    plans = [(t, s, e) for t, s, e in plans if not _overlaps(existing[t.pk], s, e)]
+    if not plans:
+        return {"created": 0}
+
+    # slug: base + date suffix
+    slugs = unique_challenge_slugs(f"{slugify(t.title)}-{s.strftime('%Y%m%d')}" for t, s, _ in plans)
+    new_instances = []
+    for (tmpl, start, end), slug in zip(plans, slugs):
+        new = Challenge(
+            title=tmpl.title,
+            short_description=tmpl.short_description,
+            description=tmpl.description,
+            points_for_completion=tmpl.points_for_completion,
+            start_date=start,
+            end_date=end,
+            image=tmpl.image,
+            badge_name_reward=tmpl.badge_name_reward,
+            badge_icon_class_reward=tmpl.badge_icon_class_reward,
+            status='upcoming' if start > now else ('active' if end >= now else 'completed_period'),
+            is_template=False,
+            is_active=tmpl.is_active,
+            template_challenge=tmpl,
+            recurrence_type='none',
+            slug=slug,
+        )
+        # bulk_create skips save(), which normally maintains next_transition_at
+        new.next_transition_at = new.compute_next_transition(now)
+        new_instances.append(new)
+
+    with transaction.atomic():
+        Challenge.objects.bulk_create(new_instances, batch_size=500)
+    return {"created": len(new_instances)}
@@ -4,19 +4,76 @@ from django.utils import timezone
 from django.conf import settings
 from datetime import timedelta
 from django.db import transaction
-from django.db.models import Q
+from django.db.models import Case, DateTimeField, ExpressionWrapper, F, Q, Value, When
 from typing import Dict
 
 from challenges.models import Challenge, UserChallengeParticipation
 
+TICK_BATCH_SIZE = 5000
 
-def update_statuses(now=None) -> Dict[str, int]:
+
+def archive_after() -> timedelta:
+    return timedelta(days=getattr(settings, 'CHALLENGES_ARCHIVE_AFTER_DAYS', 60))
+
+
+def next_transition_expression(now):
+    """SQL twin of Challenge.compute_next_transition() for recomputing a whole batch in one UPDATE."""
+    live = Q(is_active=True)
+    return Case(
+        When(status='archived', then=Value(None)),
+        When(live & Q(start_date__gt=now) & ~Q(status='upcoming'), then=Value(now)),
+        When(start_date__gt=now, then=F('start_date')),
+        When(live & Q(end_date__gte=now) & ~Q(status='active'), then=Value(now)),
+        When(end_date__gte=now, then=F('end_date')),
+        When(live & ~Q(status='completed_period'), then=Value(now)),
+        When(status='completed_period',
+             then=ExpressionWrapper(F('end_date') + archive_after(), output_field=DateTimeField())),
+        default=Value(None),
+        output_field=DateTimeField(),
+    )
+
+
+def _apply_transitions(ids, now, counters: Dict[str, int]) -> None:
+    challenges = Challenge.objects.filter(pk__in=ids)
+    live = challenges.filter(is_active=True)
+
+    counters["ch_upcoming"] += live.filter(start_date__gt=now).exclude(status="upcoming").update(status="upcoming")
+    counters["ch_active"] += (live.filter(start_date__lte=now, end_date__gte=now)
+                              .exclude(status="active").update(status="active"))
+    counters["ch_completed_period"] += (live.filter(end_date__lt=now)
+                                        .exclude(status__in=["completed_period", "archived"])
+                                        .update(status="completed_period"))
+
+    # Participants who never finished an ended challenge. Only the challenges that are due in
+    # this tick are joined, instead of every historical participation.
+    ended_ids = list(challenges.filter(end_date__lt=now).order_by().values_list('pk', flat=True))
+    if ended_ids:
+        counters["parts_failed"] += UserChallengeParticipation.objects.filter(
+            challenge_id__in=ended_ids,
+            status__in=["joined", "in_progress"],
+        ).update(status="failed")
+
+    # Auto-archive challenges after a retention window
+    counters["ch_archived"] += challenges.filter(
+        status="completed_period", end_date__lt=now - archive_after()
+    ).update(status="archived")
+
+    challenges.update(next_transition_at=next_transition_expression(now))
+
+
+def update_statuses(now=None, *, full: bool = False, batch_size: int = TICK_BATCH_SIZE) -> Dict[str, int]:
     """
     Update Challenge.status by dates and finalize participant outcomes for ended challenges.
 
     - before start_date => upcoming
     - between start and end => active
     - after end_date => completed_period (challenge); participants in joined/in_progress => failed
+    - CHALLENGES_ARCHIVE_AFTER_DAYS after end_date => archived
+
+    Only challenges whose ``next_transition_at`` has passed are touched; each batch gets one
+    UPDATE per target state and then has its next transition recomputed. ``full=True`` first
+    marks every non-archived challenge as due (after bulk edits that bypassed save(), or after
+    changing CHALLENGES_ARCHIVE_AFTER_DAYS).
 
     Returns counters of updates applied.
     """
@@ -31,32 +88,21 @@ def update_statuses(now=None) -> Dict[str, int]:
         "parts_failed": 0,
     }
 
-    with transaction.atomic():
-        # Upcoming
-        upcoming_qs = Challenge.objects.filter(is_active=True, start_date__gt=now).exclude(status="upcoming")
-        counters["ch_upcoming"] = upcoming_qs.update(status="upcoming")
-
-        # Active
-        active_qs = Challenge.objects.filter(
-            is_active=True, start_date__lte=now, end_date__gte=now
-        ).exclude(status="active")
-        counters["ch_active"] = active_qs.update(status="active")
+    if full:
+        Challenge.objects.exclude(status='archived').update(next_transition_at=now)
 
-        # Completed (period ended)
-        ended_qs = Challenge.objects.filter(is_active=True, end_date__lt=now).exclude(status__in=["completed_period", "archived"])
-        counters["ch_completed_period"] = ended_qs.update(status="completed_period")
-
-        # Mark participants of ended challenges who haven't completed as failed
-        parts_qs = UserChallengeParticipation.objects.filter(
-            challenge__end_date__lt=now,
-            status__in=["joined", "in_progress"],
+    last_pk = 0
+    while True:
+        ids = list(
+            Challenge.objects.filter(next_transition_at__lte=now, pk__gt=last_pk)
+            .order_by('pk').values_list('pk', flat=True)[:batch_size]
         )
-        counters["parts_failed"] = parts_qs.update(status="failed")
-
-    # Auto-archive challenges after a retention window
-    days = getattr(settings, 'CHALLENGES_ARCHIVE_AFTER_DAYS', 60)
-    archive_before = now - timedelta(days=days)
-    archive_qs = Challenge.objects.filter(status="completed_period", end_date__lt=archive_before)
-    counters["ch_archived"] = archive_qs.update(status="archived")
+        if not ids:
+            break
+        last_pk = ids[-1]
+        with transaction.atomic():
+            _apply_transitions(ids, now, counters)
+        if len(ids) < batch_size:
+            break
 
     return counters
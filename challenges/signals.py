@@ -0,0 +1,17 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import EcoPointEvent
+from .services.leaderboard import record_points
+
+
+@receiver(post_save, sender=EcoPointEvent)
+def eco_point_event_created(sender, instance, created, **kwargs):
+    if created and instance.amount:
+        record_points(instance.user_id, instance.amount, instance.created_at)
+
+
+@receiver(post_delete, sender=EcoPointEvent)
+def eco_point_event_deleted(sender, instance, **kwargs):
+    if instance.amount:
+        record_points(instance.user_id, -instance.amount, instance.created_at)
@@ -1,9 +1,16 @@
-from background_task import background
+import logging
+
+from taskqueue import background
 from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.template.loader import render_to_string
 from django.contrib.auth import get_user_model
+from common.email_templates import render_batch
 from common.mail import send_email
 
+logger = logging.getLogger(__name__)
+
+
 def send_winner_notification_email_task(user_id, place, coupon_code, discount_value):
     """
     Фоновая задача для отправки email победителю челленджа.
@@ -12,7 +19,7 @@ def send_winner_notification_email_task(user_id, place, coupon_code, discount_va
     try:
         user = User.objects.get(id=user_id)
         if not user.email:
-            print(f"!!! TASK: Nie można wysłać email do użytkownika #{user.id}: Brak adresu email.")
+            logger.warning("TASK: Nie można wysłać email do użytkownika #%s: Brak adresu email.", user.id)
             return False
 
         subject = 'Gratulacje! Jesteś zwycięzcą w EcoMarket!'
@@ -37,13 +44,62 @@ def send_winner_notification_email_task(user_id, place, coupon_code, discount_va
             from_email=from_email,
             fail_silently=False,
         )
-        print(f"TASK: Email zwycięzcy dla użytkownika #{user.id} wysłany.")
+        logger.info("TASK: Email zwycięzcy dla użytkownika #%s wysłany.", user.id)
         return True
     except User.DoesNotExist:
-        print(f"!!! TASK ERROR: Użytkownik z ID {user_id} nie istnieje. Email nie wysłany.")
+        logger.error("TASK ERROR: Użytkownik z ID %s nie istnieje. Email nie wysłany.", user_id)
         return False
     except Exception as e:
-        print(f"!!! TASK ERROR: Błąd przy wysyłaniu emaila zwycięzcy dla użytkownika #{user_id}: {e}")
+        logger.exception("TASK ERROR: Błąd przy wysyłaniu emaila zwycięzcy dla użytkownika #%s: %s", user_id, e)
         return False
 
 send_winner_notification_email_task = background(schedule=5)(send_winner_notification_email_task)
+
+
+WINNER_EMAIL_SUBJECT = 'Gratulacje! Jesteś zwycięzcą w EcoMarket!'
+WINNER_EMAIL_CHUNK = 100
+
+
+def send_winner_notifications_task(notifications):
+    """
+    Wysyła powiadomienia do wielu zwycięzców naraz: jedno zapytanie o użytkowników
+    i jedno połączenie z backendem email na całą paczkę.
+    notifications: lista słowników {user_id, place, coupon_code, discount_value}.
+    """
+    User = get_user_model()
+    users = User.objects.in_bulk([n['user_id'] for n in notifications])
+    recipients, contexts = [], []
+    for n in notifications:
+        user = users.get(n['user_id'])
+        if not user or not user.email:
+            continue
+        recipients.append(user.email)
+        contexts.append({
+            'user': user,
+            'place': n['place'],
+            'coupon_code': n['coupon_code'],
+            'discount_value': n['discount_value'],
+        })
+    # one template lookup and one shared base context for the whole batch
+    messages = []
+    for email, (text, html) in zip(recipients, render_batch('challenges/emails/winner_notification', contexts)):
+        msg = EmailMultiAlternatives(
+            subject=WINNER_EMAIL_SUBJECT, body=text, from_email=settings.DEFAULT_FROM_EMAIL, to=[email],
+        )
+        msg.attach_alternative(html, 'text/html')
+        messages.append(msg)
+    if not messages:
+        return 0
+    sent = get_connection(fail_silently=False).send_messages(messages) or 0
+    logger.info("TASK: Wysłano %s/%s emaili do zwycięzców.", sent, len(messages))
+    return sent
+
+send_winner_notifications_task = background(schedule=5)(send_winner_notifications_task)
+
+
+def enqueue_winner_notifications(notifications, chunk_size=WINNER_EMAIL_CHUNK):
+    """Jedno zadanie w tle na każde ``chunk_size`` powiadomień zamiast jednego na zwycięzcę."""
+    notifications = list(notifications)
+    for start in range(0, len(notifications), chunk_size):
+        send_winner_notifications_task(notifications[start:start + chunk_size])
+    return -(-len(notifications) // chunk_size)
@@ -1,3 +1,334 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from common.scheduler import Job, Scheduler, load_jobs, serve_status
+from .models import Challenge, EcoPointEvent, LeaderboardEntry, UserChallengeParticipation
+from .services import leaderboard
+from .services.statuses import update_statuses
+from .tasks import send_winner_notifications_task
+from store.models import Coupon, CouponBatch, UserCoupon
+from store.services.coupons import Grant, generate_codes, issue_coupons
+
+User = get_user_model()
+
+
+@override_settings(CHALLENGES_ARCHIVE_AFTER_DAYS=60)
+class ChallengeStatusTickTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.user = User.objects.create_user(username='runner', password='pass12345')
+
+    def _challenge(self, slug, start_offset, days=7, **kwargs):
+        start = self.now + start_offset
+        return Challenge.objects.create(
+            title=slug, description='-', slug=slug, start_date=start, end_date=start + timedelta(days=days), **kwargs
+        )
+
+    def test_save_tracks_next_transition(self):
+        upcoming = self._challenge('upcoming', timedelta(days=2))
+        running = self._challenge('running', timedelta(days=-1), status='active')
+        self.assertEqual(upcoming.next_transition_at, upcoming.start_date)
+        self.assertEqual(running.next_transition_at, running.end_date)
+
+    def test_tick_walks_challenge_through_its_lifecycle(self):
+        ch = self._challenge('lifecycle', timedelta(hours=1))
+        part = UserChallengeParticipation.objects.create(user=self.user, challenge=ch, status='in_progress')
+
+        self.assertEqual(sum(update_statuses(self.now).values()), 0)
+
+        counters = update_statuses(ch.start_date)
+        ch.refresh_from_db()
+        self.assertEqual((counters['ch_active'], ch.status, ch.next_transition_at), (1, 'active', ch.end_date))
+
+        counters = update_statuses(ch.end_date + timedelta(seconds=1))
+        ch.refresh_from_db()
+        part.refresh_from_db()
+        self.assertEqual((counters['ch_completed_period'], counters['parts_failed']), (1, 1))
+        self.assertEqual((ch.status, part.status), ('completed_period', 'failed'))
+        self.assertEqual(ch.next_transition_at, ch.end_date + timedelta(days=60))
+
+        counters = update_statuses(ch.end_date + timedelta(days=61))
+        ch.refresh_from_db()
+        self.assertEqual((counters['ch_archived'], ch.status, ch.next_transition_at), (1, 'archived', None))
+
+    def test_tick_only_touches_due_challenges(self):
+        for i in range(5):
+            self._challenge(f'future-{i}', timedelta(days=10 + i))
+        due = self._challenge('due', timedelta(hours=-1))
+        # status still 'upcoming' although it started: one due row, found through the index;
+        # due ids, savepoint, 3 status updates, ended ids, archive, next transition, release
+        with self.assertNumQueries(9):
+            counters = update_statuses()
+        self.assertEqual(counters['ch_active'], 1)
+        due.refresh_from_db()
+        self.assertEqual(due.status, 'active')
+
+    def test_full_pass_repairs_rows_changed_behind_save(self):
+        ch = self._challenge('bulk-edited', timedelta(days=5))
+        Challenge.objects.filter(pk=ch.pk).update(start_date=self.now - timedelta(days=1), next_transition_at=None)
+        self.assertEqual(update_statuses(self.now)['ch_active'], 0)
+        self.assertEqual(update_statuses(self.now, full=True)['ch_active'], 1)
+
+
+class SchedulerTests(SimpleTestCase):
+    class _Lock:
+        def __init__(self, leader=True):
+            self.leader = leader
+            self.released = False
+
+        async def acquire(self):
+            return self.leader
+
+        async def release(self):
+            self.released = True
+
+    def _run(self, scheduler, seconds):
+        async def main():
+            runner = asyncio.create_task(scheduler.run())
+            await asyncio.sleep(seconds)
+            scheduler.stop()
+            await runner
+        asyncio.run(main())
+
+    def test_leader_runs_jobs_with_metrics_and_isolated_failures(self):
+        calls = []
+
+        def boom():
+            raise RuntimeError('nope')
+
+        jobs = [Job('ok', lambda: calls.append(1) or 'done', interval=1, jitter=0), Job('boom', boom, interval=60)]
+        lock = self._Lock()
+        scheduler = Scheduler(jobs, lock=lock, leader_check_interval=0.1)
+        self._run(scheduler, 0.3)
+
+        self.assertTrue(lock.released)
+        status = scheduler.status()
+        self.assertEqual(status['jobs']['ok']['runs'], 1)
+        self.assertEqual(status['jobs']['ok']['last_result'], 'done')
+        self.assertEqual((status['jobs']['boom']['failures'], status['jobs']['boom']['last_error']),
+                         (1, 'RuntimeError: nope'))
+        self.assertGreater(status['jobs']['boom']['next_run_at'], time.time() + 50)
+
+    def test_follower_does_not_run_jobs(self):
+        calls = []
+        scheduler = Scheduler([Job('ok', lambda: calls.append(1), interval=1)], lock=self._Lock(leader=False),
+                              leader_check_interval=0.05)
+        self._run(scheduler, 0.2)
+        self.assertEqual(calls, [])
+        self.assertFalse(scheduler.status()['leader'])
+
+    def test_jitter_bounds_and_config_loading(self):
+        job = Job('j', lambda: None, interval=100, jitter=0.2)
+        rng = random.Random(1)
+        delays = [job.next_delay(rng) for _ in range(200)]
+        self.assertTrue(all(80 <= d <= 120 for d in delays))
+        self.assertGreater(len(set(delays)), 1)
+
+        jobs = load_jobs({
+            'statuses': {'func': 'challenges.services.statuses.update_statuses', 'interval': 60},
+            'thumbs': {'command': 'backfill_comment_thumbs', 'args': ['--limit', '5'], 'interval': 600},
+            'off': {'func': 'os.getcwd', 'interval': 1, 'enabled': False},
+        })
+        self.assertEqual([j.name for j in jobs], ['statuses', 'thumbs'])
+        with self.assertRaises(ValueError):
+            load_jobs({'statuses': {'interval': 60}})
+
+    def test_status_endpoint_serves_json(self):
+        scheduler = Scheduler([Job('ok', lambda: None, interval=60)], lock=self._Lock())
+
+        async def main():
+            server = await serve_status(scheduler, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(b"GET /status HTTP/1.1\r\nHost: x\r\n\r\n")
+            await writer.drain()
+            raw = await reader.read()
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            return raw
+
+        raw = asyncio.run(main())
+        head, body = raw.split(b"\r\n\r\n", 1)
+        self.assertTrue(head.startswith(b"HTTP/1.1 200"))
+        self.assertIn('ok', json.loads(body)['jobs'])
+
+
+class RecurrentChallengeGenerationTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now().replace(microsecond=0)
+
+    def _template(self, slug, start_offset, recurrence='weekly', max_future=1, title=None):
+        start = self.now + start_offset
+        return Challenge.objects.create(
+            title=title or slug, description='-', slug=slug, start_date=start, end_date=start + timedelta(days=6),
+            is_template=True, recurrence_type=recurrence, max_future_instances=max_future,
+        )
+
+    def test_catches_up_missed_periods_and_fills_future_slots(self):
+        from .services.recurrence import generate_recurrent_challenges
+        tmpl = self._template('weekly', timedelta(weeks=-10), max_future=2)
+        with self.assertNumQueries(6):  # templates, overlaps, slugs, savepoint, bulk insert, release
+            self.assertEqual(generate_recurrent_challenges(self.now)['created'], 2)
+        periods = list(tmpl.instances.order_by('start_date').values_list('start_date', 'status'))
+        self.assertEqual([p[1] for p in periods], ['active', 'upcoming'])
+        self.assertLessEqual(periods[0][0], self.now)
+        # slots are full now
+        self.assertEqual(generate_recurrent_challenges(self.now)['created'], 0)
+
+    def test_backfill_missed_and_slug_collisions(self):
+        from .services.recurrence import generate_recurrent_challenges
+        self._template('tmpl-a', timedelta(weeks=-3), title='Eko tydzień')
+        self._template('tmpl-b', timedelta(weeks=-3), title='Eko tydzień')
+        created = generate_recurrent_challenges(self.now, backfill_missed=True)['created']
+        self.assertEqual(created, 6)  # two missed weeks + the current one, per template
+        slugs = list(Challenge.objects.filter(is_template=False).values_list('slug', flat=True))
+        self.assertEqual(len(slugs), len(set(slugs)))
+        self.assertTrue(any(slug.endswith('-2') for slug in slugs))
+        ended = Challenge.objects.filter(is_template=False, status='completed_period')
+        self.assertEqual(ended.count(), 4)
+        self.assertTrue(all(c.next_transition_at for c in ended))
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user(username='alice', password='pass12345')
+        self.bob = User.objects.create_user(username='bob', password='pass12345')
+        self.carol = User.objects.create_user(username='carol', password='pass12345')
+        self.period = leaderboard.period_of()
+
+    def _award(self, user, amount):
+        with self.captureOnCommitCallbacks(execute=True):
+            return EcoPointEvent.objects.create(user=user, amount=amount)
+
+    def test_events_maintain_rollup_and_rank(self):
+        self._award(self.alice, 10)
+        self._award(self.bob, 15)
+        self._award(self.carol, 5)
+        self._award(self.carol, 10)  # ties with bob, but reached 15 later
+
+        entries = leaderboard.top_monthly(self.period)
+        self.assertEqual([(e['rank'], e['username'], e['points']) for e in entries],
+                         [(1, 'bob', 15), (2, 'carol', 15), (3, 'alice', 10)])
+        self.assertEqual(leaderboard.monthly_rank(self.carol, self.period), {'rank': 2, 'points': 15})
+
+        event = EcoPointEvent.objects.filter(user=self.bob).get()
+        with self.captureOnCommitCallbacks(execute=True):
+            event.delete()
+        self.assertEqual(LeaderboardEntry.objects.get(user=self.bob, period=self.period).points, 0)
+        self.assertEqual([e['username'] for e in leaderboard.top_monthly(self.period)], ['carol', 'alice'])
+        self.assertIsNone(leaderboard.monthly_rank(self.bob, self.period))
+
+    def test_top_lists_are_cached_and_invalidated_on_write(self):
+        self._award(self.alice, 10)
+        leaderboard.top_monthly(self.period)
+        with self.assertNumQueries(1):  # only users and profiles of the cached (user_id, points) pairs
+            self.assertEqual(len(leaderboard.top_monthly(self.period)), 1)
+        # names and avatars are not part of the cached list
+        User.objects.filter(pk=self.alice.pk).update(first_name='Alicja', last_name='Nowak')
+        self.assertEqual(leaderboard.top_monthly(self.period)[0]['display_name'], 'Alicja Nowak')
+        self._award(self.bob, 20)
+        self.assertEqual(leaderboard.top_monthly(self.period)[0]['username'], 'bob')
+
+        past = (self.period - timedelta(days=1)).replace(day=1)
+        LeaderboardEntry.objects.create(user=self.carol, period=past, points=7)
+        self.assertEqual(leaderboard.rebuild_period(past), 0)  # no events in that month
+        self.assertEqual(leaderboard.top_monthly(past), [])
+
+    def test_views_use_rollup(self):
+        self._award(self.alice, 10)
+        self.client.force_login(self.alice)
+        response = self.client.get(reverse('challenges:leaderboard_monthly'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['my_rank'], {'rank': 1, 'points': 10})
+        self.assertContains(response, 'alice')
+        response = self.client.get(reverse('challenges:leaderboard'),
+                                   {'year': self.period.year, 'month': self.period.month})
+        self.assertEqual(response.status_code, 200)
+
+    def test_requested_month_is_clamped_to_months_with_data(self):
+        self._award(self.alice, 10)
+        url = reverse('challenges:leaderboard_monthly')
+        for year, month in ((2999, 1), (1999, 5)):
+            response = self.client.get(url, {'year': year, 'month': month})
+            self.assertEqual(response.context['leaderboard_entries'][0]['username'], 'alice')
+        past = (self.period - timedelta(days=1)).replace(day=1)
+        LeaderboardEntry.objects.create(user=self.bob, period=past, points=3)
+        leaderboard.leaderboard_cache.delete_many([leaderboard.FIRST_PERIOD_CACHE_KEY])
+        self.assertEqual(leaderboard.clamp_period(date(1999, 5, 1)), past)
+
+
+class AwardWinnersTests(TestCase):
+    def setUp(self):
+        current = leaderboard.period_of()
+        self.period = (current - timedelta(days=1)).replace(day=1)
+        self.users = []
+        for i, points in enumerate([50, 40, 30, 20, 10]):
+            user = User.objects.create_user(username=f'winner{i}', email=f'w{i}@example.com', password='pass12345')
+            LeaderboardEntry.objects.create(user=user, period=self.period, points=points)
+            self.users.append(user)
+
+    def _award(self, *args):
+        out = io.StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('award_winners', '--places', '4', '--chunk-size', '3', *args, stdout=out)
+        return out.getvalue()
+
+    def test_bulk_issuance_is_idempotent_per_period(self):
+        from taskqueue.models import QueuedTask
+        self._award()
+        batch = CouponBatch.objects.get(key=f'award_winners:{self.period:%Y-%m}')
+        self.assertEqual(batch.issued, 4)
+        awarded = {uc.user_id: uc.coupon for uc in UserCoupon.objects.select_related('coupon')}
+        self.assertEqual([awarded[u.pk].discount for u in self.users[:4]], [20, 15, 10, 10])
+        self.assertNotIn(self.users[4].pk, awarded)
+        self.assertTrue(awarded[self.users[0].pk].code.startswith(f"TOP1-{self.period:%b%Y}".upper()))
+        self.assertEqual(QueuedTask.objects.count(), 1)  # one batched notification task
+
+        self.assertIn('Issued 0 coupon(s), skipped 4', self._award())
+        self.assertEqual(Coupon.objects.count(), 4)
+        self.assertEqual(QueuedTask.objects.count(), 1)
+
+    def test_rerun_queues_grants_left_unnotified_by_an_interrupted_run(self):
+        from taskqueue.models import QueuedTask
+        key = f'award_winners:{self.period:%Y-%m}'
+        # a run that died after committing the coupons, before queueing the emails
+        issue_coupons(key, [Grant(user_id=u.pk, discount=Decimal(10)) for u in self.users[:2]])
+        self.assertIn('Issued 2 coupon(s), skipped 2', self._award())
+        task = QueuedTask.objects.get()
+        self.assertEqual(sorted(n['user_id'] for n in task.args[0]), sorted(u.pk for u in self.users[:4]))
+        self.assertFalse(UserCoupon.objects.filter(notified_at__isnull=True).exists())
+
+        batch = CouponBatch.objects.get(key=key)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            coupon = Coupon.objects.create(code='SECOND', discount=5, valid_from=timezone.now(),
+                                           valid_to=timezone.now(), batch=batch)
+            UserCoupon.objects.create(user=self.users[0], coupon=coupon, batch=batch)
+
+    def test_batched_notifications_and_code_generator(self):
+        sent = send_winner_notifications_task.now([
+            {'user_id': u.pk, 'place': i, 'coupon_code': f'CODE{i}', 'discount_value': 10}
+            for i, u in enumerate(self.users[:3], 1)
+        ])
+        self.assertEqual(sent, 3)
+        self.assertEqual([m.to for m in mail.outbox], [['w0@example.com'], ['w1@example.com'], ['w2@example.com']])
+        self.assertIn('CODE1', mail.outbox[0].body)
+
+        codes = generate_codes(['TOP1-X'] * 500)
+        self.assertEqual(len(set(codes)), 500)
+        self.assertTrue(all(c.startswith('TOP1-X-') for c in codes))
@@ -4,12 +4,13 @@ from django.urls import reverse, reverse_lazy
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.utils import timezone
-from datetime import datetime
-from django.db.models import Sum, Count, F
+from datetime import date
+from django.db.models import Count, F
 from django.db import transaction # Для атомарных операций
-from .models import Challenge, UserChallengeParticipation, Badge, UserBadge, EcoPointEvent
+from .models import Challenge, UserChallengeParticipation, Badge, UserBadge
 from store.models import Profile, UserCoupon # Обновленный импорт
 from .forms import ChallengeParticipationForm # Если вы создали этот файл
+from .services import leaderboard
 from django.views.decorators.http import require_POST
 
 def challenge_list_view(request):
@@ -174,21 +175,10 @@ def my_progress_view(request):
 
 
 def leaderboard_view(request):
-    # Топ пользователей по очкам. Используем select_related для оптимизации запроса к user.
-    top_profiles = Profile.objects.filter(eco_points__gt=0).select_related('user').order_by('-eco_points', 'last_points_update')[:20] 
-
-    # Добавляем ранг для отображения
-    leaderboard_entries = []
-    for i, profile_entry in enumerate(top_profiles):
-        leaderboard_entries.append({
-            'rank': i + 1,
-            'user': profile_entry.user,
-            'eco_points': profile_entry.eco_points,
-            'avatar_url': profile_entry.avatar_url # Используем avatar_url из Profile
-        })
-
+    # Топ пользователей по очкам: кэшированный список, строится по индексу Profile (-eco_points, last_points_update)
     context = {
-        'leaderboard_entries': leaderboard_entries,
+        'leaderboard_entries': leaderboard.top_all_time(),
+        'my_rank': leaderboard.all_time_rank(request.user),
         'page_title': 'Leaderboard Eko-wyzwań',
         'description': 'Zobacz, kto zdobył najwięcej punktów w naszych eko-wyzwaniach! Tutaj znajdziesz najlepszych uczestników, którzy aktywnie dbają o środowisko i zdobywają eko-punkty za swoje działania.',
     }
@@ -196,16 +186,16 @@ def leaderboard_view(request):
 
 
 def leaderboard_monthly_view(request):
-    # Parse optional year/month from query params, default to current month (Warsaw TZ)
+    # Parse optional year/month from query params, default to current month (UTC, like the rollup periods)
     now = timezone.now()
     try:
         year = int(request.GET.get('year', now.year))
         month = int(request.GET.get('month', now.month))
-        # normalize tz-aware start of month
-        naive = datetime(year, month, 1, 0, 0, 0)
-        start = timezone.make_aware(naive, timezone=now.tzinfo) if timezone.is_naive(naive) else naive
+        start = date(year, month, 1)
     except Exception:
-        start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        start = leaderboard.period_of(now)
+    # only months that can have entries (nothing after the current one or before the first rollup row)
+    start = leaderboard.clamp_period(start)
     # compute next/prev month starts
     if start.month == 12:
         next_start = start.replace(year=start.year + 1, month=1)
@@ -216,39 +206,15 @@ def leaderboard_monthly_view(request):
     else:
         prev_start = start.replace(month=start.month - 1)
 
-    qs = (
-        EcoPointEvent.objects.filter(created_at__gte=start, created_at__lt=next_start)
-        .values('user')
-        .annotate(points=Sum('amount'))
-        .order_by('-points')[:20]
-    )
-    # Collect user and profile info
-    from django.contrib.auth import get_user_model
-    User = get_user_model()
-    user_ids = [row['user'] for row in qs]
-    users = {u.id: u for u in User.objects.filter(id__in=user_ids).select_related('profile')}
-
-    leaderboard_entries = []
-    for i, row in enumerate(qs):
-        u = users.get(row['user'])
-        if not u:
-            continue
-        # profile may not exist
-        avatar_url = getattr(getattr(u, 'profile', None), 'avatar_url', None)
-        leaderboard_entries.append({
-            'rank': i + 1,
-            'user': u,
-            'points': row['points'] or 0,
-            'avatar_url': avatar_url,
-        })
-
     context = {
-        'leaderboard_entries': leaderboard_entries,
+        # materialized rollup (LeaderboardEntry); past months are cached for a week
+        'leaderboard_entries': leaderboard.top_monthly(start),
+        'my_rank': leaderboard.monthly_rank(request.user, start),
         'page_title': 'Miesięczny ranking Eko-punktów',
-    'period': start,
-    'prev_year': prev_start.year,
-    'prev_month': prev_start.month,
-    'next_year': next_start.year,
-    'next_month': next_start.month,
+        'period': start,
+        'prev_year': prev_start.year,
+        'prev_month': prev_start.month,
+        'next_year': next_start.year,
+        'next_month': next_start.month,
     }
     return render(request, 'challenges/leaderboard_monthly.html', context)
\ No newline at end of file
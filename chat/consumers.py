@@ -6,6 +6,7 @@ from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser
 
+from common.ratelimit import get_limiter, scope_client_ip
 from .models import ChatRoom, Message
 
 
@@ -59,6 +60,16 @@ class ChatConsumer(AsyncWebsocketConsumer):
             user = self.scope['user']
             client_id = payload.get('client_id')
             reply_to_id = payload.get('reply_to_id')
+            # Same limit as the HTTP send_message view, checked before anything is stored or broadcast
+            limited = await self._hit_rate_limit(user)
+            if not limited.allowed:
+                await self.send(text_data=json.dumps({
+                    'type': 'error',
+                    'client_id': client_id,
+                    'errors': ['Zbyt wiele wiadomości, zwolnij trochę.'],
+                    'retry_after': limited.retry_after,
+                }))
+                return
             msg = await self._create_message(room_id=self.room_id, user_id=user.id, text=text, reply_to_id=reply_to_id)
             # Build reply preview if available
             reply_preview = None
@@ -115,6 +126,14 @@ class ChatConsumer(AsyncWebsocketConsumer):
             'id': event['id'],
         }))
 
+    async def chat_attachment_ready(self, event):
+        # Thumbnail finished in the background; clients swap the placeholder
+        await self.send(text_data=json.dumps({
+            'type': 'attachment_ready',
+            'message_id': event['message_id'],
+            'attachment': event['attachment'],
+        }))
+
     async def chat_typing(self, event):
         # Forward typing indicator to clients
         await self.send(text_data=json.dumps({
@@ -122,6 +141,10 @@ class ChatConsumer(AsyncWebsocketConsumer):
             'user': event.get('user', ''),
         }))
 
+    @database_sync_to_async
+    def _hit_rate_limit(self, user):
+        return get_limiter('chat_message').hit(user=user, ip=scope_client_ip(self.scope))
+
     # DB helpers
     @database_sync_to_async
     def _get_room(self, room_id):
@@ -138,6 +161,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
     def _get_recent_messages(self, room_id: int, user_id: int, limit: int = 30):
         qs = (
             Message.objects.filter(room_id=room_id, is_removed=False)
+            .select_related('user', 'room', 'reply_to__user')
             .prefetch_related('attachments')
             .order_by('-id')[:limit]
         )
@@ -150,13 +174,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 'text': m.text,
                 'created_at': m.created_at.isoformat(),
                 'can_delete': (m.user_id == user_id) or (m.room.owner_id == user_id),
-                'attachments': [
-                    {
-                        'url': a.file.url,
-                        'name': (a.file.name.rsplit('/', 1)[-1] if a.file and a.file.name else ''),
-                    }
-                    for a in m.attachments.all()
-                ],
+                'attachments': [a.to_payload() for a in m.attachments.all()],
                 'reply_to': (
                     {
                         'id': m.reply_to_id,
@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-19 16:34
+
+import django.core.files.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_alter_messageattachment_file'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='messageattachment',
+            name='content_type',
+            field=models.CharField(blank=True, default='', max_length=100, verbose_name='Typ MIME'),
+        ),
+        migrations.AddField(
+            model_name='messageattachment',
+            name='size',
+            field=models.PositiveBigIntegerField(default=0, verbose_name='Rozmiar (bajty)'),
+        ),
+        migrations.AddField(
+            model_name='messageattachment',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Przetwarzanie'), ('ready', 'Gotowy'), ('failed', 'Błąd przetwarzania')], default='ready', max_length=10, verbose_name='Status'),
+        ),
+        migrations.AddField(
+            model_name='messageattachment',
+            name='thumbnail',
+            field=models.ImageField(blank=True, null=True, storage=django.core.files.storage.FileSystemStorage(), upload_to='chat_attachments/thumbs/%Y/%m/', verbose_name='Miniatura'),
+        ),
+    ]
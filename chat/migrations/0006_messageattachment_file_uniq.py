@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-19 20:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_messageattachment_thumbnail_status'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='messageattachment',
+            constraint=models.UniqueConstraint(fields=('file',), name='chat_attachment_file_uniq'),
+        ),
+    ]
@@ -38,21 +38,57 @@ class Message(models.Model):
 
 
 class MessageAttachment(models.Model):
+    STATUS_CHOICES = (
+        ('pending', 'Przetwarzanie'),
+        ('ready', 'Gotowy'),
+        ('failed', 'Błąd przetwarzania'),
+    )
     message = models.ForeignKey(Message, on_delete=models.CASCADE, related_name='attachments', verbose_name='Wiadomość')
     file = models.FileField(
         upload_to='chat_attachments/%Y/%m/',
         storage=get_product_image_storage_instance(),
         verbose_name='Plik'
     )
+    thumbnail = models.ImageField(
+        upload_to='chat_attachments/thumbs/%Y/%m/',
+        storage=get_product_image_storage_instance(),
+        null=True,
+        blank=True,
+        verbose_name='Miniatura'
+    )
+    content_type = models.CharField(max_length=100, blank=True, default='', verbose_name='Typ MIME')
+    size = models.PositiveBigIntegerField(default=0, verbose_name='Rozmiar (bajty)')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='ready', verbose_name='Status')
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         verbose_name = 'Załącznik wiadomości'
         verbose_name_plural = 'Załączniki wiadomości'
+        constraints = [
+            # One stored object backs at most one attachment: upload tickets are single-use
+            models.UniqueConstraint(fields=['file'], name='chat_attachment_file_uniq'),
+        ]
 
     def __str__(self) -> str:
         return f"Załącznik {self.id} do wiadomości {self.message_id}"
 
+    @property
+    def is_image(self) -> bool:
+        if self.content_type:
+            return self.content_type.startswith('image/')
+        return (self.file.name or '').lower().rsplit('.', 1)[-1] in ('png', 'jpg', 'jpeg', 'gif', 'webp', 'bmp')
+
+    def to_payload(self) -> dict:
+        """JSON shape shared by the REST API, WS history and broadcasts."""
+        return {
+            'id': self.id,
+            'url': self.file.url,
+            'name': (self.file.name.rsplit('/', 1)[-1] if self.file and self.file.name else ''),
+            'is_image': self.is_image,
+            'thumb_url': self.thumbnail.url if self.thumbnail else None,
+            'status': self.status,
+        }
+
 
 class ChatInvite(models.Model):
     STATUS_CHOICES = (
@@ -0,0 +1,171 @@
+"""
+Direct-to-storage uploads for chat attachments.
+
+Flow:
+  1. the client asks for an upload ticket (``issue_ticket``) with the file name,
+     MIME type and size; it gets back a URL, form fields and a signed token;
+  2. the file is POSTed straight to storage (S3/MinIO presigned POST in
+     production, the local ``chat:upload_local`` stand-in with FileSystemStorage);
+  3. the message is sent with the tokens; ``claim_uploads`` verifies them and
+     checks that the objects really landed in storage. A ticket is single-use:
+     a key that already backs a ``MessageAttachment`` is rejected, and the
+     unique constraint on ``MessageAttachment.file`` stops concurrent claims.
+
+The web worker never proxies attachment bytes in production.
+"""
+from __future__ import annotations
+
+import os
+import uuid
+from dataclasses import dataclass
+from typing import Iterable, List
+
+from django.conf import settings
+from django.core import signing
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.text import slugify
+
+from chat.models import MessageAttachment
+
+# Chat attachments validation settings
+ALLOWED_MIME_PREFIXES = ['image/']
+ALLOWED_MIME_TYPES = ['application/pdf']
+MAX_FILE_BYTES = 10 * 1024 * 1024  # 10 MB per file
+MAX_TOTAL_BYTES = 40 * 1024 * 1024  # 40 MB per message
+MAX_FILES_PER_MESSAGE = 10
+
+TICKET_SALT = 'chat.upload'
+
+
+class UploadError(Exception):
+    """Raised when an upload ticket is invalid or the object is missing."""
+
+
+@dataclass(frozen=True)
+class ClaimedUpload:
+    key: str
+    content_type: str
+    size: int
+
+
+def attachment_storage():
+    return MessageAttachment._meta.get_field('file').storage
+
+
+def ticket_ttl() -> int:
+    return int(getattr(settings, 'CHAT_UPLOAD_TICKET_TTL', 15 * 60))
+
+
+def validate_file(name: str, content_type: str, size: int) -> List[str]:
+    """Return a list of human-readable errors (empty when the file is acceptable)."""
+    errors = []
+    if size > MAX_FILE_BYTES:
+        errors.append(f"Plik '{name}' przekracza {MAX_FILE_BYTES // (1024*1024)} MB")
+    allowed = any(content_type.startswith(p) for p in ALLOWED_MIME_PREFIXES) or content_type in ALLOWED_MIME_TYPES
+    if not allowed:
+        errors.append(f"Niedozwolony typ pliku dla '{name}'")
+    return errors
+
+
+def build_key(filename: str) -> str:
+    """Storage name under the same upload_to layout as MessageAttachment.file."""
+    base, ext = os.path.splitext(os.path.basename(filename or ''))
+    safe = slugify(base)[:60] or 'plik'
+    now = timezone.now()
+    return f"chat_attachments/{now:%Y}/{now:%m}/{uuid.uuid4().hex[:12]}-{safe}{ext.lower()[:10]}"
+
+
+class LocalUploadBackend:
+    """Stand-in for S3 presigned POST: uploads go to the ``chat:upload_local`` view."""
+
+    def presign(self, token: str, key: str, content_type: str) -> dict:
+        return {'url': reverse('chat:upload_local', args=[token]), 'fields': {}}
+
+
+class S3UploadBackend:
+    """Presigned POST against the bucket behind the attachment storage (S3 or MinIO)."""
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def presign(self, token: str, key: str, content_type: str) -> dict:
+        # Include AWS_LOCATION prefix exactly like storage.save() would
+        object_key = self.storage._normalize_name(key)
+        fields = {'Content-Type': content_type}
+        conditions = [
+            {'Content-Type': content_type},
+            ['content-length-range', 1, MAX_FILE_BYTES],
+        ]
+        cache_control = (getattr(settings, 'AWS_S3_OBJECT_PARAMETERS', None) or {}).get('CacheControl')
+        if cache_control:
+            fields['Cache-Control'] = cache_control
+            conditions.append({'Cache-Control': cache_control})
+        client = self.storage.connection.meta.client
+        post = client.generate_presigned_post(
+            Bucket=self.storage.bucket_name,
+            Key=object_key,
+            Fields=fields,
+            Conditions=conditions,
+            ExpiresIn=ticket_ttl(),
+        )
+        return {'url': post['url'], 'fields': post['fields']}
+
+
+def get_upload_backend():
+    storage = attachment_storage()
+    choice = getattr(settings, 'CHAT_UPLOAD_BACKEND', 'auto')
+    if choice == 's3' or (choice == 'auto' and hasattr(storage, 'bucket_name')):
+        return S3UploadBackend(storage)
+    return LocalUploadBackend()
+
+
+def issue_ticket(*, room_id: int, user_id: int, filename: str, content_type: str, size: int) -> dict:
+    errors = validate_file(filename, content_type, size)
+    if errors:
+        raise UploadError(' · '.join(errors))
+    key = build_key(filename)
+    token = signing.dumps(
+        {'k': key, 'r': room_id, 'u': user_id, 'ct': content_type},
+        salt=TICKET_SALT,
+        compress=True,
+    )
+    ticket = get_upload_backend().presign(token, key, content_type)
+    ticket['token'] = token
+    return ticket
+
+
+def read_ticket(token: str, *, room_id: int = None, user_id: int = None) -> dict:
+    try:
+        data = signing.loads(token, salt=TICKET_SALT, max_age=ticket_ttl())
+    except signing.BadSignature:
+        raise UploadError('Nieprawidłowy lub wygasły bilet przesyłania')
+    if user_id is not None and data.get('u') != user_id:
+        raise UploadError('Bilet przesyłania należy do innego użytkownika')
+    if room_id is not None and data.get('r') != room_id:
+        raise UploadError('Bilet przesyłania dotyczy innego pokoju')
+    return data
+
+
+def claim_uploads(tokens: Iterable[str], *, room_id: int, user_id: int) -> List[ClaimedUpload]:
+    """Verify tickets and the stored objects; returns uploads ready to attach."""
+    storage = attachment_storage()
+    tickets = [read_ticket(token, room_id=room_id, user_id=user_id) for token in list(tokens)[:MAX_FILES_PER_MESSAGE]]
+    keys = [data['k'] for data in tickets]
+    # tickets stay valid for their whole TTL, so reuse is refused by key: one object, one attachment
+    if len(set(keys)) != len(keys) or MessageAttachment.objects.filter(file__in=keys).exists():
+        raise UploadError('Bilet przesyłania został już wykorzystany')
+    claimed = []
+    total = 0
+    for data, key in zip(tickets, keys):
+        if not storage.exists(key):
+            raise UploadError('Plik nie został przesłany do magazynu')
+        size = storage.size(key)
+        if size > MAX_FILE_BYTES:
+            storage.delete(key)
+            raise UploadError(f"Plik przekracza {MAX_FILE_BYTES // (1024*1024)} MB")
+        total += size
+        claimed.append(ClaimedUpload(key=key, content_type=data.get('ct', ''), size=size))
+    if total > MAX_TOTAL_BYTES:
+        raise UploadError(f"Łączny rozmiar przekracza {MAX_TOTAL_BYTES // (1024*1024)} MB")
+    return claimed
@@ -0,0 +1,54 @@
+"""Background tasks for chat attachments."""
+
+import logging
+
+from asgiref.sync import async_to_sync
+from taskqueue import background
+from channels.layers import get_channel_layer
+
+from store.utils.images import generate_variant
+from .models import MessageAttachment
+
+logger = logging.getLogger(__name__)
+
+
+def broadcast_attachment_ready(attachment: MessageAttachment) -> None:
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    async_to_sync(channel_layer.group_send)(
+        f"chat_{attachment.message.room_id}",
+        {
+            'type': 'chat.attachment_ready',
+            'message_id': attachment.message_id,
+            'attachment': attachment.to_payload(),
+        }
+    )
+
+
+def generate_attachment_thumbnail(attachment_id: int) -> bool:
+    """Render the 'chat' image variant for an attachment and notify the room."""
+    try:
+        att = MessageAttachment.objects.select_related('message').get(pk=attachment_id)
+    except MessageAttachment.DoesNotExist:
+        logger.warning("TASK: chat attachment #%s not found, skipping thumbnail", attachment_id)
+        return False
+    if att.status == 'ready' and att.thumbnail:
+        return True
+    try:
+        thumb_name = generate_variant(att.file, 'chat', storage=att.thumbnail.storage)
+        att.thumbnail.name = thumb_name
+        att.status = 'ready'
+        att.save(update_fields=['thumbnail', 'status'])
+    except Exception as e:  # noqa: BLE001 - undecodable image; clients fall back to the original
+        logger.exception("TASK ERROR: thumbnail for chat attachment #%s failed: %s", attachment_id, e)
+        att.status = 'failed'
+        att.save(update_fields=['status'])
+    try:
+        broadcast_attachment_ready(att)
+    except Exception as e:  # noqa: BLE001 - broadcast is best-effort
+        logger.warning("TASK: could not broadcast thumbnail for attachment #%s: %s", attachment_id, e)
+    return att.status == 'ready'
+
+
+generate_attachment_thumbnail_task = background(schedule=0)(generate_attachment_thumbnail)
@@ -0,0 +1,142 @@
+import io
+import shutil
+import tempfile
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from .consumers import ChatConsumer
+from .models import ChatRoom, Message, MessageAttachment
+from .services.uploads import ClaimedUpload
+from .tasks import generate_attachment_thumbnail
+
+User = get_user_model()
+
+
+def _png_bytes(size=(1200, 800)):
+    buf = io.BytesIO()
+    Image.new('RGB', size, (30, 160, 90)).save(buf, format='PNG')
+    return buf.getvalue()
+
+
+class DirectUploadTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root, CHAT_UPLOAD_BACKEND='local')
+        self.override.enable()
+        self.user = User.objects.create_user(username='alice', password='pass12345')
+        self.room = ChatRoom.objects.create(name='Eko', owner=self.user)
+        self.room.members.add(self.user)
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def _ticket(self, name='photo.png', content_type='image/png', size=1000, room=None):
+        return self.client.post(
+            reverse('chat:upload_ticket', args=[(room or self.room).id]),
+            {'name': name, 'content_type': content_type, 'size': size},
+        )
+
+    def test_ticket_rejects_disallowed_type(self):
+        resp = self._ticket(name='x.exe', content_type='application/x-msdownload')
+        self.assertEqual(resp.status_code, 400)
+
+    def test_upload_send_and_thumbnail(self):
+        data = _png_bytes()
+        ticket = self._ticket(size=len(data)).json()
+        self.assertTrue(ticket['ok'])
+        up = self.client.post(ticket['url'], {'file': SimpleUploadedFile('photo.png', data, content_type='image/png')})
+        self.assertEqual(up.status_code, 201)
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            resp = self.client.post(
+                reverse('chat:send_message', args=[self.room.id]),
+                {'text': 'Zdjęcie', 'uploads': [ticket['token']]},
+            )
+        self.assertEqual(resp.status_code, 200, resp.content)
+        self.assertEqual(len(callbacks), 1)  # thumbnail job queued after commit
+        att = MessageAttachment.objects.get(message_id=resp.json()['id'])
+        self.assertEqual(att.status, 'pending')
+        self.assertIsNone(att.to_payload()['thumb_url'])
+
+        self.assertTrue(generate_attachment_thumbnail(att.id))
+        att.refresh_from_db()
+        self.assertEqual(att.status, 'ready')
+        with att.thumbnail.open('rb') as f:
+            thumb = Image.open(f)
+            self.assertLessEqual(max(thumb.size), 480)
+        self.assertTrue(att.to_payload()['thumb_url'])
+
+    def test_ticket_is_single_use(self):
+        data = _png_bytes()
+        ticket = self._ticket(size=len(data)).json()
+        self.client.post(ticket['url'], {'file': SimpleUploadedFile('photo.png', data, content_type='image/png')})
+        send = reverse('chat:send_message', args=[self.room.id])
+        self.assertEqual(self.client.post(send, {'text': 'a', 'uploads': [ticket['token']]}).status_code, 200)
+        resp = self.client.post(send, {'text': 'b', 'uploads': [ticket['token']]})
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn('wykorzystany', resp.json()['errors'][0])
+        self.assertEqual(MessageAttachment.objects.count(), 1)
+
+        # A concurrent send that passed the check before the first one committed hits the constraint
+        att = MessageAttachment.objects.get()
+        raced = [ClaimedUpload(key=att.file.name, content_type='image/png', size=att.size)]
+        with mock.patch('chat.views.claim_uploads', return_value=raced):
+            resp = self.client.post(send, {'text': 'c', 'uploads': [ticket['token']]})
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn('wykorzystany', resp.json()['errors'][0])
+        self.assertEqual(Message.objects.filter(room=self.room).count(), 1)
+
+    def test_token_bound_to_room(self):
+        other = ChatRoom.objects.create(name='Inny', owner=self.user)
+        ticket = self._ticket(room=other).json()
+        resp = self.client.post(
+            reverse('chat:send_message', args=[self.room.id]),
+            {'text': 'x', 'uploads': [ticket['token']]},
+        )
+        self.assertEqual(resp.status_code, 400)
+
+    def test_missing_object_is_rejected(self):
+        ticket = self._ticket().json()
+        resp = self.client.post(
+            reverse('chat:send_message', args=[self.room.id]),
+            {'text': 'x', 'uploads': [ticket['token']]},
+        )
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(MessageAttachment.objects.exists())
+
+
+@override_settings(RATE_LIMITS={'chat_message': (2, 60)})
+class ConsumerRateLimitTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('socket', password='x')
+        self.room = ChatRoom.objects.create(name='Room', owner=self.user)
+
+    async def _exchange(self, count):
+        communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), f'/ws/chat/{self.room.pk}/')
+        communicator.scope['url_route'] = {'kwargs': {'room_id': self.room.pk}}
+        communicator.scope['user'] = self.user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        frames = []
+        for i in range(count):
+            await communicator.send_json_to({'action': 'send', 'text': f'msg {i}', 'client_id': f'c{i}'})
+            frames.append(await communicator.receive_json_from())
+        await communicator.disconnect()
+        return frames
+
+    def test_send_over_websocket_is_rate_limited(self):
+        frames = async_to_sync(self._exchange)(3)
+        self.assertEqual([f['type'] for f in frames], ['message', 'message', 'error'])
+        self.assertEqual(frames[2]['client_id'], 'c2')
+        self.assertEqual(Message.objects.filter(room=self.room).count(), 2)
@@ -9,6 +9,8 @@ urlpatterns = [
     path('rooms/<int:pk>/', views.room_detail, name='room_detail'),
     path('api/rooms/<int:pk>/messages/', views.messages_api, name='messages_api'),
     path('api/rooms/<int:pk>/messages/send/', views.send_message, name='send_message'),
+    path('api/rooms/<int:pk>/uploads/', views.upload_ticket, name='upload_ticket'),
+    path('api/uploads/<str:token>/', views.upload_local, name='upload_local'),
     path('api/messages/<int:msg_id>/delete/', views.delete_message, name='delete_message'),
     path('api/rooms/<int:pk>/invite/', views.send_invite, name='send_invite'),
     path('api/invites/<int:invite_id>/accept/', views.accept_invite, name='accept_invite'),
@@ -2,18 +2,26 @@ from django.contrib.auth.decorators import login_required
 from django.shortcuts import get_object_or_404, redirect, render
 from django.http import JsonResponse, HttpResponseForbidden
 from django.views.decorators.http import require_GET, require_POST
+from django.db import IntegrityError, transaction
 from django.db.models import Q
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 
+from common.ratelimit import client_ip, get_limiter
+
 from .models import ChatRoom, Message, ChatInvite, MessageAttachment
 from .forms import ChatRoomForm, MessageForm
-
-# Chat attachments validation settings
-ALLOWED_MIME_PREFIXES = ['image/']
-ALLOWED_MIME_TYPES = ['application/pdf']
-MAX_FILE_BYTES = 10 * 1024 * 1024  # 10 MB per file
-MAX_TOTAL_BYTES = 40 * 1024 * 1024  # 40 MB per message
+from .services.uploads import (
+    MAX_FILES_PER_MESSAGE,
+    MAX_TOTAL_BYTES,
+    UploadError,
+    attachment_storage,
+    claim_uploads,
+    issue_ticket,
+    read_ticket,
+    validate_file,
+)
+from .tasks import generate_attachment_thumbnail_task
 
 
 @login_required
@@ -54,9 +62,9 @@ def messages_api(request, pk: int):
     if room.is_private and request.user not in room.members.all():
         return JsonResponse({'error': 'forbidden'}, status=403)
     since_id = request.GET.get('since_id')
-    qs = room.messages.filter(is_removed=False).prefetch_related('attachments').order_by('-id')[:50]
+    qs = room.messages.filter(is_removed=False).select_related('user', 'reply_to__user').prefetch_related('attachments').order_by('-id')[:50]
     if since_id and since_id.isdigit():
-        qs = room.messages.filter(is_removed=False, id__gt=int(since_id)).prefetch_related('attachments').order_by('id')[:100]
+        qs = room.messages.filter(is_removed=False, id__gt=int(since_id)).select_related('user', 'reply_to__user').prefetch_related('attachments').order_by('id')[:100]
         iterable = qs
     else:
         # Initial load: reverse newest-first slice to oldest→newest
@@ -74,13 +82,7 @@ def messages_api(request, pk: int):
                     'text': (m.reply_to.text[:120] if m.reply_to and m.reply_to.text else ''),
                 } if m.reply_to_id else None
             ),
-            'attachments': [
-                {
-                    'url': a.file.url,
-                    'name': a.file.name.split('/')[-1],
-                }
-                for a in m.attachments.all()
-            ],
+            'attachments': [a.to_payload() for a in m.attachments.all()],
             'can_delete': (m.user_id == request.user.id) or (room.owner_id == request.user.id),
         }
     for m in iterable
@@ -88,52 +90,126 @@ def messages_api(request, pk: int):
     return JsonResponse({'messages': data})
 
 
+@login_required
+@require_POST
+def upload_ticket(request, pk: int):
+    """Issue a direct-to-storage upload ticket for one attachment."""
+    room = get_object_or_404(ChatRoom, pk=pk)
+    if room.is_private and request.user not in room.members.all():
+        return JsonResponse({'error': 'forbidden'}, status=403)
+    name = (request.POST.get('name') or '').strip()
+    content_type = (request.POST.get('content_type') or '').strip()
+    try:
+        size = int(request.POST.get('size') or 0)
+    except ValueError:
+        size = 0
+    if not name or size <= 0:
+        return JsonResponse({'ok': False, 'errors': ['Brak nazwy lub rozmiaru pliku']}, status=400)
+    try:
+        ticket = issue_ticket(
+            room_id=room.id, user_id=request.user.id,
+            filename=name, content_type=content_type, size=size,
+        )
+    except UploadError as e:
+        return JsonResponse({'ok': False, 'errors': [str(e)]}, status=400)
+    return JsonResponse({'ok': True, **ticket})
+
+
+@login_required
+@require_POST
+def upload_local(request, token: str):
+    """Local stand-in for the S3 presigned POST endpoint (FileSystemStorage, tests)."""
+    try:
+        data = read_ticket(token, user_id=request.user.id)
+    except UploadError as e:
+        return JsonResponse({'ok': False, 'errors': [str(e)]}, status=403)
+    f = request.FILES.get('file')
+    if f is None:
+        return JsonResponse({'ok': False, 'errors': ['Brak pliku']}, status=400)
+    errors = validate_file(f.name, data.get('ct', ''), f.size or 0)
+    if errors:
+        return JsonResponse({'ok': False, 'errors': errors}, status=400)
+    storage = attachment_storage()
+    # FileSystemStorage writes UploadedFile.chunks(), so large files are streamed
+    saved = storage.save(data['k'], f)
+    if saved != data['k']:
+        storage.delete(saved)
+        return JsonResponse({'ok': False, 'errors': ['Konflikt nazwy pliku']}, status=409)
+    return JsonResponse({'ok': True}, status=201)
+
+
 @login_required
 @require_POST
 def send_message(request, pk: int):
     room = get_object_or_404(ChatRoom, pk=pk)
     if room.is_private and request.user not in room.members.all():
         return JsonResponse({'error': 'forbidden'}, status=403)
+    limited = get_limiter('chat_message').hit(user=request.user, ip=client_ip(request))
+    if not limited.allowed:
+        response = JsonResponse({'ok': False, 'errors': ['Zbyt wiele wiadomości, zwolnij trochę.']}, status=429)
+        response['Retry-After'] = str(limited.retry_after)
+        return response
     form = MessageForm(request.POST)
     reply_to_id = request.POST.get('reply_to')
     files = request.FILES.getlist('attachments')
-    # Server-side validation for attachments
+    upload_tokens = request.POST.getlist('uploads')
+    # Server-side validation for attachments sent inline (legacy multipart path)
     total_size = 0
     invalid = []
     for f in files:
         ct = getattr(f, 'content_type', '') or ''
         size = getattr(f, 'size', 0) or 0
-        if size > MAX_FILE_BYTES:
-            invalid.append(f"Plik '{f.name}' przekracza {MAX_FILE_BYTES // (1024*1024)} MB")
-        allowed = any(ct.startswith(p) for p in ALLOWED_MIME_PREFIXES) or ct in ALLOWED_MIME_TYPES
-        if not allowed:
-            invalid.append(f"Niedozwolony typ pliku dla '{f.name}'")
+        invalid.extend(validate_file(f.name, ct, size))
         total_size += size
     if total_size > MAX_TOTAL_BYTES:
         invalid.append(f"Łączny rozmiar przekracza {MAX_TOTAL_BYTES // (1024*1024)} MB")
+    claimed = []
+    if upload_tokens and not invalid:
+        try:
+            claimed = claim_uploads(upload_tokens, room_id=room.id, user_id=request.user.id)
+        except UploadError as e:
+            invalid.append(str(e))
     if invalid:
         return JsonResponse({'ok': False, 'errors': invalid}, status=400)
-    if form.is_valid():
-        msg = form.save(commit=False)
-        msg.room = room
-        msg.user = request.user
-        if reply_to_id and str(reply_to_id).isdigit():
-            try:
-                from .models import Message as Msg
-                msg.reply_to = Msg.objects.filter(room=room).get(pk=int(reply_to_id))
-            except Msg.DoesNotExist:
-                pass
-        msg.save()
-    else:
-        # Allow image-only (or file-only) messages: create an empty-text message if files provided
-        if files:
-            msg = Message.objects.create(room=room, user=request.user, text='')
-        else:
-            return JsonResponse({'ok': False, 'errors': form.errors}, status=400)
-
-    # Save attachments if any (cap to first N to prevent abuse)
-    for f in files[:10]:
-        MessageAttachment.objects.create(message=msg, file=f)
+    try:
+        with transaction.atomic():
+            if form.is_valid():
+                msg = form.save(commit=False)
+                msg.room = room
+                msg.user = request.user
+                if reply_to_id and str(reply_to_id).isdigit():
+                    msg.reply_to = Message.objects.filter(room=room, pk=int(reply_to_id)).select_related('user').first()
+                msg.save()
+            else:
+                # Allow image-only (or file-only) messages: create an empty-text message if files provided
+                if files or claimed:
+                    msg = Message.objects.create(room=room, user=request.user, text='')
+                else:
+                    return JsonResponse({'ok': False, 'errors': form.errors}, status=400)
+
+            # Save attachments if any (cap to first N to prevent abuse)
+            attachments = []
+            for f in files[:MAX_FILES_PER_MESSAGE]:
+                ct = getattr(f, 'content_type', '') or ''
+                attachments.append(MessageAttachment.objects.create(
+                    message=msg, file=f, content_type=ct, size=f.size or 0,
+                    status='pending' if ct.startswith('image/') else 'ready',
+                ))
+            for up in claimed[:MAX_FILES_PER_MESSAGE - len(attachments)]:
+                att = MessageAttachment(
+                    message=msg, content_type=up.content_type, size=up.size,
+                    status='pending' if up.content_type.startswith('image/') else 'ready',
+                )
+                # Object is already in storage; just point the field at it
+                att.file.name = up.key
+                att.save()
+                attachments.append(att)
+            for att in attachments:
+                if att.status == 'pending':
+                    transaction.on_commit(lambda aid=att.id: generate_attachment_thumbnail_task(aid))
+    except IntegrityError:
+        # Another request attached the same upload between claim_uploads() and here
+        return JsonResponse({'ok': False, 'errors': ['Bilet przesyłania został już wykorzystany']}, status=400)
     # Broadcast over WS
     channel_layer = get_channel_layer()
     async_to_sync(channel_layer.group_send)(
@@ -146,10 +222,7 @@ def send_message(request, pk: int):
             'created_at': msg.created_at.isoformat(),
             'user_id': request.user.id,
             'room_owner_id': room.owner_id,
-            'attachments': [
-                {'url': a.file.url, 'name': a.file.name.split('/')[-1]}
-                for a in msg.attachments.all()
-            ],
+            'attachments': [a.to_payload() for a in attachments],
             'reply_to': (
                 {
                     'id': msg.reply_to_id,
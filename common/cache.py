@@ -0,0 +1,433 @@
+"""Cache tiers, per-app key namespaces and hit-ratio counters.
+
+``CACHES`` (config/settings.py):
+
+* ``default`` - Redis (``REDIS_CACHE_URL`` or ``REDIS_URL``), shared by every
+  process and kept across restarts; without Redis each process falls back to
+  its own LocMem cache;
+* ``tiered`` - ``TieredCache``: a per-process LRU (L1) in front of another
+  alias (L2, ``LOCATION``). Reads are served from L1 for at most
+  ``L1_TIMEOUT`` seconds; every write goes to L2 and is broadcast on a Redis
+  pub/sub channel so the other processes drop their L1 copy right away. Meant
+  for hot, read-mostly keys (catalog version, leaderboards). When L2 is itself
+  process-local (LocMem, dummy) L1 is skipped.
+
+``Namespace`` gives an app its own key space - ``<name>:<generation>:<key>``
+with the code-level ``version`` passed as the cache key version - so a whole
+app's keys are dropped with one ``clear()`` (generation bump) and a changed
+payload format only needs a new ``version``::
+
+    leaderboard_cache = Namespace('leaderboard', alias='tiered')
+    leaderboard_cache.get_or_set('all', load_all_time, 300)
+
+``TieredCache`` counts L1 hits, L2 hits and misses per namespace (the part of
+the raw key before the first ``:``) and adds them to a shared hash in L2 every
+``STATS_FLUSH_INTERVAL`` seconds; ``manage.py cache_stats`` reads them back.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import pickle
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.functional import cached_property
+
+logger = logging.getLogger(__name__)
+
+STATS_KEY = 'cache-stats'
+TIERS = ('l1', 'l2', 'miss')
+
+_MISSING = object()
+_stores: Dict[str, '_L1Store'] = {}
+_stores_lock = threading.Lock()
+
+
+def redis_client(cache: BaseCache):
+    """The redis-py client behind Django's RedisCache, or None for other backends."""
+    client = getattr(cache, '_cache', None)
+    get_client = getattr(client, 'get_client', None)
+    return get_client(write=True) if get_client is not None else None
+
+
+class _L1Store:
+    """Per-process LRU for one tiered alias, shared by the per-thread TieredCache instances."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.data: 'OrderedDict[str, tuple]' = OrderedDict()
+        self.lock = threading.Lock()
+        self.origin = uuid.uuid4().hex
+        self.stats: Counter = Counter()
+        self.flushed_at = time.monotonic()
+        self.listener: Optional[threading.Thread] = None
+        self.stopped = threading.Event()
+
+    def get(self, key: str):
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                return _MISSING
+            if item[0] <= time.monotonic():
+                del self.data[key]
+                return _MISSING
+            self.data.move_to_end(key)
+            blob = item[1]
+        return pickle.loads(blob)
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self.data[key] = (time.monotonic() + ttl, blob)
+            self.data.move_to_end(key)
+            while len(self.data) > self.max_entries:
+                self.data.popitem(last=False)
+
+    def discard(self, keys: Iterable[str]) -> None:
+        with self.lock:
+            for key in keys:
+                self.data.pop(key, None)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.data.clear()
+
+    def count(self, key: str, tier: str, n: int = 1) -> None:
+        namespace = key.split(':', 1)[0] if ':' in key else '-'
+        with self.lock:
+            self.stats[f'{namespace}:{tier}'] += n
+
+    def take_stats(self) -> Counter:
+        with self.lock:
+            stats, self.stats = self.stats, Counter()
+            self.flushed_at = time.monotonic()
+        return stats
+
+
+@receiver(setting_changed)
+def _reset_stores(setting, **kwargs):
+    if setting == 'CACHES':
+        with _stores_lock:
+            for store in _stores.values():
+                store.stopped.set()
+            _stores.clear()
+
+
+class TieredCache(BaseCache):
+    def __init__(self, location: str, params: Dict[str, Any]):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._l2_alias = location or 'default'
+        self._l1_timeout = float(options.get('L1_TIMEOUT', 5))
+        self._channel = options.get('CHANNEL', 'cache-invalidate')
+        self._stats_interval = float(options.get('STATS_FLUSH_INTERVAL', 30))
+        with _stores_lock:
+            self._store = _stores.setdefault(f'{self._l2_alias}|{self._channel}', _L1Store(self._max_entries))
+
+    @cached_property
+    def l2(self) -> BaseCache:
+        return caches[self._l2_alias]
+
+    @cached_property
+    def _use_l1(self) -> bool:
+        return not isinstance(self.l2, (LocMemCache, DummyCache))
+
+    # --- invalidation -------------------------------------------------------------------------
+
+    def _ensure_listener(self) -> None:
+        store = self._store
+        if store.listener is not None or redis_client(self.l2) is None:
+            return
+        with _stores_lock:
+            if store.listener is None:
+                store.listener = threading.Thread(target=self._listen, args=(store,), daemon=True,
+                                                  name=f'cache-invalidate-{self._l2_alias}')
+                store.listener.start()
+
+    def _listen(self, store: _L1Store) -> None:
+        while not store.stopped.is_set():
+            pubsub = None
+            try:
+                pubsub = redis_client(self.l2).pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self._channel)
+                while not store.stopped.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if not message or message.get('type') != 'message':
+                        continue
+                    payload = json.loads(message['data'])
+                    if payload.get('origin') == store.origin:
+                        continue
+                    if payload.get('clear'):
+                        store.clear()
+                    else:
+                        store.discard(payload.get('keys', ()))
+            except Exception as e:  # noqa: BLE001 - reconnect; L1 entries expire on their own meanwhile
+                logger.warning("Cache invalidation listener (%s) failed: %s", self._channel, e)
+                # messages published while we were not subscribed are lost: start from an empty L1
+                store.clear()
+                store.stopped.wait(5)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:  # noqa: BLE001
+                        pass
+
+    def _invalidate(self, keys: List[str] = (), clear: bool = False) -> None:
+        if not self._use_l1:
+            return
+        self._ensure_listener()
+        if clear:
+            self._store.clear()
+        else:
+            self._store.discard(keys)
+        client = redis_client(self.l2)
+        if client is None:
+            return
+        try:
+            client.publish(self._channel, json.dumps({'origin': self._store.origin, 'keys': list(keys), 'clear': clear}))
+        except Exception as e:  # noqa: BLE001 - the other processes fall back on the L1 timeout
+            logger.warning("Cache invalidation publish failed: %s", e)
+
+    # --- stats --------------------------------------------------------------------------------
+
+    def _count(self, key: str, tier: str, n: int = 1) -> None:
+        store = self._store
+        store.count(key, tier, n)
+        if time.monotonic() - store.flushed_at >= self._stats_interval:
+            self.flush_stats()
+
+    def flush_stats(self) -> None:
+        """Add this process' counters to the shared ones in L2."""
+        stats = self._store.take_stats()
+        if not stats:
+            return
+        try:
+            client = redis_client(self.l2)
+            if client is not None:
+                pipe = client.pipeline(transaction=False)
+                for field, n in stats.items():
+                    pipe.hincrby(self.l2.make_key(STATS_KEY), field, n)
+                pipe.execute()
+            else:
+                shared = Counter(self.l2.get(STATS_KEY) or {})
+                shared.update(stats)
+                self.l2.set(STATS_KEY, dict(shared), None)
+        except Exception as e:  # noqa: BLE001 - metrics are best-effort
+            logger.warning("Cache stats flush failed: %s", e)
+
+    # --- cache API ----------------------------------------------------------------------------
+
+    def _l1_ttl(self, timeout) -> float:
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        return self._l1_timeout if timeout is None else min(self._l1_timeout, timeout)
+
+    def get(self, key, default=None, version=None):
+        l1_key = self.make_and_validate_key(key, version=version)
+        if self._use_l1:
+            self._ensure_listener()
+            value = self._store.get(l1_key)
+            if value is not _MISSING:
+                self._count(key, 'l1')
+                return value
+        value = self.l2.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            self._count(key, 'miss')
+            return default
+        self._count(key, 'l2')
+        if self._use_l1:
+            self._store.set(l1_key, value, self._l1_timeout)
+        return value
+
+    def get_many(self, keys, version=None):
+        found, remaining = {}, []
+        for key in keys:
+            value = self._store.get(self.make_and_validate_key(key, version=version)) if self._use_l1 else _MISSING
+            if value is _MISSING:
+                remaining.append(key)
+            else:
+                self._count(key, 'l1')
+                found[key] = value
+        if remaining:
+            fetched = self.l2.get_many(remaining, version=version)
+            for key in remaining:
+                if key in fetched:
+                    self._count(key, 'l2')
+                    if self._use_l1:
+                        self._store.set(self.make_and_validate_key(key, version=version), fetched[key], self._l1_timeout)
+                else:
+                    self._count(key, 'miss')
+            found.update(fetched)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        l1_key = self.make_and_validate_key(key, version=version)
+        self.l2.set(key, value, timeout, version=version)
+        self._invalidate([l1_key])
+        ttl = self._l1_ttl(timeout)
+        if self._use_l1 and ttl > 0:
+            self._store.set(l1_key, value, ttl)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.l2.add(key, value, timeout, version=version)
+        if added:
+            self._invalidate([self.make_and_validate_key(key, version=version)])
+        return added
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.l2.set_many(data, timeout, version=version)
+        self._invalidate([self.make_and_validate_key(key, version=version) for key in data])
+        return failed
+
+    def delete(self, key, version=None):
+        deleted = self.l2.delete(key, version=version)
+        self._invalidate([self.make_and_validate_key(key, version=version)])
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self.l2.delete_many(keys, version=version)
+        self._invalidate([self.make_and_validate_key(key, version=version) for key in keys])
+
+    def incr(self, key, delta=1, version=None):
+        value = self.l2.incr(key, delta, version=version)
+        self._invalidate([self.make_and_validate_key(key, version=version)])
+        return value
+
+    def decr(self, key, delta=1, version=None):
+        return self.incr(key, -delta, version=version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.l2.touch(key, timeout, version=version)
+
+    def has_key(self, key, version=None):
+        return self.get(key, _MISSING, version=version) is not _MISSING
+
+    def clear(self):
+        self.l2.clear()
+        self._invalidate(clear=True)
+
+    def close(self, **kwargs):
+        pass
+
+
+class Namespace:
+    """One app's keys: ``<name>:<generation>:<key>``; ``clear()`` bumps the generation instead of deleting."""
+
+    def __init__(self, name: str, *, alias: str = 'default', version: int = 1):
+        self.name = name
+        self.alias = alias
+        self.version = version
+        self._generation_key = f'{name}:generation'
+
+    @property
+    def cache(self) -> BaseCache:
+        return caches[self.alias]
+
+    def _generation(self) -> int:
+        generation = self.cache.get(self._generation_key)
+        if generation is None:
+            self.cache.add(self._generation_key, 1, timeout=None)
+            generation = self.cache.get(self._generation_key) or 1
+        return generation
+
+    def key(self, key: str) -> str:
+        return f'{self.name}:{self._generation()}:{key}'
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.cache.get(self.key(key), default, version=self.version)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        prefix = f'{self.name}:{self._generation()}:'
+        found = self.cache.get_many([prefix + key for key in keys], version=self.version)
+        return {key[len(prefix):]: value for key, value in found.items()}
+
+    def set(self, key: str, value: Any, timeout=DEFAULT_TIMEOUT) -> None:
+        self.cache.set(self.key(key), value, timeout, version=self.version)
+
+    def add(self, key: str, value: Any, timeout=DEFAULT_TIMEOUT) -> bool:
+        return self.cache.add(self.key(key), value, timeout, version=self.version)
+
+    def get_or_set(self, key: str, default, timeout=DEFAULT_TIMEOUT) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = default() if callable(default) else default
+            self.set(key, value, timeout)
+        return value
+
+    def delete(self, key: str) -> None:
+        self.cache.delete(self.key(key), version=self.version)
+
+    def delete_many(self, keys: Iterable[str]) -> None:
+        prefix = f'{self.name}:{self._generation()}:'
+        self.cache.delete_many([prefix + key for key in keys], version=self.version)
+
+    def clear(self) -> None:
+        """Drop every key of the namespace at once; the old entries are left to expire."""
+        try:
+            self.cache.incr(self._generation_key)
+        except ValueError:
+            self.cache.add(self._generation_key, 2, timeout=None)
+
+
+def collect_stats(alias: str = 'tiered') -> Dict[str, Any]:
+    """Shared hit/miss counters per namespace plus Redis' own keyspace figures (when available)."""
+    cache = caches[alias]
+    if isinstance(cache, TieredCache):
+        cache.flush_stats()
+        l2 = cache.l2
+    else:
+        l2 = cache
+    client = redis_client(l2)
+    if client is not None:
+        raw = {k.decode() if isinstance(k, bytes) else k: int(v)
+               for k, v in client.hgetall(l2.make_key(STATS_KEY)).items()}
+    else:
+        raw = l2.get(STATS_KEY) or {}
+    namespaces: Dict[str, Dict[str, Any]] = {}
+    for field, n in raw.items():
+        namespace, _, tier = field.rpartition(':')
+        namespaces.setdefault(namespace, dict.fromkeys(TIERS, 0))[tier] = n
+    for counts in namespaces.values():
+        total = sum(counts[tier] for tier in TIERS)
+        counts['hit_ratio'] = (counts['l1'] + counts['l2']) / total if total else None
+        counts['l1_ratio'] = counts['l1'] / total if total else None
+    server = None
+    if client is not None:
+        try:
+            info = client.info()
+            hits, misses = info.get('keyspace_hits', 0), info.get('keyspace_misses', 0)
+            server = {
+                'keyspace_hits': hits,
+                'keyspace_misses': misses,
+                'hit_ratio': hits / (hits + misses) if hits + misses else None,
+                'used_memory_human': info.get('used_memory_human'),
+                'evicted_keys': info.get('evicted_keys'),
+                'connected_clients': info.get('connected_clients'),
+            }
+        except Exception as e:  # noqa: BLE001 - INFO may be disabled on managed Redis
+            server = {'error': f'{type(e).__name__}: {e}'}
+    return {'namespaces': dict(sorted(namespaces.items())), 'redis': server}
+
+
+def reset_stats(alias: str = 'tiered') -> None:
+    cache = caches[alias]
+    if isinstance(cache, TieredCache):
+        cache._store.take_stats()
+        cache = cache.l2
+    client = redis_client(cache)
+    if client is not None:
+        client.delete(cache.make_key(STATS_KEY))
+    else:
+        cache.delete(STATS_KEY)
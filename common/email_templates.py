@@ -0,0 +1,109 @@
+"""Rendering of email templates with compiled-template and base-context caching.
+
+``render_to_string`` resolves and (with DEBUG, or without the cached loader)
+re-parses the template on every call, and every task rebuilt the same
+support/site context. Here email templates are compiled once per process by a
+dedicated engine with the cached loader, the shared context is computed once
+(and reset when settings change, e.g. in tests), and ``render_batch`` renders
+many emails from one template pair with a single reusable Context::
+
+    text, html = render_email('emails/order_confirmation', {'order': order})
+    pairs = render_batch('challenges/emails/winner_notification', contexts)
+
+Templates are addressed without extension: ``<name>.txt`` and ``<name>.html``
+(either may be missing).
+"""
+from __future__ import annotations
+
+import threading
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.template import Context, Engine, TemplateDoesNotExist, engines
+
+_engine: Optional[Engine] = None
+_engine_lock = threading.RLock()
+
+
+def get_engine() -> Engine:
+    """Copy of the project's Django template engine that always caches compiled templates."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                main = engines['django'].engine
+                loaders = ['django.template.loaders.filesystem.Loader']
+                if main.app_dirs or any('app_directories' in str(loader) for loader in main.loaders):
+                    loaders.append('django.template.loaders.app_directories.Loader')
+                _engine = Engine(
+                    dirs=main.dirs,
+                    loaders=[('django.template.loaders.cached.Loader', loaders)],
+                    libraries=main.libraries,
+                    string_if_invalid=main.string_if_invalid,
+                    file_charset=main.file_charset,
+                    autoescape=main.autoescape,
+                )
+    return _engine
+
+
+@lru_cache(maxsize=1)
+def base_context() -> Dict[str, Any]:
+    """Context shared by every email: support contacts, site name/url and account links."""
+    site_url = getattr(settings, "SITE_URL", None) or None
+    site_name = None
+    if site_url:
+        try:
+            netloc = urlparse(site_url).netloc
+            site_name = netloc.split(":")[0] if netloc else None
+        except Exception:  # noqa: BLE001
+            site_name = None
+    base = site_url.rstrip('/') if site_url else None
+    return {
+        "support_email": getattr(settings, "SUPPORT_EMAIL", None) or getattr(settings, "DEFAULT_FROM_EMAIL", None),
+        "support_phone": getattr(settings, "SUPPORT_PHONE", ""),
+        "support_address": getattr(settings, "SUPPORT_ADDRESS", ""),
+        "site_name": site_name or "EcoMarket",
+        "site_url": site_url,
+        "profile_url": f"{base}/store/profile/edit/" if base else None,
+        "orders_url": f"{base}/store/orders/" if base else None,
+    }
+
+
+@receiver(setting_changed)
+def _reset_caches(setting, **kwargs):
+    global _engine
+    if setting in ('TEMPLATES', 'INSTALLED_APPS', 'LANGUAGE_CODE', 'LANGUAGES', 'LOCALE_PATHS'):
+        _engine = None
+    base_context.cache_clear()
+
+
+def _template(name: str):
+    try:
+        return get_engine().get_template(name)
+    except TemplateDoesNotExist:
+        return None
+
+
+def render_batch(name: str, contexts: Iterable[Dict[str, Any]]) -> List[Tuple[str, str]]:
+    """(text, html) per context; templates are looked up once and the base context layer is shared."""
+    text_tpl, html_tpl = _template(f"{name}.txt"), _template(f"{name}.html")
+    if text_tpl is None and html_tpl is None:
+        raise TemplateDoesNotExist(f"{name}.txt / {name}.html")
+    engine = get_engine()
+    context = Context(dict(base_context()), autoescape=engine.autoescape)
+    results = []
+    for extra in contexts:
+        with context.push(extra):
+            results.append((
+                text_tpl.render(context) if text_tpl is not None else '',
+                html_tpl.render(context) if html_tpl is not None else '',
+            ))
+    return results
+
+
+def render_email(name: str, context: Optional[Dict[str, Any]] = None) -> Tuple[str, str]:
+    return render_batch(name, [context or {}])[0]
@@ -0,0 +1,207 @@
+"""Sliding-window rate limiting backed by the Django cache.
+
+Counters live in the cache configured by ``RATE_LIMIT_CACHE_ALIAS`` so every
+worker shares them; if that cache is unreachable the limiter degrades to a
+per-process in-memory store instead of failing the request. Limits per scope
+come from ``settings.RATE_LIMITS`` (``{scope: (max_hits, window_seconds)}``).
+
+Usage::
+
+    result = get_limiter('blog_comment').hit(user=request.user, ip=client_ip(request))
+    if not result.allowed:
+        return JsonResponse({'error': ...}, status=429)
+"""
+from __future__ import annotations
+
+import logging
+import math
+import threading
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMIT = (10, 60)
+
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    count: float  # estimated hits in the sliding window (before this one)
+    limit: int
+    retry_after: int  # seconds; 0 when allowed
+
+
+class LocalCounterStore:
+    """Process-local fallback with the same get_many/incr interface as the cache store."""
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, int]:
+        now = time.monotonic()
+        with self._lock:
+            found = {}
+            for key in keys:
+                item = self._data.get(key)
+                if item and item[1] > now:
+                    found[key] = item[0]
+            return found
+
+    def incr(self, key: str, ttl: int) -> None:
+        now = time.monotonic()
+        with self._lock:
+            value, expires = self._data.get(key, (0, 0.0))
+            if expires <= now:
+                value, expires = 0, now + ttl
+            self._data[key] = (value + 1, expires)
+            if len(self._data) > 10000:
+                self._data = {k: v for k, v in self._data.items() if v[1] > now}
+
+    def decr(self, key: str) -> None:
+        with self._lock:
+            item = self._data.get(key)
+            if item and item[0] > 0:
+                self._data[key] = (item[0] - 1, item[1])
+
+
+class CacheCounterStore:
+    def __init__(self, alias: str):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, int]:
+        return self.cache.get_many(list(keys))
+
+    def incr(self, key: str, ttl: int) -> None:
+        cache = self.cache
+        if not cache.add(key, 1, timeout=ttl):
+            try:
+                cache.incr(key)
+            except ValueError:  # expired between add() and incr()
+                cache.add(key, 1, timeout=ttl)
+
+    def decr(self, key: str) -> None:
+        try:
+            self.cache.decr(key)
+        except ValueError:  # already expired, nothing to give back
+            pass
+
+
+_local_store = LocalCounterStore()
+
+
+class SlidingWindowLimiter:
+    """
+    Sliding-window counter: the estimate is ``previous_bucket * overlap + current_bucket``,
+    which needs two counters per identity instead of a log of timestamps.
+    """
+
+    def __init__(self, scope: str, limit: int, window: int, *, cache_alias: Optional[str] = None):
+        self.scope = scope
+        self.limit = int(limit)
+        self.window = int(window)
+        self.store = CacheCounterStore(cache_alias or getattr(settings, 'RATE_LIMIT_CACHE_ALIAS', 'default'))
+
+    def _keys(self, ident: str, bucket: int) -> Tuple[str, str]:
+        prefix = f"rl:{self.scope}:{ident}"
+        return f"{prefix}:{bucket - 1}", f"{prefix}:{bucket}"
+
+    @staticmethod
+    def identities(user=None, ip: Optional[str] = None, key: Optional[str] = None) -> List[str]:
+        idents = []
+        if user is not None and getattr(user, 'is_authenticated', False):
+            idents.append(f"u{user.pk}")
+        if ip:
+            idents.append(f"ip{ip}")
+        if key:
+            idents.append(f"k{key}")
+        return idents
+
+    def _estimate(self, store, idents: List[str], now: float) -> float:
+        bucket = int(now // self.window)
+        overlap = 1 - (now % self.window) / self.window
+        keys = {ident: self._keys(ident, bucket) for ident in idents}
+        values = store.get_many([k for pair in keys.values() for k in pair])
+        worst = 0.0
+        for prev_key, cur_key in keys.values():
+            worst = max(worst, values.get(prev_key, 0) * overlap + values.get(cur_key, 0))
+        return worst
+
+    def _retry_after(self, now: float) -> int:
+        # Upper bound: when the current bucket rolls over its weight starts decaying
+        return max(1, math.ceil(self.window - (now % self.window)))
+
+    def hit(self, *, user=None, ip: Optional[str] = None, key: Optional[str] = None,
+            peek: bool = False) -> RateLimitResult:
+        """
+        Record one hit for every identity (user, IP, free-form key) unless any of them is over the limit.
+
+        With ``peek=True`` nothing is recorded. Otherwise the hit is counted first and checked
+        afterwards (and given back when over the limit), so concurrent requests cannot all take
+        the last free slot.
+        """
+        idents = self.identities(user, ip, key)
+        if not idents:
+            return RateLimitResult(True, 0, self.limit, 0)
+        now = time.time()
+        try:
+            return self._hit(self.store, idents, now, peek)
+        except Exception as e:  # noqa: BLE001 - cache outage must not take the endpoint down
+            logger.warning("Rate limit cache unavailable for scope %s, using local counters: %s", self.scope, e)
+            return self._hit(_local_store, idents, now, peek)
+
+    def _hit(self, store, idents: List[str], now: float, peek: bool) -> RateLimitResult:
+        if peek:
+            count = self._estimate(store, idents, now)
+            if count >= self.limit:
+                return RateLimitResult(False, count, self.limit, self._retry_after(now))
+            return RateLimitResult(True, count, self.limit, 0)
+        bucket = int(now // self.window)
+        keys = [self._keys(ident, bucket)[1] for ident in idents]
+        for key in keys:
+            store.incr(key, ttl=self.window * 2)
+        count = self._estimate(store, idents, now) - 1  # without our own hit
+        if count >= self.limit:
+            for key in keys:
+                store.decr(key)
+            return RateLimitResult(False, count, self.limit, self._retry_after(now))
+        return RateLimitResult(True, count, self.limit, 0)
+
+    def reset(self, *, user=None, ip: Optional[str] = None, key: Optional[str] = None) -> None:
+        bucket = int(time.time() // self.window)
+        keys = [k for ident in self.identities(user, ip, key) for k in self._keys(ident, bucket)]
+        try:
+            caches[self.store.alias].delete_many(keys)
+        except Exception:  # noqa: BLE001
+            pass
+
+
+def get_limiter(scope: str, subject=None) -> SlidingWindowLimiter:
+    """
+    Limiter for ``scope`` as configured in RATE_LIMITS. ``subject`` (e.g. a post id) gives each
+    object its own counters under the same limit.
+    """
+    limit, window = getattr(settings, 'RATE_LIMITS', {}).get(scope, DEFAULT_LIMIT)
+    return SlidingWindowLimiter(scope if subject is None else f"{scope}:{subject}", limit, window)
+
+
+def client_ip(request) -> Optional[str]:
+    """First address from X-Forwarded-For (we run behind a proxy), else REMOTE_ADDR."""
+    return request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')[0].strip() or request.META.get('REMOTE_ADDR')
+
+
+def scope_client_ip(scope) -> Optional[str]:
+    """The same as client_ip() for an ASGI scope (WebSocket consumers)."""
+    headers = dict(scope.get('headers') or [])
+    forwarded = headers.get(b'x-forwarded-for', b'').decode('latin-1').split(',')[0].strip()
+    if forwarded:
+        return forwarded
+    client = scope.get('client')
+    return client[0] if client else None
@@ -0,0 +1,310 @@
+"""Long-running asyncio scheduler for periodic maintenance jobs (``manage.py run_scheduler``).
+
+Replaces spawning ``manage.py cron_tick`` (a full Django start-up) on every
+tick: one process stays up and runs the jobs from ``settings.SCHEDULER_JOBS``::
+
+    SCHEDULER_JOBS = {
+        'challenge_statuses': {'func': 'challenges.services.statuses.update_statuses', 'interval': 60},
+        'stripe_sync': {'command': 'sync_stripe_subscriptions', 'args': ['--only-active'], 'interval': 6 * 3600},
+    }
+
+* every run is followed by ``interval`` seconds +/- ``jitter`` (fraction), so
+  replicas restarted together do not hit the database in lock-step;
+* jobs run in a small thread pool (the ORM is synchronous) and never overlap
+  with themselves;
+* only the replica holding a PostgreSQL session advisory lock runs jobs, the
+  others keep retrying and take over if the leader's connection goes away
+  (other databases have no advisory locks: every process acts as leader);
+* per-job metrics (runs, failures, last/avg/max duration, last error) are
+  served as JSON by a tiny HTTP status endpoint inside the same event loop.
+"""
+import asyncio
+import io
+import json
+import logging
+import os
+import random
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import close_old_connections, connections
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOCK_ID = 0x45434F53  # "ECOS"
+DEFAULT_JITTER = 0.1
+
+
+@dataclass
+class JobStats:
+    runs: int = 0
+    failures: int = 0
+    running: bool = False
+    last_started_at: Optional[float] = None
+    last_finished_at: Optional[float] = None
+    last_duration: Optional[float] = None
+    total_duration: float = 0.0
+    max_duration: float = 0.0
+    last_result: str = ''
+    last_error: str = ''
+    next_run_at: Optional[float] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data['avg_duration'] = self.total_duration / self.runs if self.runs else None
+        return data
+
+
+@dataclass
+class Job:
+    name: str
+    func: Callable[[], Any]
+    interval: float
+    jitter: float = DEFAULT_JITTER
+    run_at_start: bool = True
+    stats: JobStats = field(default_factory=JobStats)
+
+    def next_delay(self, rng: random.Random) -> float:
+        return max(1.0, self.interval * (1 + rng.uniform(-self.jitter, self.jitter)))
+
+
+def _run_command(name: str, args: Iterable[str]) -> str:
+    out = io.StringIO()
+    call_command(name, *args, stdout=out, stderr=out)
+    lines = [ln for ln in out.getvalue().splitlines() if ln.strip()]
+    return lines[-1] if lines else ''
+
+
+def job_from_config(name: str, cfg: Dict[str, Any]) -> Job:
+    """Build a Job from one SCHEDULER_JOBS entry: ``func`` (dotted path + ``kwargs``) or ``command`` (+ ``args``)."""
+    if 'func' in cfg:
+        func = partial(import_string(cfg['func']), **cfg.get('kwargs', {}))
+    elif 'command' in cfg:
+        func = partial(_run_command, cfg['command'], list(cfg.get('args', ())))
+    else:
+        raise ValueError(f"Scheduler job {name!r} needs 'func' or 'command'")
+    return Job(
+        name=name,
+        func=func,
+        interval=float(cfg['interval']),
+        jitter=float(cfg.get('jitter', DEFAULT_JITTER)),
+        run_at_start=bool(cfg.get('run_at_start', True)),
+    )
+
+
+def load_jobs(config: Optional[Dict[str, Dict[str, Any]]] = None, only: Optional[Iterable[str]] = None) -> List[Job]:
+    config = getattr(settings, 'SCHEDULER_JOBS', {}) if config is None else config
+    only = set(only or ())
+    unknown = only - set(config)
+    if unknown:
+        raise ValueError(f"Unknown scheduler job(s): {', '.join(sorted(unknown))}")
+    return [
+        job_from_config(name, cfg) for name, cfg in config.items()
+        if cfg.get('enabled', True) and (not only or name in only)
+    ]
+
+
+class AdvisoryLock:
+    """
+    Session-level ``pg_try_advisory_lock`` held on the connection of one dedicated thread
+    (Django connections are per thread). Losing that connection releases the lock server-side,
+    so the holder re-checks it on every call and steps down when it is gone.
+    """
+
+    def __init__(self, lock_id: int = DEFAULT_LOCK_ID, alias: str = 'default'):
+        self.lock_id = lock_id
+        self.alias = alias
+        self.held = False
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='scheduler-lock')
+        self._warned = False
+
+    def _check(self) -> bool:
+        conn = connections[self.alias]
+        if conn.vendor != 'postgresql':
+            if not self._warned:
+                logger.warning("Scheduler: advisory locks need PostgreSQL (%s); assuming a single replica.", conn.vendor)
+                self._warned = True
+            return True
+        try:
+            with conn.cursor() as cursor:
+                if self.held:
+                    cursor.execute(
+                        "SELECT 1 FROM pg_locks WHERE locktype = 'advisory' AND granted AND pid = pg_backend_pid()"
+                        " AND classid = %s AND objid = %s AND objsubid = 1",
+                        [self.lock_id >> 32, self.lock_id & 0xFFFFFFFF],
+                    )
+                    return cursor.fetchone() is not None
+                cursor.execute("SELECT pg_try_advisory_lock(%s)", [self.lock_id])
+                return bool(cursor.fetchone()[0])
+        except Exception as e:  # noqa: BLE001 - a dead connection means the lock is gone too
+            logger.warning("Scheduler: advisory lock check failed: %s", e)
+            conn.close()
+            return False
+
+    def _release(self) -> None:
+        conn = connections[self.alias]
+        if conn.vendor == 'postgresql' and self.held:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT pg_advisory_unlock(%s)", [self.lock_id])
+            except Exception:  # noqa: BLE001
+                pass
+        conn.close()
+
+    async def acquire(self) -> bool:
+        self.held = await asyncio.get_running_loop().run_in_executor(self._executor, self._check)
+        return self.held
+
+    async def release(self) -> None:
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._release)
+        self.held = False
+        self._executor.shutdown(wait=False)
+
+
+class Scheduler:
+    def __init__(self, jobs: List[Job], *, lock=None, max_workers: int = 4,
+                 leader_check_interval: float = 15.0, rng: Optional[random.Random] = None):
+        self.jobs = jobs
+        self.lock = lock if lock is not None else AdvisoryLock(getattr(settings, 'SCHEDULER_LOCK_ID', DEFAULT_LOCK_ID))
+        self.leader_check_interval = leader_check_interval
+        self.rng = rng or random.Random()
+        self.is_leader = False
+        self.started_at = time.time()
+        self.heartbeat_at: Optional[float] = None
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='scheduler-job')
+        self._tasks: set = set()
+        self._stop = asyncio.Event()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def status(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            'host': socket.gethostname(),
+            'pid': os.getpid(),
+            'leader': self.is_leader,
+            'uptime': round(now - self.started_at, 1),
+            'heartbeat_age': round(now - self.heartbeat_at, 1) if self.heartbeat_at else None,
+            'jobs': {job.name: {'interval': job.interval, **job.stats.as_dict()} for job in self.jobs},
+        }
+
+    def _call(self, job: Job):
+        close_old_connections()
+        try:
+            return job.func()
+        finally:
+            close_old_connections()
+
+    async def run_job(self, job: Job) -> None:
+        stats = job.stats
+        stats.running = True
+        stats.last_started_at = time.time()
+        started = time.perf_counter()
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self._executor, self._call, job)
+            stats.last_result = str(result)[:500] if result is not None else ''
+            stats.last_error = ''
+        except Exception as e:  # noqa: BLE001 - one failing job must not stop the others
+            stats.failures += 1
+            stats.last_error = f"{type(e).__name__}: {e}"[:500]
+            logger.exception("Scheduler job %s failed", job.name)
+        finally:
+            elapsed = time.perf_counter() - started
+            stats.runs += 1
+            stats.running = False
+            stats.last_duration = elapsed
+            stats.total_duration += elapsed
+            stats.max_duration = max(stats.max_duration, elapsed)
+            stats.last_finished_at = time.time()
+            stats.next_run_at = stats.last_finished_at + job.next_delay(self.rng)
+            logger.info("Scheduler job %s finished in %.3fs", job.name, elapsed)
+
+    def _become_leader(self) -> None:
+        now = time.time()
+        for job in self.jobs:
+            job.stats.next_run_at = now if job.run_at_start else now + job.next_delay(self.rng)
+
+    async def run(self) -> None:
+        next_leader_check = 0.0
+        try:
+            while not self._stop.is_set():
+                now = time.time()
+                if now >= next_leader_check:
+                    leader = await self.lock.acquire()
+                    if leader and not self.is_leader:
+                        logger.info("Scheduler: acquired leadership (%s/%s)", socket.gethostname(), os.getpid())
+                        self._become_leader()
+                    elif self.is_leader and not leader:
+                        logger.warning("Scheduler: lost leadership; pausing jobs")
+                    self.is_leader = leader
+                    next_leader_check = now + self.leader_check_interval
+                self.heartbeat_at = now
+
+                wake_at = next_leader_check
+                if self.is_leader:
+                    for job in self.jobs:
+                        if job.stats.running:
+                            continue
+                        if job.stats.next_run_at is not None and job.stats.next_run_at <= now:
+                            task = asyncio.create_task(self.run_job(job))
+                            self._tasks.add(task)
+                            task.add_done_callback(self._tasks.discard)
+                        elif job.stats.next_run_at is not None:
+                            wake_at = min(wake_at, job.stats.next_run_at)
+                try:
+                    await asyncio.wait_for(self._stop.wait(), timeout=max(0.05, min(wake_at - time.time(), 1.0)))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if self._tasks:
+                await asyncio.wait(self._tasks)
+            await self.lock.release()
+            self._executor.shutdown(wait=False)
+            self.is_leader = False
+
+    async def run_once(self) -> None:
+        """Run every job once (in order) without leader election; used by ``run_scheduler --once``."""
+        for job in self.jobs:
+            await self.run_job(job)
+        self._executor.shutdown(wait=False)
+
+
+async def serve_status(scheduler: Scheduler, host: str, port: int):
+    """
+    Minimal HTTP endpoint in the scheduler's event loop:
+    ``GET /status`` -> JSON metrics, ``GET /healthz`` -> 200 while the loop keeps ticking.
+    """
+
+    async def handle(reader, writer):
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            path = request_line[1] if len(request_line) > 1 else '/'
+            if path.startswith('/status'):
+                status, body = 200, scheduler.status()
+            elif path.startswith('/healthz'):
+                age = scheduler.status()['heartbeat_age']
+                healthy = age is not None and age < max(30.0, scheduler.leader_check_interval * 2)
+                status, body = (200 if healthy else 503), {'ok': healthy, 'leader': scheduler.is_leader}
+            else:
+                status, body = 404, {'error': 'not found'}
+            data = json.dumps(body).encode('utf-8')
+            reason = {200: 'OK', 404: 'Not Found', 503: 'Service Unavailable'}[status]
+            writer.write(
+                f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode('latin-1') + data
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
@@ -0,0 +1,186 @@
+"""Hybrid session engine (``SESSION_ENGINE = 'common.sessions'``).
+
+* Anonymous sessions that fit in ``SESSION_COOKIE_MAX_BYTES`` (a small cart,
+  a captcha answer) live in a signed cookie, as in Django's
+  ``signed_cookies`` backend: browsing and filling a cart never touches
+  ``django_session``.
+* Authenticated sessions - and anonymous ones that outgrow the cookie - are
+  stored server-side by ``cached_db``: reads come from the cache, writes go
+  through to the database. Logging in moves the session server-side (and
+  gives it a fresh key), so login state is never carried in a cookie.
+* Saves are dirty-tracked: a session whose data did not change since it was
+  loaded is not rewritten, even when code marked it modified, until
+  ``SESSION_REFRESH_INTERVAL`` has passed (to push the expiry forward).
+* ``clear_expired`` (``manage.py clearsessions`` and the ``session_sweep``
+  scheduler job) deletes expired rows in batches instead of one long DELETE.
+
+Signed-cookie keys change on every save; use ``session_identifier`` where a
+stable id of the visitor's session is stored.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY as AUTH_SESSION_KEY
+from django.contrib.sessions.backends.base import CreateError
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.core import signing
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+logger = logging.getLogger(__name__)
+
+COOKIE_SALT = 'common.sessions'
+SAVED_AT_KEY = '_saved_at'
+IDENTIFIER_KEY = '_sid'
+SWEEP_BATCH_SIZE = 5000
+
+
+def is_cookie_key(session_key: Optional[str]) -> bool:
+    # server keys are 32 lowercase alphanumerics; signed payloads always contain ':'
+    return bool(session_key) and ':' in session_key
+
+
+def session_identifier(session) -> str:
+    """Stable id of the visitor's session, whatever the storage."""
+    key = session.session_key
+    if key and not is_cookie_key(key):
+        return key
+    identifier = session.get(IDENTIFIER_KEY)
+    if not identifier:
+        identifier = session[IDENTIFIER_KEY] = get_random_string(32)
+    return identifier
+
+
+class SessionStore(CachedDBStore):
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self._loaded_fingerprint: Optional[bytes] = None
+
+    # --- dirty tracking -----------------------------------------------------------------------
+
+    def _fingerprint(self, data: Dict[str, Any]) -> bytes:
+        return json.dumps({k: v for k, v in data.items() if k != SAVED_AT_KEY}, sort_keys=True,
+                          separators=(',', ':'), cls=DjangoJSONEncoder).encode()
+
+    def _unchanged(self, data: Dict[str, Any]) -> bool:
+        if not self.session_key or self._loaded_fingerprint is None:
+            return False
+        refresh = getattr(settings, 'SESSION_REFRESH_INTERVAL', settings.SESSION_COOKIE_AGE // 2)
+        if time.time() - data.get(SAVED_AT_KEY, 0) >= refresh:
+            return False
+        return self._fingerprint(data) == self._loaded_fingerprint
+
+    # --- storage ------------------------------------------------------------------------------
+
+    def load(self):
+        if is_cookie_key(self.session_key):
+            try:
+                data = signing.loads(self.session_key, serializer=self.serializer, salt=COOKIE_SALT,
+                                     max_age=self.get_session_cookie_age())
+            except Exception:  # noqa: BLE001 - bad signature, expired or corrupted: start over
+                data = {}
+                self._session_key = None
+        else:
+            data = super().load()
+        self._loaded_fingerprint = self._fingerprint(data) if self.session_key else None
+        return data
+
+    def _cookie_key(self, data: Dict[str, Any]) -> Optional[str]:
+        """Signed payload for ``data`` when it may live in the cookie, else None."""
+        if AUTH_SESSION_KEY in data:
+            return None
+        key = signing.dumps(data, compress=True, salt=COOKIE_SALT, serializer=self.serializer)
+        return key if len(key) <= getattr(settings, 'SESSION_COOKIE_MAX_BYTES', 2048) else None
+
+    def save(self, must_create=False):
+        data = self._get_session(no_load=must_create)
+        if not must_create and self._unchanged(data):
+            return
+        data[SAVED_AT_KEY] = int(time.time())
+        cookie_key = self._cookie_key(data)
+        if cookie_key is not None:
+            if self.session_key and not is_cookie_key(self.session_key):
+                super().delete(self.session_key)
+            self._session_key = cookie_key
+        elif self.session_key and not is_cookie_key(self.session_key):
+            super().save(must_create=must_create)
+        else:
+            self._create_server_session()
+        self._loaded_fingerprint = self._fingerprint(data)
+        self.modified = True
+
+    def _create_server_session(self) -> None:
+        while True:
+            self._session_key = self._get_new_session_key()
+            try:
+                super().save(must_create=True)
+            except CreateError:
+                continue
+            return
+
+    def create(self):
+        # the storage is picked (and the key generated) by save()
+        self._session_key = None
+        self._loaded_fingerprint = None
+        self.modified = True
+
+    def exists(self, session_key):
+        return not is_cookie_key(session_key) and super().exists(session_key)
+
+    def delete(self, session_key=None):
+        key = session_key if session_key is not None else self.session_key
+        if key and not is_cookie_key(key):
+            super().delete(key)
+        if session_key is None:
+            self._session_key = None
+            self._session_cache = {}
+            self.modified = True
+
+    async def aload(self):
+        return await sync_to_async(self.load)()
+
+    async def asave(self, must_create=False):
+        return await sync_to_async(self.save)(must_create=must_create)
+
+    async def acreate(self):
+        return self.create()
+
+    async def aexists(self, session_key):
+        return await sync_to_async(self.exists)(session_key)
+
+    async def adelete(self, session_key=None):
+        return await sync_to_async(self.delete)(session_key)
+
+    # --- sweeping -----------------------------------------------------------------------------
+
+    @classmethod
+    def clear_expired(cls, batch_size: int = SWEEP_BATCH_SIZE) -> int:
+        """Delete expired server-side sessions ``batch_size`` rows at a time; returns the number deleted."""
+        model = cls.get_model_class()
+        now = timezone.now()
+        deleted = 0
+        while True:
+            keys = list(model.objects.filter(expire_date__lt=now).order_by()
+                        .values_list('session_key', flat=True)[:batch_size])
+            if not keys:
+                return deleted
+            deleted += model.objects.filter(session_key__in=keys).delete()[0]
+
+    @classmethod
+    async def aclear_expired(cls):
+        return await sync_to_async(cls.clear_expired)()
+
+
+def sweep_expired(batch_size: int = SWEEP_BATCH_SIZE) -> Dict[str, int]:
+    """Scheduler job: batched ``clearsessions`` for this engine."""
+    deleted = SessionStore.clear_expired(batch_size=batch_size)
+    if deleted:
+        logger.info("Session sweep: deleted %s expired session(s)", deleted)
+    return {'deleted': deleted}
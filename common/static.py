@@ -0,0 +1,166 @@
+"""Static assets: minified, fingerprinted and precompressed at build time, served from memory.
+
+``collectstatic`` (the build step, nixpacks.toml) runs through
+``MinifiedManifestStaticFilesStorage`` (``STORAGES['staticfiles']`` outside
+DEBUG). It works in four steps:
+
+* CSS and JS are minified (``rcssmin``/``rjsmin``) before they are hashed, so
+  the fingerprint is the hash of what is actually served;
+* every file gets a content hash in its name (``css/base.3f2a9c1e.css``) and
+  ``{% static %}`` resolves names through the manifest;
+* text assets are precompressed next to the hashed file as ``.br`` (when
+  ``Brotli`` is installed) and ``.gz``;
+* the unhashed copies are dropped (``WHITENOISE_KEEP_ONLY_HASHED_FILES``).
+
+``MemoryWhiteNoiseMiddleware`` serves hashed files with one-year
+``immutable`` cache headers. It keeps the bytes of requested files in
+process memory, up to ``STATIC_MEMORY_CACHE_LIMIT`` in total and
+``STATIC_MEMORY_CACHE_MAX_FILE_SIZE`` per file: the first request reads a
+file (or its ``.br``/``.gz`` variant) from disk, later ones don't touch the
+filesystem. ``preload_links()`` resolves ``STATIC_PRELOAD`` (critical CSS/JS)
+to hashed URLs for ``<link rel="preload">`` (``{% static_preload %}``).
+
+Without ``rcssmin``/``rjsmin`` assets are still hashed and compressed, just
+not minified.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from functools import lru_cache
+from http import HTTPStatus
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.files.base import ContentFile
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import HttpResponse
+from whitenoise.middleware import WhiteNoiseMiddleware
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+logger = logging.getLogger(__name__)
+
+ONE_YEAR = 365 * 24 * 60 * 60
+
+
+# --- build: minify before hashing ---------------------------------------------------------------
+
+def _minifier(path: str):
+    if '.min.' in path:
+        return None
+    try:
+        if path.endswith('.css'):
+            from rcssmin import cssmin
+            return cssmin
+        if path.endswith('.js'):
+            from rjsmin import jsmin
+            return jsmin
+    except ImportError:
+        return None
+    return None
+
+
+def minify(path: str, content: bytes) -> bytes:
+    """Minified ``content`` of a CSS/JS file, the input unchanged for anything else."""
+    minifier = _minifier(path)
+    if minifier is None:
+        return content
+    try:
+        return minifier(content.decode('utf-8')).encode('utf-8')
+    except (UnicodeDecodeError, ValueError) as e:
+        logger.warning("Not minifying %s: %s", path, e)
+        return content
+
+
+class _MinifiedSource:
+    """Wraps a finder's storage so the manifest storage reads (and hashes) minified sources."""
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def open(self, path, mode='rb'):
+        with self.storage.open(path, mode) as f:
+            return ContentFile(minify(path, f.read()), name=path)
+
+    def __getattr__(self, name):
+        return getattr(self.storage, name)
+
+
+class MinifiedManifestStaticFilesStorage(CompressedManifestStaticFilesStorage):
+    def post_process(self, paths, *args, **kwargs):
+        paths = {name: (_MinifiedSource(storage), path) for name, (storage, path) in paths.items()}
+        yield from super().post_process(paths, *args, **kwargs)
+
+
+# --- serving ------------------------------------------------------------------------------------
+
+class MemoryWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoise with one-year caching of hashed files and an in-memory copy of the files being served."""
+
+    FOREVER = ONE_YEAR
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings=settings)
+        self.memory_limit = getattr(settings, 'STATIC_MEMORY_CACHE_LIMIT', 32 * 2 ** 20)
+        self.memory_max_file_size = getattr(settings, 'STATIC_MEMORY_CACHE_MAX_FILE_SIZE', 512 * 2 ** 10)
+        self.memory: Dict[str, bytes] = {}
+        self.memory_used = 0
+        self._memory_lock = threading.Lock()
+
+    def _cached_body(self, path: str, size: int) -> Optional[bytes]:
+        body = self.memory.get(path)
+        if body is not None:
+            return body
+        if size > self.memory_max_file_size or self.memory_used + size > self.memory_limit:
+            return None
+        with open(path, 'rb') as f:
+            body = f.read()
+        with self._memory_lock:
+            if path not in self.memory and self.memory_used + len(body) <= self.memory_limit:
+                self.memory[path] = body
+                self.memory_used += len(body)
+        return body
+
+    def serve(self, static_file, request):
+        # files only change on deploy (a new process) unless WhiteNoise re-scans them on every request
+        if (self.autorefresh or request.method != 'GET' or 'HTTP_RANGE' in request.META
+                or static_file.is_not_modified(request.META)):
+            return super().serve(static_file, request)
+        path, headers = static_file.get_path_and_headers(request.META)
+        headers = list(headers)
+        body = self._cached_body(path, int(dict(headers)['Content-Length']))
+        if body is None:
+            return super().serve(static_file, request)
+        response = HttpResponse(body, status=HTTPStatus.OK)
+        del response['Content-Type']
+        for key, value in headers:
+            response[key] = value
+        return response
+
+
+# --- preload hints ------------------------------------------------------------------------------
+
+@lru_cache(maxsize=1)
+def _preload_links() -> Tuple[Tuple[str, str], ...]:
+    links = []
+    for name, kind in getattr(settings, 'STATIC_PRELOAD', ()):
+        try:
+            links.append((staticfiles_storage.url(name), kind))
+        except ValueError:  # not collected (yet)
+            logger.warning("STATIC_PRELOAD: %s is not in the static files manifest", name)
+    return tuple(links)
+
+
+def preload_links() -> List[Tuple[str, str]]:
+    """``(url, as)`` pairs for ``STATIC_PRELOAD``; resolved once per process unless DEBUG."""
+    if settings.DEBUG:
+        _preload_links.cache_clear()
+    return list(_preload_links())
+
+
+@receiver(setting_changed)
+def _reset_preload_links(*, setting, **kwargs):
+    if setting in ('STATIC_PRELOAD', 'STORAGES', 'STATIC_URL'):
+        _preload_links.cache_clear()
@@ -0,0 +1,88 @@
+import io
+import time
+
+import fakeredis
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from common.cache import Namespace, TieredCache, _L1Store, collect_stats, redis_client
+
+
+def _fake_redis_caches(**tiered_options):
+    return {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': 'redis://cache-tests:6379/0',
+            'OPTIONS': {'connection_class': fakeredis.FakeConnection},
+        },
+        'tiered': {
+            'BACKEND': 'common.cache.TieredCache',
+            'LOCATION': 'default',
+            'OPTIONS': {'L1_TIMEOUT': 60, 'STATS_FLUSH_INTERVAL': 3600, **tiered_options},
+        },
+    }
+
+
+class TieredCacheTests(TestCase):
+    def setUp(self):
+        override = override_settings(CACHES=_fake_redis_caches())
+        override.enable()
+        self.addCleanup(override.disable)
+        self.l2, self.tiered = caches['default'], caches['tiered']
+        redis_client(self.l2).flushall()
+
+    def _eventually(self, check):
+        for _ in range(100):
+            if check():
+                return True
+            time.sleep(0.02)
+        return False
+
+    def test_l1_serves_reads_and_other_processes_invalidate_it(self):
+        self.tiered.set('catalog:version', 'a')
+        self.l2.set('catalog:version', 'changed behind our back')
+        self.assertEqual(self.tiered.get('catalog:version'), 'a')  # L1 copy
+
+        # another process (own L1 store, same channel) writes the key
+        other = TieredCache('default', {'OPTIONS': {'L1_TIMEOUT': 60}})
+        other._store = _L1Store(100)
+        client = redis_client(self.l2)
+        self.assertTrue(self._eventually(lambda: client.pubsub_numsub('cache-invalidate')[0][1] > 0))
+        other.set('catalog:version', 'b')
+        self.assertTrue(self._eventually(lambda: self.tiered.get('catalog:version') == 'b'))
+        other.delete('catalog:version')
+        self.assertTrue(self._eventually(lambda: self.tiered.get('catalog:version') is None))
+
+    def test_namespaces_are_versioned_and_cleared_by_generation(self):
+        v1, v2 = Namespace('leaderboard', alias='tiered'), Namespace('leaderboard', alias='tiered', version=2)
+        v1.set('all', [1])
+        self.assertEqual(v1.get('all'), [1])
+        self.assertIsNone(v2.get('all'))  # new payload format, new keys
+        self.assertEqual(v1.get_or_set('month', lambda: [2]), [2])
+        v1.clear()
+        self.assertEqual(v1.get_many(['all', 'month']), {})
+
+    def test_hit_ratio_per_namespace(self):
+        self.tiered.set('blog:bans', {'ips': []})
+        self.tiered.get('blog:bans')
+        self.l2.set('blog:other', 1)
+        self.tiered.get('blog:other')
+        self.tiered.get('blog:missing')
+        stats = collect_stats()['namespaces']['blog']
+        self.assertEqual((stats['l1'], stats['l2'], stats['miss']), (1, 1, 1))
+        self.assertAlmostEqual(stats['hit_ratio'], 2 / 3)
+        out = io.StringIO()
+        call_command('cache_stats', stdout=out)
+        self.assertIn('blog', out.getvalue())
+        call_command('cache_stats', '--reset', stdout=io.StringIO())
+        self.assertEqual(collect_stats()['namespaces'], {})
+
+    def test_local_l2_skips_l1(self):
+        with override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tiered-tests'},
+            'tiered': {'BACKEND': 'common.cache.TieredCache', 'LOCATION': 'default'},
+        }):
+            caches['tiered'].set('k', 1)
+            caches['default'].set('k', 2)
+            self.assertEqual(caches['tiered'].get('k'), 2)
@@ -5,11 +5,18 @@ Usage:
     RESEND_API_KEY = '<your key>'
 
 Supports: to/cc/bcc, reply-to, text and HTML bodies, simple attachments (optional).
+
+One pooled ``httpx.Client`` is shared by every backend instance in the process
+(keep-alive connections survive between ``send_messages`` calls), and messages
+without attachments are sent through the batch endpoint, up to
+``RESEND_BATCH_SIZE`` (max 100) per request. The Resend message id of every
+delivered message is stored on it as ``msg.provider_message_id``.
 """
 from __future__ import annotations
 
 import base64
 import logging
+import threading
 from typing import List, Optional
 
 import httpx
@@ -19,13 +26,115 @@ from django.core.mail.message import EmailMessage
 
 logger = logging.getLogger(__name__)
 
+RESEND_MAX_BATCH = 100
+
+_client: Optional[httpx.Client] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> httpx.Client:
+    """Process-wide pooled client (created on first use)."""
+    global _client
+    if _client is None or _client.is_closed:
+        with _client_lock:
+            if _client is None or _client.is_closed:
+                _client = httpx.Client(
+                    timeout=getattr(settings, "EMAIL_TIMEOUT", 60),
+                    limits=httpx.Limits(max_connections=10, max_keepalive_connections=5, keepalive_expiry=60),
+                )
+    return _client
+
+
+def close_client() -> None:
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
 
 class ResendEmailBackend(BaseEmailBackend):
     api_url = "https://api.resend.com/emails"
+    batch_url = "https://api.resend.com/emails/batch"
+    supports_batch = True
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.api_key: Optional[str] = getattr(settings, "RESEND_API_KEY", None)
+        self.batch_size = max(1, min(RESEND_MAX_BATCH, int(getattr(settings, "RESEND_BATCH_SIZE", RESEND_MAX_BATCH))))
+
+    def _payload(self, msg: EmailMessage) -> Optional[dict]:
+        from_email = msg.from_email or getattr(settings, "DEFAULT_FROM_EMAIL", None)
+        if not from_email:
+            logger.warning("Email skipped: missing from email and DEFAULT_FROM_EMAIL")
+            return None
+        # Determine text/html bodies
+        text_body = msg.body or None
+        html_body = None
+        # Django stores alternatives as list of (content, mimetype)
+        for content, mimetype in getattr(msg, "alternatives", []) or []:
+            if mimetype == "text/html":
+                html_body = content
+        # If only html was provided via EmailMultiAlternatives, body might be text; we keep both if present
+
+        payload = {
+            "from": from_email,
+            "to": list(msg.to or []),
+            "subject": msg.subject or "",
+        }
+        if getattr(msg, "cc", None):
+            payload["cc"] = list(msg.cc)
+        if getattr(msg, "bcc", None):
+            payload["bcc"] = list(msg.bcc)
+        # reply_to expects list of strings
+        if getattr(msg, "reply_to", None):
+            payload["reply_to"] = list(msg.reply_to)
+        if html_body:
+            payload["html"] = html_body
+        if text_body:
+            payload["text"] = text_body
+
+        # Attachments (optional): Resend expects list of {filename, content}
+        attachments_payload = []
+        for attachment in getattr(msg, "attachments", []) or []:
+            try:
+                if isinstance(attachment, tuple) and len(attachment) in (2, 3):
+                    filename = attachment[0]
+                    content = attachment[1]
+                    if hasattr(content, "read"):
+                        content = content.read()
+                    if isinstance(content, str):
+                        content_bytes = content.encode("utf-8")
+                    else:
+                        content_bytes = content
+                    attachments_payload.append(
+                        {
+                            "filename": filename,
+                            "content": base64.b64encode(content_bytes).decode("ascii"),
+                        }
+                    )
+            except Exception as ex:  # noqa: BLE001
+                logger.warning("Skipping attachment due to error: %s", ex)
+        if attachments_payload:
+            payload["attachments"] = attachments_payload
+        return payload
+
+    def _post(self, url: str, body) -> Optional[httpx.Response]:
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+        try:
+            resp = get_client().post(url, headers=headers, json=body)
+        except Exception as e:  # noqa: BLE001
+            if not self.fail_silently:
+                raise
+            logger.exception("Failed to send email via Resend: %s", e)
+            return None
+        if 200 <= resp.status_code < 300:
+            return resp
+        logger.error("Resend API error %s: %s", resp.status_code, resp.text)
+        return None
 
     def send_messages(self, email_messages: List[EmailMessage]) -> int:
         if not email_messages:
@@ -34,77 +143,31 @@ class ResendEmailBackend(BaseEmailBackend):
             logger.error("RESEND_API_KEY is not configured; cannot send emails.")
             return 0
         sent = 0
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-        }
-        timeout = getattr(settings, "EMAIL_TIMEOUT", 60)
-        from_email_default = getattr(settings, "DEFAULT_FROM_EMAIL", None)
-
-        with httpx.Client(timeout=timeout) as client:
-            for msg in email_messages:
-                try:
-                    from_email = msg.from_email or from_email_default
-                    if not from_email:
-                        logger.warning("Email skipped: missing from email and DEFAULT_FROM_EMAIL")
-                        continue
-                    # Determine text/html bodies
-                    text_body = msg.body or None
-                    html_body = None
-                    # Django stores alternatives as list of (content, mimetype)
-                    for content, mimetype in getattr(msg, "alternatives", []) or []:
-                        if mimetype == "text/html":
-                            html_body = content
-                    # If only html was provided via EmailMultiAlternatives, body might be text; we keep both if present
-
-                    payload = {
-                        "from": from_email,
-                        "to": list(msg.to or []),
-                        "subject": msg.subject or "",
-                    }
-                    if getattr(msg, "cc", None):
-                        payload["cc"] = list(msg.cc)
-                    if getattr(msg, "bcc", None):
-                        payload["bcc"] = list(msg.bcc)
-                    # reply_to expects list of strings
-                    if getattr(msg, "reply_to", None):
-                        payload["reply_to"] = list(msg.reply_to)
-                    if html_body:
-                        payload["html"] = html_body
-                    if text_body:
-                        payload["text"] = text_body
-
-                    # Attachments (optional): Resend expects list of {filename, content}
-                    attachments_payload = []
-                    for attachment in getattr(msg, "attachments", []) or []:
-                        try:
-                            if isinstance(attachment, tuple) and len(attachment) in (2, 3):
-                                filename = attachment[0]
-                                content = attachment[1]
-                                if hasattr(content, "read"):
-                                    content = content.read()
-                                if isinstance(content, str):
-                                    content_bytes = content.encode("utf-8")
-                                else:
-                                    content_bytes = content
-                                attachments_payload.append(
-                                    {
-                                        "filename": filename,
-                                        "content": base64.b64encode(content_bytes).decode("ascii"),
-                                    }
-                                )
-                        except Exception as ex:  # noqa: BLE001
-                            logger.warning("Skipping attachment due to error: %s", ex)
-                    if attachments_payload:
-                        payload["attachments"] = attachments_payload
-
-                    resp = client.post(self.api_url, headers=headers, json=payload)
-                    if resp.status_code >= 200 and resp.status_code < 300:
-                        sent += 1
-                    else:
-                        logger.error("Resend API error %s: %s", resp.status_code, resp.text)
-                except Exception as e:  # noqa: BLE001
-                    if not self.fail_silently:
-                        raise
-                    logger.exception("Failed to send email via Resend: %s", e)
+        batchable = []
+        for msg in email_messages:
+            payload = self._payload(msg)
+            if payload is None:
+                continue
+            if "attachments" in payload:
+                # the batch endpoint does not accept attachments
+                resp = self._post(self.api_url, payload)
+                if resp is not None:
+                    msg.provider_message_id = (resp.json() or {}).get("id", "")
+                    sent += 1
+            else:
+                batchable.append((msg, payload))
+
+        for start in range(0, len(batchable), self.batch_size):
+            chunk = batchable[start:start + self.batch_size]
+            if len(chunk) == 1:
+                resp = self._post(self.api_url, chunk[0][1])
+                ids = [(resp.json() or {}).get("id", "")] if resp is not None else None
+            else:
+                resp = self._post(self.batch_url, [payload for _, payload in chunk])
+                ids = [row.get("id", "") for row in (resp.json() or {}).get("data", [])] if resp is not None else None
+            if ids is None:
+                continue
+            for (msg, _), message_id in zip(chunk, ids + [""] * (len(chunk) - len(ids))):
+                msg.provider_message_id = message_id
+            sent += len(chunk)
         return sent
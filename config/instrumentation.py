@@ -0,0 +1,344 @@
+"""Per-request instrumentation (``config.instrumentation.InstrumentationMiddleware``).
+
+Every request is recorded against its resolved view name (``store:product_list``):
+query count and DB time, cache hits/misses, template render time, and time spent
+in outgoing HTTP calls made with ``requests`` or ``httpx`` (Stripe, Resend,
+Overpass, ...), broken down by host.
+
+Records go to an in-process ring buffer (``INSTRUMENTATION_BUFFER_SIZE``), which
+staff can read at ``/admin/instrumentation/``. They are also written to the
+``config.instrumentation`` logger as one JSON line per request.
+``INSTRUMENTATION_BUDGETS`` maps view names (``'*'`` for every view) to limits on
+the recorded metrics. A request over budget is logged as a warning.
+``BudgetAssertionsMixin.assertWithinBudget`` makes the same check in tests.
+"""
+from __future__ import annotations
+
+import functools
+import json
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from statistics import median
+from typing import Any, Dict, Iterator, List, Optional
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import JsonResponse
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+METRICS = ('duration_ms', 'queries', 'db_ms', 'cache_hits', 'cache_misses', 'template_ms', 'http_calls', 'http_ms')
+UNRESOLVED = '<unresolved>'
+
+_MISSING = object()
+_current: ContextVar[Optional['RequestRecord']] = ContextVar('instrumentation_record', default=None)
+_buffer: Optional[deque] = None
+_buffer_lock = threading.Lock()
+_captures: List[List['RequestRecord']] = []
+_hooks_installed = False
+_hooks_lock = threading.Lock()
+
+
+@dataclass
+class RequestRecord:
+    method: str
+    path: str
+    view: str = UNRESOLVED
+    status: int = 0
+    at: float = field(default_factory=time.time)
+    duration_ms: float = 0.0
+    queries: int = 0
+    db_ms: float = 0.0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    template_ms: float = 0.0
+    http_calls: int = 0
+    http_ms: float = 0.0
+    http_hosts: Dict[str, float] = field(default_factory=dict)
+    violations: List[str] = field(default_factory=list)
+    # nesting guards: a tiered cache calling its L2, a template rendered from a template tag
+    _cache_depth: int = field(default=0, repr=False)
+    _template_depth: int = field(default=0, repr=False)
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = {k: v for k, v in asdict(self).items() if not k.startswith('_')}
+        for metric in ('duration_ms', 'db_ms', 'template_ms', 'http_ms'):
+            data[metric] = round(data[metric], 2)
+        data['http_hosts'] = {host: round(ms, 2) for host, ms in self.http_hosts.items()}
+        return data
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_ms += (time.perf_counter() - start) * 1000
+
+
+# --- hooks --------------------------------------------------------------------------------------
+
+def _wrap_cache_class(cls) -> None:
+    if cls.__dict__.get('_instrumented'):
+        return
+    get, get_many = cls.get, cls.get_many
+
+    @functools.wraps(get)
+    def instrumented_get(self, key, default=None, version=None):
+        record = _current.get()
+        if record is None or record._cache_depth:
+            return get(self, key, default, version)
+        record._cache_depth += 1
+        try:
+            value = get(self, key, _MISSING, version)
+        finally:
+            record._cache_depth -= 1
+        if value is _MISSING:
+            record.cache_misses += 1
+            return default
+        record.cache_hits += 1
+        return value
+
+    @functools.wraps(get_many)
+    def instrumented_get_many(self, keys, version=None):
+        record = _current.get()
+        if record is None or record._cache_depth:
+            return get_many(self, keys, version)
+        keys = list(keys)
+        record._cache_depth += 1
+        try:
+            found = get_many(self, keys, version)
+        finally:
+            record._cache_depth -= 1
+        record.cache_hits += len(found)
+        record.cache_misses += len(keys) - len(found)
+        return found
+
+    cls.get, cls.get_many, cls._instrumented = instrumented_get, instrumented_get_many, True
+
+
+def _wrap_template_class(cls) -> None:
+    render = cls.render
+
+    @functools.wraps(render)
+    def instrumented_render(self, context=None, request=None):
+        record = _current.get()
+        if record is None or record._template_depth:
+            return render(self, context, request)
+        record._template_depth += 1
+        start = time.perf_counter()
+        try:
+            return render(self, context, request)
+        finally:
+            record._template_depth -= 1
+            record.template_ms += (time.perf_counter() - start) * 1000
+
+    cls.render = instrumented_render
+
+
+def _wrap_http_client(cls) -> None:
+    send = cls.send
+
+    @functools.wraps(send)
+    def instrumented_send(self, request, *args, **kwargs):
+        record = _current.get()
+        if record is None:
+            return send(self, request, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return send(self, request, *args, **kwargs)
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            host = urlsplit(str(request.url)).hostname or '?'
+            record.http_calls += 1
+            record.http_ms += elapsed
+            record.http_hosts[host] = record.http_hosts.get(host, 0.0) + elapsed
+
+    cls.send = instrumented_send
+
+
+def install_hooks() -> None:
+    """Patch cache backends, the template backend and HTTP clients once per process."""
+    global _hooks_installed
+    with _hooks_lock:
+        if _hooks_installed:
+            return
+        for config in settings.CACHES.values():
+            _wrap_cache_class(import_string(config['BACKEND']))
+        from django.template.backends.django import Template
+        _wrap_template_class(Template)
+        try:
+            import requests
+            _wrap_http_client(requests.Session)  # also Stripe's default client
+        except ImportError:
+            pass
+        try:
+            import httpx
+            _wrap_http_client(httpx.Client)  # Resend email backend
+        except ImportError:
+            pass
+        _hooks_installed = True
+
+
+# --- budgets ------------------------------------------------------------------------------------
+
+def budget_for(view: str) -> Dict[str, float]:
+    budgets = getattr(settings, 'INSTRUMENTATION_BUDGETS', {})
+    return {**budgets.get('*', {}), **budgets.get(view, {})}
+
+
+def check_budget(record: RequestRecord, budget: Optional[Dict[str, float]] = None) -> List[str]:
+    budget = budget_for(record.view) if budget is None else budget
+    violations = []
+    for metric, limit in budget.items():
+        value = getattr(record, metric)
+        if value > limit:
+            violations.append(f"{metric} {round(value, 2)} > {limit}")
+    return violations
+
+
+# --- ring buffer --------------------------------------------------------------------------------
+
+def _get_buffer() -> deque:
+    global _buffer
+    if _buffer is None:
+        _buffer = deque(maxlen=getattr(settings, 'INSTRUMENTATION_BUFFER_SIZE', 500))
+    return _buffer
+
+
+def recent(view: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    with _buffer_lock:
+        records = list(_get_buffer())
+    if view:
+        records = [r for r in records if r.view == view]
+    if limit:
+        records = records[-limit:]
+    return [r.as_dict() for r in records]
+
+
+def summarize(records: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    by_view: Dict[str, List[Dict[str, Any]]] = {}
+    for record in records:
+        by_view.setdefault(record['view'], []).append(record)
+    summary = {}
+    for view, rows in sorted(by_view.items()):
+        durations = sorted(r['duration_ms'] for r in rows)
+        lookups = sum(r['cache_hits'] + r['cache_misses'] for r in rows)
+        summary[view] = {
+            'requests': len(rows),
+            'p50_ms': round(median(durations), 2),
+            'p95_ms': durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+            'avg_queries': round(sum(r['queries'] for r in rows) / len(rows), 2),
+            'max_queries': max(r['queries'] for r in rows),
+            'avg_db_ms': round(sum(r['db_ms'] for r in rows) / len(rows), 2),
+            'avg_template_ms': round(sum(r['template_ms'] for r in rows) / len(rows), 2),
+            'avg_http_ms': round(sum(r['http_ms'] for r in rows) / len(rows), 2),
+            'cache_hit_ratio': round(sum(r['cache_hits'] for r in rows) / lookups, 3) if lookups else None,
+            'over_budget': sum(1 for r in rows if r['violations']),
+        }
+    return summary
+
+
+def reset() -> None:
+    with _buffer_lock:
+        _get_buffer().clear()
+
+
+def _finish(record: RequestRecord) -> None:
+    record.violations = check_budget(record)
+    with _buffer_lock:
+        _get_buffer().append(record)
+    for captured in _captures:
+        captured.append(record)
+    line = json.dumps(record.as_dict(), sort_keys=True)
+    if record.violations:
+        logger.warning("over budget %s", line)
+    else:
+        logger.log(logging.getLevelName(getattr(settings, 'INSTRUMENTATION_LOG_LEVEL', 'INFO')), "request %s", line)
+
+
+# --- middleware ---------------------------------------------------------------------------------
+
+class InstrumentationMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'INSTRUMENTATION_ENABLED', True):
+            raise MiddlewareNotUsed
+        install_hooks()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        record = RequestRecord(method=request.method, path=request.path)
+        token = _current.set(record)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(record.execute_wrapper))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        record.duration_ms = (time.perf_counter() - start) * 1000
+        record.status = response.status_code
+        if record.view == UNRESOLVED and getattr(request, 'resolver_match', None):
+            record.view = request.resolver_match.view_name
+        _finish(record)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        record = _current.get()
+        if record is not None and request.resolver_match:
+            record.view = request.resolver_match.view_name
+
+
+@staff_member_required
+def instrumentation_report(request):
+    """Recent request records and per-view aggregates (``?view=store:product_list&limit=50``)."""
+    try:
+        limit = max(1, int(request.GET.get('limit', 100)))
+    except ValueError:
+        limit = 100
+    records = recent(view=request.GET.get('view'))
+    return JsonResponse({
+        'buffer_size': getattr(settings, 'INSTRUMENTATION_BUFFER_SIZE', 500),
+        'budgets': getattr(settings, 'INSTRUMENTATION_BUDGETS', {}),
+        'summary': summarize(records),
+        'recent': records[-limit:],
+    })
+
+
+# --- tests --------------------------------------------------------------------------------------
+
+@contextmanager
+def capture() -> Iterator[List[RequestRecord]]:
+    """Collect the records of the requests made inside the block."""
+    records: List[RequestRecord] = []
+    _captures.append(records)
+    try:
+        yield records
+    finally:
+        _captures.remove(records)
+
+
+class BudgetAssertionsMixin:
+    """For TestCase classes: ``with self.assertWithinBudget('store:product_list'): self.client.get(...)``."""
+
+    @contextmanager
+    def assertWithinBudget(self, view: Optional[str] = None, **limits):
+        with capture() as records:
+            yield records
+        matched = [r for r in records if view is None or r.view == view]
+        if not matched:
+            self.fail(f"No request to {view or 'any view'} was made")
+        for record in matched:
+            violations = check_budget(record, {**budget_for(record.view), **limits})
+            if violations:
+                self.fail(f"{record.method} {record.path} ({record.view}) over budget: {'; '.join(violations)}")
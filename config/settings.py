@@ -64,7 +64,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'storages',  # required for S3Boto3Storage in production
-    'background_task',
+    'background_task',  # only to drain tasks queued before taskqueue (TASK_BACKEND=...BackgroundTasksBackend)
     'axes',
     'rest_framework',
     'rest_framework.authtoken',
@@ -76,13 +76,16 @@ INSTALLED_APPS = [
     'challenges.apps.ChallengesConfig',
     'places.apps.PlacesConfig',
     'chat.apps.ChatConfig',
+    'taskqueue.apps.TaskQueueConfig',
+    'benchmarks.apps.BenchmarksConfig',  # no models: data generator and scenario commands only
     'channels',
     'csp',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # place right after SecurityMiddleware (per WhiteNoise docs)
+    'common.static.MemoryWhiteNoiseMiddleware',  # WhiteNoise: place right after SecurityMiddleware (per WhiteNoise docs)
+    'config.instrumentation.InstrumentationMiddleware',  # outermost of the app middleware: sees their queries too
     'csp.middleware.CSPMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
@@ -210,11 +213,19 @@ STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_DIRS = [ BASE_DIR / 'static', ]
 
-# Определяем storage один раз, без дублей
-if DEBUG:
-    STATICFILES_STORAGE = 'whitenoise.storage.CompressedStaticFilesStorage'
-else:
-    STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+# Build step (collectstatic, see common/static.py): CSS/JS minified, names fingerprinted, .br/.gz next to them.
+# The storage itself is set in STORAGES below.
+WHITENOISE_KEEP_ONLY_HASHED_FILES = True
+# Hashed files are served with one-year immutable caching; the requested ones are kept in memory up to:
+STATIC_MEMORY_CACHE_LIMIT = int(os.getenv('STATIC_MEMORY_CACHE_MB', 32)) * 2 ** 20
+STATIC_MEMORY_CACHE_MAX_FILE_SIZE = 512 * 2 ** 10
+# Critical assets announced with <link rel="preload"> ({% static_preload %} in base.html)
+STATIC_PRELOAD = [
+    ('css/base.css', 'style'),
+    ('css/custom_styles.css', 'style'),
+    ('js/cart.js', 'script'),
+    ('js/base.js', 'script'),
+]
 # Media files (User uploaded files like product images)
 # https://docs.djangoproject.com/en/stable/howto/static-files/
 
@@ -228,8 +239,11 @@ if not DEBUG: # Настройки для ПРОДАКШЕНА (использу
     AWS_S3_ENDPOINT_URL = os.getenv('AWS_S3_ENDPOINT_URL') # Оставь пустым, если используешь Amazon S3
     AWS_S3_CUSTOM_DOMAIN = os.getenv('AWS_S3_CUSTOM_DOMAIN')
 
+    # Медиа кэшируются ограниченное время, без immutable: имя освобождается после удаления файла
+    # (например, очищенный аватар) и может снова быть занято другим содержимым. Immutable на год
+    # получают только статические файлы с отпечатком в имени (whitenoise, см. выше).
     AWS_S3_OBJECT_PARAMETERS = {
-        'CacheControl': 'max-age=86400', # Кеширование на 1 день
+        'CacheControl': f"public, max-age={int(os.getenv('MEDIA_CACHE_MAX_AGE', 24 * 60 * 60))}",
     }
     AWS_LOCATION = 'media' # Файлы будут в s3://<bucket_name>/media/
     # In buckets with Object Ownerslsehip: Bucket owner enforced, ACLs are disabled.
@@ -264,6 +278,15 @@ else: # Настройки для РАЗРАБОТКИ (локальное хр
     MEDIA_ROOT = BASE_DIR / 'media'
     DEFAULT_FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
 
+# Django 5.1+ ignores STATICFILES_STORAGE/DEFAULT_FILE_STORAGE settings; STORAGES is what takes effect
+STORAGES = {
+    'default': {'BACKEND': DEFAULT_FILE_STORAGE},
+    'staticfiles': {
+        'BACKEND': 'whitenoise.storage.CompressedStaticFilesStorage' if DEBUG
+        else 'common.static.MinifiedManifestStaticFilesStorage',
+    },
+}
+
 # Where to store generated image variants
 # 'variants_tree' (default) -> products/variants/<key>/...
 # 'sibling' -> next to original file (no extra variants/ folders)
@@ -272,6 +295,54 @@ IMAGE_VARIANT_STORAGE = os.getenv('IMAGE_VARIANT_STORAGE', 'sibling' if not DEBU
 # In production we default to disabling unless explicitly enabled.
 IMAGE_VARIANTS_ENABLED = os.getenv('IMAGE_VARIANTS_ENABLED', 'False' if not DEBUG else 'True').lower() in ('true','1','t','yes')
 
+# Chat attachments are uploaded straight to storage with signed tickets.
+# 'auto' -> S3/MinIO presigned POST when the storage is S3-backed, else the local stand-in view.
+CHAT_UPLOAD_BACKEND = os.getenv('CHAT_UPLOAD_BACKEND', 'auto')
+CHAT_UPLOAD_TICKET_TTL = int(os.getenv('CHAT_UPLOAD_TICKET_TTL', 15 * 60))
+
+# Sliding-window rate limits (common/ratelimit.py): scope -> (max hits, window seconds).
+# Counters are shared through this cache alias; a cache outage falls back to per-process counters.
+RATE_LIMIT_CACHE_ALIAS = os.getenv('RATE_LIMIT_CACHE_ALIAS', 'default')
+RATE_LIMITS = {
+    'blog_comment': (3, 120),
+    'chat_message': (20, 10),
+    'place_review': (5, 60 * 60),
+}
+
+# Background tasks (@background from taskqueue): run by `manage.py run_task_worker` from the QueuedTask table
+# (started next to daphne by entrypoint.sh unless RUN_TASK_WORKER=0).
+# 'taskqueue.backends.ImmediateBackend' runs them inline (no worker needed in local development).
+TASK_BACKEND = os.getenv('TASK_BACKEND', 'taskqueue.backends.DatabaseBackend')
+TASK_QUEUE_MAX_ATTEMPTS = int(os.getenv('TASK_QUEUE_MAX_ATTEMPTS', 5))
+TASK_QUEUE_BACKOFF_BASE = 10  # seconds before the first retry, doubled on every failure
+TASK_QUEUE_BACKOFF_MAX = 60 * 60
+TASK_QUEUE_LEASE = 10 * 60  # a claimed task not finished by then is handed to another worker
+TASK_QUEUE_KEEP_DONE = 24 * 60 * 60  # finished rows are kept this long for metrics
+
+# Periodic jobs of `manage.py run_scheduler` (common/scheduler.py): 'func' (dotted path) or 'command'
+# (management command + 'args'), run every 'interval' seconds +/- 'jitter'. Only the replica holding the
+# PostgreSQL advisory lock SCHEDULER_LOCK_ID runs them. entrypoint.sh starts it next to daphne unless
+# RUN_SCHEDULER=0; its JSON status endpoint listens on 127.0.0.1:SCHEDULER_STATUS_PORT.
+SCHEDULER_LOCK_ID = int(os.getenv('SCHEDULER_LOCK_ID', 0x45434F53))
+SCHEDULER_JOBS = {
+    'challenge_statuses': {'func': 'challenges.services.statuses.update_statuses', 'interval': 60},
+    'recurring_challenges': {'func': 'challenges.services.recurrence.generate_recurrent_challenges', 'interval': 15 * 60},
+    'stripe_sync': {
+        'command': 'sync_stripe_subscriptions', 'args': ['--only-active'], 'interval': 6 * 60 * 60,
+        'run_at_start': False, 'enabled': bool(os.getenv('STRIPE_SECRET_KEY')),
+    },
+    'comment_thumbs_backfill': {
+        'command': 'backfill_comment_thumbs', 'args': ['--limit', '500', '--workers', '2'], 'interval': 30 * 60,
+    },
+    'email_outbox': {'func': 'payments.services.outbox.flush_outbox', 'interval': 30},
+    'session_sweep': {'func': 'common.sessions.sweep_expired', 'interval': 60 * 60, 'run_at_start': False},
+}
+
+# Hybrid sessions (common/sessions.py): small anonymous sessions in a signed cookie, everything else
+# (and every logged-in session) in the cache with write-through to django_session.
+SESSION_ENGINE = 'common.sessions'
+SESSION_COOKIE_MAX_BYTES = 2048  # larger anonymous sessions move server-side
+SESSION_REFRESH_INTERVAL = 24 * 60 * 60  # unchanged sessions are rewritten at most once a day (expiry refresh)
 SESSION_COOKIE_HTTPONLY = True
 CSRF_COOKIE_HTTPONLY = False
 SESSION_COOKIE_SAMESITE = 'Lax'
@@ -286,6 +357,20 @@ SECURE_CROSS_ORIGIN_OPENER_POLICY = 'same-origin'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 CART_SESSION_ID = 'cart'
+# Per-request instrumentation (config/instrumentation.py): ring buffer at /admin/instrumentation/,
+# one JSON log line per request, warnings for requests over their view's budget ('*' applies to every view)
+INSTRUMENTATION_ENABLED = os.getenv('INSTRUMENTATION_ENABLED', 'True').lower() in ('true', '1', 't')
+INSTRUMENTATION_BUFFER_SIZE = int(os.getenv('INSTRUMENTATION_BUFFER_SIZE', '500'))
+INSTRUMENTATION_LOG_LEVEL = os.getenv('INSTRUMENTATION_LOG_LEVEL', 'INFO')
+INSTRUMENTATION_BUDGETS = {
+    '*': {'queries': 40, 'duration_ms': 2000},
+    'store:product_list': {'queries': 20},
+    'store:product_detail': {'queries': 12},
+    'places:places_api': {'queries': 2},
+    'chat:messages_api': {'queries': 6},
+}
+# Logged-in users' carts are DB rows (store.Cart); their cached snapshot lives this long (seconds)
+CART_CACHE_TIMEOUT = 60 * 60
 
 # Channels: use Redis in production when REDIS_URL is provided, else in-memory for dev
 REDIS_URL = os.getenv('REDIS_URL')
@@ -305,6 +390,33 @@ else:
             'BACKEND': 'channels.layers.InMemoryChannelLayer',
         },
     }
+
+# Caches (common/cache.py): 'default' is Redis shared by every process (REDIS_CACHE_URL, else REDIS_URL),
+# LocMem per process without Redis. 'tiered' keeps hot, read-mostly keys in a per-process LRU in front of
+# 'default' for L1_TIMEOUT seconds; writes are broadcast over Redis pub/sub to drop the other processes' copies.
+REDIS_CACHE_URL = os.getenv('REDIS_CACHE_URL') or REDIS_URL
+if REDIS_CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_CACHE_URL,
+            'KEY_PREFIX': os.getenv('CACHE_KEY_PREFIX', 'eco'),
+            'TIMEOUT': 300,
+            'OPTIONS': {'socket_connect_timeout': 2, 'socket_timeout': 2, 'health_check_interval': 30},
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'ecomarket',
+        },
+    }
+CACHES['tiered'] = {
+    'BACKEND': 'common.cache.TieredCache',
+    'LOCATION': 'default',  # L2 alias
+    'OPTIONS': {'MAX_ENTRIES': 2000, 'L1_TIMEOUT': int(os.getenv('CACHE_L1_TIMEOUT', 5))},
+}
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
@@ -382,6 +494,12 @@ except Exception:
 
 # Опционально: Управление соединениями (может помочь при некоторых проблемах)
 EMAIL_TIMEOUT = 60 # Время ожидания ответа от сервера (секунды)
+# Resend batch endpoint: messages per request (API maximum: 100)
+RESEND_BATCH_SIZE = int(os.getenv('RESEND_BATCH_SIZE', 100))
+# Transactional email outbox (payments/services/outbox.py): retries with exponential backoff
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv('EMAIL_OUTBOX_MAX_ATTEMPTS', 6))
+EMAIL_OUTBOX_BACKOFF_BASE = 30  # seconds before the first retry, doubled on every failure
+EMAIL_OUTBOX_BACKOFF_MAX = 6 * 60 * 60
 
 # Проверка наличия основных настроек: предупреждаем только если выбран SMTP бекенд
 if EMAIL_BACKEND.endswith('smtp.EmailBackend'):
@@ -408,6 +526,8 @@ AXES_BEHIND_REVERSE_PROXY = True
 AXES_REVERSE_PROXY_HEADER = 'HTTP_X_FORWARDED_FOR'
 
 AVERAGE_ANNUAL_CO2_FOOTPRINT_PL_KG = 5600
+# Max age (seconds) of the in-process calculator catalog snapshot; admin edits invalidate it immediately
+CARBON_CATALOG_TTL = int(os.getenv('CARBON_CATALOG_TTL', '300'))
 
 
 # --- Дополнительно: логирование в файлы logs/info.log и logs/error.log ---
@@ -537,6 +657,9 @@ CSP_CONNECT_SRC = (
     # Stripe API
     'https://api.stripe.com',
 )
+if AWS_IMG_SOURCES:
+    # Direct-to-storage chat uploads (presigned POST)
+    CSP_CONNECT_SRC = CSP_CONNECT_SRC + tuple(AWS_IMG_SOURCES)
 CSP_OBJECT_SRC = ("'none'",)
 CSP_FRAME_ANCESTORS = ("'none'",)
 CSP_BASE_URI = ("'self'",)
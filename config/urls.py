@@ -21,9 +21,12 @@ from .sitemaps import (
 )
 from django.http import HttpResponse  # <-- добавить
 from .csp_views import csp_report
+from .instrumentation import instrumentation_report
 
 
 urlpatterns = [
+    # before admin/: the admin would take 'instrumentation' for an app label
+    path('admin/instrumentation/', instrumentation_report, name='instrumentation_report'),
     path('admin/', admin.site.urls),
     # Healthcheck для Railway
     path('healthz/', lambda r: HttpResponse('ok'), name='healthz'),  # <-- добавить
@@ -8,6 +8,33 @@ python manage.py migrate --noinput
 echo "Compiling translations..."
 python manage.py compilemessages || echo "WARNING: compilemessages failed (is gettext installed?). Continuing..."
 
+# Воркер фоновых задач (@background -> таблица QueuedTask). Без него задачи только копятся в очереди.
+# RUN_TASK_WORKER=0 — если воркер запущен отдельным сервисом; перезапускаем его, если процесс упал.
+if [ "${RUN_TASK_WORKER:-1}" != "0" ]; then
+    echo "Starting task worker..."
+    (
+        while true; do
+            python manage.py run_task_worker --concurrency "${TASK_WORKER_CONCURRENCY:-4}"
+            echo "Task worker exited, restarting in 5s..."
+            sleep 5
+        done
+    ) &
+fi
+
+# Планировщик периодических задач (settings.SCHEDULER_JOBS: статусы челленджей, повторяющиеся челленджи,
+# синхронизация Stripe, outbox писем, очистка сессий). На нескольких репликах задачи выполняет только
+# держатель advisory lock, остальные ждут. RUN_SCHEDULER=0 — если он запущен отдельным сервисом.
+if [ "${RUN_SCHEDULER:-1}" != "0" ]; then
+    echo "Starting scheduler..."
+    (
+        while true; do
+            python manage.py run_scheduler
+            echo "Scheduler exited, restarting in 5s..."
+            sleep 5
+        done
+    ) &
+fi
+
 # Запускаем веб-сервер
 echo "Starting server..."
-daphne -b 0.0.0.0 -p $PORT config.asgi:application
\ No newline at end of file
+exec daphne -b 0.0.0.0 -p $PORT config.asgi:application
\ No newline at end of file
@@ -1,3 +1,24 @@
 from django.contrib import admin
+from django.utils import timezone
 
-# Register your models here.
+from .models import OutboxEmail
+
+
+@admin.action(description="Wyślij ponownie (przy najbliższym opróżnianiu kolejki)")
+def retry_now(modeladmin, request, queryset):
+    updated = queryset.exclude(status=OutboxEmail.STATUS_SENT).update(
+        status=OutboxEmail.STATUS_PENDING, next_attempt_at=timezone.now()
+    )
+    modeladmin.message_user(request, f"Ponownie zakolejkowano: {updated}")
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'category', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('status', 'category')
+    search_fields = ('subject', 'to', 'dedupe_key', 'provider_message_id')
+    readonly_fields = [f.name for f in OutboxEmail._meta.fields]
+    actions = [retry_now]
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,73 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from common.email_templates import render_batch
+from store.models import SubscriptionBoxType, UserSubscription
+
+User = get_user_model()
+
+TEMPLATE = "emails/subscription_confirmation"
+
+
+def legacy_base_context() -> dict:
+    """What every task rebuilt per email before common.email_templates (kept as the baseline)."""
+    site_url = getattr(settings, "SITE_URL", None)
+    site_name = None
+    if site_url:
+        try:
+            netloc = urlparse(site_url).netloc
+            site_name = netloc.split(":")[0] if netloc else None
+        except Exception:  # noqa: BLE001
+            site_name = None
+    return {
+        "support_email": getattr(settings, "SUPPORT_EMAIL", None) or getattr(settings, "DEFAULT_FROM_EMAIL", None),
+        "support_phone": getattr(settings, "SUPPORT_PHONE", ""),
+        "support_address": getattr(settings, "SUPPORT_ADDRESS", ""),
+        "site_name": site_name or "EcoMarket",
+        "site_url": site_url,
+    }
+
+
+class Command(BaseCommand):
+    help = ("Benchmark email rendering: render_to_string per email (before) vs "
+            "common.email_templates.render_batch (after). Uses unsaved objects, touches no tables.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=10_000, help="Emails (text + HTML pairs) to render.")
+
+    def handle(self, *args, **options):
+        count = max(1, options["count"])
+        box = SubscriptionBoxType(name="Eko Box", slug="eko-box", price=Decimal("49.99"), billing_period="month")
+        now = timezone.now()
+        subs = [
+            UserSubscription(
+                user=User(username=f"user{i}", first_name="Jan", last_name=f"Nowak {i}"), box_type=box,
+                status="active", stripe_subscription_id=f"sub_{i}",
+                current_period_start=now, current_period_end=now + timedelta(days=30),
+            )
+            for i in range(count)
+        ]
+
+        started = time.perf_counter()
+        for sub in subs:
+            base = getattr(settings, "SITE_URL", "")
+            context = {"user_subscription": sub, "profile_url": f"{base}/store/profile/edit/", **legacy_base_context()}
+            render_to_string(f"{TEMPLATE}.txt", context)
+            render_to_string(f"{TEMPLATE}.html", context)
+        before = time.perf_counter() - started
+
+        started = time.perf_counter()
+        render_batch(TEMPLATE, ({"user_subscription": sub} for sub in subs))
+        after = time.perf_counter() - started
+
+        for label, elapsed in (("render_to_string per email (before)", before), ("render_batch (after)", after)):
+            self.stdout.write(f"{label:<38} {elapsed:8.2f} s  {elapsed / count * 1e6:8.1f} us/email")
+        self.stdout.write(f"speed-up: x{before / after:.1f} (DEBUG={settings.DEBUG})")
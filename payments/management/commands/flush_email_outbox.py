@@ -0,0 +1,26 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from payments.services.outbox import BATCH_SIZE, FLUSH_LIMIT, flush_outbox, outbox_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Send due emails from the outbox in batches (normally run by run_scheduler). "
+        "Usage: manage.py flush_email_outbox [--limit N] [--batch-size N] [--stats]"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=FLUSH_LIMIT, help="Max emails claimed in this run.")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Emails per backend call.")
+        parser.add_argument("--stats", action="store_true", help="Only print per-status metrics as JSON.")
+
+    def handle(self, *args, **options):
+        if options["stats"]:
+            self.stdout.write(json.dumps(outbox_stats(), indent=2))
+            return
+        counters = flush_outbox(limit=max(1, options["limit"]), batch_size=max(1, options["batch_size"]))
+        self.stdout.write(self.style.SUCCESS(
+            f"sent={counters['sent']} retry={counters['retry']} failed={counters['failed']}"
+        ))
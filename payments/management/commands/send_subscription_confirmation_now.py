@@ -1,7 +1,7 @@
 import logging
 from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
-from django.template.loader import render_to_string
+from common.email_templates import render_email
 from common.mail import send_email
 
 from store.models import UserSubscription
@@ -35,12 +35,9 @@ class Command(BaseCommand):
         subject = f"Potwierdzenie subskrypcji: {user_sub.box_type.name} - EcoMarket"
         recipient_email = user_sub.user.email
         from_email = settings.DEFAULT_FROM_EMAIL
-        base = getattr(settings, "SITE_URL", "http://localhost:8000").rstrip("/")
-        profile_url = f"{base}/store/profile/edit/"
-        context = {"user_subscription": user_sub, "profile_url": profile_url}
-
-        plain_message = render_to_string("emails/subscription_confirmation.txt", context)
-        html_message = render_to_string("emails/subscription_confirmation.html", context)
+        plain_message, html_message = render_email(
+            "emails/subscription_confirmation", {"user_subscription": user_sub}
+        )
 
         send_email(
             subject=subject,
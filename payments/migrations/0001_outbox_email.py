@@ -0,0 +1,44 @@
+# Generated by Django 5.2 on 2026-10-19 17:13
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(blank=True, db_index=True, default='', max_length=50, verbose_name='Kategoria')),
+                ('dedupe_key', models.CharField(blank=True, max_length=150, null=True, unique=True, verbose_name='Klucz deduplikacji')),
+                ('subject', models.CharField(max_length=255, verbose_name='Temat')),
+                ('from_email', models.CharField(blank=True, default='', max_length=255, verbose_name='Nadawca')),
+                ('to', models.JSONField(default=list, verbose_name='Do')),
+                ('cc', models.JSONField(blank=True, default=list)),
+                ('bcc', models.JSONField(blank=True, default=list)),
+                ('reply_to', models.JSONField(blank=True, default=list)),
+                ('text', models.TextField(blank=True, default='', verbose_name='Treść (tekst)')),
+                ('html', models.TextField(blank=True, default='', verbose_name='Treść (HTML)')),
+                ('status', models.CharField(choices=[('pending', 'Oczekuje'), ('sending', 'W trakcie wysyłki'), ('sent', 'Wysłany'), ('failed', 'Błąd (bez kolejnych prób)')], default='pending', max_length=10, verbose_name='Status')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Próby')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Następna próba')),
+                ('last_error', models.TextField(blank=True, default='', verbose_name='Ostatni błąd')),
+                ('provider_message_id', models.CharField(blank=True, default='', max_length=100, verbose_name='ID u dostawcy')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Utworzono')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Wysłano')),
+            ],
+            options={
+                'verbose_name': 'Email w kolejce',
+                'verbose_name_plural': 'Kolejka emaili',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx')],
+            },
+        ),
+    ]
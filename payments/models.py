@@ -1,3 +1,46 @@
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class OutboxEmail(models.Model):
+    """Queued transactional email; flushed in batches by payments.services.outbox.flush_outbox."""
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Oczekuje'),
+        (STATUS_SENDING, 'W trakcie wysyłki'),
+        (STATUS_SENT, 'Wysłany'),
+        (STATUS_FAILED, 'Błąd (bez kolejnych prób)'),
+    ]
+
+    category = models.CharField(max_length=50, blank=True, default='', db_index=True, verbose_name="Kategoria")
+    dedupe_key = models.CharField(max_length=150, null=True, blank=True, unique=True, verbose_name="Klucz deduplikacji")
+    subject = models.CharField(max_length=255, verbose_name="Temat")
+    from_email = models.CharField(max_length=255, blank=True, default='', verbose_name="Nadawca")
+    to = models.JSONField(default=list, verbose_name="Do")
+    cc = models.JSONField(default=list, blank=True)
+    bcc = models.JSONField(default=list, blank=True)
+    reply_to = models.JSONField(default=list, blank=True)
+    text = models.TextField(blank=True, default='', verbose_name="Treść (tekst)")
+    html = models.TextField(blank=True, default='', verbose_name="Treść (HTML)")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING, verbose_name="Status")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Próby")
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name="Następna próba")
+    last_error = models.TextField(blank=True, default='', verbose_name="Ostatni błąd")
+    provider_message_id = models.CharField(max_length=100, blank=True, default='', verbose_name="ID u dostawcy")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Utworzono")
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name="Wysłano")
+
+    class Meta:
+        verbose_name = "Email w kolejce"
+        verbose_name_plural = "Kolejka emaili"
+        ordering = ['-created_at']
+        indexes = [
+            # the worker only ever looks at due, unsent rows
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)} ({self.status})"
@@ -0,0 +1,193 @@
+"""Transactional email outbox.
+
+Emails are rendered by the caller and stored in ``OutboxEmail`` (same
+transaction as the business change that triggered them); ``flush_outbox``
+claims due rows, sends them over one backend connection - through the Resend
+batch endpoint when that backend is active - and records the outcome per row.
+Failed rows are retried with exponential backoff and jitter, up to
+``EMAIL_OUTBOX_MAX_ATTEMPTS``; rows left in ``sending`` by a crashed worker
+become due again once their lease expires.
+
+Flushing runs as a scheduler job (``SCHEDULER_JOBS['email_outbox']``) and is
+also kicked through one coalesced background task after every enqueue.
+"""
+from __future__ import annotations
+
+import logging
+import random
+from collections import defaultdict
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import IntegrityError, connection as db_connection, transaction
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from payments.models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+FLUSH_LIMIT = 500
+BATCH_SIZE = 100
+SENDING_LEASE = timedelta(minutes=10)
+
+
+def max_attempts() -> int:
+    return int(getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 6))
+
+
+def backoff(attempts: int, rng: Optional[random.Random] = None) -> timedelta:
+    """30s, 1m, 2m, 4m ... capped at 6h, +/-20% jitter so a failed batch does not retry in lock-step."""
+    base = getattr(settings, 'EMAIL_OUTBOX_BACKOFF_BASE', 30)
+    cap = getattr(settings, 'EMAIL_OUTBOX_BACKOFF_MAX', 6 * 3600)
+    delay = min(cap, base * 2 ** max(0, attempts - 1))
+    return timedelta(seconds=delay * (rng or random).uniform(0.8, 1.2))
+
+
+def enqueue(*, subject: str, to: Iterable[str], text: Optional[str] = None, html: Optional[str] = None,
+            from_email: Optional[str] = None, cc: Optional[Iterable[str]] = None, bcc: Optional[Iterable[str]] = None,
+            reply_to: Optional[Iterable[str]] = None, category: str = '', dedupe_key: Optional[str] = None,
+            kick: bool = True) -> Optional[OutboxEmail]:
+    """Queue one email. With ``dedupe_key`` the email is queued at most once (the existing row is returned)."""
+    to = [addr for addr in (to or []) if addr]
+    if not to:
+        return None
+    fields = dict(
+        subject=subject or '',
+        from_email=from_email or getattr(settings, 'DEFAULT_FROM_EMAIL', None) or '',
+        to=to, cc=list(cc or []), bcc=list(bcc or []), reply_to=list(reply_to or []),
+        text=text or '', html=html or '', category=category,
+    )
+    if dedupe_key:
+        existing = OutboxEmail.objects.filter(dedupe_key=dedupe_key).first()
+        if existing:
+            return existing
+        try:
+            with transaction.atomic():
+                email = OutboxEmail.objects.create(dedupe_key=dedupe_key, **fields)
+        except IntegrityError:
+            return OutboxEmail.objects.get(dedupe_key=dedupe_key)
+    else:
+        email = OutboxEmail.objects.create(**fields)
+    if kick:
+        transaction.on_commit(_kick_flush)
+    return email
+
+
+def _kick_flush() -> None:
+    from payments.tasks import flush_email_outbox_task
+    # one pending flush task at a time, however many emails were queued meanwhile
+    flush_email_outbox_task(remove_existing_tasks=True)
+
+
+def _claim(limit: int) -> List[OutboxEmail]:
+    now = timezone.now()
+    due = Q(status=OutboxEmail.STATUS_PENDING) | Q(status=OutboxEmail.STATUS_SENDING)
+    with transaction.atomic():
+        qs = OutboxEmail.objects.filter(due, next_attempt_at__lte=now).order_by('next_attempt_at')
+        if db_connection.features.has_select_for_update_skip_locked:
+            qs = qs.select_for_update(skip_locked=True)
+        ids = list(qs.values_list('pk', flat=True)[:limit])
+        if not ids:
+            return []
+        OutboxEmail.objects.filter(pk__in=ids).update(status=OutboxEmail.STATUS_SENDING,
+                                                      next_attempt_at=now + SENDING_LEASE)
+    return list(OutboxEmail.objects.filter(pk__in=ids).order_by('pk'))
+
+
+def _message(row: OutboxEmail, connection) -> EmailMultiAlternatives:
+    msg = EmailMultiAlternatives(
+        subject=row.subject, body=row.text, from_email=row.from_email or None, to=row.to,
+        cc=row.cc, bcc=row.bcc, reply_to=row.reply_to, connection=connection,
+    )
+    if row.html:
+        msg.attach_alternative(row.html, 'text/html')
+    return msg
+
+
+def _send_chunk(connection, rows: List[OutboxEmail]) -> Dict[int, Optional[str]]:
+    """Send one chunk; returns row pk -> error (None on success)."""
+    messages = [_message(row, connection) for row in rows]
+    results: Dict[int, Optional[str]] = {}
+    if getattr(connection, 'supports_batch', False):
+        error = 'provider rejected the message'
+        try:
+            connection.send_messages(messages)
+        except Exception as e:  # noqa: BLE001 - recorded per row and retried
+            error = f"{type(e).__name__}: {e}"
+        for row, msg in zip(rows, messages):
+            ok = getattr(msg, 'provider_message_id', None) is not None
+            row.provider_message_id = (getattr(msg, 'provider_message_id', '') or '')[:100]
+            results[row.pk] = None if ok else error
+        return results
+    for row, msg in zip(rows, messages):
+        try:
+            results[row.pk] = None if connection.send_messages([msg]) else 'backend did not send the message'
+        except Exception as e:  # noqa: BLE001
+            results[row.pk] = f"{type(e).__name__}: {e}"
+    return results
+
+
+def flush_outbox(limit: int = FLUSH_LIMIT, batch_size: int = BATCH_SIZE) -> Dict[str, int]:
+    """Send due emails in batches over one connection; returns counters per outcome."""
+    counters = {'sent': 0, 'retry': 0, 'failed': 0}
+    rows = _claim(limit)
+    if not rows:
+        return counters
+    connection = get_connection(fail_silently=False)
+    results: Dict[int, Optional[str]] = {}
+    try:
+        connection.open()
+        for start in range(0, len(rows), batch_size):
+            results.update(_send_chunk(connection, rows[start:start + batch_size]))
+    except Exception as e:  # noqa: BLE001 - e.g. SMTP login failure: the whole claim is retried
+        logger.exception("Email outbox: backend failure")
+        for row in rows:
+            results.setdefault(row.pk, f"{type(e).__name__}: {e}")
+    finally:
+        try:
+            connection.close()
+        except Exception:  # noqa: BLE001
+            pass
+
+    now = timezone.now()
+    limit_attempts = max_attempts()
+    for row in rows:
+        error = results.get(row.pk, 'not sent')
+        if error is None:
+            row.status, row.sent_at, row.last_error = OutboxEmail.STATUS_SENT, now, ''
+            counters['sent'] += 1
+            continue
+        row.attempts += 1
+        row.last_error = error[:2000]
+        if row.attempts >= limit_attempts:
+            row.status = OutboxEmail.STATUS_FAILED
+            counters['failed'] += 1
+            logger.error("Email outbox: giving up on #%s after %s attempts: %s", row.pk, row.attempts, error)
+        else:
+            row.status = OutboxEmail.STATUS_PENDING
+            row.next_attempt_at = now + backoff(row.attempts)
+            counters['retry'] += 1
+    OutboxEmail.objects.bulk_update(
+        rows, ['status', 'sent_at', 'attempts', 'last_error', 'next_attempt_at', 'provider_message_id'], batch_size=500
+    )
+    logger.info("Email outbox flushed: %s", counters)
+    return counters
+
+
+def outbox_stats() -> Dict:
+    """Counts per status (overall and per category) plus the age of the oldest due email."""
+    by_status: Dict[str, int] = {status: 0 for status, _ in OutboxEmail.STATUS_CHOICES}
+    by_category: Dict[str, Dict[str, int]] = defaultdict(dict)
+    for row in OutboxEmail.objects.order_by().values('category', 'status').annotate(n=Count('pk')):
+        by_status[row['status']] += row['n']
+        by_category[row['category'] or '-'][row['status']] = row['n']
+    oldest = (OutboxEmail.objects.filter(status=OutboxEmail.STATUS_PENDING, next_attempt_at__lte=timezone.now())
+              .aggregate(oldest=Min('created_at'))['oldest'])
+    return {
+        'by_status': by_status,
+        'by_category': dict(by_category),
+        'oldest_due_age': round((timezone.now() - oldest).total_seconds(), 1) if oldest else None,
+    }
@@ -0,0 +1,29 @@
+"""The Stripe SDK, imported on first use.
+
+``import stripe`` loads a few hundred generated resource modules (~0.7 s),
+which used to be most of the boot time of every worker and ``manage.py``
+process that imported the URLconf. Views call ``get_stripe()`` instead of
+importing the module at the top; it imports the SDK once and sets
+``api_key`` from settings.
+"""
+from __future__ import annotations
+
+import threading
+
+from django.conf import settings
+
+_lock = threading.Lock()
+_stripe = None
+
+
+def get_stripe():
+    """The ``stripe`` module, configured with ``STRIPE_SECRET_KEY``."""
+    global _stripe
+    if _stripe is None:
+        with _lock:
+            if _stripe is None:
+                import stripe
+
+                stripe.api_key = settings.STRIPE_SECRET_KEY
+                _stripe = stripe
+    return _stripe
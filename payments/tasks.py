@@ -1,38 +1,16 @@
 """Background email tasks for payments app."""
 
 import logging
-from urllib.parse import urlparse
-from background_task import background
+from taskqueue import background
 from django.conf import settings
-from django.template.loader import render_to_string
 from django.db import transaction
+from common.email_templates import render_email
 from store.models import Order, UserSubscription
-from common.mail import send_email
+from payments.services import outbox
 
 logger = logging.getLogger(__name__)
 
 
-def _email_base_context() -> dict:
-    """Common context for emails: support contacts and site name/url."""
-    site_url = getattr(settings, "SITE_URL", None)
-    site_name = None
-    if site_url:
-        try:
-            netloc = urlparse(site_url).netloc
-            site_name = netloc.split(":")[0] if netloc else None
-        except Exception:  # noqa: BLE001
-            site_name = None
-    if not site_name:
-        site_name = "EcoMarket"
-    return {
-        "support_email": getattr(settings, "SUPPORT_EMAIL", None) or getattr(settings, "DEFAULT_FROM_EMAIL", None),
-        "support_phone": getattr(settings, "SUPPORT_PHONE", ""),
-        "support_address": getattr(settings, "SUPPORT_ADDRESS", ""),
-        "site_name": site_name,
-        "site_url": site_url,
-    }
-
-
 @background(schedule=5)
 def send_order_confirmation_email_task(order_id: int) -> bool:
     """Send order confirmation email in background."""
@@ -54,40 +32,24 @@ def send_order_confirmation_email_task(order_id: int) -> bool:
         recipient_email = order.email
         from_email = settings.DEFAULT_FROM_EMAIL
 
-        profile_url = None
-        orders_url = None
-        try:
-            base = settings.SITE_URL
-            profile_url = f"{base}/store/profile/edit/"
-            orders_url = f"{base}/store/orders/"
-        except Exception:  # noqa: BLE001 - best-effort URL build
-            profile_url = None
-            orders_url = None
-
-        context = {
-            "order": order,
-            "user": order.user,
-            "profile_url": profile_url,
-            "orders_url": orders_url,
-            **_email_base_context(),
-        }
-        plain_message = render_to_string("emails/order_confirmation.txt", context)
-        html_message = render_to_string("emails/order_confirmation.html", context)
-
-        send_email(
+        # support contacts and profile/orders links come from the cached base context
+        plain_message, html_message = render_email("emails/order_confirmation", {"order": order, "user": order.user})
+
+        outbox.enqueue(
             subject=subject,
             to=[recipient_email],
             text=plain_message,
             html=html_message,
             from_email=from_email,
-            fail_silently=False,
+            category="order_confirmation",
+            dedupe_key=f"order_confirmation:{order.id}",
         )
-        # Mark as sent after successful send
+        # Mark as sent once queued: the outbox owns delivery and retries from here
         with transaction.atomic():
             order = Order.objects.select_for_update().get(id=order_id)
             order.email_sent = True
             order.save(update_fields=["email_sent", "updated_at"]) if hasattr(order, "updated_at") else order.save(update_fields=["email_sent"])  # noqa: E701
-        logger.info("Email confirmation for Order #%s sent", order.id)
+        logger.info("Email confirmation for Order #%s queued", order.id)
         return True
     except Order.DoesNotExist:
         logger.error("TASK ERROR: Order with ID %s not found. Email not sent", order_id)
@@ -112,26 +74,18 @@ def send_subscription_confirmation_email_task(user_subscription_id: int) -> bool
         subject = f"Potwierdzenie subskrypcji: {user_sub.box_type.name} - EcoMarket"
         recipient_email = user_sub.user.email
         from_email = settings.DEFAULT_FROM_EMAIL
-        profile_url = None
-        try:
-            base = settings.SITE_URL
-            profile_url = f"{base}/store/profile/edit/"
-        except Exception:
-            profile_url = None
-        context = {"user_subscription": user_sub, "profile_url": profile_url, **_email_base_context()}
-        plain_message = render_to_string("emails/subscription_confirmation.txt", context)
-        html_message = render_to_string("emails/subscription_confirmation.html", context)
-
-        send_email(
+        plain_message, html_message = render_email("emails/subscription_confirmation", {"user_subscription": user_sub})
+
+        outbox.enqueue(
             subject=subject,
             to=[recipient_email],
             text=plain_message,
             html=html_message,
             from_email=from_email,
-            fail_silently=False,
+            category="subscription_confirmation",
         )
         logger.info(
-            "Subscription confirmation email sent for UserSubscription #%s to %s",
+            "Subscription confirmation email queued for UserSubscription #%s to %s",
             user_sub.id,
             user_sub.user.email,
         )
@@ -163,26 +117,18 @@ def send_subscription_canceled_email_task(user_subscription_id: int) -> bool:
         subject = f'Twoja subskrypcja "{user_sub.box_type.name}" została anulowana - EcoMarket'
         recipient_email = user_sub.user.email
         from_email = settings.DEFAULT_FROM_EMAIL
-        profile_url = None
-        try:
-            base = settings.SITE_URL
-            profile_url = f"{base}/store/profile/edit/"
-        except Exception:
-            profile_url = None
-        context = {"user_subscription": user_sub, "profile_url": profile_url, **_email_base_context()}
-        plain_message = render_to_string("emails/subscription_canceled_notice.txt", context)
-        html_message = render_to_string("emails/subscription_canceled_notice.html", context)
-
-        send_email(
+        plain_message, html_message = render_email("emails/subscription_canceled_notice", {"user_subscription": user_sub})
+
+        outbox.enqueue(
             subject=subject,
             to=[recipient_email],
             text=plain_message,
             html=html_message,
             from_email=from_email,
-            fail_silently=False,
+            category="subscription_canceled",
         )
         logger.info(
-            "Subscription cancel notice sent for UserSubscription #%s to %s",
+            "Subscription cancel notice queued for UserSubscription #%s to %s",
             user_sub.id,
             user_sub.user.email,
         )
@@ -216,26 +162,18 @@ def send_payment_failed_email_task(user_subscription_id: int) -> bool:
 
         subject = f'Problem z płatnością za subskrypcję "{user_sub.box_type.name}" - EcoMarket'
         from_email = settings.DEFAULT_FROM_EMAIL
-        profile_url = None
-        try:
-            base = settings.SITE_URL
-            profile_url = f"{base}/store/profile/edit/"
-        except Exception:
-            profile_url = None
-        context = {"user_subscription": user_sub, "profile_url": profile_url, **_email_base_context()}
-        plain_message = render_to_string("emails/subscription_payment_failed.txt", context)
-        html_message = render_to_string("emails/subscription_payment_failed.html", context)
-
-        send_email(
+        plain_message, html_message = render_email("emails/subscription_payment_failed", {"user_subscription": user_sub})
+
+        outbox.enqueue(
             subject=subject,
             to=[user_sub.user.email],
             text=plain_message,
             html=html_message,
             from_email=from_email,
-            fail_silently=False,
+            category="subscription_payment_failed",
         )
         logger.info(
-            "Payment failed email sent for UserSubscription #%s to %s",
+            "Payment failed email queued for UserSubscription #%s to %s",
             user_sub.id,
             user_sub.user.email,
         )
@@ -252,4 +190,10 @@ def send_payment_failed_email_task(user_subscription_id: int) -> bool:
             user_subscription_id,
             e,
         )
-        return False
\ No newline at end of file
+        return False
+
+
+@background(schedule=5)
+def flush_email_outbox_task() -> dict:
+    """Send due emails from the outbox (coalesced: enqueue() keeps at most one pending task)."""
+    return outbox.flush_outbox()
@@ -1,3 +1,127 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import httpx
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.mail import EmailMultiAlternatives
+from django.template.loader import render_to_string
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone, translation
+
+from common import email_templates
+from config.email_backends import resend
+from store.models import SubscriptionBoxType, UserSubscription
+from .models import OutboxEmail
+from .services import outbox
+
+
+class OutboxTests(TestCase):
+    def _queue(self, n, **kwargs):
+        return [outbox.enqueue(subject=f's{i}', to=[f'u{i}@example.com'], text='hi', html='<p>hi</p>',
+                               kick=False, **kwargs) for i in range(n)]
+
+    def test_flush_sends_due_emails_in_batches(self):
+        self._queue(5, category='order_confirmation')
+        counters = outbox.flush_outbox(batch_size=2)
+        self.assertEqual(counters, {'sent': 5, 'retry': 0, 'failed': 0})
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
+        self.assertFalse(OutboxEmail.objects.exclude(status=OutboxEmail.STATUS_SENT).exists())
+        self.assertEqual(outbox.flush_outbox(), {'sent': 0, 'retry': 0, 'failed': 0})
+        self.assertEqual(outbox.outbox_stats()['by_category']['order_confirmation'], {'sent': 5})
+
+    @override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=2)
+    def test_failures_back_off_and_give_up(self):
+        email, = self._queue(1)
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('down')):
+            self.assertEqual(outbox.flush_outbox()['retry'], 1)
+            email.refresh_from_db()
+            self.assertEqual((email.status, email.attempts, email.last_error), ('pending', 1, 'OSError: down'))
+            self.assertGreater(email.next_attempt_at, timezone.now() + outbox.backoff(1) * 0.5)
+            self.assertEqual(outbox.flush_outbox()['sent'], 0)  # not due yet
+
+            OutboxEmail.objects.update(next_attempt_at=timezone.now())
+            self.assertEqual(outbox.flush_outbox()['failed'], 1)
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboxEmail.STATUS_FAILED)
+        self.assertEqual(outbox.outbox_stats()['by_status']['failed'], 1)
+
+    def test_dedupe_key_and_kick(self):
+        from taskqueue.models import QueuedTask
+        with self.captureOnCommitCallbacks(execute=True):
+            first = outbox.enqueue(subject='order', to=['a@example.com'], dedupe_key='order_confirmation:1')
+            again = outbox.enqueue(subject='order', to=['a@example.com'], dedupe_key='order_confirmation:1')
+            outbox.enqueue(subject='other', to=['b@example.com'])
+        self.assertEqual(first.pk, again.pk)
+        self.assertEqual(OutboxEmail.objects.count(), 2)
+        self.assertEqual(QueuedTask.objects.count(), 1)  # flush task coalesced
+        self.assertIsNone(outbox.enqueue(subject='nobody', to=['']))
+
+    def test_stale_sending_rows_are_reclaimed(self):
+        email, = self._queue(1)
+        OutboxEmail.objects.filter(pk=email.pk).update(status=OutboxEmail.STATUS_SENDING,
+                                                        next_attempt_at=timezone.now() - outbox.SENDING_LEASE)
+        self.assertEqual(outbox.flush_outbox()['sent'], 1)
+
+
+@override_settings(RESEND_API_KEY='re_test', DEFAULT_FROM_EMAIL='shop@example.com', RESEND_BATCH_SIZE=3)
+class ResendBackendTests(SimpleTestCase):
+    def setUp(self):
+        self.requests = []
+
+        def handler(request):
+            body = json.loads(request.content)
+            self.requests.append((request.url.path, body))
+            if request.url.path.endswith('/batch'):
+                return httpx.Response(200, json={'data': [{'id': f'id-{i}'} for i in range(len(body))]})
+            return httpx.Response(200, json={'id': 'single'})
+
+        self.client = httpx.Client(transport=httpx.MockTransport(handler))
+        patcher = mock.patch.object(resend, 'get_client', return_value=self.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.client.close)
+
+    def test_batches_up_to_batch_size_and_sends_attachments_alone(self):
+        messages = [EmailMultiAlternatives(subject=f's{i}', body='x', to=[f'u{i}@example.com']) for i in range(4)]
+        with_file = EmailMultiAlternatives(subject='invoice', body='x', to=['a@example.com'])
+        with_file.attach('invoice.txt', 'data', 'text/plain')
+
+        sent = resend.ResendEmailBackend().send_messages(messages + [with_file])
+        self.assertEqual(sent, 5)
+        self.assertEqual([path for path, _ in self.requests], ['/emails', '/emails/batch', '/emails'])
+        self.assertEqual(len(self.requests[1][1]), 3)
+        self.assertEqual([m.provider_message_id for m in messages], ['id-0', 'id-1', 'id-2', 'single'])
+        self.assertEqual(with_file.provider_message_id, 'single')
+
+
+@override_settings(SITE_URL='https://eco.example.com', SUPPORT_EMAIL='help@example.com')
+class EmailTemplateTests(SimpleTestCase):
+    def _sub(self, i):
+        box = SubscriptionBoxType(name='Eko Box', slug='eko-box', price=Decimal('49.99'), billing_period='month')
+        now = timezone.now()
+        return UserSubscription(user=get_user_model()(username=f'user{i}'), box_type=box, status='active',
+                                stripe_subscription_id=f'sub_{i}', current_period_start=now,
+                                current_period_end=now + timedelta(days=30))
+
+    def test_cached_rendering_matches_render_to_string(self):
+        sub = self._sub(1)
+        context = {'user_subscription': sub, **email_templates.base_context()}
+        self.assertEqual(context['profile_url'], 'https://eco.example.com/store/profile/edit/')
+        for lang in ('pl', 'en'):
+            with translation.override(lang):
+                text, html = email_templates.render_email('emails/subscription_confirmation', {'user_subscription': sub})
+                self.assertEqual(text, render_to_string('emails/subscription_confirmation.txt', context))
+                self.assertEqual(html, render_to_string('emails/subscription_confirmation.html', context))
+
+    def test_batch_renders_each_context(self):
+        pairs = email_templates.render_batch('emails/subscription_confirmation', [
+            {'user_subscription': self._sub(i)} for i in range(3)
+        ])
+        self.assertEqual(len(pairs), 3)
+        self.assertIn('sub_2', pairs[2][0])
+        self.assertNotIn('sub_2', pairs[0][0])
+        self.assertIn('help@example.com', pairs[0][1])
@@ -13,8 +13,6 @@ from django.shortcuts import redirect, render, reverse
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 
-import stripe
-
 from store.cart import Cart
 from store.forms import OrderCreateForm
 from store.models import (
@@ -27,6 +25,7 @@ from store.models import (
     UserCoupon,
     UserSubscription,
 )
+from .services.stripe_api import get_stripe
 from .tasks import (
     send_order_confirmation_email_task,
     send_payment_failed_email_task,
@@ -36,8 +35,6 @@ from .tasks import (
 
 logger = logging.getLogger(__name__)
 
-stripe.api_key = settings.STRIPE_SECRET_KEY
-
 
 def checkout_and_payment(request):
     """
@@ -56,6 +53,7 @@ def checkout_and_payment(request):
             if request.user.is_authenticated:
                 order.user = request.user
             order.save()
+            # iterating the cart re-prices its lines from Product.price, so the order never uses a stored old price
             for item in cart:
                 OrderItem.objects.create(
                     order=order,
@@ -130,6 +128,7 @@ def checkout_and_payment(request):
                 request.session.get('coupon_discount', 0)
             )
 
+            stripe = get_stripe()
             try:
                 total_pln = cart.get_total_price()
                 if total_pln < Decimal('2.00'):
@@ -187,6 +186,7 @@ def stripe_webhook(request):
         logger.error("WEBHOOK: STRIPE_WEBHOOK_SECRET not configured")
         return HttpResponse(status=500, content="Webhook secret not configured.")
 
+    stripe = get_stripe()
     try:
         event = stripe.Webhook.construct_event(payload, sig_header, endpoint_secret)
     except ValueError as e:
@@ -2,7 +2,6 @@ import logging
 import time
 from typing import Any, Dict, List, Tuple
 
-import requests
 from django.conf import settings
 
 # Note: Data source is OpenStreetMap (OSM) via Overpass API.
@@ -107,6 +106,7 @@ def import_osm_places(
     Returns a dict with summary fields:
       used_api, fetched, processed, created, skipped_unnamed, sample (list)
     """
+    import requests  # here, not at the top: places.admin imports this module at startup
     from places.models import EcoPlace  # local import to avoid circulars at import time
 
     log = logger or logging.getLogger(__name__)
@@ -9,6 +9,7 @@ import math
 from .models import EcoPlace, PlaceReview, PlaceReviewVote
 from .forms import EcoPlaceForm, PlaceReviewForm
 from django.db import models
+from common.ratelimit import client_ip, get_limiter
 
 
 def _haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
@@ -84,7 +85,12 @@ def places_api(request):
             ]
             return JsonResponse({"results": data})
 
-    # Без фильтра радиуса — просто отдаем список
+    # Без фильтра радиуса — просто отдаем список (рейтинг и число отзывов одним запросом)
+    approved = models.Q(reviews__is_approved=True)
+    qs = qs.annotate(
+        average_rating=models.Avg("reviews__rating", filter=approved),
+        reviews_count=models.Count("reviews", filter=approved),
+    )
     data = [
         {
             "id": p.id,
@@ -95,8 +101,8 @@ def places_api(request):
             "lat": float(p.lat),
             "lng": float(p.lng),
             "description": p.description,
-            "average_rating": round((p.reviews.filter(is_approved=True).aggregate(models.Avg("rating"))["rating__avg"] or 0), 2),
-            "reviews_count": p.reviews.filter(is_approved=True).count(),
+            "average_rating": round(p.average_rating or 0, 2),
+            "reviews_count": p.reviews_count,
         }
         for p in qs
     ]
@@ -167,7 +173,9 @@ def add_review(request, pk: int):
     place = get_object_or_404(EcoPlace, pk=pk, is_active=True)
     if request.method == "POST":
         form = PlaceReviewForm(request.POST)
-        if form.is_valid():
+        if form.is_valid() and not get_limiter("place_review").hit(user=request.user, ip=client_ip(request)).allowed:
+            form.add_error(None, "Zbyt wiele opinii w krótkim czasie. Spróbuj ponownie później.")
+        elif form.is_valid():
             review = form.save(commit=False)
             review.place = place
             review.user = request.user
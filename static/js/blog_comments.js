@@ -55,13 +55,47 @@
     });
 
     // Highlight user's ratings if present
-    document.querySelectorAll('.comment-rating[data-user-rating]').forEach(function(cr){
-      var uv = parseInt(cr.getAttribute('data-user-rating'));
-      if (!uv) return;
-      cr.querySelectorAll('.rating-star').forEach(function(s){
-        var v = parseInt(s.getAttribute('data-value'));
-        s.classList.toggle('text-warning', v <= uv);
-        s.classList.toggle('text-secondary', v > uv);
+    function highlightUserRatings(root){
+      root.querySelectorAll('.comment-rating[data-user-rating]').forEach(function(cr){
+        var uv = parseInt(cr.getAttribute('data-user-rating'));
+        if (!uv) return;
+        cr.querySelectorAll('.rating-star').forEach(function(s){
+          var v = parseInt(s.getAttribute('data-value'));
+          s.classList.toggle('text-warning', v <= uv);
+          s.classList.toggle('text-secondary', v > uv);
+        });
+      });
+    }
+    highlightUserRatings(document);
+
+    // "Load more" - next keyset page of comments
+    var loadMoreBtn = document.getElementById('comments-load-more');
+    if (loadMoreBtn) loadMoreBtn.addEventListener('click', function(){
+      var cursor = loadMoreBtn.getAttribute('data-cursor');
+      if (!cursor) return;
+      loadMoreBtn.disabled = true;
+      fetch(loadMoreBtn.getAttribute('data-url') + '?cursor=' + encodeURIComponent(cursor), {
+        headers: { 'X-Requested-With': 'XMLHttpRequest' }
+      }).then(function(res){ return res.json(); }).then(function(data){
+        if (!data || !data.ok) return;
+        var wrapper = document.createElement('div');
+        wrapper.innerHTML = data.html;
+        highlightUserRatings(wrapper);
+        while (wrapper.firstElementChild) {
+          var node = wrapper.firstElementChild;
+          // Skip comments already on the page (e.g. one just added by this user)
+          if (node.id && document.getElementById(node.id)) { node.remove(); continue; }
+          commentsList.appendChild(node);
+        }
+        if (data.next_cursor) {
+          loadMoreBtn.setAttribute('data-cursor', data.next_cursor);
+        } else {
+          loadMoreBtn.parentElement.remove();
+        }
+      }).catch(function(err){
+        try { console.error('Błąd ładowania komentarzy:', err); } catch(_) {}
+      }).finally(function(){
+        loadMoreBtn.disabled = false;
       });
     });
 
@@ -20,6 +20,7 @@
   const roomId = parseInt(root.dataset.roomId, 10);
   const currentUsername = root.dataset.username || '';
   const messagesApi = root.dataset.messagesApi;
+  const uploadApi = root.dataset.uploadApi;
   const csrftoken = (document.querySelector('[name=csrfmiddlewaretoken]') || {}).value || '';
 
   let socket = null;
@@ -84,6 +85,8 @@
     if (m.id && seenIds.has(m.id)) {
       const existing = messagesBox.querySelector(`[data-id="${m.id}"] [data-text]`);
       if (existing && typeof m.text === 'string') existing.textContent = m.text;
+      // Polling clients pick up thumbnails generated since the last fetch
+      (m.attachments || []).forEach(a => { if (a.status !== 'pending') applyAttachmentReady(a); });
       return;
     }
     // Reconcile optimistic message if client_id matches
@@ -165,16 +168,20 @@
       att.className = 'mt-1 chat-attachments';
       m.attachments.forEach(a => {
         try {
-          const isImg = /\.(png|jpe?g|gif|webp|bmp|svg)$/i.test(a.name || a.url || '');
+          const isImg = (typeof a.is_image === 'boolean') ? a.is_image : /\.(png|jpe?g|gif|webp|bmp|svg)$/i.test(a.name || a.url || '');
           if (isImg){
             const aLink = document.createElement('a');
             aLink.href = a.url;
             aLink.className = 'chat-attach-thumb-link';
             aLink.setAttribute('data-image', '1');
+            if (a.id) aLink.setAttribute('data-attachment-id', String(a.id));
             const img = document.createElement('img');
-            img.src = a.url;
+            // Never load the original inline; wait for the thumbnail while it is being generated
+            if (a.thumb_url) img.src = a.thumb_url;
+            else if (a.status === 'pending') img.classList.add('is-pending');
+            else img.src = a.url;
             img.alt = a.name || '';
-            img.className = 'chat-attach-thumb';
+            img.classList.add('chat-attach-thumb');
             aLink.appendChild(img);
             att.appendChild(aLink);
           } else {
@@ -228,6 +235,14 @@
     if (m.id) lastId = m.id;
   }
 
+  function applyAttachmentReady(a){
+    if (!a || !a.id) return;
+    const img = messagesBox.querySelector(`[data-attachment-id="${a.id}"] img.is-pending`);
+    if (!img) return;
+    img.src = a.thumb_url || a.url;
+    img.classList.remove('is-pending');
+  }
+
   async function pollOnce(){
     const qs = lastId ? ('?since_id=' + lastId) : '';
     try {
@@ -266,8 +281,14 @@
           showScrollBtn(false);
         } else if (data.type === 'message'){
           renderMessage(data, { animate: true });
+        } else if (data.type === 'attachment_ready'){
+          applyAttachmentReady(data.attachment);
         } else if (data.type === 'typing' && data.user && data.user !== currentUsername){
           showTyping(data.user);
+        } else if (data.type === 'error'){
+          const pending = data.client_id && pendingByClientId.get(data.client_id);
+          if (pending){ pending.remove(); pendingByClientId.delete(data.client_id); }
+          attachmentsInfo.textContent = (data.errors || ['Błąd wysyłki wiadomości']).join(' · ');
         } else if (data.type === 'message_removed'){
             const wrap = messagesBox.querySelector(`[data-id="${data.id}"]`);
             if (wrap){ wrap.classList.add('removing'); setTimeout(() => { wrap.remove(); }, 180); }
@@ -388,6 +409,24 @@
       bar.querySelector('#cancelReply').onclick = () => setReplying(null);
     } else if (bar){ bar.remove(); }
   }
+  // Direct-to-storage upload: ticket from the app, bytes straight to storage
+  async function uploadDirect(file){
+    const meta = new FormData();
+    meta.append('name', file.name);
+    meta.append('content_type', file.type || '');
+    meta.append('size', String(file.size || 0));
+    const resp = await fetch(uploadApi, { method: 'POST', body: meta, headers: { 'X-CSRFToken': csrftoken } });
+    const ticket = await resp.json();
+    if (!resp.ok || !ticket.ok) throw new Error((ticket.errors || ['Błąd przesyłania']).join(' · '));
+    const body = new FormData();
+    Object.entries(ticket.fields || {}).forEach(([k, v]) => body.append(k, v));
+    body.append('file', file);
+    const sameOrigin = ticket.url.startsWith('/');
+    const put = await fetch(ticket.url, { method: 'POST', body, headers: sameOrigin ? { 'X-CSRFToken': csrftoken } : {} });
+    if (!put.ok) throw new Error(`Nie udało się przesłać pliku: ${file.name}`);
+    return ticket.token;
+  }
+
   form.addEventListener('submit', async (e) => {
     e.preventDefault();
     const input = form.querySelector('textarea, input[name="text"]');
@@ -438,6 +477,16 @@
     try {
   const fd = new FormData(form);
       if (replyingTo) fd.append('reply_to', String(replyingTo.id));
+      if (hasFiles && uploadApi){
+        fd.delete('attachments');
+        try {
+          const tokens = await Promise.all(filesArray().map(uploadDirect));
+          tokens.forEach(t => fd.append('uploads', t));
+        } catch(err){
+          attachmentsInfo.textContent = err.message || 'Błąd przesyłania';
+          return;
+        }
+      }
       const resp = await fetch(form.action, { method: 'POST', body: fd, headers: { 'X-CSRFToken': csrftoken } });
       if (resp.ok){
         form.reset();
@@ -1,7 +1,7 @@
 # store/admin.py
 
 from django.contrib import admin
-from .models import (Category, Product, Order, OrderItem, Profile, SubscriptionBoxType, UserSubscription, Coupon, UserCoupon, ProductRating, HomePageSettings)
+from .models import (Category, Product, Order, OrderItem, Profile, SubscriptionBoxType, UserSubscription, Coupon, CouponBatch, UserCoupon, Cart, CartLine, ProductRating, HomePageSettings)
 from import_export.admin import ImportExportModelAdmin
 from .admin_resources import CategoryResource, ProductResource
 from django.utils.safestring import mark_safe
@@ -185,8 +185,8 @@ class UserSubscriptionAdmin(admin.ModelAdmin):
 
 @admin.register(Coupon)
 class CouponAdmin(admin.ModelAdmin):
-    list_display = ('code', 'discount', 'valid_from', 'valid_to', 'active')
-    list_filter = ('active', 'valid_from', 'valid_to')
+    list_display = ('code', 'discount', 'valid_from', 'valid_to', 'active', 'batch')
+    list_filter = ('active', 'valid_from', 'valid_to', 'batch')
     search_fields = ('code',)
     ordering = ('-valid_from',)
     fieldsets = (
@@ -195,6 +195,27 @@ class CouponAdmin(admin.ModelAdmin):
         }),
     )
 
+@admin.register(CouponBatch)
+class CouponBatchAdmin(admin.ModelAdmin):
+    list_display = ('key', 'issued', 'created_at', 'completed_at')
+    search_fields = ('key',)
+    readonly_fields = ('key', 'issued', 'created_at', 'completed_at')
+
+class CartLineInline(admin.TabularInline):
+    model = CartLine
+    raw_id_fields = ['product']
+    readonly_fields = ('product', 'quantity', 'unit_price')
+    extra = 0
+    can_delete = False
+
+@admin.register(Cart)
+class CartAdmin(admin.ModelAdmin):
+    # Tylko podgląd: koszyk zmienia się przez store.cart.Cart (który odświeża kopię w cache)
+    list_display = ('user', 'created_at', 'updated_at')
+    search_fields = ('user__username', 'user__email')
+    readonly_fields = ('user', 'created_at', 'updated_at')
+    inlines = [CartLineInline]
+
 @admin.action(description="Oznacz jako nieużywane")
 def mark_as_used(modeladmin, request, queryset):
     queryset.update(is_used=True)
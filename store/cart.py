@@ -1,8 +1,8 @@
 # store/cart.py
 
 from decimal import Decimal
-from django.conf import settings
 from .models import Product, Coupon # Added Coupon
+from store.services.carts import Line, cart_store_for, from_minor, to_minor
 from django.utils import timezone # Added timezone
 import logging
 
@@ -10,23 +10,9 @@ logger = logging.getLogger(__name__)
 class Cart:
     def __init__(self, request):
         self.session = request.session
-        cart_data = self.session.get(settings.CART_SESSION_ID)
-        if not cart_data:
-            # Initialize cart and coupon_id if not present
-            cart_data = self.session[settings.CART_SESSION_ID] = {}
-        self.cart = cart_data
-
-        # Sanitize existing cart entries: keep only JSON-serializable fields
-        # Allowed keys in each item: 'quantity' (int), 'price' (str)
-        changed = False
-        for pid, data in list(self.cart.items()):
-            if isinstance(data, dict):
-                keys_to_remove = [k for k in list(data.keys()) if k not in ('quantity', 'price')]
-                for k in keys_to_remove:
-                    data.pop(k, None)
-                    changed = True
-        if changed:
-            self.save()
+        # Гости: корзина в сессии; вошедшие пользователи: store.Cart в БД (см. store/services/carts.py)
+        self.store = cart_store_for(request)
+        self.lines = self.store.load()
 
         # Coupon handling
         self.coupon = None
@@ -43,98 +29,89 @@ class Cart:
             except Coupon.DoesNotExist:
                 self.clear_coupon() # Coupon ID in session but no such coupon
 
+    @property
+    def cart(self):
+        """
+        Позиции в прежнем формате сессии: {product_id: {'quantity': int, 'price': str}} (только для чтения).
+        """
+        return {product_id: {'quantity': line.quantity, 'price': str(from_minor(line.price))}
+                for product_id, line in self.lines.items()}
+
     def add(self, product, quantity=1, update_quantity=False):
         """
         Добавить товар в корзину или обновить его количество.
         """
         product_id = str(product.id) # Используем строку для ID товара в качестве ключа JSON
 
-        if product_id not in self.cart:
-            self.cart[product_id] = {'quantity': 0, 'price': str(product.price)}
+        line = self.lines.get(product_id)
+        if line is None:
+            line = self.lines[product_id] = Line(quantity=0, price=to_minor(product.price))
 
         if update_quantity:
             # Если флаг update_quantity=True, устанавливаем новое количество
-            self.cart[product_id]['quantity'] = quantity
+            line.quantity = quantity
         else:
             # Иначе, увеличиваем количество на quantity (обычно на 1)
-            self.cart[product_id]['quantity'] += quantity
+            line.quantity += quantity
 
         # Проверка, чтобы количество не превышало остаток на складе
-        if product.stock is not None and self.cart[product_id]['quantity'] > product.stock:
-             self.cart[product_id]['quantity'] = product.stock # Ограничиваем максимальным количеством на складе
-             # Можно добавить сообщение для пользователя здесь или в представлении
+        if product.stock is not None and line.quantity > product.stock:
+             line.quantity = product.stock # Ограничиваем максимальным количеством на складе
 
         # Если количество стало 0 или меньше, удаляем товар
-        if self.cart[product_id]['quantity'] <= 0:
+        if line.quantity <= 0:
              self.remove(product)
         else:
-             self.save()
+             self.save([product_id])
 
     def remove(self, product):
         """
         Удалить товар из корзины.
         """
         product_id = str(product.id)
-        if product_id in self.cart:
-            del self.cart[product_id]
+        if product_id in self.lines:
+            del self.lines[product_id]
             # Если после удаления корзина пуста — полностью очищаем её и купон
-            if not self.cart:  # пустой dict
-                self.clear()  # также очистит купон и пометит сессию изменённой
+            if not self.lines:
+                self.clear()  # также очистит купон
             else:
-                self.save()
+                self.save([product_id])
 
     def __iter__(self):
-        product_ids = self.cart.keys()
-        # Используем logger.debug() или logger.info() вместо print()
-        logger.info(f"CART_DEBUG: Product IDs in session cart: {list(product_ids)}")
+        product_ids = list(self.lines.keys())
+        logger.info(f"CART_DEBUG: Product IDs in cart: {product_ids}")
 
         products = Product.objects.filter(id__in=product_ids)
-        logger.info(f"CART_DEBUG: Products fetched from DB: {[(p.id, p.name, p.slug) for p in products]}")
-
-        cart = self.cart.copy()
 
         products_in_cart = []
-        for product_instance in products: # Переименовал для ясности
+        found = set()
+        repriced = []
+        for product_instance in products:
             product_id_str = str(product_instance.id)
-            if not product_instance.slug: # ПРОВЕРКА ПРЯМО ЗДЕСЬ
+            found.add(product_id_str)
+            if not product_instance.slug:
                 logger.error(f"CART_CRITICAL_DEBUG: Product ID {product_instance.id} ('{product_instance.name}') has an empty or NULL slug ('{product_instance.slug}') right after fetching from DB!")
-            
-            raw = cart.get(product_id_str) # Используем .get() для безопасности, хотя ID должен быть
-            if raw is None:
-                logger.warning(f"CART_DEBUG: Product ID {product_id_str} found in DB but not in cart session copy. Skipping.")
-                continue
-
-            # Do NOT mutate session-stored dicts; build a separate item dict for template
-            try:
-                price_dec = Decimal(raw['price'])
-            except Exception:
-                # Fallback: coerce to Decimal safely
-                price_dec = Decimal(str(raw.get('price', '0')))
-            item_for_template = {
+            line = self.lines[product_id_str]
+            # Корзина (особенно в БД) живёт долго: цена всегда текущая цена товара, не цена на момент добавления
+            current_price = to_minor(product_instance.price)
+            if line.price != current_price:
+                line.price = current_price
+                repriced.append(product_id_str)
+            # Цены хранятся в грошах; в шаблон отдаём Decimal
+            products_in_cart.append({
                 'product_obj': product_instance,
-                'quantity': raw.get('quantity', 0),
-                'price': price_dec,
-                'total_price': price_dec * raw.get('quantity', 0),
-            }
-            products_in_cart.append(item_for_template)
-
-        current_product_ids_in_db = [str(p.id) for p in products]
-        ids_removed_from_session = []
-        for product_id_in_session in list(cart.keys()): 
-            if product_id_in_session not in current_product_ids_in_db:
-                ids_removed_from_session.append(product_id_in_session)
-                del self.cart[product_id_in_session]
-        
-        if ids_removed_from_session:
-            logger.info(f"CART_DEBUG: Product IDs removed from session because not in DB: {ids_removed_from_session}")
-            self.save() 
-
-        logger.info(f"CART_DEBUG: Final products_in_cart to be iterated by template: {[{'id': item['product_obj'].id, 'name': item['product_obj'].name, 'slug': item['product_obj'].slug, 'qty': item['quantity']} for item in products_in_cart]}")
-        
-        # Дополнительная проверка непосредственно перед возвратом
-        for item_for_template in products_in_cart:
-            if not item_for_template['product_obj'].slug:
-                logger.error(f"CART_CRITICAL_DEBUG_FINAL_CHECK: Product ID {item_for_template['product_obj'].id} ('{item_for_template['product_obj'].name}') has slug ('{item_for_template['product_obj'].slug}') before returning to template!")
+                'quantity': line.quantity,
+                'price': from_minor(line.price),
+                'total_price': from_minor(line.price * line.quantity),
+            })
+
+        ids_removed = [product_id for product_id in product_ids if product_id not in found]
+        if ids_removed:
+            logger.info(f"CART_DEBUG: Product IDs removed from cart because not in DB: {ids_removed}")
+            for product_id in ids_removed:
+                del self.lines[product_id]
+        if ids_removed or repriced:
+            self.save(ids_removed + repriced)
 
         return iter(products_in_cart)
 
@@ -142,30 +119,28 @@ class Cart:
         """
         Подсчет общего количества товаров в корзине.
         """
-        return sum(item['quantity'] for item in self.cart.values())
+        return sum(line.quantity for line in self.lines.values())
 
     def get_total_price(self):
         """
         Подсчет общей стоимости товаров в корзине.
         """
-        # Возвращаем Decimal даже если корзина пуста, чтобы избежать ошибок при quantize
-        return sum((Decimal(item['price']) * item['quantity'] for item in self.cart.values()), Decimal('0.00'))
+        # Суммируем в грошах и один раз переводим в Decimal (0.00 для пустой корзины)
+        return from_minor(sum(line.price * line.quantity for line in self.lines.values()))
 
     def clear(self):
         """
-        Удаление корзины из сессии и сброс купона.
+        Удаление всех позиций корзины и сброс купона.
         """
-        # del self.session[settings.CART_SESSION_ID] # This would delete the cart items too
-        # Instead, clear the cart items and then the coupon
-        self.cart = self.session[settings.CART_SESSION_ID] = {}
+        self.lines = {}
+        self.store.clear()
         self.clear_coupon() # Ensure coupon is cleared when cart is cleared
-        self.save()
 
-    def save(self):
+    def save(self, product_ids=None):
         """
-        Помечает сессию как "измененную", чтобы убедиться, что она сохранена.
+        Сохраняет изменённые позиции (по умолчанию все) в хранилище корзины.
         """
-        self.session.modified = True
+        self.store.save(self.lines, self.lines.keys() if product_ids is None else product_ids)
 
     def set_coupon(self, coupon):
         """
@@ -173,7 +148,6 @@ class Cart:
         """
         self.session['coupon_id'] = coupon.id
         self.coupon = coupon
-        self.save()
 
     def get_discount(self):
         """
@@ -200,15 +174,12 @@ class Cart:
         """
         Удаляет купон из сессии (сброс скидки).
         """
-        if 'coupon_id' in self.session:
-            del self.session['coupon_id']
-        # Remove old session keys if they exist, for cleanup
-        if 'coupon_code' in self.session:
-            del self.session['coupon_code']
-        if 'coupon_discount' in self.session:
-            del self.session['coupon_discount']
+        # Remove old session keys (coupon_code, coupon_discount) too, for cleanup.
+        # Deleting a key marks the session modified; nothing to delete means nothing to save.
+        for key in ('coupon_id', 'coupon_code', 'coupon_discount'):
+            if key in self.session:
+                del self.session[key]
         self.coupon = None
-        self.save()
 
     def get_discount_amount(self):
         """
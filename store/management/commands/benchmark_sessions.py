@@ -0,0 +1,114 @@
+import random
+import re
+from contextlib import contextmanager
+from decimal import Decimal
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from store.cart import Cart
+from store.models import Category, Product
+from store.services.carts import SessionCartStore
+
+User = get_user_model()
+
+WRITE_RE = re.compile(r'^\s*(INSERT|UPDATE|DELETE)\b', re.I)
+ENGINES = (
+    ("db engine + old cart (before)", "django.contrib.sessions.backends.db", True),
+    ("db engine", "django.contrib.sessions.backends.db", False),
+    ("common.sessions (after)", "common.sessions", False),
+)
+
+
+class Rollback(Exception):
+    pass
+
+
+@contextmanager
+def legacy_cart():
+    """The previous Cart.__init__ stored an empty cart in the session on every page render."""
+    original = Cart.__init__
+
+    def init(self, request):
+        original(self, request)
+        if isinstance(self.store, SessionCartStore) and settings.CART_SESSION_ID not in self.session:
+            self.session[settings.CART_SESSION_ID] = self.cart
+
+    with mock.patch.object(Cart, '__init__', init):
+        yield
+
+
+class Command(BaseCommand):
+    help = ("DB writes per 1k page views with the default DB session engine vs the hybrid engine "
+            "(common.sessions), on a synthetic browse / add-to-cart / logged-in traffic mix. "
+            "Everything is created inside a transaction that is rolled back at the end.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--views", type=int, default=1000, help="Page views per engine.")
+        parser.add_argument("--logged-in", type=float, default=0.2, help="Share of logged-in visitors.")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise Rollback
+        except Rollback:
+            self.stdout.write("Synthetic data rolled back.")
+
+    def _run(self, options):
+        category = Category.objects.create(name="Bench sessions", slug="bench-sessions")
+        products = [
+            Product.objects.create(category=category, name=f"Bench product {i}", slug=f"bench-session-product-{i}",
+                                   price=Decimal("19.99"), stock=100, available=True)
+            for i in range(20)
+        ]
+        users = [User.objects.create_user(username=f"bench_session_{i}", password="x" * 12) for i in range(20)]
+        views = max(1, options["views"])
+        for label, engine, old_cart in ENGINES:
+            with override_settings(SESSION_ENGINE=engine, ALLOWED_HOSTS=["testserver"]):
+                rng = random.Random(options["seed"])
+                if old_cart:
+                    with legacy_cart():
+                        session_writes, writes = self._traffic(rng, views, options["logged_in"], products, users)
+                else:
+                    session_writes, writes = self._traffic(rng, views, options["logged_in"], products, users)
+            per_1k = 1000 / views
+            self.stdout.write(f"{label:<32} session writes/1k views: {session_writes * per_1k:8.1f}   "
+                              f"all DB writes/1k views: {writes * per_1k:8.1f}")
+
+    def _traffic(self, rng, views, logged_in_share, products, users):
+        session_writes = writes = done = 0
+        while done < views:
+            client = Client()
+            if rng.random() < logged_in_share:
+                client.force_login(rng.choice(users))
+            # one visit: a few pages, sometimes a cart add and the cart page
+            for _ in range(rng.randint(2, 6)):
+                product = rng.choice(products)
+                roll = rng.random()
+                reset_queries()  # queries_log is a bounded deque; CaptureQueriesContext slices it by index
+                with CaptureQueriesContext(connection) as ctx:
+                    if roll < 0.4:
+                        client.get(reverse("store:product_list"))
+                    elif roll < 0.8:
+                        client.get(reverse("store:product_detail", args=[product.slug]))
+                    elif roll < 0.9:
+                        client.post(reverse("store:cart_add", args=[product.id]), {"quantity": 1},
+                                    HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+                    else:
+                        client.get(reverse("store:cart_detail"))
+                for query in ctx.captured_queries:
+                    if WRITE_RE.match(query["sql"]):
+                        writes += 1
+                        session_writes += "django_session" in query["sql"]
+                done += 1
+                if done >= views:
+                    break
+        return session_writes, writes
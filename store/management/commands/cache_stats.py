@@ -0,0 +1,62 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from common.cache import collect_stats, reset_stats
+
+
+def _pct(ratio):
+    return f"{ratio:6.1%}" if ratio is not None else "     -"
+
+
+class Command(BaseCommand):
+    help = (
+        "Cache hit ratio per key namespace (L1 / L2 / miss of the tiered cache) and Redis keyspace figures. "
+        "Usage: manage.py cache_stats [--alias tiered] [--watch SECONDS] [--json] [--reset]"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--alias", default="tiered", help="Cache alias to report on.")
+        parser.add_argument("--watch", type=float, default=0, help="Refresh every N seconds until interrupted.")
+        parser.add_argument("--json", action="store_true", help="Print raw metrics as JSON.")
+        parser.add_argument("--reset", action="store_true", help="Zero the shared counters and exit.")
+
+    def handle(self, *args, **options):
+        if options["reset"]:
+            reset_stats(options["alias"])
+            self.stdout.write(self.style.SUCCESS("Cache counters reset."))
+            return
+        while True:
+            stats = collect_stats(options["alias"])
+            if options["json"]:
+                self.stdout.write(json.dumps(stats, indent=2))
+            else:
+                self._table(stats)
+            if not options["watch"]:
+                return
+            try:
+                time.sleep(options["watch"])
+            except KeyboardInterrupt:
+                return
+
+    def _table(self, stats):
+        self.stdout.write(f"{'namespace':<24} {'L1 hits':>9} {'L2 hits':>9} {'misses':>9} {'hit %':>7} {'L1 %':>7}")
+        for name, row in stats["namespaces"].items():
+            self.stdout.write(
+                f"{name:<24} {row['l1']:>9} {row['l2']:>9} {row['miss']:>9} "
+                f"{_pct(row['hit_ratio'])} {_pct(row['l1_ratio'])}"
+            )
+        if not stats["namespaces"]:
+            self.stdout.write("(no cache reads recorded yet)")
+        server = stats["redis"]
+        if server is None:
+            self.stdout.write("Redis: not configured (process-local cache).")
+        elif "error" in server:
+            self.stdout.write(f"Redis: {server['error']}")
+        else:
+            self.stdout.write(
+                f"Redis: hits={server['keyspace_hits']} misses={server['keyspace_misses']} "
+                f"hit%={_pct(server['hit_ratio']).strip()} memory={server['used_memory_human']} "
+                f"evicted={server['evicted_keys']} clients={server['connected_clients']}"
+            )
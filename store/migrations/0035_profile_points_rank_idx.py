@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-19 17:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0034_alter_homepagesettings_box_image_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['-eco_points', 'last_points_update'], name='profile_points_rank_idx'),
+        ),
+    ]
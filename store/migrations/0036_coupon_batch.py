@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-19 17:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0035_profile_points_rank_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CouponBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True, verbose_name='Klucz idempotencji')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Data utworzenia')),
+                ('completed_at', models.DateTimeField(blank=True, null=True, verbose_name='Data zakończenia')),
+                ('issued', models.PositiveIntegerField(default=0, verbose_name='Wydanych kuponów')),
+            ],
+            options={
+                'verbose_name': 'Partia kuponów',
+                'verbose_name_plural': 'Partie kuponów',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='coupon',
+            name='batch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='coupons', to='store.couponbatch', verbose_name='Partia'),
+        ),
+    ]
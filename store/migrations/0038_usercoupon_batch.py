@@ -0,0 +1,43 @@
+# Generated by Django 5.2 on 2026-10-19 18:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_batches(apps, schema_editor):
+    """Coupons issued before this migration: batch from their coupon, treated as already notified."""
+    UserCoupon = apps.get_model('store', 'UserCoupon')
+    seen = set()
+    changed = []
+    for uc in UserCoupon.objects.filter(coupon__batch__isnull=False).select_related('coupon').order_by('pk'):
+        if (uc.coupon.batch_id, uc.user_id) in seen:
+            continue  # a duplicate from a concurrent run stays outside the batch
+        seen.add((uc.coupon.batch_id, uc.user_id))
+        uc.batch_id, uc.notified_at = uc.coupon.batch_id, uc.awarded_at
+        changed.append(uc)
+    UserCoupon.objects.bulk_update(changed, ['batch', 'notified_at'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0037_persistent_cart'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usercoupon',
+            name='batch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='user_coupons', to='store.couponbatch', verbose_name='Partia'),
+        ),
+        migrations.AddField(
+            model_name='usercoupon',
+            name='notified_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Powiadomienie wysłane do kolejki'),
+        ),
+        migrations.RunPython(backfill_batches, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='usercoupon',
+            constraint=models.UniqueConstraint(fields=('batch', 'user'), name='usercoupon_batch_user_uniq'),
+        ),
+    ]
@@ -20,6 +20,7 @@ def profile_avatar_upload_to(instance, filename: str) -> str:
     safe_user = slugify(getattr(instance.user, 'username', '') or 'user')
     safe_name = slugify(name or 'avatar')
     return f"avatars/{safe_user}/{safe_name}{ext.lower()}"
+from django.utils.functional import LazyObject
 from django.utils.module_loading import import_string
 from django.core.validators import MinValueValidator, MaxValueValidator
 
@@ -43,20 +44,33 @@ class Category(models.Model):
         # 'store:product_list_by_category' - это имя URL, которое мы создадим позже
         return reverse('store:product_list_by_category', args=[self.slug])
     
+class ProductImageStorage(LazyObject):
+    """
+    Хранилище для загружаемых изображений: S3 (settings.DEFAULT_FILE_STORAGE) в продакшене,
+    FileSystemStorage при DEBUG=True. Класс хранилища (boto3) импортируется при первом
+    обращении к файлу, а не при определении моделей.
+    """
+    def _setup(self):
+        if not settings.DEBUG:
+            storage_path = settings.DEFAULT_FILE_STORAGE # Должен быть 'storages.backends.s3boto3.S3Boto3Storage'
+        else:
+            storage_path = 'django.core.files.storage.FileSystemStorage' # Явно для DEBUG=True
+        self._wrapped = import_string(storage_path)()
+
+    def __bool__(self):
+        # FileField.__init__ делает `storage or default_storage` - без этого хранилище создавалось бы сразу
+        return True
+
+
+product_image_storage = ProductImageStorage()
+
+
 def get_product_image_storage_instance():
     """
-    Возвращает экземпляр файлового хранилища в зависимости от settings.DEBUG.
-    Вызывается один раз при определении класса Product.
+    Возвращает общий для всех моделей экземпляр хранилища изображений.
+    Оставлена для полей моделей и старых миграций, которые её вызывают.
     """
-    if not settings.DEBUG:
-        storage_path = settings.DEFAULT_FILE_STORAGE # Должен быть 'storages.backends.s3boto3.S3Boto3Storage'
-        print(f"[get_product_image_storage_instance] Using S3 Storage: {storage_path}")
-    else:
-        storage_path = 'django.core.files.storage.FileSystemStorage' # Явно для DEBUG=True
-        print(f"[get_product_image_storage_instance] Using FileSystem Storage: {storage_path}")
-    
-    StorageClass = import_string(storage_path)
-    return StorageClass()
+    return product_image_storage
 
 class Product(models.Model):
     category = models.ForeignKey(Category,
@@ -160,6 +174,22 @@ class HomePageSettings(models.Model):
         obj, _ = cls.objects.get_or_create(pk=1)
         return obj
 
+class CouponBatch(models.Model):
+    """Jedno masowe wydanie kuponów (np. nagrody za miesiąc); klucz zapewnia idempotentność ponownych uruchomień."""
+    key = models.CharField(max_length=100, unique=True, verbose_name="Klucz idempotencji")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Data utworzenia")
+    completed_at = models.DateTimeField(null=True, blank=True, verbose_name="Data zakończenia")
+    issued = models.PositiveIntegerField(default=0, verbose_name="Wydanych kuponów")
+
+    class Meta:
+        verbose_name = "Partia kuponów"
+        verbose_name_plural = "Partie kuponów"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return self.key
+
+
 class Coupon(models.Model):
     from django.core.validators import MinValueValidator, MaxValueValidator
     code = models.CharField(max_length=50, unique=True, verbose_name="Kod kuponu")
@@ -172,6 +202,10 @@ class Coupon(models.Model):
         validators=[MinValueValidator(0), MaxValueValidator(100)]
     )
     active = models.BooleanField(default=True, verbose_name="Aktywny")
+    batch = models.ForeignKey(
+        CouponBatch, null=True, blank=True, on_delete=models.SET_NULL, related_name='coupons',
+        verbose_name="Partia"
+    )
 
     class Meta:
         verbose_name = "Kupon rabatowy"
@@ -264,7 +298,40 @@ class OrderItem(models.Model):
     def get_cost(self):
         """Возвращает стоимость данного элемента заказа (цена * количество)"""
         return self.price * self.quantity
-    
+
+
+class Cart(models.Model):
+    """Koszyk zalogowanego użytkownika (trwały, wspólny dla wszystkich urządzeń); goście mają koszyk w sesji."""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='cart',
+                                verbose_name="Użytkownik")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Data utworzenia")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Data aktualizacji")
+
+    class Meta:
+        verbose_name = "Koszyk"
+        verbose_name_plural = "Koszyki"
+
+    def __str__(self):
+        return f"Koszyk {self.user}"
+
+
+class CartLine(models.Model):
+    """Pozycja koszyka; cena z chwili dodania w groszach (jednostkach podrzędnych waluty)."""
+    cart = models.ForeignKey(Cart, related_name='lines', on_delete=models.CASCADE, verbose_name="Koszyk")
+    product = models.ForeignKey(Product, related_name='cart_lines', on_delete=models.CASCADE, verbose_name="Produkt")
+    quantity = models.PositiveIntegerField(default=1, verbose_name="Ilość")
+    unit_price = models.PositiveIntegerField(verbose_name="Cena jednostkowa (gr)")
+
+    class Meta:
+        verbose_name = "Pozycja koszyka"
+        verbose_name_plural = "Pozycje koszyka"
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='store_cartline_cart_product_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} w koszyku {self.cart_id}"
+
 
 class UserCoupon(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='coupons', verbose_name="Użytkownik")
@@ -290,12 +357,22 @@ class UserCoupon(models.Model):
         related_name='awarded_user_coupons',
         verbose_name="Wyzwanie (źródło kuponu)"
     )
+    # Партия массовой выдачи (store/services/coupons.py): не больше одного купона партии на пользователя
+    batch = models.ForeignKey(
+        CouponBatch, on_delete=models.SET_NULL, null=True, blank=True, related_name='user_coupons',
+        verbose_name="Partia"
+    )
+    notified_at = models.DateTimeField(null=True, blank=True, verbose_name="Powiadomienie wysłane do kolejki")
 
     class Meta:
         verbose_name = "Kupon użytkownika"
         verbose_name_plural = "Kupony użytkowników"
         unique_together = ('user', 'coupon') # Пользователь может получить конкретный купон только один раз
         ordering = ['-awarded_at']
+        constraints = [
+            # повторный/параллельный запуск той же партии не выдаст второй купон (NULL-партии не ограничены)
+            models.UniqueConstraint(fields=['batch', 'user'], name='usercoupon_batch_user_uniq'),
+        ]
 
     def __str__(self):
         return f"Kupon {self.coupon.code} dla {self.user.username} (Przyznany: {self.awarded_at.strftime('%Y-%m-%d %H:%M')})"
@@ -317,6 +394,10 @@ class Profile(models.Model): # Без отступа в начале строк
     class Meta:
         verbose_name = "Profil użytkownika"
         verbose_name_plural = "Profile użytkowników"
+        indexes = [
+            # all-time leaderboard order (top-N and rank lookups)
+            models.Index(fields=['-eco_points', 'last_points_update'], name='profile_points_rank_idx'),
+        ]
 
     def __str__(self):
         return f"Profil użytknika {self.user.username}"
@@ -0,0 +1,179 @@
+"""Cart storage.
+
+``store.cart.Cart`` keeps its API; where its lines live is a ``CartStore``:
+
+* ``SessionCartStore`` - guests: ``session[CART_SESSION_ID]`` in the format it
+  always had (``{product_id: {'quantity': int, 'price': '19.99'}}``);
+* ``DatabaseCartStore`` - authenticated users: one ``store.Cart`` per user with
+  ``CartLine`` rows (prices in minor units), so the cart follows them across
+  devices. Reads go through a snapshot in the ``carts`` namespace of the
+  tiered cache, refreshed from the database after every write.
+
+Lines are ``Line(quantity, price)`` with the price in minor units (grosze):
+totals are integer sums turned into a ``Decimal`` once. Stored prices are
+only a cache of ``Product.price``: listing a cart (cart page, checkout)
+re-prices changed lines, so a cart kept for months cannot check out at an old
+price. ``merge_session_cart`` moves a guest cart into the user's cart on login
+(store.signals), at current prices.
+"""
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Dict, Iterable
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from common.cache import Namespace
+from store.models import Cart as CartModel, CartLine, Product
+
+logger = logging.getLogger(__name__)
+
+CENT = Decimal('0.01')
+
+carts_cache = Namespace('carts', alias='tiered')
+
+
+def to_minor(amount) -> int:
+    return int((Decimal(str(amount)) * 100).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def from_minor(minor: int) -> Decimal:
+    return (Decimal(minor) / 100).quantize(CENT)
+
+
+@dataclass
+class Line:
+    quantity: int
+    price: int  # unit price in minor units, refreshed from Product.price when the cart is listed or merged
+
+
+Lines = Dict[str, Line]
+
+
+class CartStore:
+    def load(self) -> Lines:
+        raise NotImplementedError
+
+    def save(self, lines: Lines, changed: Iterable[str]) -> None:
+        """Persist ``changed`` product ids: written when in ``lines``, removed otherwise."""
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class SessionCartStore(CartStore):
+    def __init__(self, session):
+        self.session = session
+
+    def load(self) -> Lines:
+        lines = {}
+        for product_id, data in (self.session.get(settings.CART_SESSION_ID) or {}).items():
+            try:
+                lines[product_id] = Line(int(data['quantity']), to_minor(data['price']))
+            except (KeyError, TypeError, ValueError, ArithmeticError):
+                logger.warning("Dropping malformed session cart line %r: %r", product_id, data)
+        return lines
+
+    def save(self, lines: Lines, changed: Iterable[str] = ()) -> None:
+        self.session[settings.CART_SESSION_ID] = {
+            product_id: {'quantity': line.quantity, 'price': str(from_minor(line.price))}
+            for product_id, line in lines.items()
+        }
+        self.session.modified = True
+
+    def clear(self) -> None:
+        self.session[settings.CART_SESSION_ID] = {}
+        self.session.modified = True
+
+
+class DatabaseCartStore(CartStore):
+    def __init__(self, user):
+        self.user_id = user.pk
+
+    def _snapshot(self) -> Dict[str, tuple]:
+        rows = CartLine.objects.filter(cart__user_id=self.user_id).values_list('product_id', 'quantity', 'unit_price')
+        snapshot = {str(product_id): (quantity, price) for product_id, quantity, price in rows}
+        carts_cache.set(str(self.user_id), snapshot, getattr(settings, 'CART_CACHE_TIMEOUT', 3600))
+        return snapshot
+
+    def load(self) -> Lines:
+        snapshot = carts_cache.get(str(self.user_id))
+        if snapshot is None:
+            snapshot = self._snapshot()
+        return {product_id: Line(quantity, price) for product_id, (quantity, price) in snapshot.items()}
+
+    def save(self, lines: Lines, changed: Iterable[str]) -> None:
+        changed = set(changed)
+        written = [CartLine(product_id=int(pid), quantity=lines[pid].quantity, unit_price=lines[pid].price)
+                   for pid in changed if pid in lines]
+        removed = [int(pid) for pid in changed if pid not in lines]
+        try:
+            with transaction.atomic():
+                cart, created = CartModel.objects.get_or_create(user_id=self.user_id)
+                if not created:
+                    CartModel.objects.filter(pk=cart.pk).update(updated_at=timezone.now())
+                for line in written:
+                    line.cart = cart
+                if written:
+                    CartLine.objects.bulk_create(written, update_conflicts=True, unique_fields=['cart', 'product'],
+                                                 update_fields=['quantity', 'unit_price'])
+                if removed:
+                    CartLine.objects.filter(cart=cart, product_id__in=removed).delete()
+                # re-read rather than cache ``lines``: another tab may have changed other lines meanwhile
+                self._snapshot()
+        except Exception:
+            carts_cache.delete(str(self.user_id))
+            raise
+
+    def clear(self) -> None:
+        CartLine.objects.filter(cart__user_id=self.user_id).delete()
+        carts_cache.set(str(self.user_id), {}, getattr(settings, 'CART_CACHE_TIMEOUT', 3600))
+
+
+def merge_session_cart(session, user) -> int:
+    """Add the guest cart in ``session`` to ``user``'s cart (capped at stock) and drop it; returns lines merged."""
+    guest = SessionCartStore(session).load()
+    session.pop(settings.CART_SESSION_ID, None)
+    if not guest:
+        return 0
+    store = DatabaseCartStore(user)
+    lines = store.load()
+    ids = [int(pid) for pid in set(guest) | set(lines) if pid.isdigit()]
+    products = {product_id: (stock, to_minor(price))
+                for product_id, stock, price in Product.objects.filter(id__in=ids).values_list('id', 'stock', 'price')}
+    # lines already in the user's cart are re-priced too; ones whose product is gone are left to Cart.__iter__
+    repriced = [pid for pid, line in lines.items()
+                if pid not in guest and int(pid) in products and line.price != products[int(pid)][1]]
+    for pid in repriced:
+        lines[pid].price = products[int(pid)][1]
+    merged = []
+    for product_id, line in guest.items():
+        if not product_id.isdigit() or int(product_id) not in products:
+            continue  # product deleted since it was added
+        stock, price = products[int(product_id)]
+        current = lines.get(product_id)
+        quantity = min(line.quantity + (current.quantity if current else 0), stock)
+        if quantity <= 0:
+            continue
+        # neither the guest price nor the one stored with the user's line: both may be weeks old
+        lines[product_id] = Line(quantity, price)
+        merged.append(product_id)
+    if merged or repriced:
+        store.save(lines, merged + repriced)
+    return len(merged)
+
+
+def cart_store_for(request) -> CartStore:
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        if settings.CART_SESSION_ID in request.session:
+            # a guest cart left over in a session that logged in without passing through the login signal
+            merge_session_cart(request.session, user)
+        return DatabaseCartStore(user)
+    return SessionCartStore(request.session)
+
@@ -0,0 +1,164 @@
+"""Bulk coupon issuance.
+
+``issue_coupons`` hands out personal coupons to many users at once (e.g. the
+monthly winners at rollover): codes are generated in memory and checked for
+collisions with one query per chunk, Coupon and UserCoupon rows are written
+with ``bulk_create``, and everything belongs to a ``CouponBatch`` identified
+by an idempotency key. Re-running with the same key only issues coupons to
+users that did not get one yet, so an interrupted run can simply be repeated.
+Concurrent runs of one key are serialized per chunk by a row lock on the
+batch, and ``UserCoupon(batch, user)`` is unique, so a user never gets two
+coupons from one batch. ``UserCoupon.notified_at`` records which grants have
+had their notification queued (``unnotified`` / ``mark_notified``).
+"""
+from __future__ import annotations
+
+import secrets
+from dataclasses import dataclass, field
+from datetime import timedelta
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from store.models import Coupon, CouponBatch, UserCoupon
+
+# no 0/O, 1/I/L: codes are typed in by hand
+CODE_ALPHABET = '23456789ABCDEFGHJKMNPQRSTUVWXYZ'
+CODE_RANDOM_LENGTH = 8
+CODE_MAX_LENGTH = Coupon._meta.get_field('code').max_length
+ISSUE_CHUNK_SIZE = 1000
+MAX_CODE_ATTEMPTS = 5
+
+
+@dataclass
+class Grant:
+    user_id: int
+    discount: Decimal
+    prefix: str = 'ECO'
+    challenge_source_id: Optional[int] = None
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class Issued:
+    user_id: int
+    code: str
+    discount: Decimal
+    extra: Dict[str, Any]
+
+
+@dataclass
+class IssueResult:
+    batch: CouponBatch
+    issued: List[Issued]
+    skipped: int
+
+
+def random_code(prefix: str, length: int = CODE_RANDOM_LENGTH) -> str:
+    body = ''.join(secrets.choice(CODE_ALPHABET) for _ in range(length))
+    return f"{prefix[:CODE_MAX_LENGTH - length - 1]}-{body}" if prefix else body
+
+
+def generate_codes(prefixes: List[str]) -> List[str]:
+    """One unused code per prefix: unique within the list and against the table (one query per attempt)."""
+    codes: List[Optional[str]] = [None] * len(prefixes)
+    pending = list(range(len(prefixes)))
+    seen: Set[str] = set()
+    for _ in range(MAX_CODE_ATTEMPTS):
+        candidates = {}
+        for i in pending:
+            code = random_code(prefixes[i])
+            if code not in seen and code not in candidates:
+                candidates[code] = i
+        taken = set(Coupon.objects.filter(code__in=list(candidates)).values_list('code', flat=True))
+        for code, i in candidates.items():
+            if code not in taken:
+                codes[i] = code
+                seen.add(code)
+        pending = [i for i in pending if codes[i] is None]
+        if not pending:
+            return codes
+    raise RuntimeError(f"Could not generate {len(pending)} unique coupon codes; widen CODE_RANDOM_LENGTH")
+
+
+def _issue_chunk(batch: CouponBatch, grants: List[Grant], valid_from, valid_to) -> Tuple[List[Issued], int]:
+    """Issue one chunk in its own transaction; returns (issued, skipped because a concurrent run got there first)."""
+    with transaction.atomic():
+        # serializes concurrent runs of this batch; the (batch, user) constraint backs it up on SQLite
+        CouponBatch.objects.select_for_update().filter(pk=batch.pk).exists()
+        taken = set(UserCoupon.objects.filter(batch=batch, user_id__in=[g.user_id for g in grants])
+                    .values_list('user_id', flat=True))
+        todo = [g for g in grants if g.user_id not in taken]
+        if not todo:
+            return [], len(grants)
+        codes = generate_codes([g.prefix for g in todo])
+        coupons = [
+            Coupon(code=code, discount=g.discount, valid_from=valid_from, valid_to=valid_to, active=True, batch=batch)
+            for code, g in zip(codes, todo)
+        ]
+        Coupon.objects.bulk_create(coupons)
+        if any(c.pk is None for c in coupons):  # backends without RETURNING
+            ids = dict(Coupon.objects.filter(code__in=codes).values_list('code', 'pk'))
+            for c in coupons:
+                c.pk = ids[c.code]
+        UserCoupon.objects.bulk_create([
+            UserCoupon(user_id=g.user_id, coupon=c, batch=batch, challenge_source_id=g.challenge_source_id)
+            for g, c in zip(todo, coupons)
+        ])
+    return [Issued(g.user_id, c.code, g.discount, g.extra) for g, c in zip(todo, coupons)], len(grants) - len(todo)
+
+
+def issue_coupons(key: str, grants: Iterable[Grant], *, valid_from=None, valid_to=None,
+                  valid_days: int = 30, chunk_size: int = ISSUE_CHUNK_SIZE) -> IssueResult:
+    """
+    Issue one personal coupon per grant under the idempotency ``key``.
+
+    Users that already hold a coupon from this batch are skipped. Each chunk is committed on
+    its own, so a crash loses at most the chunk in flight and a re-run picks up from there.
+    """
+    valid_from = valid_from or timezone.now()
+    valid_to = valid_to or valid_from + timedelta(days=valid_days)
+    batch, _ = CouponBatch.objects.get_or_create(key=key)
+    done = set(UserCoupon.objects.filter(batch=batch).values_list('user_id', flat=True))
+
+    pending, skipped = [], 0
+    for grant in grants:
+        if grant.user_id in done:
+            skipped += 1
+            continue
+        done.add(grant.user_id)
+        pending.append(grant)
+
+    issued: List[Issued] = []
+    for start in range(0, len(pending), chunk_size):
+        chunk = pending[start:start + chunk_size]
+        try:
+            chunk_issued, chunk_skipped = _issue_chunk(batch, chunk, valid_from, valid_to)
+        except IntegrityError:
+            # a code was taken between the check and the insert (or a concurrent run won a user on a
+            # backend without row locks): draw new codes once, users issued meanwhile are skipped
+            chunk_issued, chunk_skipped = _issue_chunk(batch, chunk, valid_from, valid_to)
+        issued.extend(chunk_issued)
+        skipped += chunk_skipped
+
+    CouponBatch.objects.filter(pk=batch.pk).update(
+        issued=UserCoupon.objects.filter(batch=batch).count(), completed_at=timezone.now()
+    )
+    batch.refresh_from_db()
+    return IssueResult(batch=batch, issued=issued, skipped=skipped)
+
+
+def unnotified(batch: CouponBatch) -> List[Issued]:
+    """Grants of ``batch`` whose notification was never queued, including those of an interrupted earlier run."""
+    rows = (UserCoupon.objects.filter(batch=batch, notified_at__isnull=True)
+            .select_related('coupon').order_by('pk'))
+    return [Issued(uc.user_id, uc.coupon.code, uc.coupon.discount, {}) for uc in rows]
+
+
+def mark_notified(batch: CouponBatch, user_ids: Iterable[int]) -> int:
+    """Call in the transaction that queues the notifications, so a grant is queued exactly once."""
+    return UserCoupon.objects.filter(batch=batch, user_id__in=list(user_ids), notified_at__isnull=True).update(
+        notified_at=timezone.now(),
+    )
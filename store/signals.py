@@ -1,11 +1,19 @@
 from django.db.models.signals import post_save
 from django.contrib.auth.models import User # Или settings.AUTH_USER_MODEL
+from django.contrib.auth.signals import user_logged_in
 from django.dispatch import receiver
 from .models import Profile
+from store.services.carts import merge_session_cart
 
 @receiver(post_save, sender=User) # Используем стандартного User, если settings.AUTH_USER_MODEL это он
 def create_or_update_user_profile(sender, instance, created, **kwargs):
     if created:
         Profile.objects.create(user=instance)
     # Если профиль уже существует и нужно что-то обновить при сохранении User (не для аватара)
-    # instance.profile.save() # Это не нужно здесь, т.к. Profile создается пустым
\ No newline at end of file
+    # instance.profile.save() # Это не нужно здесь, т.к. Profile создается пустым
+
+@receiver(user_logged_in)
+def merge_guest_cart(sender, request, user, **kwargs):
+    # Корзина гостя из сессии переносится в корзину пользователя в БД
+    if request is not None and hasattr(request, 'session'):
+        merge_session_cart(request.session, user)
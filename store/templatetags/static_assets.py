@@ -0,0 +1,15 @@
+from django import template
+from django.utils.html import format_html_join
+
+from common.static import preload_links
+
+register = template.Library()
+
+
+@register.simple_tag
+def static_preload():
+    """
+    <link rel="preload"> for the critical assets in settings.STATIC_PRELOAD, with their hashed URLs.
+    Use early in <head>: {% static_preload %}
+    """
+    return format_html_join('\n    ', '<link rel="preload" href="{}" as="{}">', preload_links())
@@ -5,6 +5,9 @@ from django.contrib.auth import get_user_model # Если будем тести
 from django.test import Client
 from .forms import OrderCreateForm
 from django.conf import settings
+from decimal import Decimal
+from config import instrumentation
+from config.instrumentation import BudgetAssertionsMixin
 
 User = get_user_model() # Получаем активную модель пользователя
 
@@ -322,4 +325,329 @@ class CartViewTests(TestCase):
         self.assertNotIn(str(self.product1.id), cart_session_after_remove)
         self.assertIn(str(self.product2.id), cart_session_after_remove)
         self.assertEqual(cart_session_after_remove[str(self.product2.id)]['quantity'], 2)
-        print("Тест test_cart_remove_product_ajax пройден.")
\ No newline at end of file
+        print("Тест test_cart_remove_product_ajax пройден.")
+
+
+class HybridSessionTests(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Sesje", slug="sesje")
+        self.product = Product.objects.create(name="Produkt", slug="produkt-sesja", category=self.category,
+                                              price="10.00", stock=5, available=True)
+        self.add_url = reverse('store:cart_add', args=[self.product.id])
+
+    def _add(self):
+        return self.client.post(self.add_url, {'quantity': 1}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+    def test_anonymous_cart_lives_in_the_cookie(self):
+        from django.contrib.sessions.models import Session
+        from common.sessions import is_cookie_key
+        self.client.get(reverse('store:product_list'))
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, self.client.cookies)  # nothing to store yet
+        self._add()
+        self._add()
+        self.assertTrue(is_cookie_key(self.client.cookies[settings.SESSION_COOKIE_NAME].value))
+        self.assertFalse(Session.objects.exists())
+        self.assertEqual(self.client.session[settings.CART_SESSION_ID][str(self.product.id)]['quantity'], 2)
+
+    def test_login_moves_the_session_server_side(self):
+        from django.contrib.sessions.models import Session
+        self._add()
+        self.client.force_login(User.objects.create_user(username='sesja', password='x' * 12))
+        key = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+        self.assertTrue(Session.objects.filter(session_key=key).exists())
+
+    def test_unchanged_sessions_are_not_rewritten(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        self.client.force_login(User.objects.create_user(username='sesja', password='x' * 12))
+        self._add()
+        session = self.client.session
+        session.modified = True
+        with CaptureQueriesContext(connection) as ctx:
+            session.save()
+        self.assertFalse([q for q in ctx.captured_queries if 'django_session' in q['sql']])
+
+    def test_oversized_anonymous_session_goes_server_side(self):
+        from django.contrib.sessions.models import Session
+        from django.test import override_settings
+        with override_settings(SESSION_COOKIE_MAX_BYTES=64):
+            self._add()
+        self.assertEqual(Session.objects.count(), 1)
+
+    def test_session_identifier_is_stable_across_cookie_saves(self):
+        from common.sessions import SessionStore, session_identifier
+        session = SessionStore()
+        identifier = session_identifier(session)
+        session.save()
+        reloaded = SessionStore(session.session_key)
+        reloaded['x'] = 1
+        reloaded.save()
+        self.assertNotEqual(reloaded.session_key, session.session_key)
+        self.assertEqual(session_identifier(SessionStore(reloaded.session_key)), identifier)
+
+    def test_clear_expired_deletes_in_batches(self):
+        from datetime import timedelta
+        from django.contrib.sessions.models import Session
+        from django.utils import timezone
+        from common.sessions import SessionStore
+        past, future = timezone.now() - timedelta(days=1), timezone.now() + timedelta(days=1)
+        Session.objects.bulk_create([Session(session_key=f'old{i}', session_data='', expire_date=past)
+                                     for i in range(5)] + [Session(session_key='live', session_data='',
+                                                                   expire_date=future)])
+        with self.assertNumQueries(7):  # three select+delete batches, then an empty select
+            self.assertEqual(SessionStore.clear_expired(batch_size=2), 5)
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['live'])
+
+
+class PersistentCartTests(TestCase):
+    def setUp(self):
+        from store.services.carts import carts_cache
+        carts_cache.clear()  # user ids are reused between tests
+        self.category = Category.objects.create(name="Koszyki", slug="koszyki")
+        self.product = Product.objects.create(name="Produkt A", slug="produkt-a", category=self.category,
+                                              price="19.99", stock=5, available=True)
+        self.other = Product.objects.create(name="Produkt B", slug="produkt-b", category=self.category,
+                                            price="0.10", stock=50, available=True)
+        self.user = User.objects.create_user(username='koszyk', password='x' * 12)
+
+    def _add(self, client, product, quantity=1):
+        return client.post(reverse('store:cart_add', args=[product.id]), {'quantity': quantity},
+                           HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+    def test_logged_in_cart_is_stored_in_minor_units_and_follows_the_user(self):
+        from store.models import CartLine
+        self.client.force_login(self.user)
+        response = self._add(self.client, self.product, 2)
+        self._add(self.client, self.other, 3)
+        self.assertEqual(response.json()['cart_total_price'], '39.98')
+        self.assertNotIn(settings.CART_SESSION_ID, self.client.session)
+        self.assertEqual(sorted(CartLine.objects.values_list('product_id', 'quantity', 'unit_price')),
+                         sorted([(self.product.id, 2, 1999), (self.other.id, 3, 10)]))
+
+        other_device = Client()
+        other_device.force_login(self.user)
+        response = other_device.get(reverse('store:cart_count'))
+        self.assertEqual(response.json(), {'count': 5, 'total': '40.28'})
+
+    def test_guest_cart_is_merged_on_login(self):
+        from store.models import CartLine
+        self.client.force_login(self.user)
+        self._add(self.client, self.product, 4)
+        self.client.logout()
+        self._add(self.client, self.product, 3)
+        self._add(self.client, self.other, 1)
+        self.client.force_login(self.user)
+        self.assertNotIn(settings.CART_SESSION_ID, self.client.session)
+        self.assertEqual(dict(CartLine.objects.values_list('product_id', 'quantity')),
+                         {self.product.id: 5, self.other.id: 1})  # 4 + 3 capped at stock
+
+    def test_stored_prices_follow_the_product_price(self):
+        from store.models import CartLine
+        self.client.force_login(self.user)
+        self._add(self.client, self.product, 2)
+        self.client.logout()
+        self._add(self.client, self.other, 1)
+        Product.objects.filter(pk=self.product.pk).update(price='24.99')
+        Product.objects.filter(pk=self.other.pk).update(price='0.20')
+        self.client.force_login(self.user)  # merge: both lines at today's price
+        self.assertEqual(dict(CartLine.objects.values_list('product_id', 'unit_price')),
+                         {self.product.id: 2499, self.other.id: 20})
+
+        Product.objects.filter(pk=self.product.pk).update(price='29.99')
+        response = self.client.get(reverse('store:cart_detail'))
+        self.assertEqual(response.context['cart'].get_total_price(), Decimal('60.18'))
+        self.assertEqual(CartLine.objects.get(product=self.product).unit_price, 2999)
+
+    def test_cached_snapshot_serves_reads(self):
+        from django.test import RequestFactory
+        from store.cart import Cart
+        request = RequestFactory().get('/')
+        request.session = self.client.session
+        request.user = self.user
+        Cart(request).add(self.product, 2)
+        with self.assertNumQueries(0):
+            cart = Cart(request)
+            self.assertEqual((len(cart), cart.get_total_price()), (2, Decimal('39.98')))
+        self.product.delete()
+        self.assertEqual(list(Cart(request)), [])  # stale line dropped on iteration
+        with self.assertNumQueries(0):
+            self.assertEqual(len(Cart(request)), 0)
+
+
+class InstrumentationTests(BudgetAssertionsMixin, TestCase):
+    def setUp(self):
+        instrumentation.reset()
+        self.category = Category.objects.create(name="Pomiary", slug="pomiary")
+        for i in range(25):
+            Product.objects.create(name=f"Produkt {i}", slug=f"pomiar-{i}", category=self.category,
+                                   price="9.99", stock=3, available=True)
+        self.user = User.objects.create_user(username='pomiar', password='x' * 12)
+
+    def test_views_stay_within_budget(self):
+        from chat.models import ChatRoom, Message
+        from places.models import EcoPlace, PlaceReview
+        room = ChatRoom.objects.create(name='Eko', owner=self.user)
+        room.members.add(self.user)
+        Message.objects.bulk_create([Message(room=room, user=self.user, text=f'm{i}') for i in range(30)])
+        for i in range(20):
+            place = EcoPlace.objects.create(name=f"Miejsce {i}", category='park', city='Warszawa', lat=52.2, lng=21.0)
+            PlaceReview.objects.create(place=place, user=self.user, rating=4, is_approved=True)
+
+        with self.assertWithinBudget('store:product_list'):
+            self.client.get(reverse('store:product_list'))
+        with self.assertWithinBudget('store:product_detail'):
+            self.client.get(reverse('store:product_detail', args=['pomiar-1']))
+        with self.assertWithinBudget('places:places_api'):
+            response = self.client.get(reverse('places:places_api'))
+        self.assertEqual(response.json()['results'][0]['reviews_count'], 1)
+        self.client.force_login(self.user)
+        with self.assertWithinBudget('chat:messages_api'):
+            self.client.get(reverse('chat:messages_api', args=[room.id]))
+        with self.assertRaises(AssertionError):
+            with self.assertWithinBudget('store:product_list', queries=1):
+                self.client.get(reverse('store:product_list'))
+
+    def test_records_db_cache_template_and_http_time(self):
+        import httpx
+        from django.core.cache import cache
+        from django.http import HttpResponse
+        from django.template import engines
+        from django.test import RequestFactory
+        client = httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(200)))
+
+        def view(request):
+            list(Product.objects.all()[:3])
+            cache.set('instrumented', 1)
+            cache.get('instrumented')
+            cache.get_many(['instrumented', 'absent'])
+            client.get('https://api.resend.com/emails')
+            return HttpResponse(engines['django'].from_string('{{ x }}').render({'x': 1}))
+
+        with instrumentation.capture() as records:
+            instrumentation.InstrumentationMiddleware(view)(RequestFactory().get('/x'))
+        record = records[0]
+        self.assertEqual((record.queries, record.cache_hits, record.cache_misses, record.http_calls), (1, 2, 1, 1))
+        self.assertEqual(list(record.http_hosts), ['api.resend.com'])
+        self.assertGreater(record.template_ms, 0)
+        self.assertEqual(instrumentation.recent()[-1]['path'], '/x')
+
+    def test_over_budget_requests_are_logged(self):
+        from django.test import override_settings
+        with override_settings(INSTRUMENTATION_BUDGETS={'*': {'queries': 0}}):
+            with self.assertLogs('config.instrumentation', 'WARNING') as logs:
+                self.client.get(reverse('store:product_list'))
+        self.assertIn('"view": "store:product_list"', logs.output[0])
+        self.assertEqual(instrumentation.recent()[-1]['violations'][0].split()[0], 'queries')
+
+    def test_report_is_staff_only(self):
+        self.client.get(reverse('store:product_list'))
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('instrumentation_report')).status_code, 302)
+        self.user.is_staff = True
+        self.user.save()
+        data = self.client.get(reverse('instrumentation_report'), {'view': 'store:product_list'}).json()
+        self.assertEqual(data['summary']['store:product_list']['requests'], 1)
+        self.assertEqual(len(data['recent']), 1)
+
+
+STARTUP_PROBE = """
+import json, os, sys, time
+start = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+from config.wsgi import application  # django.setup(), admin autodiscovery, middleware
+import config.urls
+from django.template import engines
+engines['django'].engine.template_libraries  # every templatetag module
+from django.utils.functional import empty
+from store.models import product_image_storage
+print(json.dumps({
+    'seconds': time.perf_counter() - start,
+    'heavy': sorted(name for name in json.loads(sys.argv[1]) if name in sys.modules),
+    'storage_resolved': product_image_storage._wrapped is not empty,
+}))
+"""
+
+
+class StartupImportTests(TestCase):
+    # SDKs imported on first use; loading any of them at startup costs every worker boot and cron command
+    HEAVY_MODULES = ('stripe', 'PIL', 'boto3', 'botocore', 'storages.backends.s3', 'google.generativeai')
+    # generous: a clean boot is ~0.5 s, the regressions above add ~0.7 s (stripe) each
+    STARTUP_BUDGET_S = 3.0
+
+    def test_boot_does_not_import_heavy_sdks(self):
+        import json
+        import subprocess
+        import sys
+        probe = subprocess.run([sys.executable, '-c', STARTUP_PROBE, json.dumps(self.HEAVY_MODULES)],
+                               cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=120)
+        self.assertEqual(probe.returncode, 0, probe.stderr[-2000:])
+        result = json.loads(probe.stdout.strip().splitlines()[-1])
+        self.assertEqual(result['heavy'], [])
+        self.assertFalse(result['storage_resolved'])
+        self.assertLess(result['seconds'], self.STARTUP_BUDGET_S)
+
+    def test_image_fields_share_one_storage(self):
+        from blog.models import Comment
+        from .models import HomePageSettings, get_product_image_storage_instance
+        storages = {id(field.storage) for field in (Product._meta.get_field('image'), Comment._meta.get_field('image'),
+                                                    HomePageSettings._meta.get_field('hero_image'))}
+        self.assertEqual(storages, {id(get_product_image_storage_instance())})
+
+
+class StaticPipelineTests(TestCase):
+    """collectstatic with the production storage into a temporary STATIC_ROOT, served by MemoryWhiteNoiseMiddleware."""
+
+    @classmethod
+    def setUpClass(cls):
+        import shutil
+        import tempfile
+        from django.core.management import call_command
+        from django.test import override_settings
+        super().setUpClass()
+        static_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, static_root, ignore_errors=True)
+        overrides = override_settings(
+            STATIC_ROOT=static_root, WHITENOISE_AUTOREFRESH=False, WHITENOISE_USE_FINDERS=False,
+            STORAGES={**settings.STORAGES, 'staticfiles': {'BACKEND': 'common.static.MinifiedManifestStaticFilesStorage'}},
+        )
+        overrides.enable()
+        cls.addClassCleanup(overrides.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    def test_assets_are_minified_hashed_and_precompressed(self):
+        import os
+        from django.contrib.staticfiles import finders
+        from django.contrib.staticfiles.storage import staticfiles_storage
+        hashed = staticfiles_storage.stored_name('css/custom_styles.css')
+        self.assertRegex(hashed, r'^css/custom_styles\.[0-9a-f]{12}\.css$')
+        path = os.path.join(settings.STATIC_ROOT, hashed)
+        self.assertLess(os.path.getsize(path), os.path.getsize(finders.find('css/custom_styles.css')))
+        self.assertTrue(os.path.exists(path + '.br') and os.path.exists(path + '.gz'))
+        self.assertFalse(os.path.exists(os.path.join(settings.STATIC_ROOT, 'css/custom_styles.css')))
+
+    def test_hashed_files_are_served_from_memory_with_immutable_caching(self):
+        import os
+        from django.contrib.staticfiles.storage import staticfiles_storage
+        from django.http import HttpResponseNotFound
+        from django.test import RequestFactory
+        from common.static import MemoryWhiteNoiseMiddleware
+        middleware = MemoryWhiteNoiseMiddleware(lambda request: HttpResponseNotFound())
+        url = staticfiles_storage.url('css/base.css')
+        first = middleware(RequestFactory().get(url, HTTP_ACCEPT_ENCODING='br, gzip'))
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first['Content-Encoding'], 'br')
+        self.assertIn('max-age=31536000', first['Cache-Control'])
+        self.assertIn('immutable', first['Cache-Control'])
+        # the second request doesn't touch the disk
+        path = os.path.join(settings.STATIC_ROOT, staticfiles_storage.stored_name('css/base.css') + '.br')
+        os.remove(path)
+        second = middleware(RequestFactory().get(url, HTTP_ACCEPT_ENCODING='br, gzip'))
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(first['Content-Length'], str(len(first.content)))
+
+    def test_preload_links_point_at_hashed_files(self):
+        from django.contrib.staticfiles.storage import staticfiles_storage
+        from django.template import Context, Template
+        html = Template('{% load static_assets %}{% static_preload %}').render(Context())
+        self.assertIn(f'<link rel="preload" href="{staticfiles_storage.url("css/base.css")}" as="style">', html)
+        self.assertIn(f'href="{staticfiles_storage.url("js/cart.js")}" as="script"', html)
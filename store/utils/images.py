@@ -1,25 +1,30 @@
+from __future__ import annotations
+
 import io
 import os
 from dataclasses import dataclass
-from typing import Optional, Tuple
+from typing import TYPE_CHECKING, Optional, Tuple
 
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
 from django.conf import settings
 import hashlib
-from PIL import Image
 import logging
 
+if TYPE_CHECKING:
+    from PIL import Image  # imported in the functions: Pillow is only needed once a variant is rendered
+
 @dataclass(frozen=True)
 class Variant:
     size: Tuple[int, int]
-    mode: str  # 'cover' or 'contain'
+    mode: str  # 'cover', 'contain' or 'fit' (keep aspect ratio, no padding)
 
 
 VARIANTS = {
     'card': Variant((400, 300), 'cover'),
     'thumb': Variant((200, 200), 'cover'),
     'detail': Variant((1000, 750), 'contain'),
+    'chat': Variant((480, 480), 'fit'),
 }
 
 
@@ -47,8 +52,13 @@ def _variant_path(original_name: str, key: str) -> str:
 
 
 def _resize(image: Image.Image, target: Variant) -> Image.Image:
+    from PIL import Image
+
     img = image.convert('RGB')
     tw, th = target.size
+    if target.mode == 'fit':
+        img.thumbnail((tw, th), Image.Resampling.LANCZOS)
+        return img
     if target.mode == 'cover':
         img.thumbnail((tw, th), Image.Resampling.LANCZOS)
         # pad to exact canvas
@@ -67,6 +77,30 @@ def _resize(image: Image.Image, target: Variant) -> Image.Image:
         return bg
 
 
+def generate_variant(image_field, key: str, storage=None) -> Optional[str]:
+    """
+    Render the variant for the given ImageField/FileField and store it.
+    Returns the storage name of the variant (existing or new), or None for an
+    unknown key. Ignores IMAGE_VARIANTS_ENABLED and raises on decoding errors,
+    so background callers can decide how to handle failures.
+    """
+    var = VARIANTS.get(key)
+    if not var or not image_field:
+        return None
+    storage = storage or default_storage
+    dst_name = _variant_path(image_field.name, key)
+    if storage.exists(dst_name):
+        return dst_name
+    from PIL import Image
+
+    with image_field.open('rb') as f:
+        im = Image.open(f)
+        out = _resize(im, var)
+        buf = io.BytesIO()
+        out.save(buf, format='WEBP', quality=80, method=6)
+    return storage.save(dst_name, ContentFile(buf.getvalue()))
+
+
 def get_or_generate_variant(image_field, key: str) -> Optional[str]:
     """
     Returns URL to a generated WebP variant for the given ImageField.
@@ -77,24 +111,12 @@ def get_or_generate_variant(image_field, key: str) -> Optional[str]:
     # Global kill-switch to avoid creating any variants (serve originals only)
     if getattr(settings, 'IMAGE_VARIANTS_ENABLED', True) is False:
         return getattr(image_field, 'url', None)
-    var = VARIANTS.get(key)
-    if not var:
+    if key not in VARIANTS:
         return getattr(image_field, 'url', None)
 
     src_name = image_field.name
-    dst_name = _variant_path(src_name, key)
-    if default_storage.exists(dst_name):
-        return default_storage.url(dst_name)
-
     try:
-        with image_field.open('rb') as f:
-            im = Image.open(f)
-            out = _resize(im, var)
-            buf = io.BytesIO()
-            out.save(buf, format='WEBP', quality=80, method=6)
-            content = ContentFile(buf.getvalue())
-            default_storage.save(dst_name, content)
-            return default_storage.url(dst_name)
+        return default_storage.url(generate_variant(image_field, key))
     except Exception as e:
         logging.error(f"Could not generate image variant for {src_name}. Error: {e}", exc_info=True)
         # Fallback to original URL
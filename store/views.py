@@ -14,8 +14,8 @@ from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.db.models import Q, Count
 from django.db.models import Avg
 from blog.models import Post
+from payments.services.stripe_api import get_stripe
 from django.contrib import messages
-import stripe
 from django.urls import reverse, reverse_lazy
 from django.conf import settings
 from django.utils import timezone
@@ -24,7 +24,6 @@ logger = logging.getLogger(__name__)
 from django.core.mail import send_mail, EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.utils.translation import gettext as _
-import requests
 
 
 
@@ -519,6 +518,7 @@ def process_subscription_checkout(request, box_type_id):
         #     return redirect('store:subscription_box_list')
 
 
+    stripe = get_stripe()
     try:
         session = stripe.checkout.Session.create(**checkout_session_params)
         return redirect(session.url, code=303)
@@ -604,9 +604,9 @@ def cancel_subscription(request, subscription_id):
         return redirect('store:order_history')
 
     if request.method == 'POST':
+        stripe = get_stripe()
         try:
             # Устанавливаем флаг отмены в конце периода в Stripe
-            # stripe.api_key = settings.STRIPE_SECRET_KEY # Уже должно быть установлено глобально при импорте stripe
             stripe.Subscription.modify(
                 user_subscription.stripe_subscription_id,
                 cancel_at_period_end=True
@@ -743,6 +743,7 @@ def contact(request):
             secret = getattr(settings, 'RECAPTCHA_SECRET_KEY', '')
             if secret:
                 recaptcha_ok = False
+                import requests
                 try:
                     resp = requests.post(
                         'https://www.google.com/recaptcha/api/siteverify',
@@ -0,0 +1 @@
+from .decorators import Task, background  # noqa: F401
@@ -0,0 +1,24 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import QueuedTask
+
+
+@admin.action(description="Uruchom ponownie (przy najbliższym pobraniu z kolejki)")
+def retry_now(modeladmin, request, queryset):
+    updated = queryset.filter(status=QueuedTask.STATUS_FAILED).update(
+        status=QueuedTask.STATUS_PENDING, run_at=timezone.now(), attempts=0, last_error=''
+    )
+    modeladmin.message_user(request, f"Ponownie zakolejkowano: {updated}")
+
+
+@admin.register(QueuedTask)
+class QueuedTaskAdmin(admin.ModelAdmin):
+    list_display = ('name', 'queue', 'priority', 'status', 'attempts', 'run_at', 'duration', 'finished_at')
+    list_filter = ('status', 'queue', 'name')
+    search_fields = ('name', 'task_hash', 'last_error')
+    readonly_fields = [f.name for f in QueuedTask._meta.fields]
+    actions = [retry_now]
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,105 @@
+"""Task backends selected by ``settings.TASK_BACKEND`` (dotted path, default: the database queue).
+
+* ``DatabaseBackend`` - rows in ``QueuedTask``, run by ``manage.py run_task_worker``
+  (taskqueue.worker: batched ``SELECT ... FOR UPDATE SKIP LOCKED`` dequeue,
+  concurrent workers, priorities, retries with backoff, timing metrics);
+* ``ImmediateBackend`` - runs the task inline at call time (local development
+  without a worker, tests that only care about the outcome);
+* ``BackgroundTasksBackend`` - the previous django-background-tasks queue
+  (``manage.py process_tasks``), kept to drain tasks queued before the switch.
+"""
+from __future__ import annotations
+
+import json
+import logging
+from datetime import datetime
+from hashlib import sha1
+from typing import Any, Dict, List
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKEND = 'taskqueue.backends.DatabaseBackend'
+
+_backend = None
+
+
+def task_hash(name: str, args: List[Any], kwargs: Dict[str, Any]) -> str:
+    params = json.dumps((list(args), kwargs), sort_keys=True)
+    return sha1(f"{name}{params}".encode('utf-8')).hexdigest()
+
+
+class BaseBackend:
+    def register(self, task) -> None:
+        """Called once per task when its module is imported."""
+
+    def enqueue(self, task, args: List[Any], kwargs: Dict[str, Any], *, run_at: datetime, priority: int,
+                queue: str, remove_existing: bool = False):
+        raise NotImplementedError
+
+
+class ImmediateBackend(BaseBackend):
+    def enqueue(self, task, args, kwargs, *, run_at, priority, queue, remove_existing=False):
+        # like a worker: a failing task is logged, not raised into the caller
+        try:
+            return task.task_function(*args, **kwargs)
+        except Exception:  # noqa: BLE001
+            logger.exception("Task %s failed", task.name)
+            return None
+
+
+class DatabaseBackend(BaseBackend):
+    def enqueue(self, task, args, kwargs, *, run_at, priority, queue, remove_existing=False):
+        from .models import QueuedTask
+        digest = task_hash(task.name, args, kwargs)
+        row = QueuedTask(
+            name=task.name, queue=queue, priority=priority, args=args, kwargs=kwargs, task_hash=digest,
+            run_at=run_at, max_attempts=task.max_attempts or getattr(settings, 'TASK_QUEUE_MAX_ATTEMPTS', 5),
+        )
+        if not remove_existing:
+            row.save()
+            return row
+        with transaction.atomic():
+            # rows already claimed by a worker are left alone (they may be half-way through)
+            QueuedTask.objects.filter(task_hash=digest, status=QueuedTask.STATUS_PENDING).delete()
+            row.save()
+        return row
+
+
+class BackgroundTasksBackend(BaseBackend):
+    def __init__(self):
+        self._proxies = {}
+
+    def _proxy(self, task):
+        proxy = self._proxies.get(task.name)
+        if proxy is None:
+            from background_task.tasks import tasks
+            proxy = self._proxies[task.name] = tasks.background(name=task.name, queue=task.queue)(task.task_function)
+        return proxy
+
+    def register(self, task) -> None:
+        # process_tasks looks tasks up in django-background-tasks' own registry
+        self._proxy(task)
+
+    def enqueue(self, task, args, kwargs, *, run_at, priority, queue, remove_existing=False):
+        return self._proxy(task)(*args, schedule={'run_at': run_at, 'priority': priority}, queue=queue,
+                                 remove_existing_tasks=remove_existing, **kwargs)
+
+
+def get_backend() -> BaseBackend:
+    global _backend
+    if _backend is None:
+        _backend = import_string(getattr(settings, 'TASK_BACKEND', None) or DEFAULT_BACKEND)()
+    return _backend
+
+
+@receiver(setting_changed)
+def _reset_backend(setting, **kwargs):
+    global _backend
+    if setting == 'TASK_BACKEND':
+        _backend = None
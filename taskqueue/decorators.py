@@ -0,0 +1,90 @@
+"""``@background``: drop-in replacement for django-background-tasks' decorator.
+
+Call sites stay the same - ``task(*args)``, ``task(*args, schedule=30)``,
+``task(remove_existing_tasks=True)``, ``task.now(*args)`` - while the call is
+handed to the backend configured in ``settings.TASK_BACKEND``
+(see taskqueue.backends). Tasks are registered by name
+(``<module>.<function>``) so a worker can find them after importing the
+``tasks`` modules of the installed apps.
+"""
+from __future__ import annotations
+
+import functools
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Union
+
+from django.utils import timezone
+
+Schedule = Union[None, int, float, timedelta, datetime, Dict[str, Any]]
+
+registry: Dict[str, 'Task'] = {}
+
+
+def run_at_for(schedule: Schedule, default: Schedule = None) -> datetime:
+    """Seconds, timedelta, datetime or django-background-tasks' ``{'run_at': ...}`` dict -> datetime."""
+    if isinstance(schedule, dict):
+        schedule = schedule.get('run_at')
+    if schedule is None:
+        schedule = default.get('run_at') if isinstance(default, dict) else default
+    if schedule is None:
+        return timezone.now()
+    if isinstance(schedule, datetime):
+        return schedule
+    if isinstance(schedule, timedelta):
+        return timezone.now() + schedule
+    return timezone.now() + timedelta(seconds=schedule)
+
+
+class Task:
+    def __init__(self, func: Callable, *, name: Optional[str] = None, schedule: Schedule = None,
+                 queue: Optional[str] = None, priority: int = 0, max_attempts: Optional[int] = None):
+        functools.update_wrapper(self, func)
+        self.task_function = func
+        self.name = name or f"{func.__module__}.{func.__name__}"
+        self.schedule = schedule
+        self.queue = queue or 'default'
+        self.priority = priority
+        self.max_attempts = max_attempts
+        registry[self.name] = self
+
+        from .backends import get_backend
+        get_backend().register(self)
+
+    def __call__(self, *args, schedule: Schedule = None, priority: Optional[int] = None, queue: Optional[str] = None,
+                 remove_existing_tasks: bool = False, **kwargs):
+        """Queue one call; ``remove_existing_tasks`` drops pending calls with the same arguments first."""
+        if priority is None:
+            priority = schedule.get('priority', self.priority) if isinstance(schedule, dict) else self.priority
+        from .backends import get_backend
+        return get_backend().enqueue(
+            self, list(args), kwargs, run_at=run_at_for(schedule, self.schedule), priority=priority,
+            queue=queue or self.queue, remove_existing=remove_existing_tasks,
+        )
+
+    def now(self, *args, **kwargs):
+        """Run synchronously in the calling process."""
+        return self.task_function(*args, **kwargs)
+
+    def __repr__(self):
+        return f"Task({self.name})"
+
+
+def background(name: Union[None, str, Callable] = None, schedule: Schedule = None, queue: Optional[str] = None,
+               priority: int = 0, max_attempts: Optional[int] = None):
+    """``@background``, ``@background(schedule=5)`` or ``background(schedule=0)(func)``."""
+    if callable(name):
+        return Task(name)
+
+    def decorator(func: Callable) -> Task:
+        return Task(func, name=name, schedule=schedule, queue=queue, priority=priority, max_attempts=max_attempts)
+
+    return decorator
+
+
+def get_task(name: str) -> Task:
+    try:
+        return registry[name]
+    except KeyError:
+        from django.utils.module_loading import autodiscover_modules
+        autodiscover_modules('tasks')
+        return registry[name]
@@ -0,0 +1,45 @@
+import json
+import signal
+
+from django.core.management.base import BaseCommand
+
+from taskqueue.worker import Worker, queue_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Run background tasks from the database queue (settings.TASK_BACKEND = DatabaseBackend). "
+        "Start as many processes as needed; they share the queue without blocking each other. "
+        "Usage: manage.py run_task_worker [--queue NAME ...] [--concurrency N] [--batch-size N] [--burst] [--stats]"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--queue", action="append", dest="queues", default=None,
+                            help="Only take tasks from this queue (repeatable; default: all queues).")
+        parser.add_argument("--concurrency", type=int, default=4, help="Tasks run at once by this process.")
+        parser.add_argument("--batch-size", type=int, default=None,
+                            help="Rows claimed per query (default: 2 x concurrency).")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds to wait when nothing is due.")
+        parser.add_argument("--burst", action="store_true", help="Exit once the queue has no due tasks.")
+        parser.add_argument("--max-tasks", type=int, default=None, help="Exit after running this many tasks.")
+        parser.add_argument("--stats", action="store_true", help="Only print queue metrics as JSON.")
+
+    def handle(self, *args, **options):
+        if options["stats"]:
+            self.stdout.write(json.dumps(queue_stats(), indent=2))
+            return
+        worker = Worker(queues=options["queues"], concurrency=options["concurrency"],
+                        batch_size=options["batch_size"], poll_interval=options["poll_interval"])
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: worker.stop())
+        self.stdout.write(self.style.SUCCESS(
+            f"Task worker {worker.name} started: concurrency={worker.concurrency} batch={worker.batch_size} "
+            f"queues={','.join(worker.queues) or '*'}"
+        ))
+        worker.run(burst=options["burst"], max_tasks=options["max_tasks"])
+        for name, stats in worker.summary().items():
+            self.stdout.write(
+                f"{name}: runs={stats['runs']} failures={stats['failures']} retries={stats['retries']} "
+                f"avg={stats['avg_duration']:.3f}s max={stats['max_duration']:.3f}s wait={stats['avg_wait']:.3f}s"
+            )
+        self.stdout.write(f"Task worker stopped after {worker.processed} task(s).")
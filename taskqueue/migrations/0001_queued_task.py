@@ -0,0 +1,44 @@
+# Generated by Django 5.2 on 2026-10-19 17:21
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueuedTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(db_index=True, max_length=255, verbose_name='Zadanie')),
+                ('queue', models.CharField(default='default', max_length=64, verbose_name='Kolejka')),
+                ('priority', models.SmallIntegerField(default=0, help_text='Wyższy priorytet jest pobierany wcześniej.', verbose_name='Priorytet')),
+                ('args', models.JSONField(blank=True, default=list)),
+                ('kwargs', models.JSONField(blank=True, default=dict)),
+                ('task_hash', models.CharField(db_index=True, max_length=40, verbose_name='Skrót (nazwa + argumenty)')),
+                ('status', models.CharField(choices=[('pending', 'Oczekuje'), ('running', 'W trakcie'), ('done', 'Zakończone'), ('failed', 'Błąd (bez kolejnych prób)')], default='pending', max_length=10, verbose_name='Status')),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Uruchom po')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Próby')),
+                ('max_attempts', models.PositiveSmallIntegerField(default=5, verbose_name='Maks. prób')),
+                ('locked_by', models.CharField(blank=True, default='', max_length=100, verbose_name='Worker')),
+                ('locked_until', models.DateTimeField(blank=True, null=True, verbose_name='Blokada do')),
+                ('last_error', models.TextField(blank=True, default='', verbose_name='Ostatni błąd')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Utworzono')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Rozpoczęto')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Zakończono')),
+                ('duration', models.FloatField(blank=True, null=True, verbose_name='Czas wykonania (s)')),
+            ],
+            options={
+                'verbose_name': 'Zadanie w tle',
+                'verbose_name_plural': 'Zadania w tle',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'queue', '-priority', 'run_at'], name='taskqueue_dequeue_idx'), models.Index(fields=['status', 'finished_at'], name='taskqueue_finished_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+from django.db import models
+from django.utils import timezone
+
+
+class QueuedTask(models.Model):
+    """One call of a ``@background`` task, stored by taskqueue.backends.DatabaseBackend."""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Oczekuje'),
+        (STATUS_RUNNING, 'W trakcie'),
+        (STATUS_DONE, 'Zakończone'),
+        (STATUS_FAILED, 'Błąd (bez kolejnych prób)'),
+    ]
+
+    name = models.CharField(max_length=255, db_index=True, verbose_name="Zadanie")
+    queue = models.CharField(max_length=64, default='default', verbose_name="Kolejka")
+    priority = models.SmallIntegerField(default=0, verbose_name="Priorytet",
+                                        help_text="Wyższy priorytet jest pobierany wcześniej.")
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    task_hash = models.CharField(max_length=40, db_index=True, verbose_name="Skrót (nazwa + argumenty)")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING, verbose_name="Status")
+    run_at = models.DateTimeField(default=timezone.now, verbose_name="Uruchom po")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Próby")
+    max_attempts = models.PositiveSmallIntegerField(default=5, verbose_name="Maks. prób")
+    locked_by = models.CharField(max_length=100, blank=True, default='', verbose_name="Worker")
+    locked_until = models.DateTimeField(null=True, blank=True, verbose_name="Blokada do")
+    last_error = models.TextField(blank=True, default='', verbose_name="Ostatni błąd")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Utworzono")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Rozpoczęto")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Zakończono")
+    duration = models.FloatField(null=True, blank=True, verbose_name="Czas wykonania (s)")
+
+    class Meta:
+        verbose_name = "Zadanie w tle"
+        verbose_name_plural = "Zadania w tle"
+        ordering = ['-created_at']
+        indexes = [
+            # dequeue: due rows of a queue, highest priority first, oldest first
+            models.Index(fields=['status', 'queue', '-priority', 'run_at'], name='taskqueue_dequeue_idx'),
+            models.Index(fields=['status', 'finished_at'], name='taskqueue_finished_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
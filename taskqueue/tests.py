@@ -0,0 +1,116 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from taskqueue import background
+from taskqueue.models import QueuedTask
+from taskqueue.worker import Worker, claim, lease, queue_stats
+
+calls = []
+
+
+@background(schedule=60)
+def record(value, suffix=''):
+    calls.append(f"{value}{suffix}")
+    return value
+
+
+def explode():
+    raise RuntimeError('boom')
+
+
+explode = background(max_attempts=2)(explode)
+
+
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_call_sites_queue_rows(self):
+        row = record(1, suffix='!')
+        self.assertEqual((row.name, row.args, row.kwargs), ('taskqueue.tests.record', [1], {'suffix': '!'}))
+        self.assertGreater(row.run_at, timezone.now() + timedelta(seconds=50))  # decorator default schedule
+        self.assertLess(record(2, schedule=0).run_at, row.run_at)
+
+        record(3, remove_existing_tasks=True)
+        record(3, remove_existing_tasks=True)
+        self.assertEqual(QueuedTask.objects.filter(args=[3]).count(), 1)
+        self.assertEqual(record.now(4), 4)
+        self.assertEqual(calls, ['4'])
+
+    def test_worker_runs_due_tasks_by_priority_in_batches(self):
+        for i in range(5):
+            record(i, schedule=0, priority=i % 2)
+        record('later')  # not due for a minute
+        worker = Worker(concurrency=1, batch_size=2)
+        # one batch: claim (savepoint, fail abandoned, select, update, release), fetch, one bulk_update
+        with self.assertNumQueries(7):
+            self.assertEqual(worker.run_batch(), 2)
+        worker.run(burst=True)
+        self.assertEqual(calls, ['1', '3', '0', '2', '4'])
+        self.assertEqual(QueuedTask.objects.filter(status=QueuedTask.STATUS_DONE).count(), 5)
+        self.assertEqual(worker.summary()['taskqueue.tests.record']['runs'], 5)
+        self.assertEqual(queue_stats()['by_task']['taskqueue.tests.record']['pending'], 1)
+
+    def test_failures_retry_with_backoff_then_give_up(self):
+        row = explode()
+        worker = Worker(concurrency=1)
+        worker.run(burst=True)
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.attempts, row.last_error), ('pending', 1, 'RuntimeError: boom'))
+        self.assertGreater(row.run_at, timezone.now())
+
+        QueuedTask.objects.update(run_at=timezone.now())
+        worker.run(burst=True)
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.attempts), ('failed', 2))
+        stats = worker.summary()['taskqueue.tests.explode']
+        self.assertEqual((stats['runs'], stats['failures'], stats['retries']), (2, 2, 1))
+        self.assertEqual(queue_stats()['by_task']['taskqueue.tests.explode']['retried'], 1)
+
+    def test_unknown_tasks_fail_and_stale_claims_are_reclaimed(self):
+        unknown = QueuedTask.objects.create(name='nowhere.task', task_hash='x')
+        stale = record(7, schedule=0)
+        QueuedTask.objects.filter(pk=stale.pk).update(status=QueuedTask.STATUS_RUNNING,
+                                                       locked_until=timezone.now() - timedelta(seconds=1))
+        Worker(concurrency=1).run(burst=True)
+        unknown.refresh_from_db()
+        self.assertEqual((unknown.status, unknown.last_error), ('failed', "Unknown task 'nowhere.task'"))
+        self.assertEqual(calls, ['7'])
+        self.assertEqual(claim(10), [])
+
+    def test_expired_leases_on_the_last_attempt_fail_instead_of_running_again(self):
+        row = record(8, schedule=0)
+        QueuedTask.objects.filter(pk=row.pk).update(status=QueuedTask.STATUS_RUNNING, attempts=row.max_attempts,
+                                                     locked_until=timezone.now() - timedelta(seconds=1))
+        Worker(concurrency=1).run(burst=True)
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.attempts, row.locked_until), ('failed', row.max_attempts, None))
+        self.assertIn('Lease expired', row.last_error)
+        self.assertEqual(calls, [])
+
+    def test_heartbeat_extends_the_lease_of_held_rows_only(self):
+        mine, theirs = record(1, schedule=0), record(2, schedule=0)
+        worker = Worker(concurrency=1, name='me')
+        worker._hold(claim(1, worker='me'))
+        claim(1, worker='other')
+        soon = timezone.now() + timedelta(seconds=5)
+        QueuedTask.objects.update(locked_until=soon)
+        self.assertEqual(worker.heartbeat(), 1)
+        mine.refresh_from_db()
+        theirs.refresh_from_db()
+        self.assertGreater(mine.locked_until, timezone.now() + lease() - timedelta(seconds=5))
+        self.assertEqual(theirs.locked_until, soon)
+
+    def test_queues_are_separate(self):
+        record(1, schedule=0, queue='emails')
+        record(2, schedule=0)
+        Worker(concurrency=1, queues=['emails']).run(burst=True)
+        self.assertEqual(calls, ['1'])
+
+    @override_settings(TASK_BACKEND='taskqueue.backends.ImmediateBackend')
+    def test_immediate_backend_runs_inline(self):
+        self.assertEqual(record(5), 5)
+        self.assertIsNone(explode())
+        self.assertFalse(QueuedTask.objects.exists())
@@ -0,0 +1,334 @@
+"""Worker for the database task queue (``manage.py run_task_worker``).
+
+Replaces ``process_tasks``, which locked and ran one task per poll (5 s apart
+when idle) in a single thread:
+
+* due rows are claimed in batches with ``SELECT ... FOR UPDATE SKIP LOCKED``
+  (highest ``priority`` first, then oldest ``run_at``), so any number of worker
+  processes can share a queue without blocking each other;
+* a process runs ``concurrency`` tasks at once in a thread pool and claims the
+  next batch as soon as there is room, without sleeping while work is due;
+* outcomes are written back in one ``bulk_update`` per loop; failing tasks are
+  retried with exponential backoff up to ``max_attempts``;
+* a heartbeat thread keeps pushing ``locked_until`` of the rows a worker
+  holds, so only rows whose worker is gone (crashed, killed) have an expired
+  lease; those become due again, or fail once they are out of attempts;
+* per-task counters (runs, failures, retries, duration, queue wait) are kept
+  in-process and the same figures can be computed from the table
+  (``queue_stats``); finished rows are pruned after ``TASK_QUEUE_KEEP_DONE``.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Avg, Count, F, Max, Min, Q
+from django.utils import timezone
+
+from .decorators import get_task
+from .models import QueuedTask
+
+logger = logging.getLogger(__name__)
+
+PRUNE_EVERY = 600  # seconds between two deletes of old finished rows
+
+
+def lease() -> timedelta:
+    return timedelta(seconds=getattr(settings, 'TASK_QUEUE_LEASE', 10 * 60))
+
+
+def backoff(attempts: int, rng: Optional[random.Random] = None) -> timedelta:
+    """10s, 20s, 40s ... capped at 1h, +/-20% jitter."""
+    base = getattr(settings, 'TASK_QUEUE_BACKOFF_BASE', 10)
+    cap = getattr(settings, 'TASK_QUEUE_BACKOFF_MAX', 3600)
+    delay = min(cap, base * 2 ** max(0, attempts - 1))
+    return timedelta(seconds=delay * (rng or random).uniform(0.8, 1.2))
+
+
+def default_worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim(limit: int, *, queues: Optional[Iterable[str]] = None, worker: str = '') -> List[QueuedTask]:
+    """Lock up to ``limit`` due rows for this worker; rows locked by other workers are skipped, not waited for."""
+    if limit <= 0:
+        return []
+    now = timezone.now()
+    due = (Q(status=QueuedTask.STATUS_PENDING, run_at__lte=now)
+           | Q(status=QueuedTask.STATUS_RUNNING, locked_until__lte=now))
+    order = ('-priority', 'run_at', 'pk')
+    with transaction.atomic():
+        # a task whose worker died on every attempt (OOM, segfault) would otherwise be retried forever
+        abandoned = QueuedTask.objects.filter(
+            status=QueuedTask.STATUS_RUNNING, locked_until__lte=now, attempts__gte=F('max_attempts'),
+        ).update(status=QueuedTask.STATUS_FAILED, locked_by='', locked_until=None, finished_at=now,
+                 last_error='Lease expired: the worker running the last attempt stopped responding')
+        if abandoned:
+            logger.error("Task queue: %s task(s) failed, lease expired on their last attempt", abandoned)
+        qs = QueuedTask.objects.filter(due).order_by(*order)
+        if queues:
+            qs = qs.filter(queue__in=list(queues))
+        if connection.features.has_select_for_update_skip_locked:
+            qs = qs.select_for_update(skip_locked=True)
+        ids = list(qs.values_list('pk', flat=True)[:limit])
+        if not ids:
+            return []
+        QueuedTask.objects.filter(pk__in=ids).update(
+            status=QueuedTask.STATUS_RUNNING, locked_by=worker[:100], locked_until=now + lease(),
+            attempts=F('attempts') + 1, started_at=now,
+        )
+    return list(QueuedTask.objects.filter(pk__in=ids).order_by(*order))
+
+
+def execute(row: QueuedTask) -> Tuple[Optional[str], float, bool]:
+    """Run one claimed row; returns (error or None, duration in seconds, worth retrying)."""
+    close_old_connections()
+    started = time.perf_counter()
+    try:
+        try:
+            task = get_task(row.name)
+        except KeyError:
+            return f"Unknown task {row.name!r}", 0.0, False
+        task.task_function(*row.args, **row.kwargs)
+        return None, time.perf_counter() - started, True
+    except Exception as e:  # noqa: BLE001 - recorded on the row and retried
+        logger.exception("Task %s #%s failed (attempt %s)", row.name, row.pk, row.attempts)
+        return f"{type(e).__name__}: {e}", time.perf_counter() - started, True
+    finally:
+        close_old_connections()
+
+
+def finish(results: List[Tuple[QueuedTask, Optional[str], float, bool]]) -> None:
+    """Write the outcome of executed rows back in one query."""
+    if not results:
+        return
+    now = timezone.now()
+    rows = []
+    for row, error, duration, retryable in results:
+        row.duration, row.finished_at, row.locked_by, row.locked_until = duration, now, '', None
+        if error is None:
+            row.status, row.last_error = QueuedTask.STATUS_DONE, ''
+        elif retryable and row.attempts < row.max_attempts:
+            row.status, row.last_error = QueuedTask.STATUS_PENDING, error[:2000]
+            row.run_at = now + backoff(row.attempts)
+        else:
+            row.status, row.last_error = QueuedTask.STATUS_FAILED, error[:2000]
+            logger.error("Task %s #%s: giving up after %s attempt(s): %s", row.name, row.pk, row.attempts, error)
+        rows.append(row)
+    QueuedTask.objects.bulk_update(
+        rows, ['status', 'last_error', 'run_at', 'duration', 'finished_at', 'locked_by', 'locked_until'],
+        batch_size=500,
+    )
+
+
+def extend(ids: Iterable[int], *, worker: str) -> int:
+    """Push the lease of rows ``worker`` still holds; returns how many it still holds."""
+    ids = list(ids)
+    if not ids:
+        return 0
+    return QueuedTask.objects.filter(pk__in=ids, status=QueuedTask.STATUS_RUNNING, locked_by=worker[:100]).update(
+        locked_until=timezone.now() + lease(),
+    )
+
+
+def release(rows: List[QueuedTask]) -> None:
+    """Give claimed-but-not-started rows back to the queue (shutdown)."""
+    if rows:
+        QueuedTask.objects.filter(pk__in=[row.pk for row in rows], status=QueuedTask.STATUS_RUNNING).update(
+            status=QueuedTask.STATUS_PENDING, locked_by='', locked_until=None, attempts=F('attempts') - 1,
+        )
+
+
+def prune(keep: Optional[timedelta] = None) -> int:
+    keep = keep if keep is not None else timedelta(seconds=getattr(settings, 'TASK_QUEUE_KEEP_DONE', 24 * 3600))
+    deleted, _ = QueuedTask.objects.filter(status=QueuedTask.STATUS_DONE, finished_at__lt=timezone.now() - keep).delete()
+    return deleted
+
+
+@dataclass
+class TaskStats:
+    runs: int = 0
+    failures: int = 0
+    retries: int = 0
+    total_duration: float = 0.0
+    max_duration: float = 0.0
+    total_wait: float = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data['avg_duration'] = self.total_duration / self.runs if self.runs else None
+        data['avg_wait'] = self.total_wait / self.runs if self.runs else None
+        return data
+
+
+class Worker:
+    def __init__(self, *, queues: Optional[Iterable[str]] = None, concurrency: int = 4,
+                 batch_size: Optional[int] = None, poll_interval: float = 1.0, name: Optional[str] = None):
+        self.queues = list(queues or ())
+        self.concurrency = max(1, concurrency)
+        # prefetch a little more than the pool can run so threads never wait on the next claim
+        self.batch_size = max(1, batch_size or self.concurrency * 2)
+        self.poll_interval = poll_interval
+        self.name = name or default_worker_name()
+        self.stats: Dict[str, TaskStats] = defaultdict(TaskStats)
+        self.processed = 0
+        self._stop = threading.Event()
+        self._inflight: Dict[Future, QueuedTask] = {}
+        self._held: Dict[int, QueuedTask] = {}  # claimed and not finished yet, kept alive by the heartbeat
+        self._held_lock = threading.Lock()
+        self._heartbeat: Optional[threading.Thread] = None
+        self._heartbeat_stop = threading.Event()
+        self._executor = (ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='task-worker')
+                          if self.concurrency > 1 else None)
+        self._pruned_at = 0.0
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _hold(self, rows: Iterable[QueuedTask]) -> None:
+        with self._held_lock:
+            self._held.update((row.pk, row) for row in rows)
+
+    def _unhold(self, rows: Iterable[QueuedTask]) -> None:
+        with self._held_lock:
+            for row in rows:
+                self._held.pop(row.pk, None)
+
+    def heartbeat(self) -> int:
+        """Extend the lease of every row this worker holds."""
+        with self._held_lock:
+            ids = list(self._held)
+        return extend(ids, worker=self.name)
+
+    def _heartbeat_loop(self) -> None:
+        # a third of the lease: two beats can be missed (slow DB) before another worker takes the rows over
+        interval = max(1.0, lease().total_seconds() / 3)
+        try:
+            while not self._heartbeat_stop.wait(interval):
+                try:
+                    self.heartbeat()
+                except Exception:  # noqa: BLE001 - the next beat retries
+                    logger.exception("Task worker %s: lease heartbeat failed", self.name)
+                    close_old_connections()
+        finally:
+            connection.close()
+
+    def _start_heartbeat(self) -> None:
+        if self._heartbeat is None or not self._heartbeat.is_alive():
+            self._heartbeat_stop.clear()
+            self._heartbeat = threading.Thread(target=self._heartbeat_loop, name='task-worker-heartbeat', daemon=True)
+            self._heartbeat.start()
+
+    def _record(self, results) -> None:
+        finish(results)
+        self._unhold(row for row, *_ in results)
+        for row, error, duration, _ in results:
+            stats = self.stats[row.name]
+            stats.runs += 1
+            stats.total_duration += duration
+            stats.max_duration = max(stats.max_duration, duration)
+            if row.started_at:
+                stats.total_wait += max(0.0, (row.started_at - row.run_at).total_seconds())
+            if row.attempts > 1:
+                stats.retries += 1
+            if error is not None:
+                stats.failures += 1
+        self.processed += len(results)
+
+    def _collect(self, timeout: Optional[float] = 0) -> None:
+        if not self._inflight:
+            return
+        done, _ = wait(list(self._inflight), timeout=timeout, return_when=FIRST_COMPLETED)
+        results = []
+        for future in done:
+            row = self._inflight.pop(future)
+            results.append((row, *future.result()))
+        self._record(results)
+
+    def run_batch(self) -> int:
+        """Claim and dispatch one batch; returns the number of rows claimed."""
+        rows = claim(self.batch_size - len(self._inflight), queues=self.queues, worker=self.name)
+        self._hold(rows)
+        if self._executor is None:
+            self._record([(row, *execute(row)) for row in rows])
+        else:
+            for row in rows:
+                self._inflight[self._executor.submit(execute, row)] = row
+        return len(rows)
+
+    def run(self, *, burst: bool = False, max_tasks: Optional[int] = None) -> None:
+        """Work until ``stop()``; with ``burst`` exit once nothing is due, with ``max_tasks`` after that many."""
+        self._start_heartbeat()
+        try:
+            while not self._stop.is_set():
+                self._collect()
+                claimed = self.run_batch()
+                if max_tasks is not None and self.processed >= max_tasks:
+                    break
+                if not claimed and not self._inflight:
+                    if burst:
+                        break
+                    self._prune()
+                    self._stop.wait(self.poll_interval)
+                elif self._inflight and (not claimed or len(self._inflight) >= self.batch_size):
+                    self._collect(timeout=self.poll_interval)
+        finally:
+            self._shutdown()
+
+    def _prune(self) -> None:
+        if time.monotonic() - self._pruned_at >= PRUNE_EVERY:
+            self._pruned_at = time.monotonic()
+            deleted = prune()
+            if deleted:
+                logger.info("Task queue: pruned %s finished task(s)", deleted)
+
+    def _shutdown(self) -> None:
+        unstarted = [row for future, row in list(self._inflight.items()) if future.cancel()]
+        for future in [f for f in self._inflight if f.cancelled()]:
+            self._inflight.pop(future)
+        release(unstarted)
+        self._unhold(unstarted)
+        while self._inflight:
+            self._collect(timeout=None)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        if self._heartbeat is not None:
+            self._heartbeat_stop.set()
+            self._heartbeat.join()
+            self._heartbeat = None
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        return {name: stats.as_dict() for name, stats in sorted(self.stats.items())}
+
+
+def queue_stats() -> Dict[str, Any]:
+    """Counts per status and per task, timing of finished runs and retry counts, from the table."""
+    by_status: Dict[str, int] = {status: 0 for status, _ in QueuedTask.STATUS_CHOICES}
+    by_task: Dict[str, Dict[str, Any]] = defaultdict(dict)
+    for row in QueuedTask.objects.order_by().values('name', 'status').annotate(n=Count('pk')):
+        by_status[row['status']] += row['n']
+        by_task[row['name']][row['status']] = row['n']
+    finished = (QueuedTask.objects.order_by().exclude(duration=None).values('name')
+                .annotate(avg_duration=Avg('duration'), max_duration=Max('duration'),
+                          retried=Count('pk', filter=Q(attempts__gt=1))))
+    for row in finished:
+        by_task[row.pop('name')].update(row)
+    now = timezone.now()
+    oldest = (QueuedTask.objects.filter(status=QueuedTask.STATUS_PENDING, run_at__lte=now)
+              .aggregate(oldest=Min('run_at'))['oldest'])
+    return {
+        'by_status': by_status,
+        'by_task': dict(by_task),
+        'oldest_due_age': round((now - oldest).total_seconds(), 1) if oldest else None,
+    }